@@ -3,38 +3,125 @@ import json
 import datetime
 from typing import Dict, Any, List, Optional
 import re
+from record_serializer import (HISTORY_FIELD, JsonRecordSerializer, RECORD_EXTENSIONS, list_record_files,
+                               read_record_file, read_record_fields, remove_record_file, write_record_file)
+from record_layout import (directory_cache, list_user_record_files, shard_dir_for_date,
+                           user_record_root)
+from factor_state import FactorStateEngine, auto_reduce_severity
+
+# 当天对话历史超过 HISTORY_LIMIT 条时只保留最近 HISTORY_KEEP 条
+HISTORY_LIMIT = 100
+HISTORY_KEEP = 50
 
 
 class DailyHealthRecorder:
     """每日健康记录管理器"""
 
-    def __init__(self, base_dir: str = "daily_records"):
+    def __init__(self, base_dir: str = "daily_records", serializer: JsonRecordSerializer = None,
+                 user_id: str = None, repository=None):
         """
         初始化记录器
 
         Args:
             base_dir: 记录文件的存储目录
+            serializer: 记录文件的序列化器（默认缩进JSON，读取时自动识别格式）
+            user_id: 用户昵称；提供时按用户分片存储（base_dir/<用户哈希>/<yyyy>/<mm>/<日期>.json），
+                     不提供时沿用旧的平铺布局（base_dir/<日期>.json）
+            repository: HealthRepository；与 user_id 一起提供时记录读写数据库，不再读写JSON文件
+                        （需要导出时使用 repository.export_records）；数据库按用户保存记录，
+                        没有 user_id 时忽略，调用方需要先确定当前用户
         """
         self.base_dir = base_dir
-        self.ensure_directory()
+        self.serializer = serializer or JsonRecordSerializer()
+        self.user_id = user_id
+        self.repository = repository if user_id else None
+        # 负面因子状态引擎（第一次查询时从今天的记录加载，之后查询不再读取记录）
+        self.factor_state: Optional[FactorStateEngine] = None
+        self.record_root = user_record_root(base_dir, user_id) if user_id else base_dir
+        if self.repository is None:
+            self.ensure_directory()
 
     def ensure_directory(self):
         """确保存储目录存在"""
-        if not os.path.exists(self.base_dir):
-            os.makedirs(self.base_dir)
+        directory_cache.ensure(self.record_root)
+
+    def get_record_dir(self, date_str: str) -> str:
+        """获取指定日期记录所在的目录"""
+        if self.user_id:
+            return shard_dir_for_date(self.record_root, date_str)
+        return self.record_root
 
     def get_today_filename(self) -> str:
         """获取今天的文件名"""
         today = datetime.datetime.now().strftime("%Y-%m-%d")
-        return os.path.join(self.base_dir, f"{today}.json")
+        return self.get_date_filename(today)
 
     def get_date_filename(self, date_str: str) -> str:
-        """获取指定日期的文件名"""
-        return os.path.join(self.base_dir, f"{date_str}.json")
+        """获取指定日期的文件名（当前序列化格式）"""
+        return os.path.join(self.get_record_dir(date_str), f"{date_str}{self.serializer.extension}")
+
+    def find_date_file(self, date_str: str) -> Optional[str]:
+        """
+        查找指定日期已存在的记录文件（任意格式）
+
+        目录内容由目录缓存维护，查找只 stat 一次目录（其他进程写入的记录也能找到）
+
+        Returns:
+            文件路径，不存在返回None
+        """
+        return directory_cache.find(self.get_record_dir(date_str), date_str)
+
+    def list_record_files(self) -> Dict[str, str]:
+        """
+        列出当前用户的所有记录文件
+
+        记录保存在数据库时没有记录文件，返回空字典（需要文件时使用 repository.export_records）
+
+        Returns:
+            按日期排序的 {日期: 文件路径}
+        """
+        if self.repository is not None:
+            return {}
+        if self.user_id:
+            return list_user_record_files(self.record_root)
+        return list_record_files(self.record_root)
+
+    def save_date_record(self, date_str: str, data: Dict[str, Any]) -> None:
+        """
+        按当前格式写入指定日期的记录，并清理该日期其他格式的旧文件
+
+        Args:
+            date_str: 日期字符串，格式 YYYY-MM-DD
+            data: 要保存的数据
+
+        Raises:
+            ValueError: 使用数据库仓储但数据库中没有该用户（例如档案已被删除）
+        """
+        if self.repository is not None:
+            if not self.repository.save_record(self.user_id, date_str, data):
+                raise ValueError(f"数据库中没有用户 '{self.user_id}'，记录未保存")
+            return
+
+        record_dir = self.get_record_dir(date_str)
+        directory_cache.ensure(record_dir)
+
+        filename = self.get_date_filename(date_str)
+        existing = directory_cache.find(record_dir, date_str)
+        write_record_file(filename, data, self.serializer)
+        directory_cache.record_saved(record_dir, date_str, filename)
+
+        if existing is not None and existing != filename:
+            for ext in RECORD_EXTENSIONS:
+                stale = os.path.join(record_dir, f"{date_str}{ext}")
+                if stale != filename:
+                    remove_record_file(stale)
 
     def check_today_record_exists(self) -> bool:
         """检查今天的记录文件是否存在"""
-        return os.path.exists(self.get_today_filename())
+        today = datetime.datetime.now().strftime("%Y-%m-%d")
+        if self.repository is not None:
+            return self.repository.record_exists(self.user_id, today)
+        return self.find_date_file(today) is not None
 
     def create_today_record(self, initial_data: Dict[str, Any] = None) -> Dict[str, Any]:
         """
@@ -44,9 +131,10 @@ class DailyHealthRecorder:
             initial_data: 初始数据
 
         Returns:
-            文件路径
+            今天的记录（保存失败时也返回，只是不会写入存储）
         """
-        filename = self.get_today_filename()
+        today = datetime.datetime.now().strftime("%Y-%m-%d")
+        filename = self.get_date_filename(today)
 
         if initial_data is None:
             initial_data = {
@@ -68,16 +156,21 @@ class DailyHealthRecorder:
                 "last_updated": datetime.datetime.now().isoformat()
             }
 
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(initial_data, f, ensure_ascii=False, indent=2)
-
-        print(f"✅ 创建今日记录文件: {filename}")
+        try:
+            self.save_date_record(today, initial_data)
+        except Exception as e:
+            # 不能再重新加载：记录没有保存下来，加载时又会进入这里
+            print(f"❌ 创建今日记录失败: {e}")
+            return initial_data
 
-        # 然后复制前一天的负面因子
-        self.copy_active_factors_from_previous_day()
+        if self.repository is not None:
+            print(f"✅ 创建今日记录: {today}")
+        else:
+            print(f"✅ 创建今日记录文件: {filename}")
 
-        # 重新加载文件以包含复制的因子
-        return self.load_today_record()
+        # 然后把前一天的负面因子复制到刚创建的记录中
+        self.copy_active_factors_from_previous_day(initial_data)
+        return initial_data
 
     def load_today_record(self) -> Dict[str, Any]:
         """
@@ -86,14 +179,25 @@ class DailyHealthRecorder:
         Returns:
             记录数据字典
         """
-        filename = self.get_today_filename()
+        if self.repository is not None:
+            # 对话历史在单独的表里逐条追加（add_daily_history / get_daily_history），这里不读取；
+            # 不带 daily_history 的记录保存时不会改动已有的历史
+            data = self.repository.load_record(self.user_id, datetime.datetime.now().strftime("%Y-%m-%d"),
+                                               exclude=[HISTORY_FIELD])
+            if not data:
+                data = self.create_today_record()
+                data.pop(HISTORY_FIELD, None)
+                return data
+            data['last_updated'] = datetime.datetime.now().isoformat()
+            return data
+
+        filename = self.find_date_file(datetime.datetime.now().strftime("%Y-%m-%d"))
 
-        if not os.path.exists(filename):
+        if filename is None:
             return self.create_today_record()
 
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = read_record_file(filename)
 
             # 更新最后修改时间
             data['last_updated'] = datetime.datetime.now().isoformat()
@@ -113,19 +217,46 @@ class DailyHealthRecorder:
         Returns:
             记录数据字典，如果文件不存在返回空字典
         """
-        filename = self.get_date_filename(date_str)
+        if self.repository is not None:
+            return self.repository.load_record(self.user_id, date_str)
+
+        filename = self.find_date_file(date_str)
 
-        if not os.path.exists(filename):
+        if filename is None:
             return {}
 
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = read_record_file(filename)
             return data
         except Exception as e:
             print(f"❌ 加载记录文件失败 {date_str}: {e}")
             return {}
 
+    def load_date_fields(self, date_str: str, fields: List[str]) -> Dict[str, Any]:
+        """
+        只加载指定日期记录中的部分顶层字段（不返回 daily_history 等大字段）
+
+        Args:
+            date_str: 日期字符串，格式 YYYY-MM-DD
+            fields: 需要的顶层字段列表
+
+        Returns:
+            只包含所需字段的字典，如果文件不存在返回空字典
+        """
+        if self.repository is not None:
+            return self.repository.load_record(self.user_id, date_str, fields=fields)
+
+        filename = self.find_date_file(date_str)
+
+        if filename is None:
+            return {}
+
+        try:
+            return read_record_fields(filename, fields=fields)
+        except Exception as e:
+            print(f"❌ 加载记录字段失败 {date_str}: {e}")
+            return {}
+
     def save_today_record(self, data: Dict[str, Any]) -> bool:
         """
         保存今天的记录文件
@@ -137,11 +268,8 @@ class DailyHealthRecorder:
             是否成功
         """
         try:
-            filename = self.get_today_filename()
             data['last_updated'] = datetime.datetime.now().isoformat()
-
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.save_date_record(datetime.datetime.now().strftime("%Y-%m-%d"), data)
 
             return True
         except Exception as e:
@@ -242,7 +370,8 @@ class DailyHealthRecorder:
             for i in range(1, 4):  # 前1-3天
                 date = datetime.datetime.now() - datetime.timedelta(days=i)
                 date_str = date.strftime("%Y-%m-%d")
-                record = self.load_date_record(date_str)
+                record = self.load_date_fields(
+                    date_str, ["summary", "daily_plan", "drink_number", "drink_plan"])
 
                 if record:
                     # 提取关键信息
@@ -285,27 +414,36 @@ class DailyHealthRecorder:
             print(f"❌ 获取三天摘要失败: {e}")
             return "获取历史记录时出错。"
 
-    def get_historical_records(self, days: int = 7) -> List[Dict[str, Any]]:
+    def get_historical_records(self, days: int = 7, fields: List[str] = None) -> List[Dict[str, Any]]:
         """
         获取历史记录
 
         Args:
             days: 获取最近多少天的记录
+            fields: 只读取这些顶层字段（None表示完整记录）
 
         Returns:
             历史记录列表
         """
+        if self.repository is not None:
+            # 一次范围查询，按日期倒序（与按文件逐天读取的顺序一致）
+            today = datetime.datetime.now()
+            start = (today - datetime.timedelta(days=days - 1)).strftime('%Y-%m-%d')
+            records = self.repository.load_records(self.user_id, start, today.strftime('%Y-%m-%d'), fields=fields)
+            return records[::-1]
+
         records = []
 
         for i in range(days):
             date = datetime.datetime.now() - datetime.timedelta(days=i)
-            filename = os.path.join(self.base_dir, f"{date.strftime('%Y-%m-%d')}.json")
+            filename = self.find_date_file(date.strftime('%Y-%m-%d'))
 
-            if os.path.exists(filename):
+            if filename:
                 try:
-                    with open(filename, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    records.append(data)
+                    if fields is None:
+                        records.append(read_record_file(filename))
+                    else:
+                        records.append(read_record_fields(filename, fields=fields))
                 except:
                     continue
 
@@ -336,7 +474,7 @@ class DailyHealthRecorder:
         Returns:
             摘要字符串
         """
-        records = self.get_historical_records(days)
+        records = self.get_historical_records(days, fields=["date", "important_notes"])
 
         if not records:
             return "暂无重要记录"
@@ -660,23 +798,32 @@ class DailyHealthRecorder:
             是否成功
         """
         try:
-            data = self.load_today_record()
-
-            # 确保 daily_history 存在
-            if "daily_history" not in data:
-                data["daily_history"] = []
-
             # 添加新记录
             history_entry = {
                 "role": role,
                 "content": content,
                 "timestamp": datetime.datetime.now().isoformat()
             }
+
+            if self.repository is not None:
+                # 数据库中只追加一行，不重写当天的记录
+                if not self.check_today_record_exists():
+                    self.load_today_record()
+                today = datetime.datetime.now().strftime("%Y-%m-%d")
+                return self.repository.append_history(self.user_id, today, history_entry,
+                                                       max_entries=HISTORY_LIMIT, keep=HISTORY_KEEP)
+
+            data = self.load_today_record()
+
+            # 确保 daily_history 存在
+            if "daily_history" not in data:
+                data["daily_history"] = []
+
             data["daily_history"].append(history_entry)
 
             # 限制历史记录长度，避免文件过大
-            if len(data["daily_history"]) > 100:
-                data["daily_history"] = data["daily_history"][-50:]
+            if len(data["daily_history"]) > HISTORY_LIMIT:
+                data["daily_history"] = data["daily_history"][-HISTORY_KEEP:]
 
             # 更新最后修改时间
             data["last_updated"] = datetime.datetime.now().isoformat()
@@ -700,6 +847,11 @@ class DailyHealthRecorder:
             历史记录列表
         """
         try:
+            if self.repository is not None:
+                # 按 (用户, 日期, id) 索引只读最近的几条
+                today = datetime.datetime.now().strftime("%Y-%m-%d")
+                return self.repository.load_history(self.user_id, today, limit)
+
             data = self.load_today_record()
             history = data.get("daily_history", [])
 
@@ -811,6 +963,22 @@ class DailyHealthRecorder:
             "last_updated": datetime.datetime.now().isoformat()
         }
 
+    def _factor_engine(self) -> FactorStateEngine:
+        """获取负面因子状态引擎（第一次调用时从今天的记录加载）"""
+        if self.factor_state is None:
+            data = self.load_today_record()
+            # 新建今日记录时复制因子的过程已经加载了引擎
+            if self.factor_state is None:
+                self._anchor_factor_state(data)
+        return self.factor_state
+
+    def _anchor_factor_state(self, data: Dict[str, Any]) -> None:
+        """以今天记录中的负面因子重新锚定状态引擎（因子有变化并保存后调用）"""
+        if self.factor_state is None:
+            self.factor_state = FactorStateEngine()
+        self.factor_state.load_snapshot(data.get("date") or datetime.datetime.now().strftime("%Y-%m-%d"),
+                                        data.get("negative_factors"))
+
     def add_negative_factor(self, factor_type: str, description: str,
                             severity: str = "轻", duration_days: int = 1,
                             notes: str = "", should_exercise: bool = True) -> bool:
@@ -860,12 +1028,19 @@ class DailyHealthRecorder:
             data["negative_factors"]["should_exercise"] = should_exercise
             data["negative_factors"]["last_updated"] = datetime.datetime.now().isoformat()
 
-            return self.save_today_record(data)
+            return self._save_factor_change(data)
 
         except Exception as e:
             print(f"❌ 添加负面因子失败: {e}")
             return False
 
+    def _save_factor_change(self, data: Dict[str, Any]) -> bool:
+        """保存今天的记录，并用新的负面因子重新锚定状态引擎"""
+        if not self.save_today_record(data):
+            return False
+        self._anchor_factor_state(data)
+        return True
+
     def _get_severity_level(self, severity: str) -> int:
         """将严重程度转换为数值"""
         severity_map = {
@@ -917,7 +1092,7 @@ class DailyHealthRecorder:
                     self._update_total_impact(data)
                     data["negative_factors"]["last_updated"] = datetime.datetime.now().isoformat()
 
-                    return self.save_today_record(data)
+                    return self._save_factor_change(data)
 
             return False
 
@@ -954,7 +1129,7 @@ class DailyHealthRecorder:
                     self._update_total_impact(data)
                     data["negative_factors"]["last_updated"] = datetime.datetime.now().isoformat()
 
-                    return self.save_today_record(data)
+                    return self._save_factor_change(data)
 
             return False
 
@@ -962,58 +1137,56 @@ class DailyHealthRecorder:
             print(f"❌ 标记康复失败: {e}")
             return False
 
-    def copy_active_factors_from_previous_day(self) -> bool:
+    def copy_active_factors_from_previous_day(self, today_data: Dict[str, Any] = None) -> bool:
         """
-        从昨天的记录中复制活跃的负面因子到今日，并增加天数
+        把昨天仍然活跃的负面因子写入今日记录（天数+1，并按持续时间自动减轻）
+
+        因子状态由状态引擎从昨天的记录推算，之后的查询都直接使用引擎，不再读取记录
+
+        Args:
+            today_data: 今天的记录（刚创建记录时传入，直接在其中添加因子；默认重新加载）
 
         Returns:
             是否成功
         """
         try:
             # 获取昨天的日期
+            today_str = datetime.datetime.now().strftime("%Y-%m-%d")
             yesterday = datetime.datetime.now() - datetime.timedelta(days=1)
             yesterday_str = yesterday.strftime("%Y-%m-%d")
 
-            # 加载昨天的记录
-            yesterday_data = self.load_date_record(yesterday_str)
+            # 引擎已经加载时直接推算今天的状态，否则从昨天的记录加载一次
+            engine = self.factor_state
+            if engine is None or engine.anchor_date is None or engine.anchor_date.isoformat() >= today_str:
+                yesterday_data = self.load_date_fields(yesterday_str, ["negative_factors"])
+                if not yesterday_data or "negative_factors" not in yesterday_data:
+                    return True  # 没有负面因子可复制
+                engine = FactorStateEngine()
+                engine.load_snapshot(yesterday_str, yesterday_data["negative_factors"])
 
-            if not yesterday_data or "negative_factors" not in yesterday_data:
-                return True  # 没有负面因子可复制
+            # 昨天活跃、今天仍在记录中的因子
+            carried = [factor for factor in engine.factors_on(today_str) if factor.get("copied_from") == yesterday_str]
 
             # 加载今天的记录
-            today_data = self.load_today_record()
+            if today_data is None:
+                today_data = self.load_today_record()
 
             # 初始化今天的负面因子模块
             if "negative_factors" not in today_data:
                 today_data["negative_factors"] = self._get_default_negative_factors()
 
-            # 复制昨天的活跃因子
-            active_factors_copied = 0
-            yesterday_factors = yesterday_data["negative_factors"].get("factors", [])
+            for factor in carried:
+                factor["last_updated"] = datetime.datetime.now().isoformat()
+                today_data["negative_factors"]["factors"].append(factor)
 
-            for factor in yesterday_factors:
-                if factor.get("status") == "active":
-                    # 创建副本，天数+1
-                    new_factor = factor.copy()
-                    new_factor["duration_days"] = factor.get("duration_days", 1) + 1
-                    new_factor["copied_from"] = yesterday_str
-                    new_factor["last_updated"] = datetime.datetime.now().isoformat()
-
-                    # 根据持续时间和严重程度自动调整
-                    self._auto_reduce_severity(new_factor)
-
-                    # 添加到今天的记录
-                    today_data["negative_factors"]["factors"].append(new_factor)
-                    active_factors_copied += 1
-
-            if active_factors_copied > 0:
+            if carried:
                 # 更新总影响力
                 self._update_total_impact(today_data)
                 today_data["negative_factors"]["last_updated"] = datetime.datetime.now().isoformat()
 
-                print(f"📝 已从昨天复制了 {active_factors_copied} 个活跃负面因子到今日")
+                print(f"📝 已从昨天复制了 {len(carried)} 个活跃负面因子到今日")
 
-            return self.save_today_record(today_data)
+            return self._save_factor_change(today_data)
 
         except Exception as e:
             print(f"❌ 复制负面因子失败: {e}")
@@ -1027,17 +1200,7 @@ class DailyHealthRecorder:
             活跃负面因子列表
         """
         try:
-            data = self.load_today_record()
-
-            if "negative_factors" not in data:
-                return []
-
-            active_factors = []
-            for factor in data["negative_factors"].get("factors", []):
-                if factor.get("status") == "active":
-                    active_factors.append(factor)
-
-            return active_factors
+            return self._factor_engine().active_factors()
 
         except Exception as e:
             print(f"❌ 获取活跃负面因子失败: {e}")
@@ -1051,12 +1214,12 @@ class DailyHealthRecorder:
             摘要字符串
         """
         try:
-            data = self.load_today_record()
+            engine = self._factor_engine()
 
-            if "negative_factors" not in data or not data["negative_factors"].get("factors"):
+            if not engine.factors_on():
                 return "🎉 今日无负面因子记录！保持良好的状态哦~"
 
-            active_factors = self.get_active_negative_factors()
+            active_factors = engine.active_factors()
 
             if not active_factors:
                 return "✨ 今日无活跃负面因子，所有问题都已解决！"
@@ -1076,8 +1239,8 @@ class DailyHealthRecorder:
                 )
 
             # 添加总影响力评分
-            total_impact = data["negative_factors"].get("total_impact", 0)
-            should_exercise = data["negative_factors"].get("should_exercise", True)
+            total_impact = engine.total_impact()
+            should_exercise = engine.should_exercise_flag()
 
             summary_lines.append(f"\n📊 总影响力评分：{total_impact}/10")
             summary_lines.append(f"🏃 是否适合运动：{'✅ 可以运动' if should_exercise else '❌ 建议休息'}")
@@ -1104,57 +1267,8 @@ class DailyHealthRecorder:
             包含判断结果和建议的字典
         """
         try:
-            data = self.load_today_record()
-
-            if "negative_factors" not in data:
-                return {
-                    "can_exercise": True,
-                    "reason": "无负面因子记录",
-                    "suggestion": "可以正常进行运动",
-                    "factors": []
-                }
-
-            # 获取配置的适合运动标志
-            should_exercise = data["negative_factors"].get("should_exercise", True)
-            active_factors = self.get_active_negative_factors()
-
-            if not active_factors:
-                return {
-                    "can_exercise": True,
-                    "reason": "无活跃负面因子",
-                    "suggestion": "可以正常进行运动",
-                    "factors": []
-                }
-
-            # 检查是否有重度因子
-            severe_factors = []
-            for factor in active_factors:
-                if factor.get("severity") == "重":
-                    severe_factors.append(factor)
-
-            if severe_factors:
-                return {
-                    "can_exercise": False,
-                    "reason": f"存在{len(severe_factors)}个重度负面因子",
-                    "suggestion": "建议充分休息或就医，暂停剧烈运动",
-                    "factors": severe_factors
-                }
-
-            # 如果没有重度因子，使用配置的标志
-            if should_exercise:
-                return {
-                    "can_exercise": True,
-                    "reason": "负面因子影响较小",
-                    "suggestion": "可以进行轻度到中度运动",
-                    "factors": active_factors
-                }
-            else:
-                return {
-                    "can_exercise": False,
-                    "reason": "系统建议休息",
-                    "suggestion": "建议休息或进行极轻度活动",
-                    "factors": active_factors
-                }
+            # 只遍历今天的活跃因子（缓存在状态引擎中），不读取记录
+            return self._factor_engine().can_exercise()
 
         except Exception as e:
             print(f"❌ 判断运动能力失败: {e}")
@@ -1358,102 +1472,8 @@ class DailyHealthRecorder:
             print("✅ 计划验证：已充分考虑所有负面因子")
 
     def _auto_reduce_severity(self, factor: Dict[str, Any]) -> None:
-        """
-        根据持续时间自动减轻负面因子的严重程度
-
-        规则：
-        - 轻度问题：3天后自动减轻或建议康复
-        - 中度问题：5天后自动减轻
-        - 重度问题：7天后自动减轻
-        - 超过14天：自动标记为"恢复中"
-        - 超过30天：自动康复
-        """
-        duration = factor.get("duration_days", 1)
-        current_severity = factor.get("severity", "轻")
-        factor_type = factor.get("type", "")
-
-        # 不同类型的问题有不同的恢复时间
-        recovery_timelines = {
-            "受伤": {"轻": 3, "中": 7, "重": 14},
-            "生病": {"轻": 3, "中": 5, "重": 10},
-            "情绪": {"轻": 2, "中": 4, "重": 7},
-            "疲劳": {"轻": 2, "中": 3, "重": 5},
-            "其他": {"轻": 3, "中": 5, "重": 7}
-        }
-
-        # 获取该类型问题的恢复时间
-        timeline = recovery_timelines.get(factor_type, recovery_timelines["其他"])
-        recovery_days = timeline.get(current_severity, 3)
-
-        # 记录原始值，用于大模型参考
-        if "original_severity" not in factor:
-            factor["original_severity"] = current_severity
-        if "original_start_date" not in factor:
-            factor["original_start_date"] = factor.get("start_date", "")
-
-        # 判断是否需要调整严重程度
-        if current_severity == "重":
-            if duration >= recovery_days:
-                # 重度问题达到恢复时间后降为中度
-                factor["severity"] = "中"
-                factor["severity_level"] = 2
-                factor["auto_reduced"] = True
-                factor["reduction_reason"] = f"持续{duration}天后自动减轻"
-                factor["reduction_date"] = datetime.datetime.now().strftime("%Y-%m-%d")
-
-                # 如果是受伤，调整运动建议
-                if factor_type == "受伤":
-                    factor["should_exercise"] = False  # 中度受伤仍不建议运动
-            elif duration >= recovery_days * 2:
-                # 两倍恢复时间后降为轻度
-                factor["severity"] = "轻"
-                factor["severity_level"] = 1
-                factor["auto_reduced"] = True
-                factor["reduction_reason"] = f"持续{duration}天后显著改善"
-
-                # 调整运动建议
-                factor["should_exercise"] = True  # 轻度可以适当运动
-
-        elif current_severity == "中":
-            if duration >= recovery_days:
-                # 中度问题达到恢复时间后降为轻度
-                factor["severity"] = "轻"
-                factor["severity_level"] = 1
-                factor["auto_reduced"] = True
-                factor["reduction_reason"] = f"持续{duration}天后自动减轻"
-
-                # 调整运动建议
-                factor["should_exercise"] = True  # 轻度可以适当运动
-            elif duration >= recovery_days * 1.5:
-                # 1.5倍恢复时间后建议确认康复
-                factor["status"] = "recovering"
-                factor["recovery_suggested"] = True
-                factor["recovery_reason"] = f"已持续{duration}天，建议确认是否已完全康复"
-
-        elif current_severity == "轻":
-            if duration >= recovery_days:
-                # 轻度问题达到恢复时间后建议确认康复
-                factor["status"] = "recovering"
-                factor["recovery_suggested"] = True
-                factor["recovery_reason"] = f"已持续{duration}天，建议确认是否已完全康复"
-            elif duration >= recovery_days * 2:
-                # 两倍恢复时间后自动康复
-                factor["status"] = "recovered"
-                factor["recovery_date"] = datetime.datetime.now().strftime("%Y-%m-%d")
-                factor["recovery_notes"] = f"持续{duration}天后系统自动标记康复"
-                factor["auto_recovered"] = True
-
-        # 超过30天的活跃负面因子，强制标记为康复
-        if duration >= 30 and factor.get("status") == "active":
-            factor["status"] = "recovered"
-            factor["recovery_date"] = datetime.datetime.now().strftime("%Y-%m-%d")
-            factor["recovery_notes"] = f"持续{duration}天，系统自动标记康复"
-            factor["auto_recovered"] = True
-
-        # 记录恢复进度百分比（用于大模型参考）
-        recovery_percent = min(100, (duration / recovery_days) * 100)
-        factor["recovery_progress"] = round(recovery_percent, 1)
-        factor["estimated_recovery_days"] = max(0, recovery_days - duration)
+        """根据持续时间自动减轻负面因子的严重程度（规则见 factor_state.auto_reduce_severity）"""
+        auto_reduce_severity(factor)
 
     # 在 DailyHealthRecorder 类中添加这个方法
     def get_daily_archive_info(self, view_type: str = "summary") -> dict:
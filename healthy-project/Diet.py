@@ -13,24 +13,86 @@
 '''
 import datetime
 import json
+import random
 import re
 import requests
+import sys
+import time
+import weakref
 from typing import Dict, List, Optional, Any
 from openai import OpenAI
 
+# 可选依赖：没有安装时批量计算逐条累加
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from food_matcher import FoodMatcher
+from food_parser import LocalFoodParser
+from meal_classifier import MealClassifier
+from nutrition_table import NutritionTable
+
+# 餐次识别器（正则只编译一次，所有对话共用）
+MEAL_CLASSIFIER = MealClassifier()
+
+# 营养成分表 → 加入了该表食物名称的匹配器（多个 DietFunctions 实例共用）
+_TABLE_MATCHERS = weakref.WeakKeyDictionary()
+
+
+def _iso_week(date_str: str) -> str:
+    """YYYY-MM-DD → ISO周 "2025-W03"（无法解析的日期返回空字符串）"""
+    try:
+        iso_year, iso_week, _ = datetime.date.fromisoformat(date_str).isocalendar()
+    except (TypeError, ValueError):
+        return ""
+    return f"{iso_year}-W{iso_week:02d}"
+
+
+def _group_totals(meal_totals, meal_valid, meal_codes, group_count) -> List[List[float]]:
+    """按编号汇总每餐的 (热量, 蛋白质, 碳水, 脂肪)，返回每组 [热量, 蛋白质, 碳水, 脂肪, 餐数]"""
+    if np is not None and meal_codes:
+        valid = np.array(meal_valid, dtype=np.float64)
+        codes = np.array(meal_codes, dtype=np.int64)
+        values = np.array(meal_totals, dtype=np.float64).reshape(-1, 4) * valid[:, None]
+        columns = [np.bincount(codes, weights=values[:, i], minlength=group_count) for i in range(4)]
+        columns.append(np.bincount(codes, weights=valid, minlength=group_count))
+        return np.stack(columns, axis=1).tolist()
+
+    groups = [[0, 0, 0, 0, 0] for _ in range(group_count)]
+    for totals, valid, code in zip(meal_totals, meal_valid, meal_codes):
+        if valid:
+            group = groups[code]
+            for i in range(4):
+                group[i] += totals[i]
+            group[4] += 1
+    return groups
+
+
+def _macro_summary(totals) -> Dict[str, Any]:
+    """(热量, 蛋白质, 碳水, 脂肪) → 与 calculate_calories_from_analysis 相同的取整格式"""
+    return {
+        "total_calories": round(totals[0]),
+        "protein_g": round(totals[1], 1),
+        "carbs_g": round(totals[2], 1),
+        "fat_g": round(totals[3], 1)
+    }
+
 
 class DietFunctions:
     """饮食相关功能类"""
 
-    def __init__(self, client: OpenAI = None, api_key: str = None):
+    def __init__(self, client: OpenAI = None, api_key: str = None, nutrition_table: NutritionTable = None):
         """
         初始化饮食功能
 
         Args:
             client: OpenAI客户端（用于调用大模型）
             api_key: 通义千问API密钥（可选）
+            nutrition_table: 大型营养成分表（可选，内置数据库中找不到的食物从这里查找）
         """
         self.client = client
+        self.nutrition_table = nutrition_table
 
         # 基础食物数据库（每100克）
         self.base_food_db = {
@@ -114,6 +176,43 @@ class DietFunctions:
             }
         }
 
+        # 常见关键词 → 基础食物（名称都匹配不上时使用）
+        self.food_aliases = {
+            "饭": "米饭",
+            "面": "面条",
+            "肉": "鸡肉",
+            "菜": "蔬菜",
+            "果": "苹果",
+            "蛋": "鸡蛋",
+            "奶": "牛奶",
+            "包": "面包",
+            "豆": "豆腐",
+            "鱼": "鱼",
+            "虾": "虾",
+            "鸡": "鸡肉",
+            "牛": "牛肉",
+            "猪": "猪肉"
+        }
+
+        # 把食物名称、别名和餐厅菜品编译成匹配器，查找时只扫描一遍名称
+        if nutrition_table is None:
+            self.food_matcher = FoodMatcher(self.base_food_db, self.food_aliases, self.restaurant_calories)
+        else:
+            # 营养成分表中的名称和别名也加入匹配器（同名时内置数据库优先）；表很大，同一张表只编译一次
+            self.food_matcher = _TABLE_MATCHERS.get(nutrition_table)
+            if self.food_matcher is None:
+                self.food_matcher = FoodMatcher(self.base_food_db, self.food_aliases, self.restaurant_calories)
+                for name in nutrition_table.names:
+                    self.food_matcher.add_food(name)
+                for alias, name in nutrition_table.aliases.items():
+                    self.food_matcher.add_alias(alias, name)
+                _TABLE_MATCHERS[nutrition_table] = self.food_matcher
+
+        # 本地规则解析器：描述足够明确时不调用大模型
+        self.local_parser = LocalFoodParser(self.food_matcher, self.cooking_methods,
+                                            self.portion_sizes, self.sauce_levels)
+        self.parse_stats = {"local": 0, "llm": 0}
+
     def analyze_food_with_llm(self, food_input: str) -> Dict:
         """
         使用现有的大模型客户端分析食物描述
@@ -220,36 +319,15 @@ class DietFunctions:
         Returns:
             食物数据，如果找不到返回默认值
         """
-        # 首先检查完全匹配
-        if food_name in self.base_food_db:
-            return self.base_food_db[food_name]
-
-        # 检查部分匹配
-        for key in self.base_food_db:
-            if key in food_name or food_name in key:
-                return self.base_food_db[key]
-
-        # 检查常见关键词
-        keywords = {
-            "饭": "米饭",
-            "面": "面条",
-            "肉": "鸡肉",
-            "菜": "蔬菜",
-            "果": "苹果",
-            "蛋": "鸡蛋",
-            "奶": "牛奶",
-            "包": "面包",
-            "豆": "豆腐",
-            "鱼": "鱼",
-            "虾": "虾",
-            "鸡": "鸡肉",
-            "牛": "牛肉",
-            "猪": "猪肉"
-        }
-
-        for keyword, default_food in keywords.items():
-            if keyword in food_name:
-                return self.base_food_db.get(default_food, {"calories": 100, "protein": 5, "carbs": 10, "fat": 5})
+        # 完全匹配、部分匹配（最长匹配）和常见关键词都由匹配器一次解析
+        matched_name = self.food_matcher.resolve(food_name)
+        if matched_name is not None:
+            if matched_name in self.base_food_db:
+                return self.base_food_db[matched_name]
+            if self.nutrition_table is not None:
+                table_data = self.nutrition_table.get(matched_name)
+                if table_data is not None:
+                    return table_data
 
         # 返回默认值
         return {"calories": 100, "protein": 5, "carbs": 10, "fat": 5}
@@ -291,22 +369,11 @@ class DietFunctions:
             weight = item.get("estimated_weight_g", 100)
             cooking_method = item.get("cooking_method", "炒")
 
-            # 1. 首先检查是否为连锁餐厅食物
-            is_restaurant_food = False
-            restaurant_calories = 0
-
-            for restaurant, menu in self.restaurant_calories.items():
-                if restaurant in food_name:
-                    # 查找具体菜品
-                    for dish, cal in menu.items():
-                        if dish in food_name:
-                            restaurant_calories = cal
-                            is_restaurant_food = True
-                            break
-                    if is_restaurant_food:
-                        break
-
-            if is_restaurant_food and restaurant_calories > 0:
+            # 1. 首先检查是否为连锁餐厅食物（店名和菜品名都出现在名称中）
+            restaurant_match = self.food_matcher.match_restaurant(food_name)
+            restaurant_calories = restaurant_match[2] if restaurant_match else 0
+
+            if restaurant_calories > 0:
                 # 使用餐厅菜品的热量
                 item_calories = restaurant_calories
                 item_protein = restaurant_calories * 0.15 / 4  # 估算蛋白质
@@ -396,6 +463,144 @@ class DietFunctions:
             ]
         }
 
+    def _food_nutrients(self, food_name: str):
+        """
+        一种食物用于热量计算的数据（批量计算时每个名称只解析一次）
+
+        Returns:
+            ((热量, 蛋白质, 碳水, 脂肪), 是否为餐厅菜品)；餐厅菜品为一份的数值，其他为每100克
+        """
+        restaurant_match = self.food_matcher.match_restaurant(food_name)
+        restaurant_calories = restaurant_match[2] if restaurant_match else 0
+        if restaurant_calories > 0:
+            return (restaurant_calories, restaurant_calories * 0.15 / 4,
+                    restaurant_calories * 0.5 / 4, restaurant_calories * 0.35 / 9), True
+
+        base_data = self.find_food_in_db(food_name)
+        return (base_data["calories"], base_data["protein"], base_data["carbs"], base_data["fat"]), False
+
+    def calculate_calories_batch(self, meals: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量计算多餐的热量和营养素，并按餐、按天、按周汇总（用于日报、周报）
+
+        计算规则与 calculate_calories_from_analysis 相同，每餐的结果也相同；
+        区别是所有食物条目先转换成数组（同名食物只查找一次），再用 NumPy 一次算完
+
+        Args:
+            meals: [{"date": "YYYY-MM-DD", "meal": "午餐", "analysis": 食物分析结果}, ...]
+
+        Returns:
+            {"meals": 每餐结果, "days": {日期: 汇总}, "weeks": {"2025-W03": 汇总},
+             "meal_types": {餐次: 汇总}, "total": 总汇总}
+        """
+        # 1. 展开所有食物条目（同名食物只查找一次）
+        food_rows: Dict[str, int] = {}
+        food_values: List[tuple] = []
+        food_fixed: List[bool] = []
+        item_rows, item_weights, item_cooking, item_meals = [], [], [], []
+        meal_portions, meal_sauces, meal_valid = [], [], []
+
+        for meal_index, entry in enumerate(meals):
+            analysis = entry.get("analysis") or {}
+            portion_coef = self.portion_sizes.get(analysis.get("portion_size", "中"), 1.0)
+            sauce_coef = self.sauce_levels.get(analysis.get("sauce_level", "正常"), 1.0)
+            meal_portions.append(portion_coef)
+            meal_sauces.append(sauce_coef)
+
+            valid = "error" not in analysis and bool(analysis.get("food_items"))
+            meal_valid.append(valid)
+            if not valid:
+                continue
+
+            for item in analysis["food_items"]:
+                food_name = item.get("name", "")
+                row = food_rows.get(food_name)
+                if row is None:
+                    values, fixed = self._food_nutrients(food_name)
+                    row = food_rows[food_name] = len(food_values)
+                    food_values.append(values)
+                    food_fixed.append(fixed)
+                item_rows.append(row)
+                item_weights.append(item.get("estimated_weight_g", 100))
+                item_cooking.append(self.cooking_methods.get(item.get("cooking_method", "炒"), 1.2))
+                item_meals.append(meal_index)
+
+        # 2. 计算每餐的热量和营养素（未取整）
+        meal_count = len(meals)
+        if np is not None:
+            meal_totals = self._meal_totals_numpy(food_values, food_fixed, item_rows, item_weights,
+                                                  item_cooking, item_meals, meal_portions, meal_sauces, meal_count)
+        else:
+            meal_totals = [[0, 0, 0, 0] for _ in range(meal_count)]
+            for row, weight, cooking_coef, meal_index in zip(item_rows, item_weights, item_cooking, item_meals):
+                calories, protein, carbs, fat = food_values[row]
+                if not food_fixed[row]:
+                    calories = (calories * weight / 100) * cooking_coef
+                    protein, carbs, fat = protein * weight / 100, carbs * weight / 100, fat * weight / 100
+                totals = meal_totals[meal_index]
+                totals[0] += calories
+                totals[1] += protein
+                totals[2] += carbs
+                totals[3] += fat
+            for totals, portion_coef, sauce_coef in zip(meal_totals, meal_portions, meal_sauces):
+                totals[0] *= portion_coef * sauce_coef
+                totals[1] *= portion_coef
+                totals[2] *= portion_coef
+                totals[3] *= portion_coef * sauce_coef
+
+        # 3. 按天、按周、按餐次汇总（先把日期、周、餐次编成整数编号，每个日期只解析一次）
+        results = [{"date": entry.get("date", ""), "meal": entry.get("meal", ""), "success": valid,
+                    **_macro_summary(totals)}
+                   for entry, totals, valid in zip(meals, meal_totals, meal_valid)]
+
+        date_codes: Dict[str, int] = {}
+        type_codes: Dict[str, int] = {}
+        meal_dates = [date_codes.setdefault(result["date"], len(date_codes)) for result in results]
+        meal_types = [type_codes.setdefault(result["meal"], len(type_codes)) for result in results]
+
+        week_codes: Dict[str, int] = {}
+        date_weeks = [week_codes.setdefault(_iso_week(date_str), len(week_codes)) for date_str in date_codes]
+        meal_weeks = [date_weeks[code] for code in meal_dates]
+
+        def rollup(codes: Dict[str, int], meal_codes: List[int]) -> Dict[str, Any]:
+            groups = _group_totals(meal_totals, meal_valid, meal_codes, len(codes))
+            return {key: {**_macro_summary(groups[code][:4]), "meal_count": int(groups[code][4])}
+                    for key, code in codes.items() if groups[code][4]}
+
+        total = _group_totals(meal_totals, meal_valid, [0] * meal_count, 1)[0]
+        return {
+            "meals": results,
+            "days": dict(sorted(rollup(date_codes, meal_dates).items())),
+            "weeks": dict(sorted(rollup(week_codes, meal_weeks).items())),
+            "meal_types": rollup(type_codes, meal_types),
+            "total": {**_macro_summary(total[:4]), "meal_count": int(total[4])}
+        }
+
+    @staticmethod
+    def _meal_totals_numpy(food_values, food_fixed, item_rows, item_weights, item_cooking, item_meals,
+                           meal_portions, meal_sauces, meal_count) -> List[List[float]]:
+        """用数组一次算出每餐的 (热量, 蛋白质, 碳水, 脂肪)，运算顺序与逐条计算相同，结果一致"""
+        if not item_rows:
+            return [[0, 0, 0, 0] for _ in range(meal_count)]
+
+        rows = np.array(item_rows, dtype=np.int64)
+        fixed = np.array(food_fixed, dtype=bool)[rows]
+        weights = np.array(item_weights, dtype=np.float64)
+        values = np.array(food_values, dtype=np.float64)[rows]
+
+        # 普通食物按重量折算（每100克），热量再乘烹饪系数；餐厅菜品按一份计算
+        scaled = values * weights[:, None] / 100
+        scaled[:, 0] *= np.array(item_cooking, dtype=np.float64)
+        values = np.where(fixed[:, None], values, scaled)
+
+        # 每餐求和（bincount 按条目顺序累加），再乘份量和酱料系数
+        meals = np.array(item_meals, dtype=np.int64)
+        sums = np.stack([np.bincount(meals, weights=values[:, i], minlength=meal_count) for i in range(4)], axis=1)
+        portions = np.array(meal_portions, dtype=np.float64)
+        sauces = np.array(meal_sauces, dtype=np.float64)
+        sums *= np.stack([portions * sauces, portions, portions, portions * sauces], axis=1)
+        return sums.tolist()
+
     def get_calorie_analysis(self, food_input: str) -> Dict:
         """
         主函数：获取食物热量分析
@@ -417,8 +622,14 @@ class DietFunctions:
             food_input = f"{main_part}，{supplement}"
             print(f"🔄 已合并上下文：{food_input}")
 
-        # 1. 分析食物描述
-        analysis = self.analyze_food_with_llm(food_input)
+        # 1. 分析食物描述：本地规则能确定的直接使用，否则交给大模型
+        analysis = self.local_parser.parse(food_input)
+        if analysis is not None:
+            self.parse_stats["local"] += 1
+            print(f"⚡ 本地解析食物描述，跳过大模型（本地解析率 {self.get_parse_stats()['bypass_rate']}%）")
+        else:
+            self.parse_stats["llm"] += 1
+            analysis = self.analyze_food_with_llm(food_input)
 
         # 2. 检查是否需要追问
         needs_clarification = analysis.get("needs_clarification", False)
@@ -453,6 +664,20 @@ class DietFunctions:
 
         return result
 
+    def get_parse_stats(self) -> Dict[str, Any]:
+        """
+        食物描述解析统计
+
+        Returns:
+            本地解析次数、大模型解析次数和本地解析率（跳过大模型的比例，百分比）
+        """
+        total = self.parse_stats["local"] + self.parse_stats["llm"]
+        return {
+            "local": self.parse_stats["local"],
+            "llm": self.parse_stats["llm"],
+            "bypass_rate": round(self.parse_stats["local"] / total * 100, 1) if total else 0.0
+        }
+
     def generate_explanation(self, food_input: str, result: Dict) -> str:
         """
         生成自然语言解释
@@ -528,217 +753,166 @@ def update_meal_status(self, user_input: str, meal_type: str = "auto", food_info
         current_time = datetime.datetime.now()
         current_hour = current_time.hour
 
-        #print(f"🕐 [update_meal_status内部] 当前时间：{current_time.strftime('%Y-%m-%d %H:%M:%S')}")
-        #print(f"🕐 [update_meal_status内部] 当前小时：{current_hour}")
-        #print(f"📝 [update_meal_status内部] 用户输入：'{user_input}'")
-        #print(f"🍽️ [update_meal_status内部] 传入meal_type：'{meal_type}'")
-
-        # 自动判断用餐类型
+        # 判断用餐类型：指定了就直接使用，auto 时先看关键词，没有关键词按时间段
         if meal_type == "auto":
-            # 精确匹配餐次关键词
-            meal_patterns = {
-                "早餐": [r'早餐|早饭|早点|晨餐|早(?![上中晚])|breakfast', "早餐"],
-                "午餐": [r'午餐|午饭|午(?![餐])|中餐|中午饭|lunch', "午餐"],
-                "晚餐": [r'晚餐|晚饭|晚(?![上])|晚饭|supper|dinner', "晚餐"]
-            }
-
-            detected_meal = None
-            for meal, (pattern, display_name) in meal_patterns.items():
-                if re.search(pattern, user_input, re.IGNORECASE):
-                    detected_meal = display_name
-                    break
-
-            # 根据时间判断
-            if not detected_meal:
-                if 5 <= current_hour < 11:
-                    detected_meal = "早餐"
-                elif 11 <= current_hour < 16:
-                    detected_meal = "午餐"
-                elif 16 <= current_hour < 22:
-                    detected_meal = "晚餐"
-                else:
-                    detected_meal = "宵夜"
-
-            #    print(f"🔍 [update_meal_status内部] 自动判断结果：{detected_meal}")
+            detected_meal = MEAL_CLASSIFIER.classify(user_input, current_time)
         else:
-        #    print(f"🔍 [update_meal_status内部] 使用指定的meal_type：{meal_type}")
             detected_meal = meal_type
 
-            # 检查detected_meal是否有效
-            if not detected_meal:
-                print("❌ [update_meal_status内部] 无法判断用餐类型")
-                return {
-                    "success": False,
-                    "message": "❌ 无法判断用餐类型，请明确指定是早餐、午餐还是晚餐"
-                }
-
-        #    print(f"🔍 [update_meal_status内部] 开始更新每日档案...")
-
-            # 1. 检查是否有recorder对象
-            if not hasattr(self, 'recorder'):
-                print("❌ [update_meal_status内部] 找不到recorder对象")
-                return {
-                    "success": False,
-                    "message": "❌ 系统错误：找不到记录器"
-                }
-
-            # 2. 加载今日的每日档案（不是user_profile！）
-            today_data = self.recorder.load_today_record()
-        #    print(f"✅ [update_meal_status内部] 加载今日档案成功")
-        #    print(f"📊 [update_meal_status内部] 档案日期：{today_data.get('date', '未知')}")
-
-            # 3. 设置status_field
-            status_field = f"{detected_meal}状态"
-        #    print(f"🔍 [update_meal_status内部] status_field设置为：{status_field}")
-
-            # 4. 检查是否有饮食计划用于比较
-            food_plan = today_data.get("daily_plan", {}).get("food", [])
-        #    print(f"🔍 [update_meal_status内部] 饮食计划长度：{len(food_plan)}")
-
-            current_meal_plan = ""
-            for plan_item in food_plan:
-                if plan_item.startswith(detected_meal) or detected_meal in plan_item:
-                    current_meal_plan = plan_item
-                    break
-
-        #    print(f"🔍 [update_meal_status内部] 当前餐次计划：{current_meal_plan}")
-
-            # 5. 更新状态字段（在每日档案中更新）
-            old_tuple = today_data.get(status_field, ("没吃", ""))
-            old_status = old_tuple[0]  # 旧的用餐状态
-            old_note = old_tuple[1] if len(old_tuple) > 1 else ""  # 旧的备注
-
-            # 如果旧备注是字典（单个记录），转换为列表
-            old_records = []
-            if isinstance(old_note, dict) and old_note:  # 如果是字典且有内容
-                old_records = [old_note]  # 转换为列表，包含一个元素
-            elif isinstance(old_note, list):  # 如果已经是列表
-                old_records = old_note
-            elif old_note:  # 如果是其他非空值
-                # 尝试转换为字典格式
-                try:
-                    if isinstance(old_note, str):
-                        # 如果是JSON字符串
-                        import json
-                        try:
-                            old_note_dict = json.loads(old_note)
-                            if isinstance(old_note_dict, dict):
-                                old_records = [old_note_dict]
-                            elif isinstance(old_note_dict, list):
-                                old_records = old_note_dict
-                        except:
-                            # 如果不是JSON，创建简单记录
-                            old_records = [{"description": old_note}]
-                    else:
-                        # 其他类型，创建简单记录
-                        old_records = [{"description": str(old_note)}]
-                except:
-                    old_records = []
-
-            print(f"🔍 [update_meal_status内部] 现有记录数量：{len(old_records)}")
-            for i, record in enumerate(old_records):
-                print(f"   记录{i + 1}: {record.get('description', '无描述')}")
-
-            current_time = datetime.datetime.now()
-
-            # 创建新的食物记录
-            new_record = {
-                "description": user_input,  # 使用用户输入作为描述
-                "timestamp": current_time.isoformat(),
-                "meal_type": detected_meal,
-                "record_index": len(old_records)  # 记录这是第几次进食
+        # 检查detected_meal是否有效
+        if not detected_meal:
+            print("❌ [update_meal_status内部] 无法判断用餐类型")
+            return {
+                "success": False,
+                "message": "❌ 无法判断用餐类型，请明确指定是早餐、午餐还是晚餐"
             }
 
-            # 如果有食物分析信息，添加到记录中
-            if food_info:
-                new_record.update({
-                    "total_calories": food_info.get("total_calories", 0),
-                    "protein_g": food_info.get("protein_g", 0),
-                    "carbs_g": food_info.get("carbs_g", 0),
-                    "fat_g": food_info.get("fat_g", 0),
-                    "calorie_range": food_info.get("calorie_range", ""),
-                    "details": food_info.get("details", []),
-                    "has_calorie_info": True
-                })
-            else:
-                new_record["has_calorie_info"] = False
+        # 1. 检查是否有recorder对象
+        if not hasattr(self, 'recorder'):
+            print("❌ [update_meal_status内部] 找不到recorder对象")
+            return {
+                "success": False,
+                "message": "❌ 系统错误：找不到记录器"
+            }
 
-            updated_records = old_records.copy()  # 复制现有记录
-            updated_records.append(new_record)  # 追加新记录
+        # 2. 加载今日的每日档案（不是user_profile！）
+        today_data = self.recorder.load_today_record()
 
-            print(f"✅ [update_meal_status内部] 新增记录，现在总共有 {len(updated_records)} 条{detected_meal}记录")
+        # 3. 设置status_field
+        status_field = f"{detected_meal}状态"
+
+        # 4. 检查是否有饮食计划用于比较
+        food_plan = today_data.get("daily_plan", {}).get("food", [])
+
+        current_meal_plan = ""
+        for plan_item in food_plan:
+            if plan_item.startswith(detected_meal) or detected_meal in plan_item:
+                current_meal_plan = plan_item
+                break
+
+        # 5. 更新状态字段（在每日档案中更新）
+        old_tuple = today_data.get(status_field, ("没吃", ""))
+        old_status = old_tuple[0]  # 旧的用餐状态
+        old_note = old_tuple[1] if len(old_tuple) > 1 else ""  # 旧的备注
+
+        # 如果旧备注是字典（单个记录），转换为列表
+        old_records = []
+        if isinstance(old_note, dict) and old_note:  # 如果是字典且有内容
+            old_records = [old_note]  # 转换为列表，包含一个元素
+        elif isinstance(old_note, list):  # 如果已经是列表
+            old_records = old_note
+        elif old_note:  # 如果是其他非空值
+            # 尝试转换为字典格式
+            try:
+                if isinstance(old_note, str):
+                    # 如果是JSON字符串
+                    try:
+                        old_note_dict = json.loads(old_note)
+                        if isinstance(old_note_dict, dict):
+                            old_records = [old_note_dict]
+                        elif isinstance(old_note_dict, list):
+                            old_records = old_note_dict
+                    except:
+                        # 如果不是JSON，创建简单记录
+                        old_records = [{"description": old_note}]
+                else:
+                    # 其他类型，创建简单记录
+                    old_records = [{"description": str(old_note)}]
+            except:
+                old_records = []
+
+        # 创建新的食物记录
+        new_record = {
+            "description": user_input,  # 使用用户输入作为描述
+            "timestamp": current_time.isoformat(),
+            "meal_type": detected_meal,
+            "record_index": len(old_records)  # 记录这是第几次进食
+        }
 
-            # 确定状态文本
-            if len(updated_records) == 1:
-                status_text = "吃了"
-            else:
-                status_text = f"吃了{len(updated_records)}次"  # 显示进食次数
+        # 如果有食物分析信息，添加到记录中
+        if food_info:
+            new_record.update({
+                "total_calories": food_info.get("total_calories", 0),
+                "protein_g": food_info.get("protein_g", 0),
+                "carbs_g": food_info.get("carbs_g", 0),
+                "fat_g": food_info.get("fat_g", 0),
+                "calorie_range": food_info.get("calorie_range", ""),
+                "details": food_info.get("details", []),
+                "has_calorie_info": True
+            })
+        else:
+            new_record["has_calorie_info"] = False
 
-            today_data[status_field] = (status_text, updated_records)
+        updated_records = old_records.copy()  # 复制现有记录
+        updated_records.append(new_record)  # 追加新记录
 
-            today_data["last_updated"] = current_time.isoformat()
+        print(f"✅ [update_meal_status内部] 新增记录，现在总共有 {len(updated_records)} 条{detected_meal}记录")
 
-            # 7. 保存每日档案（关键！不是save_profiles）
-            success = self.recorder.save_today_record(today_data)
-            if success:
-                print(f"✅ [update_meal_status内部] 每日档案保存成功")
-            else:
-                print(f"❌ [update_meal_status内部] 每日档案保存失败")
-                return {
-                    "success": False,
-                    "message": "❌ 保存记录失败"
-                }
+        # 确定状态文本
+        if len(updated_records) == 1:
+            status_text = "吃了"
+        else:
+            status_text = f"吃了{len(updated_records)}次"  # 显示进食次数
 
-            # 8. 从每日档案中读取状态构建返回消息
-            meal_status = {
-                "早餐": today_data.get("早餐状态", ("没吃", ""))[0],
-                "午餐": today_data.get("午餐状态", ("没吃", ""))[0],
-                "晚餐": today_data.get("晚餐状态", ("没吃", ""))[0]
-            }
+        today_data[status_field] = (status_text, updated_records)
 
-            completed_meals = [meal for meal, status in meal_status.items() if status == "吃了"]
+        today_data["last_updated"] = current_time.isoformat()
 
-            # 构建返回消息
-            response = {
-                "success": True,
-                "message": f"✅ 已记录：{detected_meal} - 吃了",
-                "detected_meal": detected_meal,
-                "current_status": meal_status,
-                "completed_meals": completed_meals,
-                "total_completed": len(completed_meals),
-                "next_action": ""
+        # 7. 保存每日档案（关键！不是save_profiles）
+        success = self.recorder.save_today_record(today_data)
+        if success:
+            print(f"✅ [update_meal_status内部] 每日档案保存成功")
+        else:
+            print(f"❌ [update_meal_status内部] 每日档案保存失败")
+            return {
+                "success": False,
+                "message": "❌ 保存记录失败"
             }
 
-            # 检查是否在合理的时间报告用餐
-            meal_time_ranges = {
-                "早餐": (5, 11),
-                "午餐": (11, 16),
-                "晚餐": (16, 22)
-            }
+        # 8. 从每日档案中读取状态构建返回消息
+        meal_status = {
+            "早餐": today_data.get("早餐状态", ("没吃", ""))[0],
+            "午餐": today_data.get("午餐状态", ("没吃", ""))[0],
+            "晚餐": today_data.get("晚餐状态", ("没吃", ""))[0]
+        }
 
-            if detected_meal in meal_time_ranges:
-                start, end = meal_time_ranges[detected_meal]
-                if not (start <= current_hour < end):
-                    time_check_message = f"⏰ 注意：当前时间{current_time.strftime('%H:%M')}不在{detected_meal}时间范围（{start}:00-{end}:00）内，但已记录您的用餐。"
-                    response["time_check"] = time_check_message
+        completed_meals = [meal for meal, status in meal_status.items() if status == "吃了"]
 
-            if current_meal_plan:
-                response["recommended_plan"] = current_meal_plan
-
-            # 根据完成情况给出建议
-            if len(completed_meals) == 3:
-                response["next_action"] = "🌟 太棒了！今天所有正餐都完成了，记得适量运动哦！"
-            elif len(completed_meals) == 2:
-                remaining_meal = next((meal for meal, status in meal_status.items() if status == "没吃"), None)
-                if remaining_meal:
-                    response["next_action"] = f"💪 继续加油！{remaining_meal}也要按时吃哦！"
-                else:
-                    response["next_action"] = "💪 继续保持！"
+        # 构建返回消息
+        response = {
+            "success": True,
+            "message": f"✅ 已记录：{detected_meal} - 吃了",
+            "detected_meal": detected_meal,
+            "current_status": meal_status,
+            "completed_meals": completed_meals,
+            "total_completed": len(completed_meals),
+            "next_action": ""
+        }
+
+        # 检查是否在合理的时间报告用餐
+        time_range = MEAL_CLASSIFIER.time_range(detected_meal)
+        if time_range:
+            start, end = time_range
+            if not (start <= current_hour < end):
+                time_check_message = f"⏰ 注意：当前时间{current_time.strftime('%H:%M')}不在{detected_meal}时间范围（{start}:00-{end}:00）内，但已记录您的用餐。"
+                response["time_check"] = time_check_message
+
+        if current_meal_plan:
+            response["recommended_plan"] = current_meal_plan
+
+        # 根据完成情况给出建议
+        if len(completed_meals) == 3:
+            response["next_action"] = "🌟 太棒了！今天所有正餐都完成了，记得适量运动哦！"
+        elif len(completed_meals) == 2:
+            remaining_meal = next((meal for meal, status in meal_status.items() if status == "没吃"), None)
+            if remaining_meal:
+                response["next_action"] = f"💪 继续加油！{remaining_meal}也要按时吃哦！"
             else:
-                response["next_action"] = "👍 好的开始！坚持记录每餐，健康更有保障！"
+                response["next_action"] = "💪 继续保持！"
+        else:
+            response["next_action"] = "👍 好的开始！坚持记录每餐，健康更有保障！"
 
-            #print(f"✅ [update_meal_status内部] 函数执行完成，返回结果：{response}")
-            return response
+        return response
 
     except Exception as e:
         print(f"❌ [update_meal_status内部] 函数执行出错：{str(e)}")
@@ -1002,4 +1176,59 @@ def get_calorie_calculator_help() -> Dict:
             "支持连锁餐厅常见菜品",
             "结果为估算值，仅供参考"
         ]
-    }
\ No newline at end of file
+    }
+
+
+def benchmark_calorie_batch(days: int = 365, seed: int = 42) -> Dict[str, Any]:
+    """
+    热量计算吞吐量测试：逐餐调用 calculate_calories_from_analysis vs calculate_calories_batch（并核对每餐结果一致）
+
+    Args:
+        days: 合成的天数（每天4餐，每餐1-4种食物）
+        seed: 随机种子
+    """
+    rng = random.Random(seed)
+    diet = DietFunctions()
+    food_names = (list(diet.base_food_db) + list(diet.restaurant_calories["家常菜"]) +
+                  ["麦当劳巨无霸", "肯德基蛋挞", "扬州炒饭", "牛肉面", "馒头", "鸡胸沙拉"])
+    start_date = datetime.date(2025, 1, 1)
+
+    meals = []
+    for day in range(days):
+        date_str = (start_date + datetime.timedelta(days=day)).isoformat()
+        for meal in ["早餐", "午餐", "晚餐", "宵夜"]:
+            meals.append({"date": date_str, "meal": meal, "analysis": {
+                "food_items": [{"name": rng.choice(food_names),
+                                "estimated_weight_g": rng.choice([50, 100, 150, 200, 250]),
+                                "cooking_method": rng.choice(list(diet.cooking_methods) + ["未知"])}
+                               for _ in range(rng.randint(1, 4))],
+                "portion_size": rng.choice(list(diet.portion_sizes)),
+                "sauce_level": rng.choice(list(diet.sauce_levels)),
+            }})
+
+    print(f"🧪 热量批量计算：{days} 天，{len(meals)} 餐，numpy={'可用' if np is not None else '不可用'}")
+    timings = {}
+
+    begin = time.perf_counter()
+    expected = [diet.calculate_calories_from_analysis(entry["analysis"]) for entry in meals]
+    timings["逐餐"] = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    batch = diet.calculate_calories_batch(meals)
+    timings["批量"] = time.perf_counter() - begin
+
+    keys = ("total_calories", "protein_g", "carbs_g", "fat_g")
+    consistent = all(all(single[key] == combined[key] for key in keys)
+                     for single, combined in zip(expected, batch["meals"]))
+    for label, seconds in timings.items():
+        print(f"  {label:<6} {seconds:7.3f} 秒  {len(meals) / seconds:>10,.0f} 餐/秒")
+    print(f"  {'✅' if consistent else '❌'} 每餐结果一致，共 {len(batch['days'])} 天 / {len(batch['weeks'])} 周，"
+          f"总热量 {batch['total']['total_calories']} 大卡")
+
+    return {"meals": len(meals), "consistent": consistent,
+            "meals_per_s": {label: round(len(meals) / seconds, 1) for label, seconds in timings.items()}}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        benchmark_calorie_batch(int(sys.argv[2]) if len(sys.argv) > 2 else 365)
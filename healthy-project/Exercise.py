@@ -6,19 +6,40 @@
 import datetime
 import re
 import json
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+# 可选依赖：没有安装时运动报告逐条汇总
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from exercise_calories import METCalorieEngine, profile_weight
+from keyword_automaton import KeywordAutomaton
+
+# 运动报告周期 → 天数
+REPORT_PERIODS = {"week": 7, "month": 30}
+
+# 追问超过这么久没有回答就不再把新输入当作补充信息（秒）
+PENDING_CLARIFICATION_TTL = 30 * 60
+
+# 含有这些词的输入看作对追问的补充
+FOLLOWUP_WORDS = ["大概", "大约", "左右", "分钟", "小时", "公里", "km", "min", "h",
+                  "补充", "还有", "另外", "加上"]
 
 
 class ExerciseFunctions:
     """运动相关功能类"""
 
-    def __init__(self, daily_recorder, user_profile: Dict[str, Any] = None):
+    def __init__(self, daily_recorder,
+                 user_profile: Union[Dict[str, Any], Callable[[], Optional[Dict[str, Any]]]] = None):
         """
         初始化运动功能
 
         Args:
             daily_recorder: DailyHealthRecorder实例
-            user_profile: 用户档案数据（可选）
+            user_profile: 用户档案数据，或返回当前用户档案的函数（可选）；
+                传入函数时每次计算热量都重新读取，档案更新（如体重变化、新建档案）后立即生效
         """
         self.recorder = daily_recorder
         self.user_profile = user_profile
@@ -77,6 +98,22 @@ class ExerciseFunctions:
             }
         }
 
+        # 关键词 → 运动类型，编译成自动机，分析时只扫描一遍输入
+        self.exercise_keyword_index = KeywordAutomaton()
+        # 运动类型在数据库中的顺序（输入中有多种运动时取靠前的，与逐个检查关键词的结果相同）
+        self._exercise_order = {}
+        for order, (ex_type, data) in enumerate(self.exercise_calories_db.items()):
+            self._exercise_order[ex_type] = order
+            for keyword in data["keywords"]:
+                if keyword.lower() not in self.exercise_keyword_index:
+                    self.exercise_keyword_index.add(keyword.lower(), ex_type)
+
+        # MET热量引擎（体重在计算时通过 _current_weight 从用户档案中读取）
+        self.calorie_engine = METCalorieEngine()
+
+        # 等待用户回答的追问：{"original_input", "questions", "record_index", "asked_at"}，没有为None
+        self.pending_clarification: Optional[Dict[str, Any]] = None
+
     # ==================== 工具1：更新运动状态 ====================
 
     def update_exercise_status(self, user_input: str, exercise_type: str = "auto") -> dict:
@@ -98,11 +135,17 @@ class ExerciseFunctions:
                     "message": "❌ 系统错误：找不到记录器"
                 }
 
-            # 分析用户输入，判断是否需要追问
-            analysis = self._analyze_exercise_input(user_input, is_followup=False)
+            # 分析用户输入（可能是对上一次追问的补充），判断是否需要追问
+            analysis = self._analyze_exercise_input_with_context(user_input)
+
+            # 回答的是计算已有记录卡路里时提出的追问：补充到那条记录上，不新增一次运动
+            pending = self.pending_clarification
+            if analysis.get("is_followup") and pending and pending.get("record_index") is not None:
+                return self.calculate_exercise_calories(user_input, exercise_type, pending["record_index"])
 
             # 如果需要追问，返回追问问题
             if analysis.get("needs_clarification", False):
+                self._set_pending_clarification(analysis)
                 return {
                     "success": False,
                     "needs_clarification": True,
@@ -117,35 +160,13 @@ class ExerciseFunctions:
             # 加载今日记录
             today_data = self.recorder.load_today_record()
 
-            # 获取当前运动状态
-            current_exercise_status = today_data.get("运动状态", ("没运动", ""))
-            current_status_text = current_exercise_status[0] if isinstance(current_exercise_status,
-                                                                           tuple) else current_exercise_status
-
-            # 如果当前状态是"没运动"，改为"运动了"
-            if current_status_text == "没运动":
-                # 第一次运动，初始化为空列表
-                exercise_records = []
-                status_text = "运动了"
-            else:
-                # 已经有运动记录，保持"运动了"状态
-                status_text = "运动了"
-                # 获取已有的运动记录
-                if isinstance(current_exercise_status, tuple) and len(current_exercise_status) > 1:
-                    records_data = current_exercise_status[1]
-                    if isinstance(records_data, list):
-                        exercise_records = records_data
-                    elif isinstance(records_data, dict):
-                        # 如果是旧的单个记录格式，转换为列表
-                        exercise_records = [records_data]
-                    else:
-                        exercise_records = []
-                else:
-                    exercise_records = []
+            # 已有的运动记录（从文件或数据库读回时状态是列表而不是元组），第一次运动时为空列表
+            exercise_records = self._status_records(today_data.get("运动状态", ("没运动", "")))
+            status_text = "运动了"
 
             # 创建新的运动记录（暂不包含卡路里，等第二个工具计算）
             new_record = {
-                "description": user_input,
+                "description": analysis.get("full_input", user_input),
                 "exercise_type": analysis.get("detected_type", "其他"),
                 "timestamp": datetime.datetime.now().isoformat(),
                 "record_status": "已计算卡路里" if should_calculate_now else "待计算卡路里"  # 标记需要计算卡路里
@@ -178,6 +199,7 @@ class ExerciseFunctions:
             success = self.recorder.save_today_record(today_data)
 
             if success:
+                self.pending_clarification = None
                 response = {
                     "success": True,
                     "message": "✅ 已记录您的运动！" + (
@@ -279,13 +301,7 @@ class ExerciseFunctions:
                 }
 
             # 获取运动记录列表
-            exercise_records = []
-            if isinstance(exercise_status, tuple) and len(exercise_status) > 1:
-                records_data = exercise_status[1]
-                if isinstance(records_data, list):
-                    exercise_records = records_data
-                elif isinstance(records_data, dict):
-                    exercise_records = [records_data]
+            exercise_records = self._status_records(exercise_status)
 
             if not exercise_records or record_index >= len(exercise_records):
                 return {
@@ -296,11 +312,16 @@ class ExerciseFunctions:
             # 获取要计算的记录
             target_record = exercise_records[record_index]
 
-            # 分析用户输入（可能是补充信息）
-            analysis = self._analyze_exercise_input_with_context(user_input, target_record.get("description", ""))
+            # 分析用户输入（可能是对这条记录的补充信息）；这条记录有待回答的追问时，接着追问时合并过的描述补充
+            previous_input = target_record.get("description", "")
+            pending_input = self._get_pending_exercise_input()
+            if pending_input and self.pending_clarification.get("record_index") == record_index:
+                previous_input = pending_input
+            analysis = self._analyze_exercise_input_with_context(user_input, previous_input)
 
             # 如果需要追问，返回追问问题
             if analysis.get("needs_clarification", False):
+                self._set_pending_clarification(analysis, record_index)
                 return {
                     "success": False,
                     "needs_clarification": True,
@@ -336,6 +357,7 @@ class ExerciseFunctions:
             success = self.recorder.save_today_record(today_data)
 
             if success:
+                self.pending_clarification = None
                 # 构建详细回复
                 response = {
                     "success": True,
@@ -362,65 +384,57 @@ class ExerciseFunctions:
             }
 
     # ==================== 辅助函数 ====================
-    def _get_recent_exercise_context(self, limit: int = 10) -> Optional[str]:
-        """
-        获取最近的与运动相关的对话上下文
+    def _set_pending_clarification(self, analysis: Dict[str, Any], record_index: Optional[int] = None) -> None:
+        """记下刚提出的追问和对应的运动描述，用户回答时直接与之合并"""
+        self.pending_clarification = {
+            "original_input": analysis.get("full_input", ""),
+            "questions": analysis.get("clarification_questions", []),
+            "record_index": record_index,
+            "asked_at": datetime.datetime.now()
+        }
 
-        Args:
-            limit: 检查最近多少条记录
+    def _get_pending_exercise_input(self) -> Optional[str]:
+        """
+        等待补充信息的运动描述（追问超时后不再使用）
 
         Returns:
-            最近的运动相关输入文本，如果没有返回None
+            上一次追问对应的运动描述，没有返回None
         """
-        try:
-            # 获取最近的对话历史
-            recent_history = self.recorder.get_daily_history(limit)
-
-            # 从最近的记录开始查找运动相关的对话
-            for i in range(len(recent_history) - 1, 0, -1):
-                if recent_history[i].get("role") == "assistant":
-                    content = recent_history[i].get("content", "").lower()
-                    # 检查是否是运动相关的追问
-                    if any(word in content for word in
-                           ["运动", "跑步", "游泳", "健身", "距离", "时间", "分钟", "公里"]):
-                        # 往前找用户的回复
-                        for j in range(i - 1, -1, -1):
-                            if recent_history[j].get("role") == "user":
-                                previous_input = recent_history[j].get("content", "")
-                                # 检查是否是运动描述
-                                if any(word in previous_input for word in ["运动", "跑", "游", "健", "练", "动"]):
-                                    return previous_input
-                        break
+        pending = self.pending_clarification
+        if pending is None:
             return None
-
-        except Exception as e:
-            print(f"❌ 获取运动上下文失败: {e}")
+        if (datetime.datetime.now() - pending["asked_at"]).total_seconds() > PENDING_CLARIFICATION_TTL:
+            self.pending_clarification = None
             return None
+        return pending["original_input"] or None
 
-    def _analyze_exercise_input_with_context(self, user_input: str) -> Dict[str, Any]:
+    def _analyze_exercise_input_with_context(self, user_input: str, previous_input: str = None) -> Dict[str, Any]:
         """
         带上下文的运动输入分析
 
         Args:
             user_input: 当前用户输入
+            previous_input: 之前的运动描述（默认使用等待回答的追问对应的描述）
 
         Returns:
             分析结果
         """
-        # 获取上下文
-        previous_input = self._get_recent_exercise_context()
-        print(f"🔍 [运动分析] 找到上下文输入：{previous_input}")
+        if previous_input is None:
+            previous_input = self._get_pending_exercise_input()
 
-        # 判断当前输入是否是补充信息
+        # 判断当前输入是否是补充信息：单独这句话不完整、没有换成另一项运动，
+        # 并且含有补充用词或者正有待回答的追问
         is_followup = False
-        if previous_input:
-            # 检查当前输入是否是补充信息
-            is_followup = any(
-                word in user_input for word in ["大概", "大约", "左右", "分钟", "小时", "公里", "km", "min", "h"]
-            ) or any(word in user_input for word in ["补充", "还有", "另外", "加上"])
+        if previous_input and user_input.strip() != previous_input.strip():
+            alone = self._analyze_exercise_input(user_input)
+            alone_type = alone["detected_type"]
+            if alone["needs_clarification"] and \
+                    (alone_type == "其他" or alone_type == self._detect_exercise_type(previous_input)):
+                is_followup = self.pending_clarification is not None or \
+                    any(word in user_input for word in FOLLOWUP_WORDS)
 
         # 合并输入
-        if is_followup and previous_input:
+        if is_followup:
             # 如果是补充信息，合并两次输入
             combined_input = f"{previous_input}。补充：{user_input}"
             print(f"🔍 [运动分析] 合并上下文：{combined_input}")
@@ -430,6 +444,14 @@ class ExerciseFunctions:
         # 使用合并后的输入进行分析
         return self._analyze_exercise_input(combined_input, is_followup)
 
+    def _detect_exercise_type(self, text: str) -> str:
+        """识别运动类型，没有关键词返回 "其他" """
+        values = self.exercise_keyword_index.values
+        matched = {values[keyword] for _, _, keyword in self.exercise_keyword_index.iter_matches(text.lower())}
+        if not matched:
+            return "其他"
+        return min(matched, key=self._exercise_order.__getitem__)
+
     def _analyze_exercise_input(self, full_input: str, is_followup: bool = False) -> Dict[str, Any]:
         """
         分析运动输入，提取信息并判断是否需要追问
@@ -442,14 +464,7 @@ class ExerciseFunctions:
             分析结果
         """
         # 检测运动类型
-        detected_type = "其他"
-        for ex_type, data in self.exercise_calories_db.items():
-            for keyword in data["keywords"]:
-                if keyword in full_input.lower():
-                    detected_type = ex_type
-                    break
-            if detected_type != "其他":
-                break
+        detected_type = self._detect_exercise_type(full_input)
 
         # 提取距离（公里）
         distance_km = None
@@ -535,6 +550,11 @@ class ExerciseFunctions:
             "is_followup": is_followup
         }
 
+    def _current_weight(self) -> Optional[float]:
+        """当前用户体重（kg），档案中没有体重返回None"""
+        profile = self.user_profile() if callable(self.user_profile) else self.user_profile
+        return profile_weight(profile)
+
     def _calculate_calories_from_analysis(self, analysis: Dict[str, Any]) -> Dict[str, Any]:
         """根据分析结果计算卡路里"""
         ex_type = analysis.get("detected_type", "其他")
@@ -545,6 +565,19 @@ class ExerciseFunctions:
                 "message": f"❌ 不支持的运动类型：{ex_type}"
             }
 
+        # 档案中有体重时按MET计算（有时长或距离的记录）
+        weight_kg = self._current_weight()
+        if weight_kg and (analysis.get("duration_min") or analysis.get("distance_km")):
+            met_result = self.calorie_engine.calories(ex_type, analysis.get("duration_min"),
+                                                      analysis.get("distance_km"), weight_kg)
+            return {
+                "success": True,
+                "total_calories": met_result["total_calories"],
+                "calculation_method": met_result["calculation_method"],
+                "explanation": met_result["explanation"],
+                "exercise_type": ex_type
+            }
+
         ex_data = self.exercise_calories_db[ex_type]
         total_calories = 0
         calculation_method = ""
@@ -624,4 +657,131 @@ class ExerciseFunctions:
 
         except Exception as e:
             print(f"❌ 获取今日运动总结失败: {e}")
-            return {"status": "获取失败", "has_exercised": False, "total_records": 0}
\ No newline at end of file
+            return {"status": "获取失败", "has_exercised": False, "total_records": 0}
+
+    # ==================== 运动报告 ====================
+
+    @staticmethod
+    def _status_records(exercise_status) -> List[Dict[str, Any]]:
+        """运动状态 ("运动了", 记录) → 记录列表（记录可能是列表或单条字典，从文件读回时状态是列表）"""
+        if not isinstance(exercise_status, (list, tuple)) or len(exercise_status) < 2:
+            return []
+        if exercise_status[0] != "运动了":
+            return []
+        records_data = exercise_status[1]
+        if isinstance(records_data, dict):
+            return [records_data]
+        if isinstance(records_data, list):
+            return [record for record in records_data if isinstance(record, dict)]
+        return []
+
+    def calculate_sessions_batch(self, sessions: List[Dict[str, Any]]) -> List[int]:
+        """
+        批量计算多次运动的消耗（按MET和档案中的体重）
+
+        Args:
+            sessions: 运动记录列表（使用 exercise_type、duration_min、distance_km 字段）
+
+        Returns:
+            与 sessions 一一对应的消耗热量（千卡）
+        """
+        totals = self.calorie_engine.calories_batch(
+            [session.get("exercise_type") or "其他" for session in sessions],
+            [session.get("duration_min") for session in sessions],
+            [session.get("distance_km") for session in sessions],
+            [self._current_weight()] * len(sessions)
+        )
+        return [int(total) for total in totals]
+
+    def get_exercise_report(self, period: Any = "week") -> Dict[str, Any]:
+        """
+        运动周报 / 月报
+
+        Args:
+            period: "week"（最近7天）、"month"（最近30天）或天数
+
+        Returns:
+            {
+                "period", "days", "start_date", "end_date",
+                "total_sessions", "total_calories", "total_duration_min", "active_days",
+                "recorded_calories": 记录中已保存的消耗合计,
+                "by_day": {日期: {"sessions", "calories", "duration_min"}},
+                "by_type": {运动类型: {"sessions", "calories", "duration_min"}}
+            }
+        """
+        try:
+            days = REPORT_PERIODS.get(period, period)
+            if not isinstance(days, int) or days <= 0:
+                return {"success": False, "message": f"❌ 不支持的报告周期：{period}"}
+
+            records = self.recorder.get_historical_records(days, fields=["date", "运动状态"])
+
+            # 展开成逐次运动（按日期升序）
+            sessions = []
+            dates = []
+            for record in reversed(records):
+                for session in self._status_records(record.get("运动状态")):
+                    sessions.append(session)
+                    dates.append(record.get("date", ""))
+
+            calories = self.calculate_sessions_batch(sessions)
+            minutes = [self.calorie_engine.duration_minutes(session.get("exercise_type") or "其他",
+                                                            session.get("duration_min"), session.get("distance_km"))
+                       for session in sessions]
+
+            # 日期、运动类型编号，按编号汇总
+            types = [session.get("exercise_type") or "其他" for session in sessions]
+            day_index = {date: i for i, date in enumerate(dict.fromkeys(dates))}
+            type_index = {ex_type: i for i, ex_type in enumerate(dict.fromkeys(types))}
+            day_labels = list(day_index)
+            type_labels = list(type_index)
+            day_codes = [day_index[date] for date in dates]
+            type_codes = [type_index[ex_type] for ex_type in types]
+
+            by_day = self._group_sessions(day_labels, day_codes, calories, minutes)
+            by_type = self._group_sessions(type_labels, type_codes, calories, minutes)
+
+            today = datetime.datetime.now()
+            return {
+                "success": True,
+                "period": period,
+                "days": days,
+                "start_date": (today - datetime.timedelta(days=days - 1)).strftime('%Y-%m-%d'),
+                "end_date": today.strftime('%Y-%m-%d'),
+                "total_sessions": len(sessions),
+                "total_calories": sum(calories),
+                "total_duration_min": round(sum(minutes), 1),
+                "active_days": len(day_labels),
+                "recorded_calories": sum(session.get("calories_burned") or 0 for session in sessions),
+                "by_day": by_day,
+                "by_type": dict(sorted(by_type.items(), key=lambda item: item[1]["calories"], reverse=True))
+            }
+
+        except Exception as e:
+            print(f"❌ 生成运动报告失败: {e}")
+            return {"success": False, "message": f"❌ 生成运动报告失败：{str(e)}"}
+
+    @staticmethod
+    def _group_sessions(labels: List[str], codes: List[int], calories: List[int],
+                        minutes: List[float]) -> Dict[str, Dict[str, Any]]:
+        """按编号汇总运动次数、消耗和时长"""
+        if np is not None and codes:
+            code_array = np.array(codes, dtype=np.int64)
+            counts = np.bincount(code_array, minlength=len(labels)).tolist()
+            calorie_sums = np.bincount(code_array, weights=np.array(calories, dtype=np.float64),
+                                       minlength=len(labels)).tolist()
+            minute_sums = np.bincount(code_array, weights=np.array(minutes, dtype=np.float64),
+                                      minlength=len(labels)).tolist()
+        else:
+            counts = [0] * len(labels)
+            calorie_sums = [0.0] * len(labels)
+            minute_sums = [0.0] * len(labels)
+            for code, calorie, minute in zip(codes, calories, minutes):
+                counts[code] += 1
+                calorie_sums[code] += calorie
+                minute_sums[code] += minute
+
+        return {
+            label: {"sessions": counts[i], "calories": int(calorie_sums[i]), "duration_min": round(minute_sums[i], 1)}
+            for i, label in enumerate(labels)
+        }
@@ -7,11 +7,28 @@
 import json
 import datetime
 import os
+import shutil
+import threading
 from typing import Dict, Any, Optional, List
 
+from record_layout import directory_cache, user_record_root
+
 # 全局变量（模拟数据库）
 USER_PROFILES = {}
 DATA_FILE = "user_profiles.json"
+# 每日记录根目录（与 DailyHealthRecorder 的默认目录相同）
+RECORDS_DIR = "daily_records"
+# USER_PROFILES 是否已经从文件（或数据库）加载过
+_PROFILES_LOADED = False
+# 档案仓储（repository.HealthRepository）；设置后档案和体重历史读写数据库，JSON文件只在导出时生成
+PROFILE_REPOSITORY = None
+
+# 多线程服务（api_server）中的档案锁：
+# 加载、保存全部档案以及增删 USER_PROFILES 中的条目时持有 _PROFILES_LOCK（时间很短）；
+# 修改某个用户的档案（读取-修改-保存）时持有该用户的锁，不同用户之间互不阻塞
+_PROFILES_LOCK = threading.RLock()
+_USER_LOCKS: Dict[str, threading.RLock] = {}
+_USER_LOCKS_GUARD = threading.Lock()
 
 # 常量定义
 GENDER_OPTIONS = {'A': '男', 'B': '女', 'C': '其他/不愿透露'}
@@ -68,6 +85,32 @@ MOVEMENT_OPTIONS={
     'M': '随便，我都可以'
 }
 
+def set_profile_repository(repository) -> None:
+    """
+    设置档案仓储（传入None恢复使用JSON文件）
+
+    参数:
+        repository: repository.HealthRepository 实例
+    """
+    global PROFILE_REPOSITORY, _PROFILES_LOADED
+    PROFILE_REPOSITORY = repository
+    _PROFILES_LOADED = False
+
+
+def profile_lock(nickname: str) -> threading.RLock:
+    """
+    获取某个用户档案的锁
+
+    参数:
+        nickname: 用户昵称
+    """
+    with _USER_LOCKS_GUARD:
+        lock = _USER_LOCKS.get(nickname)
+        if lock is None:
+            lock = _USER_LOCKS[nickname] = threading.RLock()
+        return lock
+
+
 def load_profiles() -> Dict[str, Any]:
     """
     加载所有用户档案
@@ -75,20 +118,53 @@ def load_profiles() -> Dict[str, Any]:
     返回值:
         Dict: 包含所有用户档案的字典
     """
-    global USER_PROFILES
+    global USER_PROFILES, _PROFILES_LOADED
 
-    if os.path.exists(DATA_FILE):
-        try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                USER_PROFILES = json.load(f)
+    with _PROFILES_LOCK:
+        if PROFILE_REPOSITORY is not None:
+            try:
+                USER_PROFILES = PROFILE_REPOSITORY.load_profiles()
                 print(f"已加载 {len(USER_PROFILES)} 个用户档案")
-        except Exception as e:
-            print(f"加载用户档案时出错: {e}")
+            except Exception as e:
+                print(f"加载用户档案时出错: {e}")
+                USER_PROFILES = {}
+        elif os.path.exists(DATA_FILE):
+            try:
+                with open(DATA_FILE, 'r', encoding='utf-8') as f:
+                    USER_PROFILES = json.load(f)
+                    print(f"已加载 {len(USER_PROFILES)} 个用户档案")
+            except Exception as e:
+                print(f"加载用户档案时出错: {e}")
+                USER_PROFILES = {}
+        else:
             USER_PROFILES = {}
-    else:
-        USER_PROFILES = {}
 
-    return USER_PROFILES
+        _PROFILES_LOADED = True
+        return USER_PROFILES
+
+def get_user_profile(nickname: str) -> Optional[Dict[str, Any]]:
+    """
+    读取单个用户的档案
+
+    使用数据库仓储时只查询该用户；使用JSON文件时只在第一次调用时读取文件，
+    之后直接从内存中的 USER_PROFILES 取（本进程的修改都会写回 USER_PROFILES）
+
+    参数:
+        nickname: 用户昵称
+
+    返回值:
+        Dict: 用户档案，不存在时返回None
+    """
+    if PROFILE_REPOSITORY is not None:
+        try:
+            return PROFILE_REPOSITORY.get_profile(nickname)
+        except Exception as e:
+            print(f"加载用户档案时出错: {e}")
+            return None
+    with _PROFILES_LOCK:
+        if not _PROFILES_LOADED:
+            load_profiles()
+        return USER_PROFILES.get(nickname)
 
 def get_valid_number_input(prompt: str, min_val: float, max_val: float) -> float:
     """
@@ -240,21 +316,23 @@ def create_user_profile() -> Optional[Dict[str, Any]]:
             "5. 请输入您当前的体重(kg，例如：65.2): ", 30, 300
         )
         user_data['current_weight_kg'] = weight
-        try:
-            # 创建体重记录JSON文件
-            weight_history_file = f"weight_history_{nickname}.json"
-            initial_data = {
-                "user": nickname,
-                "history": []  # 初始为空列表
-            }
-
-            # 写入文件
-            with open(weight_history_file, 'w', encoding='utf-8') as f:
-                json.dump(initial_data, f, ensure_ascii=False, indent=2)
-
-            print(f"✅ 已创建体重记录文件: {weight_history_file}")
-        except Exception as e:
-            print(f"⚠️  创建体重记录文件失败: {e}")
+        # 使用数据库时体重历史保存在 weight_history 表中，不需要创建文件
+        if PROFILE_REPOSITORY is None:
+            try:
+                # 创建体重记录JSON文件
+                weight_history_file = f"weight_history_{nickname}.json"
+                initial_data = {
+                    "user": nickname,
+                    "history": []  # 初始为空列表
+                }
+
+                # 写入文件
+                with open(weight_history_file, 'w', encoding='utf-8') as f:
+                    json.dump(initial_data, f, ensure_ascii=False, indent=2)
+
+                print(f"✅ 已创建体重记录文件: {weight_history_file}")
+            except Exception as e:
+                print(f"⚠️  创建体重记录文件失败: {e}")
 
         # 6. 计算BMI
         bmi_info = calculate_bmi(weight, height)
@@ -328,11 +406,11 @@ def create_user_profile() -> Optional[Dict[str, Any]]:
         user_data['registration_date'] = current_time
         user_data['last_update'] = current_time
 
-        # 保存到全局数据
-        USER_PROFILES[nickname] = user_data
-
-        # 保存到文件
-        if save_profiles():
+        # 保存到全局数据和文件
+        with _PROFILES_LOCK:
+            USER_PROFILES[nickname] = user_data
+            saved = save_profiles(nickname)
+        if saved:
             print(f"\n✅ 用户 '{nickname}' 档案创建成功！")
             return user_data
         else:
@@ -347,20 +425,31 @@ def create_user_profile() -> Optional[Dict[str, Any]]:
         return None
 
 
-def save_profiles() -> bool:
+def save_profiles(nickname: str = None) -> bool:
     """
-    保存所有用户档案到文件
+    保存所有用户档案到文件（设置了档案仓储时保存到数据库）
+
+    参数:
+        nickname: 只有这个用户的档案有变化（仅数据库模式下生效，只写一行）
 
     返回值:
         bool: 保存是否成功
     """
-    try:
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(USER_PROFILES, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        print(f"保存用户档案时出错: {e}")
-        return False
+    with _PROFILES_LOCK:
+        try:
+            if PROFILE_REPOSITORY is not None:
+                if nickname is not None:
+                    PROFILE_REPOSITORY.save_profile({**USER_PROFILES[nickname], 'nickname': nickname})
+                else:
+                    PROFILE_REPOSITORY.save_profiles(USER_PROFILES)
+                return True
+
+            with open(DATA_FILE, 'w', encoding='utf-8') as f:
+                json.dump(USER_PROFILES, f, ensure_ascii=False, indent=2)
+            return True
+        except Exception as e:
+            print(f"保存用户档案时出错: {e}")
+            return False
 
 def search_user_profile(user_data: Dict[str, Any]) -> None:
     """
@@ -437,87 +526,103 @@ def update_user_weight(nickname:str,new_weight: float) -> bool:
     返回值:
         bool: 更新是否成功
     """
-    if nickname not in USER_PROFILES:
-        print(f"❌ 用户 '{nickname}' 不存在")
-        return False
+    # 同一用户的体重更新串行执行；其他线程重新加载全部档案时，修改的是这里持有的档案对象，
+    # 保存前再放回 USER_PROFILES
+    with profile_lock(nickname):
+        profile = get_user_profile(nickname)
+        if profile is None:
+            print(f"❌ 用户 '{nickname}' 不存在")
+            return False
 
-    try:
-        # 显示当前信息
-        current_weight = USER_PROFILES[nickname]['current_weight_kg']
-        print(f"当前体重: {current_weight}kg")
-
-        # 更新数据
-        old_weight = current_weight
-        USER_PROFILES[nickname]['current_weight_kg'] = new_weight
-
-        # 重新计算BMI
-        height = USER_PROFILES[nickname]['height_cm']
-        bmi_info = calculate_bmi(new_weight, height)
-        USER_PROFILES[nickname].update(bmi_info)
-
-        # 更新目标体重相关数据
-        if 'target_weight_kg' in USER_PROFILES[nickname]:
-            target = USER_PROFILES[nickname]['target_weight_kg']
-            weight_to_lose = new_weight - target
-            USER_PROFILES[nickname]['weight_to_lose'] = round(abs(weight_to_lose), 1)
-
-        #把新数据计入档案
         try:
-            weight_history_file = f"weight_history_{nickname}.json"
-
-            # 如果文件不存在，创建初始文件
-            if not os.path.exists(weight_history_file):
-                print(f"📄 体重记录文件不存在，创建新文件...")
-                initial_data = {
-                    "user": nickname,
-                    "history": [],
-                    "created_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }
-                with open(weight_history_file, 'w', encoding='utf-8') as f:
-                    json.dump(initial_data, f, ensure_ascii=False, indent=2)
-                print(f"✅ 已创建体重记录文件: {weight_history_file}")
-
-            # 读取现有数据
-            with open(weight_history_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            # 添加新的记录
-            new_record = {
-                "up_date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "weight_kg": new_weight,
-                "bmi": USER_PROFILES[nickname]['bmi'],
-                "status": USER_PROFILES[nickname]['status']
-            }
-
-            data["history"].append(new_record)
-
-            # 保存回文件
-            with open(weight_history_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-
-            print(f"📝 体重记录已保存到: {weight_history_file}")
+            # 显示当前信息
+            current_weight = profile['current_weight_kg']
+            print(f"当前体重: {current_weight}kg")
+
+            # 更新数据
+            old_weight = current_weight
+            profile['current_weight_kg'] = new_weight
+
+            # 重新计算BMI
+            height = profile['height_cm']
+            bmi_info = calculate_bmi(new_weight, height)
+            profile.update(bmi_info)
+
+            # 更新目标体重相关数据
+            if 'target_weight_kg' in profile:
+                target = profile['target_weight_kg']
+                weight_to_lose = new_weight - target
+                profile['weight_to_lose'] = round(abs(weight_to_lose), 1)
+
+            #把新数据计入档案
+            if PROFILE_REPOSITORY is not None:
+                # 体重历史保存在数据库的 weight_history 表中
+                try:
+                    if not PROFILE_REPOSITORY.add_weight_record(
+                            nickname, new_weight, profile['bmi'], profile['status']):
+                        print(f"⚠️  数据库中没有用户 '{nickname}'，体重记录未保存")
+                except Exception as e:
+                    print(f"⚠️  保存体重记录失败: {e}")
+            else:
+                try:
+                    weight_history_file = f"weight_history_{nickname}.json"
+
+                    # 如果文件不存在，创建初始文件
+                    if not os.path.exists(weight_history_file):
+                        print(f"📄 体重记录文件不存在，创建新文件...")
+                        initial_data = {
+                            "user": nickname,
+                            "history": [],
+                            "created_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                        }
+                        with open(weight_history_file, 'w', encoding='utf-8') as f:
+                            json.dump(initial_data, f, ensure_ascii=False, indent=2)
+                        print(f"✅ 已创建体重记录文件: {weight_history_file}")
+
+                    # 读取现有数据
+                    with open(weight_history_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+
+                    # 添加新的记录
+                    new_record = {
+                        "up_date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        "weight_kg": new_weight,
+                        "bmi": profile['bmi'],
+                        "status": profile['status']
+                    }
+
+                    data["history"].append(new_record)
+
+                    # 保存回文件
+                    with open(weight_history_file, 'w', encoding='utf-8') as f:
+                        json.dump(data, f, ensure_ascii=False, indent=2)
+
+                    print(f"📝 体重记录已保存到: {weight_history_file}")
+
+                except Exception as e:
+                    print(f"⚠️  保存体重记录失败: {e}")
+                    # 不阻止主流程，只是记录失败
+
+            # 更新时间戳
+            profile['last_update'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+            # 保存
+            with _PROFILES_LOCK:
+                USER_PROFILES[nickname] = profile
+                saved = save_profiles(nickname)
+            if saved:
+                print(f"\n✅ 体重更新成功！")
+                print(f"📉 变化: {round(new_weight - old_weight, 1)}kg")
+                print(f"📊 新BMI: {profile['bmi']} ({profile['status']})")
+                return True
+            else:
+                print("❌ 更新失败，无法保存数据")
+                return False
 
         except Exception as e:
-            print(f"⚠️  保存体重记录失败: {e}")
-            # 不阻止主流程，只是记录失败
-
-        # 更新时间戳
-        USER_PROFILES[nickname]['last_update'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        # 保存
-        if save_profiles():
-            print(f"\n✅ 体重更新成功！")
-            print(f"📉 变化: {round(new_weight - old_weight, 1)}kg")
-            print(f"📊 新BMI: {USER_PROFILES[nickname]['bmi']} ({USER_PROFILES[nickname]['status']})")
-            return True
-        else:
-            print("❌ 更新失败，无法保存数据")
+            print(f"❌ 更新体重时出错: {e}")
             return False
 
-    except Exception as e:
-        print(f"❌ 更新体重时出错: {e}")
-        return False
-
 
 def delete_user_profile(nickname: str) -> bool:
     """
@@ -529,7 +634,7 @@ def delete_user_profile(nickname: str) -> bool:
     返回值:
         bool: 删除是否成功
     """
-    if nickname not in USER_PROFILES:
+    if get_user_profile(nickname) is None:
         print(f"❌ 你不叫 '{nickname}' ")
         return False
 
@@ -544,11 +649,10 @@ def delete_user_profile(nickname: str) -> bool:
             if os.path.exists(weight_file):
                 files_to_delete.append(weight_file)
 
-            # 2. 每日记录文件（所有日期格式的json文件）
-            import glob
-            # 匹配格式：YYYY-MM-DD.json
-            daily_files = glob.glob("????-??-??.json")
-            files_to_delete.extend(daily_files)
+            # 2. 该用户的每日记录分片目录（daily_records/<用户哈希>/，只包含这个用户的记录）
+            record_root = user_record_root(RECORDS_DIR, nickname)
+            if os.path.isdir(record_root):
+                files_to_delete.append(record_root)
 
             # 3. 显示要删除的文件
             if files_to_delete:
@@ -562,17 +666,32 @@ def delete_user_profile(nickname: str) -> bool:
                     # 删除所有文件
                     for file in files_to_delete:
                         try:
-                            os.remove(file)
+                            if os.path.isdir(file):
+                                shutil.rmtree(file)
+                            else:
+                                os.remove(file)
                             print(f"✅ 已删除: {file}")
                         except Exception as e:
                             print(f"❌ 删除失败 {file}: {e}")
+                    # 目录缓存中可能还有已删除目录的索引
+                    directory_cache.invalidate()
                     print(f"✅ 所有相关数据文件已删除")
                 else:
                     print("⚠️  文件保留，仅删除用户档案")
         except Exception as e:
             print(f"⚠️  清理文件时出错: {e}")
 
-        del USER_PROFILES[nickname]
+        with _PROFILES_LOCK:
+            USER_PROFILES.pop(nickname, None)
+        if PROFILE_REPOSITORY is not None:
+            # 数据库中级联删除该用户的体重历史、每日记录和负面因子
+            try:
+                PROFILE_REPOSITORY.delete_profile(nickname)
+                print(f"✅ 用户 '{nickname}' 已注销")
+                return True
+            except Exception as e:
+                print(f"❌ 注销失败: {e}")
+                return False
         if save_profiles():
             print(f"✅ 用户 '{nickname}' 已注销")
             return True
@@ -164,11 +164,8 @@ class HistorySummaryManager:
             updated_data["summary"] = summary
             updated_data["last_updated"] = datetime.datetime.now().isoformat()
 
-            # 构建文件路径
-            filename = os.path.join(self.base_dir, f"{date_str}.json")
-
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(updated_data, f, ensure_ascii=False, indent=2)
+            # 按记录器当前的序列化格式保存
+            self.recorder.save_date_record(date_str, updated_data)
 
             print(f"✅ 已保存{date_str}的总结（{len(summary)}字）")
             return True
@@ -412,6 +409,7 @@ class HistorySummaryManager:
                 cleared_data = {
                     "date": data.get("date", date_str),
                     "summary": summary,
+                    "daily_history": [],
                 }
 
                 # 保留其他重要字段
@@ -423,6 +421,7 @@ class HistorySummaryManager:
                 # 完全清空
                 cleared_data = {
                     "date": data.get("date", date_str),
+                    "daily_history": [],
                 }
 
             # 保存清理后的数据
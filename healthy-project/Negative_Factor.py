@@ -4,11 +4,22 @@
 """
 
 import re
+import sys
 import json
+import time
+import random
 import datetime
-from typing import Dict, List, Tuple, Any, Optional
+import multiprocessing
+from typing import Dict, List, Tuple, Any, Optional, Sequence
 from dataclasses import dataclass
 from enum import Enum
+from keyword_automaton import KeywordAutomaton
+
+# 可选依赖：没有安装时批量检测逐条调用 detect_negative_factor
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class Severity(Enum):
@@ -41,6 +52,17 @@ class NegativeFactor:
 class NegativeFactorDetector:
     """负面因子检测器"""
 
+    # 否定词只检查关键词前面这么多个字符
+    NEGATION_WINDOW = 5
+
+    # 判断因子类型用的提示词（在命中的关键词中查找，都没有时在整段文本中查找）
+    TYPE_HINT_WORDS = {
+        FactorType.INJURY: ["伤", "扭", "拉", "挫", "摔", "跌", "骨折", "骨裂"],
+        FactorType.ILLNESS: ["病", "烧", "咳", "吐", "泻", "痛", "晕", "炎", "感染"],
+        FactorType.EMOTION: ["难过", "伤心", "沮丧", "抑郁", "焦虑", "生气", "愤怒"],
+        FactorType.FATIGUE: ["累", "疲惫", "疲劳", "困", "乏", "虚弱"],
+    }
+
     def __init__(self):
         # 初始化负面因子数据库
         self.factor_database = self._initialize_factor_database()
@@ -96,6 +118,50 @@ class NegativeFactorDetector:
         # 否定词（用于降低权重）
         self.negation_words = {"不", "没有", "没", "未", "无", "非"}
 
+        self._compile_matcher()
+
+    def _compile_matcher(self) -> None:
+        """
+        把权重关键词、严重程度词、否定词和类型提示词编译进同一个自动机
+
+        检测时只扫描一遍文本，得到每个词第一次出现的位置和所有否定词的位置
+        """
+        self.matcher = KeywordAutomaton()
+        for words in (self.keyword_weights, self.severity_keywords, self.negation_words,
+                      *self.TYPE_HINT_WORDS.values()):
+            for word in words:
+                self.matcher.add(word.lower())
+        self.matcher.build()
+
+        # 按字典顺序排列的序号，保证结果与逐个关键词检查时的顺序一致
+        self._keyword_order = {keyword.lower(): (index, keyword, weight)
+                               for index, (keyword, weight) in enumerate(self.keyword_weights.items())}
+        self._severity_order = {keyword.lower(): (index, severity)
+                                for index, (keyword, severity) in enumerate(self.severity_keywords.items())}
+        self._negations = {word.lower() for word in self.negation_words}
+
+        # 每个权重关键词包含的类型提示词（类型得分按命中关键词中出现过的提示词计数）
+        self._keyword_type_hints = {
+            keyword: {(factor_type, word) for factor_type, words in self.TYPE_HINT_WORDS.items()
+                      for word in words if word in keyword}
+            for keyword in self.keyword_weights
+        }
+
+    def _scan(self, text: str) -> Tuple[Dict[str, int], List[Tuple[int, int]]]:
+        """
+        扫描一遍文本
+
+        Returns:
+            (每个词第一次出现的位置, 所有否定词出现的 (开始, 结束) 位置)
+        """
+        positions = {}
+        negations = []
+        for start, end, word in self.matcher.iter_matches(text):
+            positions.setdefault(word, start)
+            if word in self._negations:
+                negations.append((start, end))
+        return positions, negations
+
     def _initialize_factor_database(self) -> List[NegativeFactor]:
         """初始化负面因子数据库"""
         return [
@@ -220,32 +286,34 @@ class NegativeFactorDetector:
         # 转换为小写进行匹配
         input_lower = user_input.lower()
 
+        # 一次扫描得到所有关键词和否定词的位置
+        positions, negations = self._scan(input_lower)
+
         # 计算总权重
         total_weight = 0.0
         matched_keywords = []
 
-        # 检查关键词
-        for keyword, weight in self.keyword_weights.items():
-            keyword_lower = keyword.lower()
-            if keyword_lower in input_lower:
-                # 检查是否有否定词前缀
-                has_negation = self._has_negation_before(input_lower, keyword_lower)
-                if has_negation:
-                    # 有否定词，降低权重
-                    total_weight -= weight * 0.5
-                else:
-                    total_weight += weight
-                    matched_keywords.append(keyword)
+        # 检查命中的关键词（按关键词表的顺序）
+        hits = sorted(self._keyword_order[word] for word in positions if word in self._keyword_order)
+        for _, keyword, weight in hits:
+            # 检查是否有否定词前缀
+            has_negation = self._has_negation_at(negations, positions[keyword.lower()])
+            if has_negation:
+                # 有否定词，降低权重
+                total_weight -= weight * 0.5
+            else:
+                total_weight += weight
+                matched_keywords.append(keyword)
 
         # 如果总权重低于阈值，认为没有负面因子
         if total_weight < 0.5:
             return None
 
         # 检测严重程度
-        severity = self._detect_severity(input_lower, total_weight)
+        severity = self._detect_severity(input_lower, total_weight, positions)
 
         # 确定因子类型
-        factor_type = self._determine_factor_type(matched_keywords, input_lower)
+        factor_type = self._determine_factor_type(matched_keywords, input_lower, positions)
 
         # 判断是否适合运动
         should_exercise = self._should_exercise(factor_type, severity, total_weight)
@@ -266,32 +334,20 @@ class NegativeFactorDetector:
             "detected_at": datetime.datetime.now().isoformat()
         }
 
-    def _has_negation_before(self, text: str, keyword: str) -> bool:
-        """检查关键词前面是否有否定词"""
-        try:
-            keyword_index = text.find(keyword)
-            if keyword_index == -1:
-                return False
-
-            # 检查关键词前的几个字符
-            start_idx = max(0, keyword_index - 5)
-            preceding_text = text[start_idx:keyword_index]
-
-            # 检查是否有否定词
-            for negation in self.negation_words:
-                if negation in preceding_text:
-                    return True
+    def _has_negation_at(self, negations: List[Tuple[int, int]], keyword_index: int) -> bool:
+        """检查关键词前 NEGATION_WINDOW 个字符内是否有完整的否定词（否定词位置来自 _scan）"""
+        start_idx = max(0, keyword_index - self.NEGATION_WINDOW)
+        return any(start >= start_idx and end <= keyword_index for start, end in negations)
 
-            return False
-        except:
-            return False
+    def _detect_severity(self, text: str, weight: float, positions: Dict[str, int] = None) -> Severity:
+        """检测严重程度（positions 为 _scan 的结果，不提供时重新扫描）"""
+        if positions is None:
+            positions, _ = self._scan(text)
 
-    def _detect_severity(self, text: str, weight: float) -> Severity:
-        """检测严重程度"""
-        # 首先检查明确的严重程度关键词
-        for keyword, severity in self.severity_keywords.items():
-            if keyword in text:
-                return severity
+        # 首先检查明确的严重程度关键词（按关键词表的顺序取第一个）
+        found = [self._severity_order[word] for word in positions if word in self._severity_order]
+        if found:
+            return min(found, key=lambda item: item[0])[1]
 
         # 根据权重判断
         if weight >= 2.5:
@@ -301,8 +357,12 @@ class NegativeFactorDetector:
         else:
             return Severity.LIGHT
 
-    def _determine_factor_type(self, keywords: List[str], text: str) -> FactorType:
-        """确定因子类型"""
+    def _determine_factor_type(self, keywords: List[str], text: str,
+                               positions: Dict[str, int] = None) -> FactorType:
+        """确定因子类型（positions 为 _scan 的结果，不提供时重新扫描）"""
+        if positions is None:
+            positions, _ = self._scan(text)
+
         # 统计各类关键词出现次数
         type_scores = {
             FactorType.INJURY: 0,
@@ -312,29 +372,12 @@ class NegativeFactorDetector:
             FactorType.OTHER: 0
         }
 
-        # 受伤相关关键词
-        injury_words = ["伤", "扭", "拉", "挫", "摔", "跌", "骨折", "骨裂"]
-        for word in injury_words:
-            if any(word in kw for kw in keywords):
-                type_scores[FactorType.INJURY] += 1
-
-        # 生病相关关键词
-        illness_words = ["病", "烧", "咳", "吐", "泻", "痛", "晕", "炎", "感染"]
-        for word in illness_words:
-            if any(word in kw for kw in keywords):
-                type_scores[FactorType.ILLNESS] += 1
-
-        # 情绪相关关键词
-        emotion_words = ["难过", "伤心", "沮丧", "抑郁", "焦虑", "生气", "愤怒"]
-        for word in emotion_words:
-            if any(word in kw for kw in keywords):
-                type_scores[FactorType.EMOTION] += 1
-
-        # 疲劳相关关键词
-        fatigue_words = ["累", "疲惫", "疲劳", "困", "乏", "虚弱"]
-        for word in fatigue_words:
-            if any(word in kw for kw in keywords):
-                type_scores[FactorType.FATIGUE] += 1
+        # 命中的关键词中出现过的提示词（每个提示词计一次，编译时已预先算好）
+        hint_hits = set()
+        for kw in keywords:
+            hint_hits |= self._keyword_type_hints.get(kw, set())
+        for factor_type, _ in hint_hits:
+            type_scores[factor_type] += 1
 
         # 找出得分最高的类型
         max_score = 0
@@ -347,14 +390,9 @@ class NegativeFactorDetector:
 
         # 如果所有得分都为0，尝试从文本中推断
         if max_score == 0:
-            if any(word in text for word in injury_words):
-                return FactorType.INJURY
-            elif any(word in text for word in illness_words):
-                return FactorType.ILLNESS
-            elif any(word in text for word in emotion_words):
-                return FactorType.EMOTION
-            elif any(word in text for word in fatigue_words):
-                return FactorType.FATIGUE
+            for factor_type, words in self.TYPE_HINT_WORDS.items():
+                if any(word in positions for word in words):
+                    return factor_type
 
         return selected_type
 
@@ -404,6 +442,202 @@ class NegativeFactorDetector:
 
         return description
 
+    # ==================== 批量检测 ====================
+
+    def _compile_batch_tables(self) -> None:
+        """
+        编译批量检测用的矩阵（第一次批量检测时调用）
+
+        - 关键词权重向量 w（K）
+        - 关键词包含的类型提示词矩阵 M（K × W）和提示词类型矩阵 T（W × 类型数）
+        """
+        self._batch_keywords = list(self.keyword_weights.items())
+        self._batch_keyword_col = {keyword.lower(): col for col, (keyword, _) in enumerate(self._batch_keywords)}
+        self._batch_weights = np.array([weight for _, weight in self._batch_keywords], dtype=np.float64)
+
+        self._batch_severities = list(self.severity_keywords.values())
+        self._batch_severity_col = {keyword.lower(): col for col, keyword in enumerate(self.severity_keywords)}
+
+        self._batch_types = list(self.TYPE_HINT_WORDS)
+        hints = [(factor_type, word) for factor_type, words in self.TYPE_HINT_WORDS.items() for word in words]
+        self._batch_hint_cols: Dict[str, List[int]] = {}
+        for col, (_, word) in enumerate(hints):
+            self._batch_hint_cols.setdefault(word, []).append(col)
+
+        self._batch_keyword_hints = np.array(
+            [[word in keyword for _, word in hints] for keyword, _ in self._batch_keywords], dtype=np.int32)
+        self._batch_hint_types = np.array(
+            [[factor_type == t for t in self._batch_types] for factor_type, _ in hints], dtype=np.int32)
+
+    def detect_batch(self, texts: Sequence[str], processes: int = 1,
+                     chunk_size: int = 5000) -> List[Optional[Dict[str, Any]]]:
+        """
+        批量检测负面因子（用于回填历史对话）
+
+        每条文本用同一个编译好的自动机扫描一遍，得到关键词命中矩阵，
+        权重累加、严重程度和类型判断都对整批文本做矩阵运算。重复的文本（"好的"、"谢谢"等）只检测一次。
+        结果与逐条调用 detect_negative_factor 相同（detected_at 为整批的检测时间）。
+
+        Args:
+            texts: 文本列表
+            processes: 进程数，大于1时按块分给多个进程（每个进程只编译一次检测器）
+            chunk_size: 每块文本数
+
+        Returns:
+            与 texts 一一对应的检测结果（未检测到为None）
+        """
+        if np is None:
+            return [self.detect_negative_factor(text) for text in texts]
+
+        unique = list(dict.fromkeys(text for text in texts if text and isinstance(text, str)))
+        chunks = [unique[i:i + chunk_size] for i in range(0, len(unique), chunk_size)]
+        if processes > 1 and len(chunks) > 1:
+            with multiprocessing.Pool(processes, initializer=_init_batch_worker, initargs=(self,)) as pool:
+                results = pool.map(_detect_batch_chunk, chunks)
+        else:
+            results = [self._detect_chunk(chunk) for chunk in chunks]
+
+        by_text = dict(zip(unique, (result for chunk_results in results for result in chunk_results)))
+        output = []
+        seen = set()
+        for text in texts:
+            result = by_text.get(text) if isinstance(text, str) else None
+            if result is not None:
+                # 重复文本的结果复制一份，调用方修改其中一个不会影响其他
+                if text in seen:
+                    result = dict(result, matched_keywords=list(result["matched_keywords"]))
+                seen.add(text)
+            output.append(result)
+        return output
+
+    def _detect_chunk(self, texts: Sequence[str]) -> List[Optional[Dict[str, Any]]]:
+        """对一块文本做矩阵化检测"""
+        if not hasattr(self, "_batch_weights"):
+            self._compile_batch_tables()
+
+        count = len(texts)
+        keyword_col, severity_col, hint_cols = (self._batch_keyword_col, self._batch_severity_col,
+                                                self._batch_hint_cols)
+
+        # 先收集各矩阵中为真的坐标，最后一次性写入
+        hit_rows, hit_cols, hit_values = [], [], []
+        severity_rows, severity_cols = [], []
+        hint_rows, hint_cols_hit = [], []
+        valid = np.zeros(count, dtype=bool)
+
+        for row, text in enumerate(texts):
+            if not text or not isinstance(text, str):
+                continue
+            valid[row] = True
+            positions, negations = self._scan(text.lower())
+            for word, position in positions.items():
+                col = keyword_col.get(word)
+                if col is not None:
+                    hit_rows.append(row)
+                    hit_cols.append(col)
+                    hit_values.append(-0.5 if negations and self._has_negation_at(negations, position) else 1.0)
+                col = severity_col.get(word)
+                if col is not None:
+                    severity_rows.append(row)
+                    severity_cols.append(col)
+                for col in hint_cols.get(word, ()):
+                    hint_rows.append(row)
+                    hint_cols_hit.append(col)
+
+        # 命中矩阵：1 表示命中，-0.5 表示前面有否定词；unnegated 为计入 matched_keywords 的命中
+        hits = np.zeros((count, len(self._batch_keywords)), dtype=np.float64)
+        hits[hit_rows, hit_cols] = hit_values
+        unnegated = hits > 0
+        severity_hits = np.zeros((count, len(self._batch_severities)), dtype=bool)
+        severity_hits[severity_rows, severity_cols] = True
+        text_hints = np.zeros((count, len(self._batch_hint_types)), dtype=bool)
+        text_hints[hint_rows, hint_cols_hit] = True
+
+        # 按关键词表顺序逐列累加（cumsum 是顺序求和，浮点结果与逐个关键词累加完全相同）
+        total = np.cumsum(hits * self._batch_weights, axis=1)[:, -1] if hits.shape[1] else np.zeros(count)
+        detected = valid & (total >= 0.5)
+
+        # 严重程度：关键词表中第一个出现的严重程度词，没有时按权重
+        has_severity_word = severity_hits.any(axis=1)
+        first_severity = severity_hits.argmax(axis=1)
+        by_weight = np.where(total >= 2.5, 2, np.where(total >= 1.5, 1, 0))
+        weight_levels = [Severity.LIGHT, Severity.MEDIUM, Severity.SEVERE]
+
+        # 类型：命中关键词中出现过的提示词按类型计数，取得分最高（并列取靠前）的类型；
+        # 都为0时取文本中出现了提示词的第一个类型
+        hint_present = (unnegated.astype(np.int32) @ self._batch_keyword_hints) > 0
+        type_scores = hint_present.astype(np.int32) @ self._batch_hint_types
+        best_type = type_scores.argmax(axis=1)
+        has_score = type_scores.max(axis=1) > 0
+        text_types = (text_hints.astype(np.int32) @ self._batch_hint_types) > 0
+        has_text_type = text_types.any(axis=1)
+        first_text_type = text_types.argmax(axis=1)
+
+        # 只取检测到的行，转成Python列表后再逐条生成结果
+        rows = np.flatnonzero(detected)
+        columns = zip(rows.tolist(), total[rows].tolist(),
+                      np.where(has_severity_word[rows], first_severity[rows], -1).tolist(), by_weight[rows].tolist(),
+                      np.where(has_score[rows], best_type[rows],
+                               np.where(has_text_type[rows], first_text_type[rows], -1)).tolist())
+        matched_rows, matched_cols = np.nonzero(unnegated[rows])
+        matched: Dict[int, List[str]] = {}
+        for index, col in zip(matched_rows.tolist(), matched_cols.tolist()):
+            matched.setdefault(index, []).append(self._batch_keywords[col][0])
+
+        detected_at = datetime.datetime.now().isoformat()
+        results: List[Optional[Dict[str, Any]]] = [None] * count
+        for index, (row, weight, severity_col, weight_level, type_col) in enumerate(columns):
+            severity = self._batch_severities[severity_col] if severity_col >= 0 else weight_levels[weight_level]
+            factor_type = self._batch_types[type_col] if type_col >= 0 else FactorType.OTHER
+            matched_keywords = matched.get(index, [])
+            results[row] = {
+                "detected": True,
+                "type": factor_type.value,
+                "description": self._generate_description(matched_keywords, texts[row].lower()),
+                "severity": severity.value,
+                "total_weight": round(weight, 2),
+                "matched_keywords": matched_keywords,
+                "should_exercise": self._should_exercise(factor_type, severity, weight),
+                "duration_days": 1,
+                "user_input": texts[row],
+                "detected_at": detected_at
+            }
+        return results
+
+    def detect_history(self, records: List[Dict[str, Any]], processes: int = 1) -> List[Dict[str, Any]]:
+        """
+        回填：检测每日记录 daily_history 中用户说过的话
+
+        Args:
+            records: 每日记录列表（需要包含 date 和 daily_history）
+            processes: 进程数
+
+        Returns:
+            检测到负面因子的消息列表，每项包含 date、timestamp 和检测结果 result
+        """
+        messages = []
+        for record in records:
+            for entry in record.get("daily_history") or []:
+                if entry.get("role") == "user" and entry.get("content"):
+                    messages.append((record.get("date"), entry.get("timestamp"), entry["content"]))
+
+        results = self.detect_batch([content for _, _, content in messages], processes=processes)
+        return [{"date": date_str, "timestamp": timestamp, "result": result}
+                for (date_str, timestamp, _), result in zip(messages, results) if result]
+
+
+# 批量检测的工作进程：进程启动时接收一次检测器（自动机和矩阵在进程内编译一次，之后各块共用）
+_BATCH_DETECTOR: Optional[NegativeFactorDetector] = None
+
+
+def _init_batch_worker(detector: NegativeFactorDetector) -> None:
+    global _BATCH_DETECTOR
+    _BATCH_DETECTOR = detector
+
+
+def _detect_batch_chunk(texts: Sequence[str]) -> List[Optional[Dict[str, Any]]]:
+    return _BATCH_DETECTOR._detect_chunk(texts)
+
 
 class NegativeFactorManager:
     """负面因子管理器（作为MCP工具使用）"""
@@ -774,5 +1008,54 @@ def test_negative_factor_detection():
             print("  未检测到负面因子")
 
 
+def benchmark_batch_detection(count: int = 20000, processes: int = None, seed: int = 42) -> Dict[str, Any]:
+    """
+    批量检测吞吐量测试：逐条检测 vs 批量检测 vs 多进程批量检测（并核对结果一致）
+
+    Args:
+        count: 合成消息条数
+        processes: 多进程测试的进程数（默认CPU核数）
+        seed: 随机种子
+    """
+    rng = random.Random(seed)
+    fragments = ["今天早上吃了{}个包子", "中午和同事吃了{}碗黄焖鸡米饭", "下午开了{}个会", "晚上想去跑{}公里",
+                 "膝盖有点疼", "有点累", "感冒了{}天", "没有发烧", "心情不错", "压力很大", "头晕",
+                 "不太想动", "非常严重的扭伤", "有点焦虑", "睡了{}个小时", "喝了{}杯水"]
+    texts = ["，".join(rng.choice(fragments).format(rng.randint(1, 12)) for _ in range(rng.randint(1, 5)))
+             for _ in range(count)]
+    processes = processes or multiprocessing.cpu_count()
+    detector = NegativeFactorDetector()
+
+    def strip(results):
+        return [{k: v for k, v in r.items() if k != "detected_at"} if r else None for r in results]
+
+    print(f"🧪 批量检测吞吐量：{count} 条消息（{len(set(texts))} 条不重复），"
+          f"numpy={'可用' if np is not None else '不可用'}")
+    timings = {}
+
+    start = time.perf_counter()
+    expected = [detector.detect_negative_factor(text) for text in texts]
+    timings["逐条"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = detector.detect_batch(texts)
+    timings["批量"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel = detector.detect_batch(texts, processes=processes, chunk_size=max(1, count // (processes * 4)))
+    timings[f"批量×{processes}进程"] = time.perf_counter() - start
+
+    consistent = strip(expected) == strip(batch) == strip(parallel)
+    for label, seconds in timings.items():
+        print(f"  {label:<10} {seconds:7.3f} 秒  {count / seconds:>10,.0f} 条/秒")
+    print(f"  {'✅' if consistent else '❌'} 结果一致，检测到 {sum(1 for r in expected if r)} 条")
+
+    return {"count": count, "processes": processes, "consistent": consistent,
+            "messages_per_s": {label: round(count / seconds, 1) for label, seconds in timings.items()}}
+
+
 if __name__ == "__main__":
-    test_negative_factor_detection()
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        benchmark_batch_detection(int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
+    else:
+        test_negative_factor_detection()
\ No newline at end of file
@@ -0,0 +1,355 @@
+# analytics.py
+"""
+周汇总统计表
+按用户、按周（周一为一周开始）预先汇总体重和每日记录：
+- weekly_weight_summary: 每周称重次数、最低/最高/平均体重、周初/周末体重
+- weekly_activity_summary: 每周记录天数、各餐吃了的天数、运动天数（含按天的位掩码）、饮水、规划天数
+
+汇总表由触发器维护：weight_history / daily_records 每写入一行，只重算这一行所在的那一周（最多7天的数据），
+趋势查询直接读取汇总表，耗时只和周数有关，不再扫描全部原始记录
+"""
+
+import sqlite3
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 日期所在周的周一：'weekday 0' 跳到本周日（当天是周日则不变），再退6天
+WEEK_START_SQL = "date({value}, 'weekday 0', '-6 days')"
+
+SUMMARY_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS weekly_weight_summary (
+        user_id INTEGER NOT NULL,
+        week_start TEXT NOT NULL,
+        weigh_ins INTEGER NOT NULL,
+        min_weight_kg REAL,
+        max_weight_kg REAL,
+        avg_weight_kg REAL,
+        first_weight_kg REAL,
+        last_weight_kg REAL,
+        PRIMARY KEY (user_id, week_start),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS weekly_activity_summary (
+        user_id INTEGER NOT NULL,
+        week_start TEXT NOT NULL,
+        days_recorded INTEGER NOT NULL,
+        breakfast_days INTEGER NOT NULL,
+        lunch_days INTEGER NOT NULL,
+        dinner_days INTEGER NOT NULL,
+        snack_days INTEGER NOT NULL,
+        exercise_days INTEGER NOT NULL,
+        exercise_mask INTEGER NOT NULL,  -- 第i位表示周一之后第i天是否运动
+        drink_cups INTEGER NOT NULL,
+        drink_goal_days INTEGER NOT NULL,
+        food_plan_days INTEGER NOT NULL,
+        movement_plan_days INTEGER NOT NULL,
+        PRIMARY KEY (user_id, week_start),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """
+]
+
+# 重算一周的体重汇总（{user}、{week} 为SQL表达式）
+# 先删除再按GROUP BY插入：这一周已没有记录时不会插入空行（也不会给已删除的用户插入汇总）
+_WEIGHT_WEEK_SQL = """
+    DELETE FROM weekly_weight_summary WHERE user_id = {user} AND week_start = {week};
+    INSERT INTO weekly_weight_summary
+        (user_id, week_start, weigh_ins, min_weight_kg, max_weight_kg, avg_weight_kg,
+         first_weight_kg, last_weight_kg)
+    SELECT w.user_id, {week}, COUNT(*), MIN(w.weight_kg), MAX(w.weight_kg), AVG(w.weight_kg),
+        (SELECT weight_kg FROM weight_history
+         WHERE user_id = {user} AND recorded_date >= {week} AND recorded_date < date({week}, '+7 days')
+         ORDER BY recorded_date, id LIMIT 1),
+        (SELECT weight_kg FROM weight_history
+         WHERE user_id = {user} AND recorded_date >= {week} AND recorded_date < date({week}, '+7 days')
+         ORDER BY recorded_date DESC, id DESC LIMIT 1)
+    FROM weight_history w
+    WHERE w.user_id = {user} AND w.recorded_date >= {week} AND w.recorded_date < date({week}, '+7 days')
+    GROUP BY w.user_id;
+"""
+
+# 每日记录按周汇总的聚合列（重算单周和全量重建共用）
+# 同一餐记录第二次后状态为 "吃了N次"（见 Diet.update_meal_status），也算吃了这一餐
+_ACTIVITY_AGGREGATES = """
+        COUNT(*),
+        SUM(COALESCE(breakfast_status, '') LIKE '吃了%'), SUM(COALESCE(lunch_status, '') LIKE '吃了%'),
+        SUM(COALESCE(dinner_status, '') LIKE '吃了%'), SUM(COALESCE(snack_status, '') LIKE '吃了%'),
+        SUM(COALESCE(exercise_status, '没运动') != '没运动'),
+        SUM(CASE WHEN COALESCE(exercise_status, '没运动') != '没运动'
+            THEN 1 << CAST(julianday(record_date) - julianday({week}) AS INTEGER) ELSE 0 END),
+        COALESCE(SUM(drink_number), 0),
+        SUM(IFNULL(drink_number >= drink_plan, 0)),
+        SUM(food_plan IS NOT NULL AND food_plan NOT IN ('', '[]')),
+        SUM(movement_plan IS NOT NULL AND movement_plan NOT IN ('', '[]'))
+"""
+
+_ACTIVITY_COLUMNS = """
+        (user_id, week_start, days_recorded, breakfast_days, lunch_days, dinner_days, snack_days,
+         exercise_days, exercise_mask, drink_cups, drink_goal_days, food_plan_days, movement_plan_days)
+"""
+
+_ACTIVITY_WEEK_SQL = """
+    DELETE FROM weekly_activity_summary WHERE user_id = {user} AND week_start = {week};
+    INSERT INTO weekly_activity_summary """ + _ACTIVITY_COLUMNS + """
+    SELECT user_id, {week}, """ + _ACTIVITY_AGGREGATES + """
+    FROM daily_records
+    WHERE user_id = {user} AND record_date >= {week} AND record_date < date({week}, '+7 days')
+    GROUP BY user_id;
+"""
+
+# 只有这些字段变化时才需要重算活动汇总（写入每日总结、负面因子等不触发）
+_ACTIVITY_TRIGGER_COLUMNS = (
+    "user_id, record_date, breakfast_status, lunch_status, dinner_status, snack_status, "
+    "exercise_status, drink_number, drink_plan, food_plan, movement_plan"
+)
+
+
+def _week_sql(template: str, row: str, date_column: str) -> str:
+    """把重算单周的SQL模板代入触发器里的 NEW/OLD 行"""
+    week = WEEK_START_SQL.format(value=f"{row}.{date_column}")
+    return template.format(user=f"{row}.user_id", week=week)
+
+
+def _trigger_sql() -> List[str]:
+    """生成维护汇总表的触发器"""
+    triggers = []
+
+    for table, date_column, template, prefix, update_of in (
+            ("weight_history", "recorded_date", _WEIGHT_WEEK_SQL, "trg_weekly_weight", ""),
+            ("daily_records", "record_date", _ACTIVITY_WEEK_SQL, "trg_weekly_activity",
+             f" OF {_ACTIVITY_TRIGGER_COLUMNS}")):
+        triggers.append(f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_insert AFTER INSERT ON {table}
+        BEGIN {_week_sql(template, "NEW", date_column)} END
+        """)
+        triggers.append(f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_delete AFTER DELETE ON {table}
+        BEGIN {_week_sql(template, "OLD", date_column)} END
+        """)
+        # 修改日期或用户时旧的一周和新的一周都要重算
+        triggers.append(f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_update AFTER UPDATE{update_of} ON {table}
+        BEGIN {_week_sql(template, "OLD", date_column)} {_week_sql(template, "NEW", date_column)} END
+        """)
+
+    return triggers
+
+
+SUMMARY_TRIGGERS_SQL = _trigger_sql()
+SUMMARY_TRIGGER_NAMES = [
+    f"{prefix}_{event}"
+    for prefix in ("trg_weekly_weight", "trg_weekly_activity")
+    for event in ("insert", "delete", "update")
+]
+
+
+def create_summary_tables(conn: sqlite3.Connection) -> bool:
+    """
+    创建汇总表和触发器（不提交）
+
+    汇总表是第一次创建时，用已有的原始记录回填
+
+    Returns:
+        是否进行了回填
+    """
+    existing = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (?, ?)",
+        ("weekly_weight_summary", "weekly_activity_summary")).fetchone()[0]
+
+    for sql in SUMMARY_TABLES_SQL + SUMMARY_TRIGGERS_SQL:
+        conn.execute(sql)
+
+    if existing < 2:
+        rebuild_weekly_summaries(conn, commit=False)
+        return True
+    return False
+
+
+def drop_summary_triggers(conn: sqlite3.Connection) -> None:
+    """删除汇总触发器（批量导入前使用，导入后调用 create_summary_triggers 和 rebuild_weekly_summaries）"""
+    for name in SUMMARY_TRIGGER_NAMES:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def create_summary_triggers(conn: sqlite3.Connection) -> None:
+    """重新创建汇总触发器"""
+    for sql in SUMMARY_TRIGGERS_SQL:
+        conn.execute(sql)
+
+
+def rebuild_weekly_summaries(conn: sqlite3.Connection, user_id: int = None, commit: bool = True) -> Dict[str, int]:
+    """
+    根据原始记录全量重建汇总表（每张表一条 GROUP BY 语句）
+
+    Args:
+        conn: 数据库连接
+        user_id: 只重建指定用户（None表示全部用户）
+        commit: 是否提交
+
+    Returns:
+        {表名: 汇总行数}
+    """
+    user_filter = "WHERE user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+    week = WEEK_START_SQL.format(value="recorded_date")
+
+    conn.execute(f"DELETE FROM weekly_weight_summary {user_filter}", params)
+    conn.execute(f"""
+    INSERT INTO weekly_weight_summary
+        (user_id, week_start, weigh_ins, min_weight_kg, max_weight_kg, avg_weight_kg,
+         first_weight_kg, last_weight_kg)
+    SELECT user_id, week_start, COUNT(*), MIN(weight_kg), MAX(weight_kg), AVG(weight_kg),
+        MAX(CASE WHEN first_rank = 1 THEN weight_kg END),
+        MAX(CASE WHEN last_rank = 1 THEN weight_kg END)
+    FROM (
+        SELECT user_id, weight_kg, {week} AS week_start,
+            ROW_NUMBER() OVER (PARTITION BY user_id, {week} ORDER BY recorded_date, id) AS first_rank,
+            ROW_NUMBER() OVER (PARTITION BY user_id, {week} ORDER BY recorded_date DESC, id DESC) AS last_rank
+        FROM weight_history {user_filter}
+    )
+    GROUP BY user_id, week_start
+    """, params)
+
+    week = WEEK_START_SQL.format(value="record_date")
+    conn.execute(f"DELETE FROM weekly_activity_summary {user_filter}", params)
+    conn.execute(f"""
+    INSERT INTO weekly_activity_summary {_ACTIVITY_COLUMNS}
+    SELECT user_id, {week} AS week_start, {_ACTIVITY_AGGREGATES.format(week=week)}
+    FROM daily_records {user_filter}
+    GROUP BY user_id, week_start
+    """, params)
+
+    if commit:
+        conn.commit()
+
+    counts = {}
+    for table in ("weekly_weight_summary", "weekly_activity_summary"):
+        counts[table] = conn.execute(f"SELECT COUNT(*) FROM {table} {user_filter}", params).fetchone()[0]
+    return counts
+
+
+def week_start_of(day: date) -> date:
+    """日期所在周的周一"""
+    return day - timedelta(days=day.weekday())
+
+
+def weight_trend(conn: sqlite3.Connection, user_id: int, weeks: int = 12) -> List[Dict[str, Any]]:
+    """
+    最近若干周的体重趋势（按周升序）
+
+    Returns:
+        每周一条：week_start、weigh_ins、min/max/avg/first/last 体重、change_kg（与上一个有称重的周相比的平均体重变化）
+    """
+    rows = conn.execute("""
+    SELECT week_start, weigh_ins, min_weight_kg, max_weight_kg, avg_weight_kg, first_weight_kg, last_weight_kg
+    FROM weekly_weight_summary
+    WHERE user_id = ?
+    ORDER BY week_start DESC
+    LIMIT ?
+    """, (user_id, weeks)).fetchall()
+
+    trend = []
+    previous_avg = None
+    for row in reversed(rows):
+        item = {
+            "week_start": row[0],
+            "weigh_ins": row[1],
+            "min_weight_kg": row[2],
+            "max_weight_kg": row[3],
+            "avg_weight_kg": round(row[4], 2),
+            "first_weight_kg": row[5],
+            "last_weight_kg": row[6],
+            "change_kg": round(row[4] - previous_avg, 2) if previous_avg is not None else None
+        }
+        previous_avg = row[4]
+        trend.append(item)
+
+    return trend
+
+
+def activity_trend(conn: sqlite3.Connection, user_id: int, weeks: int = 12) -> List[Dict[str, Any]]:
+    """
+    最近若干周的饮食/运动/饮水坚持情况（按周升序）
+
+    Returns:
+        每周一条：各项天数，以及三餐完成率 meal_adherence、运动天数比例 exercise_rate（按有记录的天数计算）
+    """
+    rows = conn.execute("""
+    SELECT week_start, days_recorded, breakfast_days, lunch_days, dinner_days, snack_days,
+           exercise_days, exercise_mask, drink_cups, drink_goal_days, food_plan_days, movement_plan_days
+    FROM weekly_activity_summary
+    WHERE user_id = ?
+    ORDER BY week_start DESC
+    LIMIT ?
+    """, (user_id, weeks)).fetchall()
+
+    trend = []
+    for row in reversed(rows):
+        days = row[1]
+        main_meals = row[2] + row[3] + row[4]
+        trend.append({
+            "week_start": row[0],
+            "days_recorded": days,
+            "breakfast_days": row[2],
+            "lunch_days": row[3],
+            "dinner_days": row[4],
+            "snack_days": row[5],
+            "exercise_days": row[6],
+            "exercise_mask": row[7],
+            "drink_cups": row[8],
+            "drink_goal_days": row[9],
+            "food_plan_days": row[10],
+            "movement_plan_days": row[11],
+            "meal_adherence": round(main_meals / (days * 3), 3) if days else 0.0,
+            "exercise_rate": round(row[6] / days, 3) if days else 0.0
+        })
+
+    return trend
+
+
+def exercise_streaks(conn: sqlite3.Connection, user_id: int, as_of: date = None) -> Dict[str, Any]:
+    """
+    连续运动天数（由每周的运动位掩码计算，每周只读一行）
+
+    Args:
+        as_of: 计算当前连续天数的截止日期（默认今天）；截止日期当天还没运动时，从前一天开始算
+
+    Returns:
+        current_streak、longest_streak、last_exercise_date
+    """
+    as_of = as_of or datetime.now().date()
+    rows = conn.execute("""
+    SELECT week_start, exercise_mask FROM weekly_activity_summary
+    WHERE user_id = ? AND exercise_mask != 0 AND week_start <= ?
+    ORDER BY week_start
+    """, (user_id, as_of.isoformat())).fetchall()
+
+    longest = 0
+    run = 0
+    last_day = None
+
+    for week_start, mask in rows:
+        monday = date.fromisoformat(week_start)
+        for offset in range(7):
+            if not mask >> offset & 1:
+                continue
+            day = monday + timedelta(days=offset)
+            if day > as_of:
+                break
+            run = run + 1 if last_day is not None and (day - last_day).days == 1 else 1
+            last_day = day
+            longest = max(longest, run)
+
+    current = run if last_day is not None and (as_of - last_day).days <= 1 else 0
+
+    return {
+        "current_streak": current,
+        "longest_streak": longest,
+        "last_exercise_date": last_day.isoformat() if last_day else None
+    }
@@ -0,0 +1,205 @@
+"""
+健康减肥助手 HTTP 服务（ASGI / FastAPI）
+每个用户一个独立的机器人会话（每日记录按用户分片存储），会话缓存在有上限的LRU池中
+
+启动：
+    export DASHSCOPE_API_KEY=sk-xxx
+    uvicorn api_server:app --host 0.0.0.0 --port 8000
+"""
+
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel, Field
+
+from async_db import AsyncHealthDatabase
+from First_Entry import get_user_profile
+from healthy_main import HealthAssistantBot, create_qwen_client
+from session_pool import BotSession, BotSessionPool
+
+API_KEY_ENV = "DASHSCOPE_API_KEY"
+MAX_SESSIONS = int(os.environ.get("HEALTH_MAX_SESSIONS", "128"))
+
+# 所有会话共享一个客户端（和其中的HTTP连接池），不为每个会话单独建立连接
+API_KEY = os.environ.get(API_KEY_ENV)
+qwen_client = create_qwen_client(API_KEY) if API_KEY else None
+
+
+def _create_bot(nickname: str) -> HealthAssistantBot:
+    """为用户创建机器人（只在会话第一次使用时调用）"""
+    if qwen_client is None:
+        raise RuntimeError(f"未设置环境变量 {API_KEY_ENV}")
+
+    # First_Entry 用模块级锁保护全局档案字典，体重更新按用户加锁，这里不需要再串行
+    return HealthAssistantBot(API_KEY, nickname=nickname, client=qwen_client)
+
+
+session_pool = BotSessionPool(_create_bot, max_sessions=MAX_SESSIONS)
+
+# 只读统计查询走异步数据库接口，不占用会话锁，也不阻塞事件循环
+async_db = AsyncHealthDatabase()
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """服务关闭时释放会话、数据库连接和共享的HTTP客户端"""
+    yield
+    session_pool.clear()
+    async_db.close()
+    if qwen_client is not None:
+        qwen_client.close()
+
+
+app = FastAPI(title="AI Fitness 健康减肥助手", version="1.0", lifespan=lifespan)
+
+
+class ChatRequest(BaseModel):
+    nickname: str
+    message: str = Field(..., min_length=1)
+
+
+class WeightRequest(BaseModel):
+    weight: float = Field(..., gt=0, lt=500)
+
+
+class MealRequest(BaseModel):
+    user_input: str = Field(..., min_length=1)
+    meal_type: str = "auto"
+
+
+class ExerciseRequest(BaseModel):
+    user_input: str = Field(..., min_length=1)
+    exercise_type: str = "auto"
+
+
+def _load_profile(nickname: str) -> Optional[Dict[str, Any]]:
+    """读取用户最新档案（只查询这一个用户，不重新加载全部档案）"""
+    return get_user_profile(nickname)
+
+
+def _get_session(nickname: str) -> BotSession:
+    """获取用户会话，用户没有档案时返回404（创建档案需要在控制台交互完成）"""
+    # 已有会话说明档案存在，不必每次请求都查询
+    if session_pool.peek(nickname) is None and _load_profile(nickname) is None:
+        raise HTTPException(status_code=404, detail=f"用户 '{nickname}' 没有健康档案")
+
+    try:
+        return session_pool.get(nickname)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@app.get("/health")
+def health() -> Dict[str, Any]:
+    """服务状态"""
+    stats = session_pool.stats()
+    return {
+        "status": "ok",
+        "active_sessions": stats["active_sessions"],
+        "max_sessions": stats["max_sessions"]
+    }
+
+
+@app.get("/sessions")
+def list_sessions() -> Dict[str, Any]:
+    """会话池统计"""
+    return session_pool.stats()
+
+
+@app.delete("/sessions/{nickname}")
+def close_session(nickname: str) -> Dict[str, Any]:
+    """关闭用户会话（下次请求时重新创建）"""
+    return {"success": session_pool.remove(nickname)}
+
+
+@app.post("/chat")
+def chat(request: ChatRequest) -> Dict[str, Any]:
+    """与健康助手对话"""
+    session = _get_session(request.nickname)
+
+    with session.lock:
+        reply = session.bot.chat(request.message)
+
+    return {"nickname": request.nickname, "reply": reply}
+
+
+@app.get("/users/{nickname}/profile")
+def get_profile(nickname: str) -> Dict[str, Any]:
+    """查看健康档案"""
+    profile = _load_profile(nickname)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"用户 '{nickname}' 没有健康档案")
+    return {"nickname": nickname, "profile": profile}
+
+
+@app.post("/users/{nickname}/weight")
+def update_weight(nickname: str, request: WeightRequest) -> Dict[str, Any]:
+    """更新体重（同步到数据库，并检查是否达到目标体重）"""
+    session = _get_session(nickname)
+
+    with session.lock:
+        result = session.bot.update_weight(request.weight)
+
+    if not result["success"]:
+        raise HTTPException(status_code=400, detail=result["message"])
+
+    return {"nickname": nickname, "message": result["message"], "profile": result["profile"]}
+
+
+@app.post("/users/{nickname}/meals")
+def update_meal(nickname: str, request: MealRequest) -> Dict[str, Any]:
+    """记录用餐情况"""
+    session = _get_session(nickname)
+
+    with session.lock:
+        return session.bot.update_meal_status(request.user_input, request.meal_type)
+
+
+@app.get("/users/{nickname}/plan")
+def get_plan(nickname: str, view_type: str = "current_meal") -> Dict[str, Any]:
+    """查看今日计划"""
+    session = _get_session(nickname)
+
+    with session.lock:
+        return session.bot.get_daily_plan(view_type)
+
+
+@app.post("/users/{nickname}/exercise")
+def update_exercise(nickname: str, request: ExerciseRequest) -> Dict[str, Any]:
+    """记录运动情况"""
+    session = _get_session(nickname)
+
+    with session.lock:
+        return session.bot.exercise_functions.update_exercise_status(request.user_input, request.exercise_type)
+
+
+@app.post("/users/{nickname}/exercise/calories")
+def exercise_calories(nickname: str, request: ExerciseRequest) -> Dict[str, Any]:
+    """计算运动消耗"""
+    session = _get_session(nickname)
+
+    with session.lock:
+        return session.bot.exercise_functions.calculate_exercise_calories(request.user_input, request.exercise_type)
+
+
+@app.get("/users/{nickname}/trends")
+async def get_trends(nickname: str, weeks: int = 12) -> Dict[str, Any]:
+    """最近若干周的体重、饮食运动坚持情况和连续运动天数（读取周汇总表）"""
+    if await async_db.get_user_id(nickname) is None:
+        raise HTTPException(status_code=404, detail=f"用户 '{nickname}' 不在数据库中")
+
+    weight, activity, streak = await asyncio.gather(
+        async_db.get_weekly_weight_trend(nickname, weeks),
+        async_db.get_weekly_activity_trend(nickname, weeks),
+        async_db.get_exercise_streak(nickname))
+
+    return {"nickname": nickname, "weight": weight, "activity": activity, "exercise_streak": streak}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "8000")))
@@ -2,6 +2,7 @@
 import streamlit as st
 import sys
 import os
+import time
 
 
 
@@ -11,12 +12,59 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 # 3. 安全导入（放在页面内容之后）
 HealthAssistantBot = None
 try:
-    from healthy_main import HealthAssistantBot
+    from healthy_main import HealthAssistantBot, create_qwen_client
 
     bot_available = True
 except ImportError:
     bot_available = False
 
+API_KEY_ENV = "DASHSCOPE_API_KEY"
+
+
+@st.cache_resource
+def get_shared_client(api_key: str):
+    """所有会话共享同一个客户端（HTTP连接池），只在第一次调用时创建"""
+    return create_qwen_client(api_key)
+
+
+class SimpleBot:
+    """没有可用的AI助手时使用的模拟机器人"""
+
+    def chat(self, msg):
+        return f"模拟回复: {msg}"
+
+    def chat_stream(self, msg):
+        yield self.chat(msg)
+
+
+def get_session_bot():
+    """
+    获取当前浏览器会话的机器人
+
+    机器人保存在st.session_state中，脚本每次重跑时直接复用，
+    不会重新创建HTTP客户端、加载档案和初始化各功能管理器
+    """
+    if "bot" not in st.session_state:
+        api_key = os.environ.get(API_KEY_ENV)
+        if bot_available and HealthAssistantBot and api_key:
+            st.session_state.bot = HealthAssistantBot(api_key, client=get_shared_client(api_key))
+            st.session_state.bot_mode = "ai"
+        else:
+            st.session_state.bot = SimpleBot()
+            st.session_state.bot_mode = "mock"
+    return st.session_state.bot
+
+
+def timed_stream(chunks, timing: dict):
+    """包装回复流，记录从提交到第一个片段的耗时"""
+    start = timing["submitted_at"]
+    for chunk in chunks:
+        if "first_token_ms" not in timing:
+            timing["first_token_ms"] = (time.perf_counter() - start) * 1000
+        yield chunk
+    timing["total_ms"] = (time.perf_counter() - start) * 1000
+
+
 # 4. 页面开始
 st.title("🏃 AI Fitness")
 
@@ -47,20 +95,11 @@ elif menu_option == "💬 聊天助手":
     st.header("💬 聊天助手")
     st.write("我是你的健康小伙伴~")
 
-    # 在这里才创建bot对象
-    if bot_available and HealthAssistantBot:
-        bot = HealthAssistantBot()
+    bot = get_session_bot()
+    if st.session_state.bot_mode == "ai":
         st.success("✅ AI助手已加载")
     else:
-        st.warning("⚠️ 使用模拟模式")
-
-
-        class SimpleBot:
-            def chat(self, msg):
-                return f"模拟回复: {msg}"
-
-
-        bot = SimpleBot()
+        st.warning(f"⚠️ 使用模拟模式（需要安装依赖并设置环境变量 {API_KEY_ENV}）")
 
     # 聊天界面
     if "messages" not in st.session_state:
@@ -74,13 +113,17 @@ elif menu_option == "💬 聊天助手":
 
     user_input = st.chat_input("输入消息...")
     if user_input:
+        timing = {"submitted_at": time.perf_counter()}
+
         with st.chat_message("user"):
             st.markdown(user_input)
         st.session_state.messages.append({"role": "user", "content": user_input})
 
         with st.chat_message("assistant"):
-            response = bot.chat(user_input)
-            st.markdown(response)
+            # 回复边生成边显示
+            response = st.write_stream(timed_stream(bot.chat_stream(user_input), timing))
+            if "first_token_ms" in timing:
+                st.caption(f"⏱️ 首字延迟 {timing['first_token_ms']:.0f} ms · 总耗时 {timing['total_ms']:.0f} ms")
 
         st.session_state.messages.append({"role": "assistant", "content": response})
 
@@ -0,0 +1,316 @@
+# async_db.py
+"""
+数据库异步访问接口
+在 asyncio 代码（FastAPI 的 async 接口等）里调用 HealthDatabaseSQLite，不阻塞事件循环：
+- 读操作在多线程的读执行器中运行，每个线程通过连接池使用自己的连接（WAL模式下读操作可以并发）
+- 写操作在单线程的写执行器中运行：SQLite同一时间只允许一个写事务，串行写入不会出现锁等待
+
+用法：
+    db = AsyncHealthDatabase()
+    user = await db.get_user_by_nickname("小明")
+    await db.update_meal_status(user["id"], "lunch", "吃了", "米饭")
+"""
+
+import os
+import time
+import random
+import asyncio
+import tempfile
+import threading
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from database import HealthDatabaseSQLite
+
+logger = logging.getLogger(__name__)
+
+# 只读方法：在读执行器中并发执行
+READ_METHODS = {
+    "get_all_users", "get_user_id", "get_user_by_nickname", "get_weight_history",
+    "get_weekly_weight_trend", "get_weekly_activity_trend", "get_exercise_streak",
+    "get_active_negative_factors",
+}
+
+# 写方法：在写执行器中按提交顺序逐个执行
+WRITE_METHODS = {
+    "create_tables", "save_user_to_db", "update_user_weight", "delete_user", "add_weight_record",
+    "update_meal_status", "update_exercise_status", "ensure_daily_record_exists", "add_drink",
+    "set_drink_status", "update_daily_plan", "update_daily_summary", "update_daily_negative_factors",
+    "add_negative_factor", "get_today_plan", "rebuild_weekly_summaries",
+}
+
+
+class AsyncHealthDatabase:
+    """HealthDatabaseSQLite 的异步外观"""
+
+    def __init__(self, db_path: str = "health_assistant.db", max_readers: int = 4):
+        """
+        初始化异步数据库接口
+
+        Args:
+            db_path: SQLite数据库文件路径
+            max_readers: 读执行器的线程数
+        """
+        self.db = HealthDatabaseSQLite(db_path)
+        if not self.db.connect():
+            raise RuntimeError(f"无法连接数据库: {db_path}")
+
+        self.max_readers = max_readers
+        self._readers = ThreadPoolExecutor(max_workers=max_readers, thread_name_prefix="db-read")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+        self._closed = False
+
+    async def _run(self, executor: ThreadPoolExecutor, func: Callable, *args, **kwargs) -> Any:
+        """在执行器中运行同步函数"""
+        if self._closed:
+            raise RuntimeError("数据库接口已关闭")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    async def read(self, func: Callable, *args, **kwargs) -> Any:
+        """在读执行器中运行任意只读函数（例如自定义查询）"""
+        return await self._run(self._readers, func, *args, **kwargs)
+
+    async def write(self, func: Callable, *args, **kwargs) -> Any:
+        """在写执行器中运行任意写函数"""
+        return await self._run(self._writer, func, *args, **kwargs)
+
+    async def fetchall(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        """执行只读SQL，返回字典列表"""
+        def query():
+            return [dict(row) for row in self.db.conn.execute(sql, params).fetchall()]
+        return await self.read(query)
+
+    def __getattr__(self, name: str) -> Callable:
+        """把 HealthDatabaseSQLite 的读写方法包装成协程函数"""
+        if name in READ_METHODS:
+            executor = self._readers
+        elif name in WRITE_METHODS:
+            executor = self._writer
+        else:
+            raise AttributeError(f"{type(self).__name__} 不支持方法: {name}")
+
+        method = getattr(self.db, name)
+
+        async def call(*args, **kwargs):
+            return await self._run(executor, method, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+
+    def _close_worker_connections(self, executor: ThreadPoolExecutor, workers: int) -> None:
+        """让执行器的每个线程关闭自己的连接（连接只能在创建它的线程里关闭）"""
+        barrier = threading.Barrier(workers)
+
+        def close():
+            try:
+                barrier.wait(timeout=5)
+            except threading.BrokenBarrierError:
+                pass
+            self.db.pool.close_thread()
+
+        for future in [executor.submit(close) for _ in range(workers)]:
+            future.result()
+
+    def close(self) -> None:
+        """等待已提交的操作完成，关闭执行器和它们的连接"""
+        if self._closed:
+            return
+        self._closed = True
+        if self.db.pool is not None:
+            self._close_worker_connections(self._readers, self.max_readers)
+            self._close_worker_connections(self._writer, 1)
+        self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+
+    async def __aenter__(self) -> "AsyncHealthDatabase":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        # 关闭时会等待执行器，放到线程里避免阻塞事件循环
+        await asyncio.to_thread(self.close)
+
+
+def _seed_benchmark_db(db_path: str, users: int) -> List[str]:
+    """创建压测用数据库，写入用户、体重和每日记录"""
+    db = HealthDatabaseSQLite(db_path)
+    db.connect()
+    db.create_tables()
+
+    nicknames = [f"压测用户{i:03d}" for i in range(users)]
+    rows = [(name, 30, "男", 175.0, 80.0, 26.1, "超重", "减肥", 70.0) for name in nicknames]
+    db.conn.executemany("""
+    INSERT INTO users (nickname, age, gender, height_cm, current_weight_kg, bmi, bmi_status, goal, target_weight_kg)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    db.conn.executemany(
+        "INSERT INTO weight_history (user_id, weight_kg, recorded_date) VALUES (?, ?, date('now', ?))",
+        [(user_id, 80 - day * 0.05, f"-{day} days") for user_id in range(1, users + 1) for day in range(365)])
+    db.conn.commit()
+    db.disconnect()
+    return nicknames
+
+
+def _weight_report(db: HealthDatabaseSQLite) -> List[tuple]:
+    """全体用户的月度体重统计（扫描整张体重表的报表查询）"""
+    return db.conn.execute("""
+    SELECT user_id, substr(recorded_date, 1, 7) AS month, COUNT(*), AVG(weight_kg), MIN(weight_kg), MAX(weight_kg)
+    FROM weight_history
+    GROUP BY user_id, month
+    """).fetchall()
+
+
+def _operation_mix(db: Any, nicknames: List[str], operations: int, write_ratio: float,
+                   report_ratio: float, seed: int = 7) -> List[tuple]:
+    """生成固定的读写操作序列 (是否写, 方法名, 参数)，方法名为 report 时执行报表查询"""
+    rng = random.Random(seed)
+    mix = []
+
+    for i in range(operations):
+        nickname = rng.choice(nicknames)
+        user_id = nicknames.index(nickname) + 1
+        roll = rng.random()
+        if roll < report_ratio:
+            mix.append((False, "report", ()))
+        elif roll < report_ratio + write_ratio:
+            if i % 2:
+                mix.append((True, "update_meal_status", (user_id, rng.choice(db.MEAL_TYPES), "吃了", "压测")))
+            else:
+                mix.append((True, "add_weight_record", (user_id, 75 + rng.random(), 24.5, "正常")))
+        else:
+            mix.append((False, rng.choice(["get_user_by_nickname", "get_weight_history",
+                                            "get_weekly_weight_trend"]), (nickname,)))
+
+    return mix
+
+
+def benchmark_concurrency(users: int = 50, operations: int = 4000, concurrency: int = 64,
+                          readers: int = 4, write_ratio: float = 0.2, report_ratio: float = 0.02) -> List[Dict[str, Any]]:
+    """
+    并发压力测试：同样的读写操作序列分别用两种方式执行
+    - 共享对象串行：一个 HealthDatabaseSQLite、一把锁，在事件循环里直接阻塞调用（原来全局 db_bridge 的用法）
+    - 异步接口：AsyncHealthDatabase，concurrency 个协程同时发起请求
+
+    同时运行一个每毫秒唤醒一次的心跳协程，统计事件循环被阻塞的最长时间（web服务里其他请求要等待的时间）。
+    结束后检查写入条数，确认并发下没有丢失或失败的写操作
+
+    Returns:
+        每种方式的吞吐量、延迟、事件循环最长阻塞时间和错误数
+    """
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        nicknames = _seed_benchmark_db(db_path, users)
+
+        def count_weights():
+            check = HealthDatabaseSQLite(db_path)
+            check.connect()
+            count = check.conn.execute("SELECT COUNT(*) FROM weight_history").fetchone()[0]
+            check.disconnect()
+            return count
+
+        async def run_serial():
+            db = HealthDatabaseSQLite(db_path)
+            db.connect()
+            lock = threading.Lock()
+            mix = _operation_mix(db, nicknames, operations, write_ratio, report_ratio)
+
+            async def call(is_write, name, args):
+                start = time.perf_counter()
+                with lock:
+                    result = _weight_report(db) if name == "report" else getattr(db, name)(*args)
+                return time.perf_counter() - start, result
+
+            outcomes, stall = await _gather_limited(mix, call, concurrency)
+            db.disconnect()
+            return mix, outcomes, stall
+
+        async def run_async():
+            async with AsyncHealthDatabase(db_path, max_readers=readers) as adb:
+                mix = _operation_mix(adb.db, nicknames, operations, write_ratio, report_ratio)
+
+                async def call(is_write, name, args):
+                    start = time.perf_counter()
+                    if name == "report":
+                        result = await adb.read(_weight_report, adb.db)
+                    else:
+                        result = await getattr(adb, name)(*args)
+                    return time.perf_counter() - start, result
+
+                outcomes, stall = await _gather_limited(mix, call, concurrency)
+                return mix, outcomes, stall
+
+        for label, runner in (("共享对象串行", run_serial), (f"异步接口({readers}读+1写)", run_async)):
+            before = count_weights()
+            start = time.perf_counter()
+            mix, outcomes, stall = asyncio.run(runner())
+            elapsed = time.perf_counter() - start
+
+            errors = sum(1 for outcome in outcomes if isinstance(outcome, Exception))
+            failed_writes = sum(1 for (is_write, _, _), outcome in zip(mix, outcomes)
+                                if is_write and not isinstance(outcome, Exception) and outcome[1] is False)
+            expected_weights = sum(1 for is_write, name, _ in mix if name == "add_weight_record")
+            latencies = sorted(outcome[0] for outcome in outcomes if not isinstance(outcome, Exception))
+
+            results.append({
+                "mode": label,
+                "elapsed_s": round(elapsed, 3),
+                "ops_per_s": round(len(mix) / elapsed, 1),
+                "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3) if latencies else 0,
+                "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3) if latencies else 0,
+                "loop_stall_ms": round(stall * 1000, 3),
+                "errors": errors + failed_writes,
+                "lost_writes": expected_weights - (count_weights() - before)
+            })
+
+    print("\n" + "=" * 96)
+    print(f"📊 数据库并发压测（{operations}次操作，写比例{write_ratio:.0%}，报表查询{report_ratio:.0%}，"
+          f"{concurrency}个并发请求）")
+    print("=" * 96)
+    print(f"{'方式':<22}{'耗时(s)':>9}{'操作/秒':>10}{'P50(ms)':>10}{'P95(ms)':>10}"
+          f"{'循环阻塞(ms)':>14}{'错误':>6}{'丢失写入':>8}")
+    for r in results:
+        print(f"{r['mode']:<22}{r['elapsed_s']:>9}{r['ops_per_s']:>10}{r['p50_ms']:>10}"
+              f"{r['p95_ms']:>10}{r['loop_stall_ms']:>14}{r['errors']:>6}{r['lost_writes']:>8}")
+    print("=" * 96)
+
+    return results
+
+
+async def _gather_limited(mix: List[tuple], call: Callable, concurrency: int) -> tuple:
+    """
+    最多 concurrency 个请求同时进行
+
+    Returns:
+        (每个操作的 (耗时, 结果) 或异常, 事件循环最长阻塞秒数)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    done = asyncio.Event()
+    max_stall = 0.0
+
+    async def heartbeat():
+        nonlocal max_stall
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            max_stall = max(max_stall, time.perf_counter() - start - 0.001)
+
+    async def limited(item):
+        async with semaphore:
+            # 让出一次事件循环，模拟请求之间的调度
+            await asyncio.sleep(0)
+            return await call(*item)
+
+    monitor = asyncio.create_task(heartbeat())
+    outcomes = await asyncio.gather(*(limited(item) for item in mix), return_exceptions=True)
+    done.set()
+    await monitor
+    return outcomes, max_stall
+
+
+if __name__ == "__main__":
+    benchmark_concurrency()
@@ -0,0 +1,523 @@
+# bulk_import.py
+"""
+JSON → SQLite 批量导入工具
+用户档案、体重历史、每日记录（餐次、喝水、计划、总结）和负面因子一次性导入数据库：
+每批数据用 executemany 在一个显式事务里写入，导入期间临时放宽同步和缓存设置，
+并输出进度和吞吐量（行/秒）
+
+用法：
+    python bulk_import.py                 # 导入当前目录的JSON数据到 health_assistant.db
+    python bulk_import.py benchmark [年数] # 用合成的多年数据测试导入吞吐量
+"""
+
+import os
+import json
+import time
+import datetime
+import tempfile
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from db_pool import create_connection
+from database import get_identity_cache
+from analytics import drop_summary_triggers, create_summary_tables, rebuild_weekly_summaries
+from record_serializer import list_record_files, read_record_fields
+from record_layout import list_user_record_files, user_record_root
+
+logger = logging.getLogger(__name__)
+
+# 导入期间的连接设置：断电时可能丢失正在导入的数据，但导入可以重新执行
+IMPORT_PRAGMAS = {
+    "synchronous": "OFF",
+    "cache_size": -200000,   # 约200MB页缓存
+    "temp_store": "MEMORY",
+}
+
+# 每日记录中的餐次字段 → 数据库字段前缀
+MEAL_FIELDS = {
+    "早餐状态": "breakfast",
+    "午餐状态": "lunch",
+    "晚餐状态": "dinner",
+    "宵夜状态": "snack",
+}
+
+# 每日记录字段 → daily_records 表的列（其余字段存在 extra 列）
+RECORD_FIELD_COLUMNS = {
+    **{field: [f"{prefix}_status", f"{prefix}_details"] for field, prefix in MEAL_FIELDS.items()},
+    "运动状态": ["exercise_status", "exercise_details"],
+    "daily_plan": ["food_plan", "movement_plan", "extra"],
+    "drink_plan": ["drink_plan"],
+    "drink_number": ["drink_number"],
+    "summary": ["daily_summary"],
+    "negative_factors": ["negative_factors"],
+    # 对话历史每条一行存在 daily_history_entries 表（结构版本6），不占 daily_records 的列
+    "daily_history": [],
+}
+
+# 状态字段的默认值
+STATUS_DEFAULTS = {**{field: "没吃" for field in MEAL_FIELDS}, "运动状态": "没运动"}
+
+DAILY_RECORD_COLUMNS = [
+    "user_id", "record_date",
+    "breakfast_status", "breakfast_details", "lunch_status", "lunch_details",
+    "dinner_status", "dinner_details", "snack_status", "snack_details",
+    "exercise_status", "exercise_details", "drink_plan", "drink_number",
+    "food_plan", "movement_plan", "daily_summary", "negative_factors"
+]
+
+# 导入时不需要读取对话历史
+DAILY_RECORD_FIELDS = ["date", "daily_plan", "drink_number", "drink_plan", "summary",
+                       "negative_factors", "运动状态"] + list(MEAL_FIELDS)
+
+
+def _to_text(value: Any) -> Optional[str]:
+    """详情字段可能是字符串、字典或列表，统一存成文本"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _status_pair(value: Any, default: str) -> Tuple[str, Optional[str]]:
+    """解析 (状态, 详情) 字段：JSON中保存为两元素列表，早期的记录只保存了状态字符串"""
+    if isinstance(value, (list, tuple)) and value:
+        return value[0] or default, _to_text(value[1] if len(value) > 1 else None)
+    if isinstance(value, str) and value:
+        return value, None
+    return default, None
+
+
+def daily_record_values(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    每日记录字典 → daily_records 表各列的值（批量导入和 repository.HealthRepository 共用）
+
+    记录中没有对应列的字段（daily_plan 中食物/运动计划以外的内容、created_at 等）放在 extra 列
+    """
+    values = {}
+    for field, default in STATUS_DEFAULTS.items():
+        status_column, details_column = RECORD_FIELD_COLUMNS[field]
+        values[status_column], values[details_column] = _status_pair(record.get(field), default)
+
+    plan = dict(record.get("daily_plan") or {})
+    food_plan, movement_plan = plan.pop("food", None), plan.pop("movement", None)
+
+    extra = {key: value for key, value in record.items()
+             if key != "date" and key not in RECORD_FIELD_COLUMNS}
+    if plan:
+        extra["daily_plan"] = plan
+
+    values.update({
+        "drink_plan": record.get("drink_plan", 8),
+        "drink_number": record.get("drink_number", 0),
+        "food_plan": _to_text(food_plan),
+        "movement_plan": _to_text(movement_plan),
+        "daily_summary": record.get("summary") or None,
+        "negative_factors": _to_text(record.get("negative_factors")),
+        "extra": json.dumps(extra, ensure_ascii=False) if extra else None,
+    })
+    return values
+
+
+class ImportProgress:
+    """导入进度和吞吐量统计"""
+
+    def __init__(self, table: str, total: int):
+        self.table = table
+        self.total = total
+        self.done = 0
+        self.start = time.perf_counter()
+
+    def advance(self, count: int) -> None:
+        self.done += count
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0
+        percent = self.done / self.total * 100 if self.total else 100
+        print(f"\r  📥 {self.table}: {self.done}/{self.total} ({percent:.0f}%) {rate:,.0f} 行/秒", end="", flush=True)
+
+    def finish(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0
+        print(f"\r  ✅ {self.table}: {self.done} 行，{elapsed:.2f} 秒，{rate:,.0f} 行/秒" + " " * 10)
+        return {"table": self.table, "rows": self.done, "seconds": round(elapsed, 3), "rows_per_s": round(rate, 1)}
+
+
+class BulkImporter:
+    """批量导入器"""
+
+    def __init__(self, db_path: str = "health_assistant.db", batch_size: int = 5000):
+        """
+        初始化导入器
+
+        Args:
+            db_path: SQLite数据库文件路径（需要已经建好表）
+            batch_size: 每个事务写入的行数
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.conn = create_connection(db_path, IMPORT_PRAGMAS)
+        # 自己控制事务边界
+        self.conn.isolation_level = None
+        self.stats: List[Dict[str, Any]] = []
+
+    def close(self) -> None:
+        """关闭导入连接"""
+        self.conn.close()
+
+    def _write_batches(self, table: str, sql: str, rows: List[tuple]) -> Dict[str, Any]:
+        """分批在显式事务中执行 executemany，并报告进度"""
+        progress = ImportProgress(table, len(rows))
+
+        for offset in range(0, len(rows), self.batch_size):
+            batch = rows[offset:offset + self.batch_size]
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(sql, batch)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            progress.advance(len(batch))
+
+        result = progress.finish()
+        self.stats.append(result)
+        return result
+
+    def _user_ids(self) -> Dict[str, int]:
+        """一次查询得到 昵称→用户ID 映射"""
+        return {row["nickname"]: row["id"] for row in self.conn.execute("SELECT id, nickname FROM users")}
+
+    def import_users(self, users_data: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+        """
+        导入用户档案
+
+        使用 ON CONFLICT(nickname) DO UPDATE，已存在的用户保留原ID（INSERT OR REPLACE 会换ID并级联删除历史数据）
+
+        Returns:
+            昵称→用户ID 映射
+        """
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = [(
+            nickname,
+            user_data.get('age'),
+            user_data.get('gender'),
+            user_data.get('height_cm'),
+            user_data.get('current_weight_kg'),
+            user_data.get('bmi'),
+            user_data.get('status'),
+            user_data.get('goal'),
+            user_data.get('target_weight_kg'),
+            json.dumps(user_data.get('diet_preferences', []), ensure_ascii=False),
+            json.dumps(user_data.get('allergens', []), ensure_ascii=False),
+            json.dumps(user_data.get('move_prefer', []), ensure_ascii=False),
+            user_data.get('remarks', ''),
+            user_data.get('registration_date'),
+            user_data.get('last_update', now)
+        ) for nickname, user_data in users_data.items()]
+
+        self._write_batches("users", """
+        INSERT INTO users (
+            nickname, age, gender, height_cm, current_weight_kg,
+            bmi, bmi_status, goal, target_weight_kg,
+            diet_preferences, allergens, move_prefer, remarks,
+            registration_date, last_update
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(nickname) DO UPDATE SET
+            age = excluded.age, gender = excluded.gender, height_cm = excluded.height_cm,
+            current_weight_kg = excluded.current_weight_kg, bmi = excluded.bmi,
+            bmi_status = excluded.bmi_status, goal = excluded.goal,
+            target_weight_kg = excluded.target_weight_kg, diet_preferences = excluded.diet_preferences,
+            allergens = excluded.allergens, move_prefer = excluded.move_prefer, remarks = excluded.remarks,
+            registration_date = excluded.registration_date, last_update = excluded.last_update
+        """, rows)
+
+        # 档案已更新，清除进程内的用户身份缓存
+        get_identity_cache(self.db_path).clear()
+        return self._user_ids()
+
+    def import_weight_history(self, user_ids: Dict[str, int], weight_histories: Dict[str, List[Dict]]) -> Dict[str, Any]:
+        """
+        导入体重历史（已存在的同一天同一体重的记录会跳过，可以重复执行）
+
+        Args:
+            user_ids: 昵称→用户ID
+            weight_histories: 昵称→体重记录列表（weight_history_<昵称>.json 中的 history）
+        """
+        existing = {(row[0], row[1], row[2]) for row in self.conn.execute(
+            "SELECT user_id, recorded_date, weight_kg FROM weight_history")}
+
+        rows = []
+        for nickname, history in weight_histories.items():
+            user_id = user_ids.get(nickname)
+            if user_id is None:
+                continue
+
+            for record in history:
+                recorded_date = record.get('up_date', datetime.datetime.now().strftime("%Y-%m-%d"))
+                recorded_date = recorded_date.split(' ')[0]
+                key = (user_id, recorded_date, record.get('weight_kg'))
+                if key in existing:
+                    continue
+                existing.add(key)
+                rows.append((user_id, record.get('weight_kg'), record.get('bmi'), record.get('status'), recorded_date))
+
+        return self._write_batches("weight_history", """
+        INSERT INTO weight_history (user_id, weight_kg, bmi, bmi_status, recorded_date)
+        VALUES (?, ?, ?, ?, ?)
+        """, rows)
+
+    def _daily_record_row(self, user_id: int, record: Dict[str, Any]) -> tuple:
+        """把一天的JSON记录转换成 daily_records 表的一行"""
+        values = daily_record_values(record)
+        return (user_id, record["date"], *(values[column] for column in DAILY_RECORD_COLUMNS[2:]))
+
+    def _factor_rows(self, user_id: int, records: List[Dict[str, Any]]) -> List[tuple]:
+        """
+        汇总负面因子
+
+        每日记录会把未恢复的因子复制到第二天，同一个因子在多天的文件里重复出现，
+        按 (类型, 描述, 开始日期) 去重，保留最后一天的状态
+        """
+        latest = {}
+
+        for record in records:
+            for factor in (record.get("negative_factors") or {}).get("factors", []):
+                start_date = factor.get("original_start_date") or factor.get("start_date") or record["date"]
+                key = (factor.get("type", "其他"), factor.get("description", ""), start_date)
+                latest[key] = factor
+
+        rows = []
+        for (factor_type, description, start_date), factor in latest.items():
+            rows.append((
+                user_id, factor_type, description,
+                factor.get("severity", "轻"),
+                factor.get("duration_days", 1),
+                1 if factor.get("should_exercise", True) else 0,
+                factor.get("status", "active"),
+                start_date,
+                factor.get("recovery_date"),
+                factor.get("recovery_notes") or factor.get("notes")
+            ))
+        return rows
+
+    def import_daily_records(self, user_ids: Dict[str, int], record_files: Dict[str, Dict[str, str]]) -> Dict[str, Any]:
+        """
+        导入每日记录和负面因子
+
+        Args:
+            user_ids: 昵称→用户ID
+            record_files: 昵称→{日期: 记录文件路径}
+        """
+        daily_rows = []
+        factor_rows = []
+
+        read_start = time.perf_counter()
+        file_count = 0
+        for nickname, files in record_files.items():
+            user_id = user_ids.get(nickname)
+            if user_id is None:
+                print(f"⚠️ 用户不存在于数据库，跳过其每日记录: {nickname}")
+                continue
+
+            records = []
+            for date_str, filepath in files.items():
+                try:
+                    record = read_record_fields(filepath, fields=DAILY_RECORD_FIELDS)
+                except Exception as e:
+                    print(f"⚠️ 跳过无法读取的文件 {filepath}: {e}")
+                    continue
+                record.setdefault("date", date_str)
+                records.append(record)
+                daily_rows.append(self._daily_record_row(user_id, record))
+                file_count += 1
+
+            factor_rows.extend(self._factor_rows(user_id, records))
+        print(f"  📂 读取 {file_count} 个每日记录文件，{time.perf_counter() - read_start:.2f} 秒")
+
+        placeholders = ", ".join(["?"] * len(DAILY_RECORD_COLUMNS))
+        updates = ", ".join(f"{column} = excluded.{column}" for column in DAILY_RECORD_COLUMNS[2:])
+        result = self._write_batches("daily_records", f"""
+        INSERT INTO daily_records ({", ".join(DAILY_RECORD_COLUMNS)})
+        VALUES ({placeholders})
+        ON CONFLICT(user_id, record_date) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP
+        """, daily_rows)
+
+        # 已导入过的因子不重复插入
+        existing = {(row[0], row[1], row[2], row[3]) for row in self.conn.execute(
+            "SELECT user_id, factor_type, description, start_date FROM negative_factors")}
+        factor_rows = [row for row in factor_rows if (row[0], row[1], row[2], row[7]) not in existing]
+
+        self._write_batches("negative_factors", """
+        INSERT INTO negative_factors
+        (user_id, factor_type, description, severity, duration_days,
+         should_exercise, status, start_date, recovery_date, recovery_notes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, factor_rows)
+
+        return result
+
+    def import_all(self, profiles_file: str = "user_profiles.json", records_dir: str = "daily_records",
+                   flat_owner: str = None, weight_dir: str = ".") -> List[Dict[str, Any]]:
+        """
+        导入全部JSON数据
+
+        Args:
+            profiles_file: 用户档案文件
+            records_dir: 每日记录目录（支持按用户分片的目录和旧的平铺目录）
+            flat_owner: 平铺目录中记录所属的用户（默认档案中的第一个用户，与一对一版本一致）
+            weight_dir: weight_history_<昵称>.json 所在目录
+
+        Returns:
+            各表的导入统计
+        """
+        if not os.path.exists(profiles_file):
+            print(f"❌ JSON文件不存在: {profiles_file}")
+            return []
+
+        with open(profiles_file, 'r', encoding='utf-8') as f:
+            users_data = json.load(f)
+
+        print(f"🚚 开始批量导入 {len(users_data)} 个用户的数据 → {self.db_path}")
+        total_start = time.perf_counter()
+
+        # 导入期间暂停周汇总触发器（逐行重算会让导入变慢一倍），导入后一次性重建
+        drop_summary_triggers(self.conn)
+        try:
+            self._import_all(users_data, records_dir, flat_owner, weight_dir)
+        finally:
+            self.conn.execute("BEGIN")
+            # 旧数据库还没有汇总表时一并创建
+            if not create_summary_tables(self.conn):
+                rebuild_weekly_summaries(self.conn, commit=False)
+            self.conn.execute("COMMIT")
+
+        total_rows = sum(stat["rows"] for stat in self.stats)
+        elapsed = time.perf_counter() - total_start
+        print(f"🎉 导入完成：共 {total_rows} 行，{elapsed:.2f} 秒，{total_rows / elapsed if elapsed else 0:,.0f} 行/秒")
+        return self.stats
+
+    def _import_all(self, users_data: Dict[str, Dict[str, Any]], records_dir: str,
+                    flat_owner: Optional[str], weight_dir: str) -> None:
+        """依次导入用户、体重历史、每日记录和负面因子"""
+        user_ids = self.import_users(users_data)
+
+        weight_histories = {}
+        for nickname in users_data:
+            weight_file = os.path.join(weight_dir, f"weight_history_{nickname}.json")
+            if os.path.exists(weight_file):
+                try:
+                    with open(weight_file, 'r', encoding='utf-8') as f:
+                        weight_histories[nickname] = json.load(f).get('history', [])
+                except Exception as e:
+                    print(f"⚠️ 读取体重历史失败 {weight_file}: {e}")
+        self.import_weight_history(user_ids, weight_histories)
+
+        record_files = {}
+        for nickname in users_data:
+            files = list_user_record_files(user_record_root(records_dir, nickname))
+            if files:
+                record_files[nickname] = files
+
+        flat_files = list_record_files(records_dir)
+        if flat_files:
+            owner = flat_owner or next(iter(users_data), None)
+            if owner:
+                record_files.setdefault(owner, {}).update(flat_files)
+        self.import_daily_records(user_ids, record_files)
+
+
+def generate_synthetic_dataset(target_dir: str, users: int = 20, years: int = 3) -> Tuple[str, str]:
+    """
+    生成多年的合成数据用于测试导入吞吐量（每日记录使用按用户分片的目录，另附体重历史文件）
+
+    Returns:
+        (档案文件路径, 每日记录目录)
+    """
+    import random
+
+    rng = random.Random(42)
+    profiles_file = os.path.join(target_dir, "user_profiles.json")
+    records_dir = os.path.join(target_dir, "daily_records")
+    start_date = datetime.date.today() - datetime.timedelta(days=365 * years)
+
+    profiles = {}
+    for i in range(users):
+        nickname = f"合成用户{i:03d}"
+        profiles[nickname] = {"nickname": nickname, "age": 20 + i % 30, "gender": "女" if i % 2 else "男",
+                              "height_cm": 160 + i % 25, "current_weight_kg": 70.0, "status": "超重"}
+
+        user_root = user_record_root(records_dir, nickname)
+        for day in range(365 * years):
+            date = start_date + datetime.timedelta(days=day)
+            date_str = date.isoformat()
+            month_dir = os.path.join(user_root, date_str[:4], date_str[5:7])
+            os.makedirs(month_dir, exist_ok=True)
+
+            record = {
+                "date": date_str,
+                "daily_plan": {"food": ["早餐：燕麦", "午餐：糙米饭"], "movement": ["快走30分钟"]},
+                "drink_number": rng.randint(0, 10),
+                "drink_plan": 8,
+                "早餐状态": ["吃了", {"description": "燕麦牛奶", "total_calories": rng.randint(200, 500)}],
+                "午餐状态": ["吃了", {"description": "米饭和青菜", "total_calories": rng.randint(400, 900)}],
+                "晚餐状态": ["没吃", ""],
+                "宵夜状态": ["没吃", ""],
+                "运动状态": ["运动了" if rng.random() < 0.5 else "没运动", ""],
+                "daily_history": [{"role": "user", "content": "今天吃了什么"}] * 5,
+                "summary": "合成数据",
+            }
+            if day % 60 == 0:
+                record["negative_factors"] = {"factors": [{
+                    "type": "生病", "description": "感冒", "severity": "轻", "start_date": date_str,
+                    "duration_days": 1, "should_exercise": False, "status": "active"}]}
+
+            with open(os.path.join(month_dir, f"{date_str}.json"), 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False)
+
+        weights = [{"up_date": (start_date + datetime.timedelta(days=day)).isoformat() + " 08:00:00",
+                     "weight_kg": round(70 - day * 0.005 + rng.uniform(-0.5, 0.5), 1), "bmi": 25.0, "status": "超重"}
+                    for day in range(0, 365 * years, 3)]
+        with open(os.path.join(target_dir, f"weight_history_{nickname}.json"), 'w', encoding='utf-8') as f:
+            json.dump({"user": nickname, "history": weights}, f, ensure_ascii=False)
+
+    with open(profiles_file, 'w', encoding='utf-8') as f:
+        json.dump(profiles, f, ensure_ascii=False)
+
+    return profiles_file, records_dir
+
+
+def benchmark_bulk_import(users: int = 20, years: int = 3) -> List[Dict[str, Any]]:
+    """在临时目录中生成多年合成数据并测试导入吞吐量"""
+    from database import HealthDatabaseSQLite
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"🧪 生成合成数据：{users} 个用户 × {years} 年每日记录...")
+        profiles_file, records_dir = generate_synthetic_dataset(tmp, users, years)
+
+        db_path = os.path.join(tmp, "bench.db")
+        db = HealthDatabaseSQLite(db_path)
+        db.connect()
+        db.create_tables()
+        db.disconnect()
+
+        importer = BulkImporter(db_path)
+        try:
+            return importer.import_all(profiles_file, records_dir, weight_dir=tmp)
+        finally:
+            importer.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        benchmark_bulk_import(years=int(sys.argv[2]) if len(sys.argv) > 2 else 3)
+    else:
+        from database import init_database
+
+        init_database()
+        importer = BulkImporter()
+        try:
+            importer.import_all()
+        finally:
+            importer.close()
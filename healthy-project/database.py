@@ -2,16 +2,88 @@
 import sqlite3
 import json
 import os
+import copy
+import threading
 from datetime import datetime
 import logging
 from typing import Dict, List, Any, Optional
 from First_Entry import calculate_bmi
+from db_pool import get_pool
+from db_migrations import HISTORY_TABLE_SQL, apply_migrations
+from analytics import create_summary_tables, rebuild_weekly_summaries, weight_trend, activity_trend, exercise_streaks
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class UserIdentityCache:
+    """
+    用户身份缓存：昵称→用户ID，以及解码后的用户档案行
+
+    同一个数据库文件在进程内共享一个缓存（db_bridge、UserManagerSQLite 等各自的实例都能看到失效），
+    写入用户表的方法负责调用 invalidate
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._nicknames: Dict[int, str] = {}
+        self._profiles: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def get_id(self, nickname: str) -> Optional[int]:
+        return self._ids.get(nickname)
+
+    def get_profile(self, nickname: str) -> Optional[Dict]:
+        profile = self._profiles.get(nickname)
+        # 返回副本，调用方修改返回值不会污染缓存
+        return copy.deepcopy(profile) if profile is not None else None
+
+    def put_id(self, nickname: str, user_id: int) -> None:
+        with self._lock:
+            self._ids[nickname] = user_id
+            self._nicknames[user_id] = nickname
+
+    def put_profile(self, profile: Dict) -> None:
+        with self._lock:
+            self._ids[profile['nickname']] = profile['id']
+            self._nicknames[profile['id']] = profile['nickname']
+            self._profiles[profile['nickname']] = copy.deepcopy(profile)
+
+    def invalidate(self, nickname: str = None, user_id: int = None) -> None:
+        """按昵称或用户ID清除缓存"""
+        with self._lock:
+            if nickname is None and user_id is not None:
+                nickname = self._nicknames.get(user_id)
+            if nickname is None:
+                return
+            old_id = self._ids.pop(nickname, None)
+            if old_id is not None:
+                self._nicknames.pop(old_id, None)
+            self._profiles.pop(nickname, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids.clear()
+            self._nicknames.clear()
+            self._profiles.clear()
+
+
+_identity_caches: Dict[str, UserIdentityCache] = {}
+_identity_caches_lock = threading.Lock()
+
+
+def get_identity_cache(db_path: str = "health_assistant.db") -> UserIdentityCache:
+    """获取数据库文件对应的用户身份缓存"""
+    key = os.path.abspath(db_path) if db_path != ":memory:" else db_path
+    with _identity_caches_lock:
+        cache = _identity_caches.get(key)
+        if cache is None:
+            cache = UserIdentityCache()
+            _identity_caches[key] = cache
+        return cache
+
+
 class HealthDatabaseSQLite:
     """完整的健康助手SQLite数据库管理类"""
 
@@ -23,34 +95,46 @@ class HealthDatabaseSQLite:
             db_path: SQLite数据库文件路径
         """
         self.db_path = db_path
-        self.conn = None
-        self.cursor = None
+        self.pool = None
+        self.identity = get_identity_cache(db_path)
+
+    @property
+    def conn(self) -> Optional[sqlite3.Connection]:
+        """当前线程的数据库连接（未连接时为None）"""
+        return self.pool.connection() if self.pool is not None else None
+
+    @property
+    def cursor(self) -> Optional[sqlite3.Cursor]:
+        """当前线程连接上的游标（未连接时为None）"""
+        return self.pool.cursor() if self.pool is not None else None
 
     def connect(self) -> bool:
-        """连接到SQLite数据库"""
+        """连接到SQLite数据库（使用共享连接池，每个线程一个连接，WAL模式）"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
-            # 启用外键约束
-            self.conn.execute("PRAGMA foreign_keys = ON")
-            # 设置行工厂，返回字典格式
-            self.conn.row_factory = sqlite3.Row
-            self.cursor = self.conn.cursor()
+            self.pool = get_pool(self.db_path)
+            # 立即为当前线程建立连接，以便尽早发现错误
+            self.pool.connection()
             logger.info(f"✅ SQLite数据库连接成功: {self.db_path}")
             return True
         except Exception as e:
+            self.pool = None
             logger.error(f"❌ SQLite连接失败: {e}")
             return False
 
     def disconnect(self):
-        """断开数据库连接"""
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
+        """断开当前线程的数据库连接"""
+        if self.pool is not None:
+            self.pool.close_thread()
+            self.pool = None
             logger.info("已断开数据库连接")
 
-    def create_tables(self) -> bool:
-        """创建所有需要的表"""
+    def create_tables(self, schema_version: int = None) -> bool:
+        """
+        创建所有需要的表，并把索引升级到指定的结构版本
+
+        Args:
+            schema_version: 目标结构版本（默认最新版本，见 db_migrations.py）
+        """
         try:
             # 1. 用户表
             self.cursor.execute("""
@@ -138,18 +222,17 @@ class HealthDatabaseSQLite:
             )
             """)
 
-            # 创建索引以提高查询性能
-            indexes = [
-                "CREATE INDEX IF NOT EXISTS idx_weight_user_date ON weight_history(user_id, recorded_date)",
-                "CREATE INDEX IF NOT EXISTS idx_daily_user_date ON daily_records(user_id, record_date)",
-                "CREATE INDEX IF NOT EXISTS idx_factors_user_status ON negative_factors(user_id, status)",
-                "CREATE INDEX IF NOT EXISTS idx_users_nickname ON users(nickname)"
-            ]
+            # 5. 对话历史表（每条消息一行，只追加）
+            self.cursor.execute(HISTORY_TABLE_SQL)
 
-            for index_sql in indexes:
-                self.cursor.execute(index_sql)
+            # 6. 周汇总表（由触发器维护，第一次创建时回填已有数据）
+            if create_summary_tables(self.conn):
+                logger.info("✅ 已根据现有记录生成周汇总表")
 
             self.conn.commit()
+
+            # 索引按结构版本管理
+            apply_migrations(self.conn, schema_version)
             logger.info("✅ 所有SQLite表创建成功")
             return True
 
@@ -225,6 +308,8 @@ class HealthDatabaseSQLite:
                 logger.info(f"✅ 迁移用户: {nickname}")
 
             self.conn.commit()
+            # INSERT OR REPLACE 会改变已有用户的ID
+            self.identity.clear()
             logger.info(f"🎉 总计迁移 {migrated_count} 个用户")
             return migrated_count
 
@@ -281,8 +366,29 @@ class HealthDatabaseSQLite:
             logger.error(f"❌ 获取用户列表失败: {e}")
             return []
 
+    def get_user_id(self, nickname: str) -> Optional[int]:
+        """根据昵称获取用户ID（优先使用缓存，未命中时只查询id列）"""
+        user_id = self.identity.get_id(nickname)
+        if user_id is not None:
+            return user_id
+
+        try:
+            self.cursor.execute("SELECT id FROM users WHERE nickname = ?", (nickname,))
+            row = self.cursor.fetchone()
+            if row:
+                self.identity.put_id(nickname, row['id'])
+                return row['id']
+            return None
+        except Exception as e:
+            logger.error(f"❌ 查询用户ID失败: {e}")
+            return None
+
     def get_user_by_nickname(self, nickname: str) -> Optional[Dict]:
         """根据昵称获取用户信息"""
+        cached = self.identity.get_profile(nickname)
+        if cached is not None:
+            return cached
+
         try:
             self.cursor.execute("SELECT * FROM users WHERE nickname = ?", (nickname,))
             row = self.cursor.fetchone()
@@ -295,6 +401,7 @@ class HealthDatabaseSQLite:
                             user_dict[field] = json.loads(user_dict[field])
                         except:
                             pass
+                self.identity.put_profile(user_dict)
                 return user_dict
             return None
         except Exception as e:
@@ -324,8 +431,8 @@ class HealthDatabaseSQLite:
         """获取用户的体重历史"""
         try:
             # 先获取用户ID
-            user = self.get_user_by_nickname(nickname)
-            if not user:
+            user_id = self.get_user_id(nickname)
+            if user_id is None:
                 return []
 
             self.cursor.execute("""
@@ -334,7 +441,7 @@ class HealthDatabaseSQLite:
             WHERE user_id = ?
             ORDER BY recorded_date DESC
             LIMIT ?
-            """, (user['id'], limit))
+            """, (user_id, limit))
 
             rows = self.cursor.fetchall()
             return [dict(row) for row in rows]
@@ -380,6 +487,52 @@ class HealthDatabaseSQLite:
             self.disconnect()
 
 
+    # 每日记录中允许通过UPSERT写入的字段（字段名会拼进SQL，必须来自白名单）
+    DAILY_RECORD_COLUMNS = {
+        "breakfast_status", "breakfast_details", "lunch_status", "lunch_details",
+        "dinner_status", "dinner_details", "snack_status", "snack_details",
+        "exercise_status", "exercise_details", "drink_plan", "drink_number",
+        "food_plan", "movement_plan", "daily_summary", "negative_factors"
+    }
+    MEAL_TYPES = ("breakfast", "lunch", "dinner", "snack")
+
+    def _upsert_daily_record(self, user_id: int, date_str: str, values: Dict[str, Any],
+                             increments: Dict[str, int] = None) -> None:
+        """
+        用一条 INSERT ... ON CONFLICT DO UPDATE 语句写入每日记录并提交一次
+
+        记录不存在时按默认值插入，存在时只更新给定字段，不需要先查询
+
+        Args:
+            user_id: 用户ID
+            date_str: 日期字符串
+            values: 直接覆盖的字段 {字段名: 值}
+            increments: 在原值基础上累加的字段 {字段名: 增量}
+        """
+        increments = increments or {}
+        columns = list(values) + list(increments)
+
+        invalid = set(columns) - self.DAILY_RECORD_COLUMNS
+        if invalid:
+            raise ValueError(f"不支持的每日记录字段: {', '.join(sorted(invalid))}")
+
+        insert_columns = ", ".join(["user_id", "record_date"] + columns)
+        placeholders = ", ".join(["?"] * (len(columns) + 2))
+
+        # 插入时：累加字段 = 默认值0 + 增量，即增量本身
+        assignments = [f"{column} = excluded.{column}" for column in values]
+        assignments += [f"{column} = {column} + excluded.{column}" for column in increments]
+        assignments.append("updated_at = CURRENT_TIMESTAMP")
+
+        sql = f"""
+        INSERT INTO daily_records ({insert_columns})
+        VALUES ({placeholders})
+        ON CONFLICT(user_id, record_date) DO UPDATE SET {", ".join(assignments)}
+        """
+
+        self.cursor.execute(sql, (user_id, date_str, *values.values(), *increments.values()))
+        self.conn.commit()
+
     def update_meal_status(self, user_id: int, meal_type: str,
                            status: str = "吃了", details: str = "") -> bool:
         """
@@ -395,24 +548,14 @@ class HealthDatabaseSQLite:
             bool: 是否成功
         """
         try:
-            today = datetime.now().date().isoformat()
-
-            # 1. 确保今日记录存在
-            self.ensure_daily_record_exists(user_id, today)
-
-            # 2. 确定要更新的字段
-            status_field = f"{meal_type}_status"
-            details_field = f"{meal_type}_details"
-
-            # 3. 更新记录
-            sql = f"""
-            UPDATE daily_records 
-            SET {status_field} = ?, {details_field} = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE user_id = ? AND record_date = ?
-            """
+            if meal_type not in self.MEAL_TYPES:
+                raise ValueError(f"未知的餐次类型: {meal_type}")
 
-            self.cursor.execute(sql, (status, details, user_id, today))
-            self.conn.commit()
+            today = datetime.now().date().isoformat()
+            self._upsert_daily_record(user_id, today, {
+                f"{meal_type}_status": status,
+                f"{meal_type}_details": details
+            })
 
             logger.info(f"✅ 更新{meal_type}状态: {status}")
             return True
@@ -424,20 +567,16 @@ class HealthDatabaseSQLite:
     def ensure_daily_record_exists(self, user_id: int, date_str: str) -> bool:
         """确保某天的记录存在"""
         try:
-            # 检查记录是否存在
-            self.cursor.execute(
-                "SELECT id FROM daily_records WHERE user_id = ? AND record_date = ?",
-                (user_id, date_str)
-            )
+            self.cursor.execute("""
+            INSERT INTO daily_records (user_id, record_date)
+            VALUES (?, ?)
+            ON CONFLICT(user_id, record_date) DO NOTHING
+            """, (user_id, date_str))
 
-            if not self.cursor.fetchone():
-                # 创建新记录
-                sql = """
-                INSERT INTO daily_records (user_id, record_date)
-                VALUES (?, ?)
-                """
-                self.cursor.execute(sql, (user_id, date_str))
-                self.conn.commit()
+            # 记录已存在时虽然没有写入，INSERT 仍然开启了事务并持有写锁，必须提交释放
+            created = self.cursor.rowcount > 0
+            self.conn.commit()
+            if created:
                 logger.info(f"✅ 创建每日记录: 用户{user_id}, 日期{date_str}")
 
             return True
@@ -452,25 +591,122 @@ class HealthDatabaseSQLite:
         """
         try:
             today = datetime.now().date().isoformat()
+            self._upsert_daily_record(user_id, today, {
+                "exercise_status": status,
+                "exercise_details": details
+            })
 
-            # 确保今日记录存在
-            self.ensure_daily_record_exists(user_id, today)
+            logger.info(f"✅ 更新运动状态: {status}")
+            return True
 
-            # 更新运动状态
-            sql = """
-            UPDATE daily_records 
-            SET exercise_status = ?, exercise_details = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE user_id = ? AND record_date = ?
-            """
+        except Exception as e:
+            logger.error(f"❌ 更新运动状态失败: {e}")
+            return False
 
-            self.cursor.execute(sql, (status, details, user_id, today))
-            self.conn.commit()
+    def add_drink(self, user_id: int, cups: int = 1, date_str: str = None) -> bool:
+        """
+        增加喝水杯数（在数据库中原子累加，不需要先读出当前值）
 
-            logger.info(f"✅ 更新运动状态: {status}")
+        Args:
+            user_id: 用户ID
+            cups: 增加的杯数（可以为负数用于撤销）
+            date_str: 日期字符串，默认今天
+        """
+        try:
+            date_str = date_str or datetime.now().date().isoformat()
+            self._upsert_daily_record(user_id, date_str, {}, increments={"drink_number": cups})
+
+            logger.info(f"✅ 喝水记录 +{cups}杯")
             return True
 
         except Exception as e:
-            logger.error(f"❌ 更新运动状态失败: {e}")
+            logger.error(f"❌ 更新喝水记录失败: {e}")
+            return False
+
+    def set_drink_status(self, user_id: int, drink_number: int = None, drink_plan: int = None,
+                         date_str: str = None) -> bool:
+        """
+        设置喝水杯数和/或喝水目标
+
+        Args:
+            user_id: 用户ID
+            drink_number: 当前杯数（None表示不修改）
+            drink_plan: 目标杯数（None表示不修改）
+            date_str: 日期字符串，默认今天
+        """
+        values = {}
+        if drink_number is not None:
+            values["drink_number"] = drink_number
+        if drink_plan is not None:
+            values["drink_plan"] = drink_plan
+        if not values:
+            return True
+
+        try:
+            date_str = date_str or datetime.now().date().isoformat()
+            self._upsert_daily_record(user_id, date_str, values)
+
+            logger.info(f"✅ 更新喝水状态: {values}")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ 更新喝水状态失败: {e}")
+            return False
+
+    def update_daily_plan(self, user_id: int, food_plan: List[str] = None,
+                          movement_plan: List[str] = None, date_str: str = None) -> bool:
+        """
+        更新每日饮食/运动计划
+
+        Args:
+            user_id: 用户ID
+            food_plan: 饮食计划列表（None表示不修改）
+            movement_plan: 运动计划列表（None表示不修改）
+            date_str: 日期字符串，默认今天
+        """
+        values = {}
+        if food_plan is not None:
+            values["food_plan"] = json.dumps(food_plan, ensure_ascii=False)
+        if movement_plan is not None:
+            values["movement_plan"] = json.dumps(movement_plan, ensure_ascii=False)
+        if not values:
+            return True
+
+        try:
+            date_str = date_str or datetime.now().date().isoformat()
+            self._upsert_daily_record(user_id, date_str, values)
+
+            logger.info(f"✅ 更新每日计划: {', '.join(values)}")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ 更新每日计划失败: {e}")
+            return False
+
+    def update_daily_summary(self, user_id: int, summary: str, date_str: str = None) -> bool:
+        """更新每日总结"""
+        try:
+            date_str = date_str or datetime.now().date().isoformat()
+            self._upsert_daily_record(user_id, date_str, {"daily_summary": summary})
+
+            logger.info(f"✅ 更新每日总结: {date_str}")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ 更新每日总结失败: {e}")
+            return False
+
+    def update_daily_negative_factors(self, user_id: int, factors: Dict, date_str: str = None) -> bool:
+        """更新每日记录中的负面因子快照"""
+        try:
+            date_str = date_str or datetime.now().date().isoformat()
+            self._upsert_daily_record(user_id, date_str, {
+                "negative_factors": json.dumps(factors, ensure_ascii=False)
+            })
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ 更新每日负面因子失败: {e}")
             return False
 
     def add_negative_factor(self, user_id: int, factor_data: Dict) -> int:
@@ -512,6 +748,32 @@ class HealthDatabaseSQLite:
             logger.error(f"❌ 添加负面因子失败: {e}")
             return 0
 
+    def get_active_negative_factors(self, user_id: int) -> List[Dict]:
+        """
+        获取用户进行中的负面因子（按开始日期排序）
+
+        Returns:
+            List[Dict]: 负面因子列表
+        """
+        try:
+            self.cursor.execute("""
+            SELECT id, factor_type, description, severity, duration_days, should_exercise, start_date
+            FROM negative_factors
+            WHERE user_id = ? AND status = 'active'
+            ORDER BY start_date
+            """, (user_id,))
+
+            factors = []
+            for row in self.cursor.fetchall():
+                factor = dict(row)
+                factor['should_exercise'] = bool(factor['should_exercise'])
+                factors.append(factor)
+            return factors
+
+        except Exception as e:
+            logger.error(f"❌ 获取负面因子失败: {e}")
+            return []
+
     def get_today_plan(self, user_id: int, plan_type: str = "all") -> Dict:
         """
         获取今日计划（对应你的get_daily_plan工具）
@@ -583,6 +845,87 @@ class HealthDatabaseSQLite:
             logger.error(f"❌ 获取今日计划失败: {e}")
             return self._get_default_plan()
 
+    def get_weekly_weight_trend(self, nickname: str, weeks: int = 12) -> List[Dict]:
+        """
+        获取最近若干周的体重趋势（读取周汇总表，按周升序）
+
+        Returns:
+            List[Dict]: 每周的称重次数、最低/最高/平均体重、周初/周末体重和周变化
+        """
+        try:
+            user_id = self.get_user_id(nickname)
+            if user_id is None:
+                return []
+            return weight_trend(self.conn, user_id, weeks)
+
+        except Exception as e:
+            logger.error(f"❌ 获取体重趋势失败: {e}")
+            return []
+
+    def get_weekly_activity_trend(self, nickname: str, weeks: int = 12) -> List[Dict]:
+        """
+        获取最近若干周的饮食、运动、饮水坚持情况（读取周汇总表，按周升序）
+
+        Returns:
+            List[Dict]: 每周各项天数、三餐完成率和运动天数比例
+        """
+        try:
+            user_id = self.get_user_id(nickname)
+            if user_id is None:
+                return []
+            return activity_trend(self.conn, user_id, weeks)
+
+        except Exception as e:
+            logger.error(f"❌ 获取坚持情况趋势失败: {e}")
+            return []
+
+    def get_exercise_streak(self, nickname: str) -> Dict:
+        """
+        获取连续运动天数
+
+        Returns:
+            Dict: current_streak（截至今天/昨天的连续天数）、longest_streak、last_exercise_date
+        """
+        empty = {"current_streak": 0, "longest_streak": 0, "last_exercise_date": None}
+        try:
+            user_id = self.get_user_id(nickname)
+            if user_id is None:
+                return empty
+            return exercise_streaks(self.conn, user_id)
+
+        except Exception as e:
+            logger.error(f"❌ 获取连续运动天数失败: {e}")
+            return empty
+
+    def rebuild_weekly_summaries(self, nickname: str = None) -> Dict[str, int]:
+        """
+        根据原始记录重建周汇总表（触发器被删除或手工修改过数据后使用）
+
+        Args:
+            nickname: 只重建指定用户（None表示全部用户）
+        """
+        try:
+            user_id = self.get_user_id(nickname) if nickname else None
+            if nickname and user_id is None:
+                return {}
+            counts = rebuild_weekly_summaries(self.conn, user_id)
+            logger.info(f"✅ 周汇总表已重建: {counts}")
+            return counts
+
+        except Exception as e:
+            self.conn.rollback()
+            logger.error(f"❌ 重建周汇总表失败: {e}")
+            return {}
+
+    def _get_default_plan(self) -> Dict:
+        """没有今日记录时返回的默认计划（与 daily_records 表的默认值一致）"""
+        return {
+            'date': datetime.now().date().isoformat(),
+            'meal_status': {'早餐': '没吃', '午餐': '没吃', '晚餐': '没吃'},
+            'water': {'target': 8, 'current': 0},
+            'exercise_status': '没运动'
+        }
+
     def save_user_to_db(self, user_data: Dict) -> int:
         """保存用户数据到数据库（新增）"""
         try:
@@ -626,6 +969,9 @@ class HealthDatabaseSQLite:
             self.cursor.execute(sql, values)
             self.conn.commit()
 
+            # INSERT OR REPLACE 会生成新的ID
+            self.identity.invalidate(nickname=user_data.get('昵称'))
+
             user_id = self.cursor.lastrowid
             logger.info(f"保存用户到数据库: {user_data.get('昵称')}, ID={user_id}")
             return user_id
@@ -660,12 +1006,31 @@ class HealthDatabaseSQLite:
             )
 
             self.conn.commit()
+            self.identity.invalidate(user_id=user_id)
             return True
 
         except Exception as e:
             logger.error(f"更新用户体重失败: {e}")
             return False
 
+    def delete_user(self, nickname: str) -> bool:
+        """
+        删除用户（由于外键约束，会级联删除相关记录）
+
+        Returns:
+            bool: 用户是否存在并已删除
+        """
+        try:
+            self.cursor.execute("DELETE FROM users WHERE nickname = ?", (nickname,))
+            self.conn.commit()
+            deleted = self.cursor.rowcount > 0
+            self.identity.invalidate(nickname=nickname)
+            return deleted
+
+        except Exception as e:
+            logger.error(f"❌ 删除用户失败: {e}")
+            return False
+
 # 便捷函数
 def init_database():
     """初始化数据库（第一次运行时调用）"""
@@ -682,16 +1047,19 @@ def init_database():
 
 
 def migrate_all_data():
-    """迁移所有JSON数据到数据库"""
+    """迁移所有JSON数据到数据库（用户、体重历史、每日记录、负面因子，批量事务导入）"""
+    from bulk_import import BulkImporter
+
     print("🚚 开始迁移JSON数据到SQLite数据库...")
-    db = HealthDatabaseSQLite()
-    if db.connect():
-        count = db.migrate_users_from_json()
-        if count > 0:
-            print(f"🎉 成功迁移 {count} 个用户的数据")
+    importer = BulkImporter()
+    try:
+        stats = importer.import_all()
+        if stats and stats[0]["rows"] > 0:
+            print(f"🎉 成功迁移 {stats[0]['rows']} 个用户的数据")
         else:
             print("⚠️ 没有迁移到用户数据")
-        db.disconnect()
+    finally:
+        importer.close()
 
 
 def demo_database_features():
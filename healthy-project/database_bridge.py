@@ -5,25 +5,277 @@
 """
 
 import json
-from typing import Dict, List, Optional
+import time
+import queue
+import atexit
+import datetime
+import threading
+from typing import Dict, List, Optional, Any, Tuple
 from database import HealthDatabaseSQLite
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class WriteBehindQueue:
+    """
+    数据库异步写入队列（write-behind）
+
+    JSON写入成功后把数据库同步操作放进有界队列立即返回，由后台线程批量写入：
+    - 一批操作共用一个事务，只提交一次
+    - 失败时整批重试（指数退避），仍然失败则逐条重试，找出并丢弃无法写入的操作
+    - 队列满时调用方最多等待 put_timeout 秒（背压），仍然满则在调用线程直接同步写入，不丢数据
+    - 程序退出时自动把队列中剩余的操作写完
+    """
+
+    def __init__(self, bridge: "DatabaseBridge", max_size: int = 1000, batch_size: int = 50,
+                 max_retries: int = 3, retry_delay: float = 0.1, put_timeout: float = 1.0):
+        """
+        初始化写入队列
+
+        Args:
+            bridge: 数据库桥接器（提供各操作的SQL实现）
+            max_size: 队列容量
+            batch_size: 每个事务最多包含的操作数
+            max_retries: 每批最多重试次数
+            retry_delay: 首次重试前的等待秒数（之后翻倍）
+            put_timeout: 队列满时调用方最多等待的秒数
+        """
+        self.bridge = bridge
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.put_timeout = put_timeout
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_size)
+        self._handlers = {
+            "user_creation": bridge._apply_user_creation,
+            "weight_update": bridge._apply_weight_update,
+        }
+
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "enqueued": 0, "written": 0, "failed": 0, "retries": 0, "batches": 0,
+            "sync_fallbacks": 0, "max_lag_ms": 0.0, "last_lag_ms": 0.0, "total_lag_ms": 0.0
+        }
+        self.failed_operations: List[Tuple[str, tuple, str]] = []
+
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._worker.start()
+        atexit.register(self.shutdown)
+
+    def submit(self, operation: str, *args) -> bool:
+        """
+        提交一个写操作
+
+        Returns:
+            是否已被接受（入队或同步写入成功）
+        """
+        if operation not in self._handlers:
+            raise ValueError(f"未知的数据库操作: {operation}")
+
+        if self._closed:
+            return self._write_now(operation, args)
+
+        try:
+            self._queue.put((operation, args, time.perf_counter()), timeout=self.put_timeout)
+        except queue.Full:
+            # 背压：等待超时后由调用线程自己写，保证数据不丢
+            logger.warning(f"⚠️ 数据库写入队列已满（{self._queue.qsize()}），改为同步写入")
+            with self._metrics_lock:
+                self._metrics["sync_fallbacks"] += 1
+            return self._write_now(operation, args)
+
+        with self._metrics_lock:
+            self._metrics["enqueued"] += 1
+        return True
+
+    def _write_now(self, operation: str, args: tuple) -> bool:
+        """在调用线程同步执行一个操作"""
+        try:
+            self._handlers[operation](*args)
+            self.bridge.db.conn.commit()
+            self.bridge._invalidate_identities([args[0]])
+            return True
+        except Exception as e:
+            self.bridge.db.conn.rollback()
+            logger.error(f"❌ 同步写入失败 {operation}: {e}")
+            return False
+
+    def _run(self) -> None:
+        """后台线程：取出一批操作写入数据库"""
+        while True:
+            first = self._queue.get()
+            if first is None:
+                self._queue.task_done()
+                break
+
+            batch = [first]
+            stop_after_batch = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.task_done()
+                    stop_after_batch = True
+                    break
+                batch.append(item)
+
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if stop_after_batch:
+                break
+
+        # 后台线程退出前关闭自己的连接
+        if self.bridge.db.pool is not None:
+            self.bridge.db.pool.close_thread()
+
+    def _apply(self, batch: list) -> None:
+        """在一个事务中执行一批操作"""
+        try:
+            for operation, args, _ in batch:
+                self._handlers[operation](*args)
+            self.bridge.db.conn.commit()
+        except Exception:
+            self.bridge.db.conn.rollback()
+            raise
+        self.bridge._invalidate_identities([args[0] for _, args, _ in batch])
+
+    def _write_batch(self, batch: list) -> None:
+        """写入一批操作，失败时重试，最后逐条隔离出无法写入的操作"""
+        delay = self.retry_delay
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._apply(batch)
+                self._record_success(batch)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"❌ 批量写入失败（已重试{self.max_retries}次），逐条重试: {e}")
+                    break
+                with self._metrics_lock:
+                    self._metrics["retries"] += 1
+                time.sleep(delay)
+                delay *= 2
+
+        for item in batch:
+            try:
+                self._apply([item])
+                self._record_success([item])
+            except Exception as e:
+                operation, args, _ = item
+                logger.error(f"❌ 数据库写入失败，已放弃 {operation}{args[:1]}: {e}")
+                with self._metrics_lock:
+                    self._metrics["failed"] += 1
+                    self.failed_operations.append((operation, args, str(e)))
+
+    def _record_success(self, batch: list) -> None:
+        """更新写入数量和延迟统计（延迟 = 入队到提交完成的时间）"""
+        now = time.perf_counter()
+        lags = [(now - enqueued_at) * 1000 for _, _, enqueued_at in batch]
+
+        with self._metrics_lock:
+            self._metrics["written"] += len(batch)
+            self._metrics["batches"] += 1
+            self._metrics["total_lag_ms"] += sum(lags)
+            self._metrics["last_lag_ms"] = lags[-1]
+            self._metrics["max_lag_ms"] = max(self._metrics["max_lag_ms"], max(lags))
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        等待队列中已提交的操作全部写入
+
+        Args:
+            timeout: 最多等待的秒数（None表示一直等）
+
+        Returns:
+            是否已全部写入
+        """
+        if timeout is None:
+            self._queue.join()
+            return True
+
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks:
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """写完剩余操作并停止后台线程（程序退出时自动调用）"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join(timeout)
+
+        remaining = self._queue.qsize()
+        if remaining:
+            logger.warning(f"⚠️ 关闭时仍有 {remaining} 个数据库操作未写入")
+
+    def metrics(self) -> Dict[str, Any]:
+        """队列积压和写入延迟统计"""
+        with self._metrics_lock:
+            result = dict(self._metrics)
+
+        result["queue_depth"] = self._queue.qsize()
+        result["avg_lag_ms"] = round(result.pop("total_lag_ms") / result["written"], 3) if result["written"] else 0.0
+        result["max_lag_ms"] = round(result["max_lag_ms"], 3)
+        result["last_lag_ms"] = round(result["last_lag_ms"], 3)
+        return result
+
+
 class DatabaseBridge:
-    """数据库桥接器，让原有代码无需大量修改"""
+    """
+    数据库桥接器，让原有代码无需大量修改
+
+    导入模块时不访问数据库：第一次用到 connected 时才连接，第一次异步写入时才启动后台写入线程
+    """
 
     def __init__(self):
-        # 初始化数据库连接
         self.db = HealthDatabaseSQLite()
-        self.connected = self.db.connect()
+        self._connected: Optional[bool] = None
+        self._writer: Optional[WriteBehindQueue] = None
+        self._init_lock = threading.Lock()
+
+    @property
+    def connected(self) -> bool:
+        """数据库是否可用（第一次访问时连接数据库）"""
+        if self._connected is None:
+            with self._init_lock:
+                if self._connected is None:
+                    self._connected = self.db.connect()
+                    if self._connected:
+                        logger.info("✅ 数据库桥接器初始化成功")
+                    else:
+                        logger.warning("⚠️ 数据库连接失败，将只使用JSON系统")
+        return self._connected
 
-        if self.connected:
-            logger.info("✅ 数据库桥接器初始化成功")
-        else:
-            logger.warning("⚠️ 数据库连接失败，将只使用JSON系统")
+    @property
+    def writer(self) -> Optional[WriteBehindQueue]:
+        """后台写入队列（第一次使用时启动；后台线程通过连接池使用自己的连接，不和调用方共享游标）"""
+        if self._writer is None and self.connected:
+            with self._init_lock:
+                if self._writer is None:
+                    self._writer = WriteBehindQueue(self)
+        return self._writer
+
+    def _invalidate_identities(self, nicknames: List[str]) -> None:
+        """
+        事务提交后清除这些用户的身份缓存
+
+        必须在提交之后清除：提交前清除的话，其他线程可能在提交前重新查询并缓存旧的用户ID和档案
+        """
+        for nickname in set(nicknames):
+            self.db.identity.invalidate(nickname=nickname)
 
     def sync_user_creation(self, nickname: str, user_data: Dict) -> bool:
         """
@@ -34,77 +286,114 @@ class DatabaseBridge:
             return False
 
         try:
-            # 转换原有JSON格式到数据库格式
-            db_user_data = {
-                'nickname': nickname,
-                'age': user_data.get('年龄'),
-                'gender': user_data.get('性别'),
-                'height_cm': user_data.get('身高'),
-                'current_weight_kg': user_data.get('当前体重_kg'),
-                'bmi': user_data.get('bmi'),
-                'bmi_status': user_data.get('status'),
-                'goal': user_data.get('目标', '减肥'),
-                'target_weight_kg': user_data.get('目标体重_kg'),
-                'diet_preferences': json.dumps(user_data.get('饮食偏好', []), ensure_ascii=False),
-                'allergens': json.dumps(user_data.get('过敏原', []), ensure_ascii=False),
-                'move_prefer': json.dumps(user_data.get('运动爱好', []), ensure_ascii=False),
-                'remarks': user_data.get('备注', ''),
-                'registration_date': user_data.get('注册时间', '')
-            }
-
-            # 保存到数据库
-            self.db.cursor.execute("""
-                INSERT OR REPLACE INTO users 
-                (nickname, age, gender, height_cm, current_weight_kg, bmi, 
-                 bmi_status, goal, target_weight_kg, diet_preferences, 
-                 allergens, move_prefer, remarks, registration_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, tuple(db_user_data.values()))
-
+            self._apply_user_creation(nickname, user_data)
             self.db.conn.commit()
+            self._invalidate_identities([nickname])
             logger.info(f"✅ 同步用户到数据库: {nickname}")
             return True
 
         except Exception as e:
+            self.db.conn.rollback()
             logger.error(f"❌ 同步用户失败: {e}")
             return False
 
-    def sync_weight_update(self, nickname: str, new_weight: float) -> bool:
+    def _apply_user_creation(self, nickname: str, user_data: Dict) -> None:
+        """执行用户创建的SQL（不提交，由调用方决定事务边界）"""
+        # 转换原有JSON格式到数据库格式
+        db_user_data = {
+            'nickname': nickname,
+            'age': user_data.get('年龄'),
+            'gender': user_data.get('性别'),
+            'height_cm': user_data.get('身高'),
+            'current_weight_kg': user_data.get('当前体重_kg'),
+            'bmi': user_data.get('bmi'),
+            'bmi_status': user_data.get('status'),
+            'goal': user_data.get('目标', '减肥'),
+            'target_weight_kg': user_data.get('目标体重_kg'),
+            'diet_preferences': json.dumps(user_data.get('饮食偏好', []), ensure_ascii=False),
+            'allergens': json.dumps(user_data.get('过敏原', []), ensure_ascii=False),
+            'move_prefer': json.dumps(user_data.get('运动爱好', []), ensure_ascii=False),
+            'remarks': user_data.get('备注', ''),
+            'registration_date': user_data.get('注册时间', '')
+        }
+
+        # 保存到数据库
+        self.db.cursor.execute("""
+            INSERT OR REPLACE INTO users 
+            (nickname, age, gender, height_cm, current_weight_kg, bmi, 
+             bmi_status, goal, target_weight_kg, diet_preferences, 
+             allergens, move_prefer, remarks, registration_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, tuple(db_user_data.values()))
+        # INSERT OR REPLACE 会生成新的用户ID，身份缓存由调用方在提交后清除
+
+    def sync_weight_update(self, nickname: str, new_weight: float, updated_at: str = None) -> bool:
         """
         同步体重更新到数据库
+
+        Args:
+            nickname: 用户昵称
+            new_weight: 新体重
+            updated_at: 更新时间（"%Y-%m-%d %H:%M:%S"，默认当前时间；异步写入时为入队时间）
         """
         if not self.connected:
             return False
 
         try:
-            # 1. 获取用户ID
-            user = self.db.get_user_by_nickname(nickname)
-            if not user:
-                logger.warning(f"用户不存在于数据库: {nickname}")
+            if not self._apply_weight_update(nickname, new_weight, updated_at):
                 return False
-
-            # 2. 更新用户表的体重
-            self.db.cursor.execute("""
-                UPDATE users 
-                SET current_weight_kg = ?, last_update = ?
-                WHERE nickname = ?
-            """, (new_weight, '2024-01-01 00:00:00', nickname))
-
-            # 3. 添加到体重历史（简化版）
-            self.db.cursor.execute("""
-                INSERT INTO weight_history 
-                (user_id, weight_kg, recorded_date)
-                VALUES (?, ?, ?)
-            """, (user['id'], new_weight, '2024-01-01'))
-
             self.db.conn.commit()
+            self._invalidate_identities([nickname])
             logger.info(f"✅ 同步体重更新: {nickname} -> {new_weight}kg")
             return True
 
         except Exception as e:
+            self.db.conn.rollback()
             logger.error(f"❌ 同步体重失败: {e}")
             return False
 
+    def _apply_weight_update(self, nickname: str, new_weight: float, updated_at: str = None) -> bool:
+        """执行体重更新的SQL（不提交），用户不存在时返回False"""
+        updated_at = updated_at or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        # 1. 获取用户ID（在本事务中查询，不走身份缓存：同一批里先重建了用户时缓存中还是旧ID）
+        self.db.cursor.execute("SELECT id FROM users WHERE nickname = ?", (nickname,))
+        row = self.db.cursor.fetchone()
+        if row is None:
+            logger.warning(f"用户不存在于数据库: {nickname}")
+            return False
+        user_id = row['id']
+
+        # 2. 更新用户表的体重
+        self.db.cursor.execute("""
+            UPDATE users 
+            SET current_weight_kg = ?, last_update = ?
+            WHERE nickname = ?
+        """, (new_weight, updated_at, nickname))
+
+        # 3. 添加到体重历史（简化版）
+        self.db.cursor.execute("""
+            INSERT INTO weight_history 
+            (user_id, weight_kg, recorded_date)
+            VALUES (?, ?, ?)
+        """, (user_id, new_weight, updated_at.split(' ')[0]))
+
+        # 缓存的档案里有旧体重，由调用方在提交后清除
+        return True
+
+    def enqueue_user_creation(self, nickname: str, user_data: Dict) -> bool:
+        """异步同步用户创建（立即返回，由后台线程写入数据库）"""
+        if not self.connected:
+            return False
+        return self.writer.submit("user_creation", nickname, user_data)
+
+    def enqueue_weight_update(self, nickname: str, new_weight: float) -> bool:
+        """异步同步体重更新（记录入队时间，立即返回）"""
+        if not self.connected:
+            return False
+        updated_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return self.writer.submit("weight_update", nickname, new_weight, updated_at)
+
     def get_user_count(self) -> int:
         """获取数据库中的用户数量（用于展示）"""
         if not self.connected:
@@ -0,0 +1,489 @@
+# db_benchmark.py
+"""
+数据库层性能测试
+1. 合成数据生成：N个用户、若干个月的体重变化、每日记录（三餐、运动、喝水、计划）和负面因子
+2. 对 HealthDatabaseSQLite 和 UserManagerSQLite 的每个方法分别在单线程和多线程并发下计时
+3. 输出JSON和CSV报告（包含提交号），可以对比两次提交的结果
+
+用法：
+    python db_benchmark.py run [用户数] [月数] [线程数]   # 生成数据并测试，报告写入 benchmark_reports/
+    python db_benchmark.py compare 旧报告.json 新报告.json  # 对比两份报告
+"""
+
+import os
+import io
+import sys
+import csv
+import json
+import time
+import random
+import sqlite3
+import platform
+import tempfile
+import threading
+import contextlib
+import subprocess
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+from database import HealthDatabaseSQLite
+from user_manager_sqlite import UserManagerSQLite
+from analytics import drop_summary_triggers, create_summary_triggers, rebuild_weekly_summaries
+from First_Entry import calculate_bmi
+
+logger = logging.getLogger(__name__)
+
+FACTOR_TEMPLATES = [
+    ("生病", "感冒发烧", "中", 4, False),
+    ("受伤", "脚踝扭伤", "重", 10, False),
+    ("生理期", "生理期", "轻", 5, True),
+    ("工作", "连续加班", "轻", 3, True),
+    ("情绪", "压力大、失眠", "中", 7, True),
+]
+
+FOODS = ["燕麦牛奶", "全麦面包和鸡蛋", "米饭和青菜", "鸡胸肉沙拉", "牛肉面", "水煮鱼", "酸奶和水果", "杂粮粥"]
+
+
+def generate_benchmark_dataset(db_path: str, users: int = 100, months: int = 6, seed: int = 42) -> List[str]:
+    """
+    生成合成的多用户数据，截止到今天
+
+    每个用户有自己的起始体重、减重速度和自律程度：
+    - 体重：按减重速度下降，带每日波动和平台期，约70%的日子称重
+    - 每日记录：约90%的日子有记录，三餐和运动按自律程度随机，喝水0~10杯
+    - 负面因子：每月约一次，持续数天，已结束的标记为已恢复
+
+    Args:
+        db_path: 数据库文件路径（不存在时创建）
+        users: 用户数
+        months: 月数
+        seed: 随机种子（相同参数生成相同数据）
+
+    Returns:
+        用户昵称列表
+    """
+    rng = random.Random(seed)
+    db = HealthDatabaseSQLite(db_path)
+    db.connect()
+    db.create_tables()
+    conn = db.conn
+    # 生成期间暂停周汇总触发器，最后一次性重建
+    drop_summary_triggers(conn)
+    conn.commit()
+
+    today = date.today()
+    days = months * 30
+    start = today - timedelta(days=days - 1)
+    nicknames = [f"测试用户{i:04d}" for i in range(users)]
+
+    user_rows = []
+    for nickname in nicknames:
+        height = rng.randint(150, 190)
+        weight = round(rng.uniform(60, 110), 1)
+        bmi = calculate_bmi(weight, height)
+        user_rows.append((nickname, rng.randint(18, 60), rng.choice(["男", "女"]), height, weight,
+                          bmi["bmi"], bmi["status"], "减肥", round(weight * 0.9, 1),
+                          json.dumps(["清淡"], ensure_ascii=False), "[]", json.dumps(["跑步"], ensure_ascii=False),
+                          "", start.isoformat()))
+    conn.executemany("""
+    INSERT INTO users (nickname, age, gender, height_cm, current_weight_kg, bmi, bmi_status, goal,
+                       target_weight_kg, diet_preferences, allergens, move_prefer, remarks, registration_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, user_rows)
+    user_ids = {row["nickname"]: row["id"] for row in conn.execute("SELECT id, nickname FROM users")}
+
+    weight_rows, daily_rows, factor_rows = [], [], []
+    for nickname, user_row in zip(nicknames, user_rows):
+        user_id = user_ids[nickname]
+        weight = user_row[4]
+        height = user_row[3]
+        loss_per_day = rng.uniform(0.02, 0.12)
+        discipline = rng.uniform(0.3, 0.9)
+        plateau_until = -1
+
+        for day in range(days):
+            current = start + timedelta(days=day)
+            date_str = current.isoformat()
+
+            if day > plateau_until and rng.random() < 0.02:
+                plateau_until = day + rng.randint(5, 15)
+            if day > plateau_until:
+                weight -= loss_per_day
+            if rng.random() < 0.7:
+                measured = round(weight + rng.uniform(-0.4, 0.4), 1)
+                bmi = calculate_bmi(measured, height)
+                weight_rows.append((user_id, measured, bmi["bmi"], bmi["status"], date_str))
+
+            if rng.random() < 0.9:
+                meals = []
+                for _ in range(4):
+                    eaten = rng.random() < discipline + 0.1
+                    meals += ["吃了", rng.choice(FOODS)] if eaten else ["没吃", None]
+                # 宵夜吃得越少越好
+                if meals[6] == "吃了" and rng.random() < discipline:
+                    meals[6:8] = ["没吃", None]
+                exercised = rng.random() < discipline
+                daily_rows.append((
+                    user_id, date_str, *meals,
+                    "已运动" if exercised else "没运动", "快走40分钟" if exercised else None,
+                    8, rng.randint(0, 10),
+                    json.dumps(["早餐：燕麦", "午餐：糙米饭"], ensure_ascii=False),
+                    json.dumps(["快走30分钟"], ensure_ascii=False),
+                    "按计划执行" if exercised else None
+                ))
+
+            if rng.random() < 1 / 30:
+                factor_type, description, severity, duration, should_exercise = rng.choice(FACTOR_TEMPLATES)
+                end = current + timedelta(days=duration)
+                recovered = end < today
+                factor_rows.append((user_id, factor_type, description, severity, duration, int(should_exercise),
+                                    "recovered" if recovered else "active", date_str,
+                                    end.isoformat() if recovered else None))
+
+    conn.executemany(
+        "INSERT INTO weight_history (user_id, weight_kg, bmi, bmi_status, recorded_date) VALUES (?, ?, ?, ?, ?)",
+        weight_rows)
+    conn.executemany("""
+    INSERT INTO daily_records (user_id, record_date, breakfast_status, breakfast_details, lunch_status, lunch_details,
+                               dinner_status, dinner_details, snack_status, snack_details,
+                               exercise_status, exercise_details, drink_plan, drink_number,
+                               food_plan, movement_plan, daily_summary)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, daily_rows)
+    conn.executemany("""
+    INSERT INTO negative_factors (user_id, factor_type, description, severity, duration_days, should_exercise,
+                                  status, start_date, recovery_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, factor_rows)
+
+    create_summary_triggers(conn)
+    rebuild_weekly_summaries(conn, commit=False)
+    conn.commit()
+    db.disconnect()
+
+    logger.info(f"✅ 合成数据: {users}个用户, 体重{len(weight_rows)}条, 每日记录{len(daily_rows)}条, "
+                f"负面因子{len(factor_rows)}条")
+    return nicknames
+
+
+class BenchmarkContext:
+    """测试用例共享的对象和数据"""
+
+    def __init__(self, db_path: str, nicknames: List[str]):
+        self.db = HealthDatabaseSQLite(db_path)
+        self.db.connect()
+        self.manager = UserManagerSQLite(db_path)
+        self.nicknames = nicknames
+        self.user_ids = {nickname: self.db.get_user_id(nickname) for nickname in nicknames}
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def unique(self, prefix: str) -> str:
+        """生成不重复的昵称（新建用户类用例使用）"""
+        with self._lock:
+            self._counter += 1
+            return f"{prefix}{self._counter:06d}"
+
+    def pick(self, rng: random.Random) -> Tuple[str, int]:
+        """随机选择一个已有用户"""
+        nickname = rng.choice(self.nicknames)
+        return nickname, self.user_ids[nickname]
+
+    def close(self) -> None:
+        self.db.disconnect()
+        self.manager.close()
+
+
+def _new_profile(ctx: BenchmarkContext, rng: random.Random) -> Dict[str, Any]:
+    """HealthDatabaseSQLite.save_user_to_db 使用的中文字段档案"""
+    return {"昵称": ctx.unique("新用户"), "年龄": 30, "性别": "女", "身高": 165, "当前体重_kg": round(rng.uniform(55, 90), 1)}
+
+
+def _new_manager_profile(ctx: BenchmarkContext, rng: random.Random) -> Dict[str, Any]:
+    """UserManagerSQLite.create_user_profile 使用的英文字段档案"""
+    weight = round(rng.uniform(55, 90), 1)
+    return {"nickname": ctx.unique("管理器用户"), "age": 30, "gender": "男", "height_cm": 175,
+            "current_weight_kg": weight, "bmi": round(weight / 1.75 ** 2, 1), "status": "正常", "goal": "减肥"}
+
+
+def _delete_created(ctx: BenchmarkContext, rng: random.Random) -> bool:
+    """删除一个新建的用户（先新建，保证每次删除都有对象）"""
+    nickname = ctx.unique("待删除用户")
+    ctx.db.save_user_to_db({"昵称": nickname, "年龄": 30, "性别": "女", "身高": 165, "当前体重_kg": 60})
+    return ctx.db.delete_user(nickname)
+
+
+# (用例名, 被测类, 类型, 函数)  函数返回 False 视为失败
+BENCHMARK_CASES: List[Tuple[str, str, str, Callable[[BenchmarkContext, random.Random], Any]]] = [
+    ("get_all_users", "HealthDatabaseSQLite", "read", lambda c, r: c.db.get_all_users()),
+    ("get_user_id", "HealthDatabaseSQLite", "read", lambda c, r: c.db.get_user_id(c.pick(r)[0])),
+    ("get_user_by_nickname", "HealthDatabaseSQLite", "read", lambda c, r: c.db.get_user_by_nickname(c.pick(r)[0])),
+    ("get_weight_history", "HealthDatabaseSQLite", "read", lambda c, r: c.db.get_weight_history(c.pick(r)[0], 30)),
+    ("get_today_plan", "HealthDatabaseSQLite", "read", lambda c, r: c.db.get_today_plan(c.pick(r)[1])),
+    ("get_active_negative_factors", "HealthDatabaseSQLite", "read",
+     lambda c, r: c.db.get_active_negative_factors(c.pick(r)[1])),
+    ("get_weekly_weight_trend", "HealthDatabaseSQLite", "read",
+     lambda c, r: c.db.get_weekly_weight_trend(c.pick(r)[0], 26)),
+    ("get_weekly_activity_trend", "HealthDatabaseSQLite", "read",
+     lambda c, r: c.db.get_weekly_activity_trend(c.pick(r)[0], 26)),
+    ("get_exercise_streak", "HealthDatabaseSQLite", "read", lambda c, r: c.db.get_exercise_streak(c.pick(r)[0])),
+    ("add_weight_record", "HealthDatabaseSQLite", "write",
+     lambda c, r: c.db.add_weight_record(c.pick(r)[1], round(r.uniform(55, 90), 1), 24.0, "正常")),
+    ("update_user_weight", "HealthDatabaseSQLite", "write",
+     lambda c, r: c.db.update_user_weight(c.pick(r)[1], round(r.uniform(55, 90), 1), {"bmi": 24.0, "status": "正常"})),
+    ("update_meal_status", "HealthDatabaseSQLite", "write",
+     lambda c, r: c.db.update_meal_status(c.pick(r)[1], r.choice(HealthDatabaseSQLite.MEAL_TYPES), "吃了", r.choice(FOODS))),
+    ("update_exercise_status", "HealthDatabaseSQLite", "write",
+     lambda c, r: c.db.update_exercise_status(c.pick(r)[1], "已运动", "跑步30分钟")),
+    ("ensure_daily_record_exists", "HealthDatabaseSQLite", "write",
+     lambda c, r: c.db.ensure_daily_record_exists(c.pick(r)[1], date.today().isoformat())),
+    ("add_drink", "HealthDatabaseSQLite", "write", lambda c, r: c.db.add_drink(c.pick(r)[1])),
+    ("set_drink_status", "HealthDatabaseSQLite", "write",
+     lambda c, r: c.db.set_drink_status(c.pick(r)[1], drink_number=r.randint(0, 8), drink_plan=8)),
+    ("update_daily_plan", "HealthDatabaseSQLite", "write",
+     lambda c, r: c.db.update_daily_plan(c.pick(r)[1], food_plan=["午餐：鸡胸肉沙拉"], movement_plan=["游泳30分钟"])),
+    ("update_daily_summary", "HealthDatabaseSQLite", "write",
+     lambda c, r: c.db.update_daily_summary(c.pick(r)[1], "今天表现不错")),
+    ("update_daily_negative_factors", "HealthDatabaseSQLite", "write",
+     lambda c, r: c.db.update_daily_negative_factors(c.pick(r)[1], {"factors": []})),
+    ("add_negative_factor", "HealthDatabaseSQLite", "write",
+     lambda c, r: c.db.add_negative_factor(c.pick(r)[1], {"factor_type": "工作", "description": "加班", "status": "recovered"})),
+    ("save_user_to_db", "HealthDatabaseSQLite", "write", lambda c, r: c.db.save_user_to_db(_new_profile(c, r))),
+    ("delete_user", "HealthDatabaseSQLite", "write", _delete_created),
+    ("manager.create_user_profile", "UserManagerSQLite", "write",
+     lambda c, r: c.manager.create_user_profile(_new_manager_profile(c, r))),
+    ("manager.get_user_by_nickname", "UserManagerSQLite", "read",
+     lambda c, r: c.manager.get_user_by_nickname(c.pick(r)[0])),
+    ("manager.update_user_weight", "UserManagerSQLite", "write",
+     lambda c, r: c.manager.update_user_weight(c.pick(r)[0], round(r.uniform(55, 90), 1))),
+    ("manager.add_weight_record", "UserManagerSQLite", "write",
+     lambda c, r: c.manager.add_weight_record(c.pick(r)[1], round(r.uniform(55, 90), 1), 24.0, "正常")),
+    ("manager.get_weight_history", "UserManagerSQLite", "read",
+     lambda c, r: c.manager.get_weight_history(c.pick(r)[0], 30)),
+    ("manager.get_all_users", "UserManagerSQLite", "read", lambda c, r: c.manager.get_all_users()),
+]
+
+
+def _summarize(case: Tuple, mode: str, threads: int, latencies: List[float], errors: int,
+               elapsed: float) -> Dict[str, Any]:
+    """把一组延迟样本整理成一行结果（微秒）"""
+    name, target, kind, _ = case
+    latencies.sort()
+    count = len(latencies)
+
+    def percentile(p):
+        return round(latencies[min(count - 1, int(count * p))] * 1e6, 1) if count else 0.0
+
+    return {
+        "case": name,
+        "target": target,
+        "kind": kind,
+        "mode": mode,
+        "threads": threads,
+        "ops": count,
+        "ops_per_s": round(count / elapsed, 1) if elapsed else 0.0,
+        "mean_us": round(sum(latencies) / count * 1e6, 1) if count else 0.0,
+        "p50_us": percentile(0.50),
+        "p95_us": percentile(0.95),
+        "p99_us": percentile(0.99),
+        "errors": errors,
+    }
+
+
+def _run_case(ctx: BenchmarkContext, case: Tuple, iterations: int, threads: int, seed: int) -> Dict[str, Any]:
+    """在 threads 个线程中共执行 iterations 次用例（threads=1 即单线程）"""
+    func = case[3]
+    per_thread = max(1, iterations // threads)
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(index: int):
+        rng = random.Random(seed * 1000 + index)
+        local, failed = [], 0
+        barrier.wait()
+        for _ in range(per_thread):
+            begin = time.perf_counter()
+            try:
+                result = func(ctx, rng)
+                if result is False or result is None and case[2] == "write":
+                    failed += 1
+            except Exception:
+                failed += 1
+            local.append(time.perf_counter() - begin)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    # 工作线程的连接随线程结束不再使用，关闭避免积累
+    ctx.db.pool.close_all()
+
+    return _summarize(case, "single" if threads == 1 else "concurrent", threads, latencies, errors[0], elapsed)
+
+
+def run_benchmark_suite(users: int = 100, months: int = 6, threads: int = 8, iterations: int = 500,
+                        db_path: str = None, cases: List[str] = None) -> Dict[str, Any]:
+    """
+    生成合成数据并测试所有用例（先单线程，再 threads 个线程并发）
+
+    Args:
+        users: 合成用户数
+        months: 合成数据月数
+        threads: 并发测试的线程数
+        iterations: 每个用例每种模式的执行次数
+        db_path: 测试数据库路径（默认在临时目录中生成，测试后删除）
+        cases: 只运行指定名称的用例
+
+    Returns:
+        报告（meta + results）
+    """
+    selected = [case for case in BENCHMARK_CASES if not cases or case[0] in cases]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = db_path or os.path.join(tmp, "benchmark.db")
+        build_start = time.perf_counter()
+        nicknames = generate_benchmark_dataset(db_path, users, months)
+        build_seconds = time.perf_counter() - build_start
+
+        ctx = BenchmarkContext(db_path, nicknames)
+        results = []
+        try:
+            # 方法内部的打印和日志会严重影响计时
+            logging.disable(logging.CRITICAL)
+            with contextlib.redirect_stdout(io.StringIO()):
+                for seed, case in enumerate(selected):
+                    results.append(_run_case(ctx, case, iterations, 1, seed))
+                    results.append(_run_case(ctx, case, iterations, threads, seed))
+        finally:
+            logging.disable(logging.NOTSET)
+            ctx.close()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "users": users,
+            "months": months,
+            "threads": threads,
+            "iterations": iterations,
+            "dataset_seconds": round(build_seconds, 2),
+        },
+        "results": results,
+    }
+    print_report(report)
+    return report
+
+
+def _git_commit() -> str:
+    """当前代码的提交号（不在git仓库中时为 unknown）"""
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return output.stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """打印报告表格"""
+    meta = report["meta"]
+    print("\n" + "=" * 100)
+    print(f"📊 数据库层性能测试  提交 {meta['commit']}  {meta['users']}用户×{meta['months']}个月  "
+          f"并发{meta['threads']}线程  SQLite {meta['sqlite']}")
+    print("=" * 100)
+    print(f"{'用例':<34}{'模式':<12}{'操作/秒':>10}{'P50(us)':>10}{'P95(us)':>10}{'P99(us)':>10}{'错误':>6}")
+    for r in report["results"]:
+        print(f"{r['case']:<34}{r['mode']:<12}{r['ops_per_s']:>10}{r['p50_us']:>10}{r['p95_us']:>10}"
+              f"{r['p99_us']:>10}{r['errors']:>6}")
+    print("=" * 100)
+
+
+def write_reports(report: Dict[str, Any], out_dir: str = "benchmark_reports") -> Tuple[str, str]:
+    """
+    写出JSON和CSV报告，文件名包含提交号和时间
+
+    Returns:
+        (JSON路径, CSV路径)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    meta = report["meta"]
+    stem = f"db_benchmark_{meta['commit']}_{meta['timestamp'].replace(':', '').replace('-', '')}"
+    json_path = os.path.join(out_dir, f"{stem}.json")
+    csv_path = os.path.join(out_dir, f"{stem}.csv")
+
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=["commit", "timestamp"] + list(report["results"][0]))
+        writer.writeheader()
+        for row in report["results"]:
+            writer.writerow({"commit": meta["commit"], "timestamp": meta["timestamp"], **row})
+
+    print(f"💾 报告已保存: {json_path}, {csv_path}")
+    return json_path, csv_path
+
+
+def compare_reports(old_path: str, new_path: str, threshold: float = 1.2) -> List[Dict[str, Any]]:
+    """
+    对比两份JSON报告的P50延迟和吞吐量
+
+    Args:
+        old_path: 基准报告
+        new_path: 新报告
+        threshold: P50变慢超过这个倍数时标记为退化
+
+    Returns:
+        每个用例的对比结果
+    """
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    old_rows = {(r["case"], r["mode"]): r for r in old["results"]}
+    rows = []
+
+    print(f"\n🔍 对比 {old['meta']['commit']} → {new['meta']['commit']}")
+    print(f"{'用例':<34}{'模式':<12}{'P50旧':>10}{'P50新':>10}{'变化':>9}{'吞吐变化':>10}")
+    for r in new["results"]:
+        before = old_rows.get((r["case"], r["mode"]))
+        if before is None:
+            continue
+        ratio = r["p50_us"] / before["p50_us"] if before["p50_us"] else 0.0
+        throughput = r["ops_per_s"] / before["ops_per_s"] if before["ops_per_s"] else 0.0
+        regressed = ratio > threshold
+        rows.append({"case": r["case"], "mode": r["mode"], "p50_ratio": round(ratio, 2),
+                     "throughput_ratio": round(throughput, 2), "regressed": regressed})
+        print(f"{r['case']:<34}{r['mode']:<12}{before['p50_us']:>10}{r['p50_us']:>10}"
+              f"{ratio:>8.2f}x{throughput:>9.2f}x{' ⚠️' if regressed else ''}")
+
+    regressions = sum(1 for row in rows if row["regressed"])
+    print(f"\n{'⚠️ ' + str(regressions) + '个用例P50变慢超过' + str(threshold) + '倍' if regressions else '✅ 没有明显退化'}")
+    return rows
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3 and sys.argv[1] == "compare":
+        found = compare_reports(sys.argv[2], sys.argv[3])
+        sys.exit(1 if any(row["regressed"] for row in found) else 0)
+    elif len(sys.argv) > 1 and sys.argv[1] == "run":
+        args = [int(value) for value in sys.argv[2:5]]
+        write_reports(run_benchmark_suite(*args))
+    else:
+        print("用法: python db_benchmark.py run [用户数] [月数] [线程数]")
+        print("      python db_benchmark.py compare 旧报告.json 新报告.json")
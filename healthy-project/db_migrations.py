@@ -0,0 +1,415 @@
+# db_migrations.py
+"""
+数据库结构版本管理
+索引变更按版本号依次执行，当前版本记录在 PRAGMA user_version 中，每个版本在一个事务里完成。
+同时提供热点查询的执行计划检查（出现全表扫描或临时B树排序即视为退化）和百万行数据下的延迟测试
+
+用法：
+    python db_migrations.py                  # 把 health_assistant.db 升级到最新版本
+    python db_migrations.py check [数据库]    # 检查热点查询的执行计划
+    python db_migrations.py benchmark [行数]  # 合成数据上对比升级前后的查询延迟
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import tempfile
+import logging
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from analytics import create_summary_tables, drop_summary_triggers, rebuild_weekly_summaries
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_weekly_summaries(conn: sqlite3.Connection) -> None:
+    """按当前的聚合规则重新创建周汇总触发器并重算汇总表（汇总表不存在时创建并回填，不提交）"""
+    drop_summary_triggers(conn)
+    if not create_summary_tables(conn):
+        rebuild_weekly_summaries(conn, commit=False)
+
+
+# 对话历史表：每条消息一行，只追加不重写（建表见 database.create_tables，索引见版本6）
+HISTORY_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS daily_history_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        record_date TEXT NOT NULL,
+        entry TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )"""
+
+
+def move_daily_history(conn: sqlite3.Connection) -> None:
+    """
+    把 daily_records.daily_history 列中已有的JSON数组拆成 daily_history_entries 表的多行，
+    然后清空该列（不提交）；直接对旧数据库执行迁移时顺便建表
+    """
+    conn.execute(HISTORY_TABLE_SQL)
+    rows = conn.execute("""SELECT user_id, record_date, daily_history FROM daily_records
+                           WHERE daily_history IS NOT NULL ORDER BY user_id, record_date""").fetchall()
+    for user_id, record_date, history in rows:
+        try:
+            entries = json.loads(history)
+        except ValueError:
+            logger.warning(f"⚠️ 无法解析的对话历史，跳过: 用户{user_id} {record_date}")
+            continue
+        conn.executemany("INSERT INTO daily_history_entries (user_id, record_date, entry) VALUES (?, ?, ?)",
+                         [(user_id, record_date, json.dumps(entry, ensure_ascii=False))
+                          for entry in entries or []])
+    conn.execute("UPDATE daily_records SET daily_history = NULL WHERE daily_history IS NOT NULL")
+
+
+# (版本号, 说明, 步骤列表)：步骤为SQL语句，或接收连接的函数（例如需要重建触发器和汇总数据的变更）
+SCHEMA_MIGRATIONS: List[Tuple[int, str, List[Union[str, Callable[[sqlite3.Connection], None]]]]] = [
+    (1, "初始索引", [
+        "CREATE INDEX IF NOT EXISTS idx_weight_user_date ON weight_history(user_id, recorded_date)",
+        "CREATE INDEX IF NOT EXISTS idx_daily_user_date ON daily_records(user_id, record_date)",
+        "CREATE INDEX IF NOT EXISTS idx_factors_user_status ON negative_factors(user_id, status)",
+        "CREATE INDEX IF NOT EXISTS idx_users_nickname ON users(nickname)",
+    ]),
+    (2, "热点查询覆盖索引，删除重复索引", [
+        # 体重历史：按日期倒序取最近N条只读索引；包含id，周汇总触发器按 (日期, id) 取周初/周末体重也不需要排序
+        """CREATE INDEX IF NOT EXISTS idx_weight_user_date_cover
+           ON weight_history(user_id, recorded_date, id, weight_kg, bmi, bmi_status, recorded_at)""",
+        "DROP INDEX IF EXISTS idx_weight_user_date",
+        # 进行中的负面因子：部分索引只包含 status='active' 的行，按开始日期排好序并覆盖查询列
+        # （WHERE 中用到的 status 也要在索引里，查询才不需要回表）
+        """CREATE INDEX IF NOT EXISTS idx_factors_active_cover
+           ON negative_factors(user_id, start_date, factor_type, severity, duration_days, should_exercise,
+                               description, status)
+           WHERE status = 'active'""",
+        "DROP INDEX IF EXISTS idx_factors_user_status",
+        # UNIQUE(nickname)、UNIQUE(user_id, record_date) 已经自动建有相同的索引
+        "DROP INDEX IF EXISTS idx_users_nickname",
+        "DROP INDEX IF EXISTS idx_daily_user_date",
+    ]),
+    (3, "负面因子外键索引", [
+        # 删除用户（以及 INSERT OR REPLACE 更新档案）会级联删除负面因子，
+        # 部分索引不能用于外键查找，没有这个索引时每次都要扫描整张表
+        "CREATE INDEX IF NOT EXISTS idx_factors_user ON negative_factors(user_id)",
+    ]),
+    (4, "数据库作为主存储：每日记录和档案的完整字段", [
+        # 对话历史和没有对应列的字段（JSON文本）保存在数据库里，JSON文件只用于导出（见 repository.py）
+        "ALTER TABLE daily_records ADD COLUMN daily_history TEXT",
+        "ALTER TABLE daily_records ADD COLUMN extra TEXT",
+        "ALTER TABLE users ADD COLUMN extra TEXT",
+    ]),
+    (5, "周活动汇总把 '吃了N次' 也算作吃了这一餐", [
+        # 触发器里嵌入了聚合语句，需要删除后重新创建，再按新规则重算已有的汇总
+        refresh_weekly_summaries,
+    ]),
+    (6, "对话历史单独成表，每条消息追加一行", [
+        # 每条消息只插入一行，不再重写整天的记录和完整的历史JSON
+        move_daily_history,
+        "CREATE INDEX IF NOT EXISTS idx_history_user_date ON daily_history_entries(user_id, record_date, id)",
+    ]),
+]
+
+LATEST_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """读取数据库当前的结构版本"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn: sqlite3.Connection, target: int = None) -> List[int]:
+    """
+    把数据库升级到目标版本（表需要已经创建）
+
+    Args:
+        conn: 数据库连接
+        target: 目标版本（默认最新版本）
+
+    Returns:
+        本次执行的版本号列表
+    """
+    target = LATEST_VERSION if target is None else target
+    current = get_schema_version(conn)
+    applied = []
+
+    if conn.in_transaction:
+        conn.commit()
+
+    for version, description, statements in SCHEMA_MIGRATIONS:
+        if version <= current or version > target:
+            continue
+
+        conn.execute("BEGIN")
+        try:
+            for step in statements:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        applied.append(version)
+        logger.info(f"✅ 数据库结构升级到版本 {version}: {description}")
+
+    return applied
+
+
+# 热点查询（与 database.py / analytics.py 中的语句保持一致）
+# (名称, SQL, 参数, 是否允许全表扫描)
+HOT_QUERIES: List[Tuple[str, str, tuple, bool]] = [
+    ("昵称查用户ID", "SELECT id FROM users WHERE nickname = ?", ("用户00001",), False),
+    ("昵称查用户档案", "SELECT * FROM users WHERE nickname = ?", ("用户00001",), False),
+    ("用户列表", """
+        SELECT id, nickname, age, gender, height_cm, current_weight_kg, bmi, bmi_status, goal
+        FROM users ORDER BY nickname""", (), True),
+    ("最近体重记录", """
+        SELECT weight_kg, bmi, bmi_status, recorded_date, recorded_at
+        FROM weight_history WHERE user_id = ? ORDER BY recorded_date DESC LIMIT ?""", (1, 10), False),
+    ("一周内首次称重", """
+        SELECT weight_kg FROM weight_history
+        WHERE user_id = ? AND recorded_date >= ? AND recorded_date < date(?, '+7 days')
+        ORDER BY recorded_date, id LIMIT 1""", (1, "2024-01-01", "2024-01-01"), False),
+    ("今日计划", """
+        SELECT food_plan, movement_plan, breakfast_status, lunch_status, dinner_status,
+               drink_plan, drink_number, exercise_status
+        FROM daily_records WHERE user_id = ? AND record_date = ?""", (1, "2024-01-01"), False),
+    ("一周每日记录", """
+        SELECT COUNT(*) FROM daily_records
+        WHERE user_id = ? AND record_date >= ? AND record_date < date(?, '+7 days')""",
+     (1, "2024-01-01", "2024-01-01"), False),
+    ("按日期范围读取每日记录", """
+        SELECT record_date, breakfast_status, breakfast_details, food_plan, movement_plan, extra
+        FROM daily_records WHERE user_id = ? AND record_date BETWEEN ? AND ?
+        ORDER BY record_date""", (1, "2024-01-01", "2024-01-31"), False),
+    ("按因子识别负面因子", """
+        UPDATE negative_factors SET status = status
+        WHERE user_id = ? AND factor_type = ? AND description = ? AND start_date = ?""",
+     (1, "生病", "感冒", "2024-01-01"), False),
+    ("进行中的负面因子", """
+        SELECT id, factor_type, description, severity, duration_days, should_exercise, start_date
+        FROM negative_factors WHERE user_id = ? AND status = 'active' ORDER BY start_date""", (1,), False),
+    ("当天对话历史", """
+        SELECT entry FROM daily_history_entries
+        WHERE user_id = ? AND record_date = ? ORDER BY id""", (1, "2024-01-01"), False),
+    ("最近几条对话历史", """
+        SELECT entry FROM daily_history_entries
+        WHERE user_id = ? AND record_date = ? ORDER BY id DESC LIMIT ?""", (1, "2024-01-01", 10), False),
+    ("周体重趋势", """
+        SELECT week_start, weigh_ins, min_weight_kg, max_weight_kg, avg_weight_kg, first_weight_kg, last_weight_kg
+        FROM weekly_weight_summary WHERE user_id = ? ORDER BY week_start DESC LIMIT ?""", (1, 12), False),
+    ("周坚持情况趋势", """
+        SELECT * FROM weekly_activity_summary WHERE user_id = ? ORDER BY week_start DESC LIMIT ?""",
+     (1, 12), False),
+]
+
+
+def explain(conn: sqlite3.Connection, sql: str, params: tuple = ()) -> List[str]:
+    """返回查询计划的每一步描述"""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+
+def check_query_plans(conn: sqlite3.Connection, verbose: bool = True) -> List[Dict[str, Any]]:
+    """
+    检查热点查询的执行计划
+
+    以下情况视为退化：
+    - SCAN 整张表（不允许全表扫描的查询）
+    - USE TEMP B-TREE（需要额外排序或分组）
+    - 当前结构版本还没有查询用到的表或列
+
+    Returns:
+        有问题的查询列表，全部正常时为空
+    """
+    problems = []
+
+    for name, sql, params, allow_scan in HOT_QUERIES:
+        try:
+            plan = explain(conn, sql, params)
+        except sqlite3.OperationalError as e:
+            plan, issues = [], [f"无法执行: {e}"]
+        else:
+            issues = [step for step in plan if "TEMP B-TREE" in step]
+            if not allow_scan:
+                issues += [step for step in plan if step.startswith("SCAN ")]
+
+        if issues:
+            problems.append({"query": name, "plan": plan, "issues": issues})
+
+        if verbose:
+            print(f"{'❌' if issues else '✅'} {name}")
+            for step in plan or issues:
+                print(f"      {step}")
+
+    return problems
+
+
+def _build_synthetic_db(db_path: str, weight_rows: int) -> Dict[str, int]:
+    """
+    生成合成数据库：weight_rows 条体重记录平均分给各用户（每人每天一条），
+    每个用户一年的每日记录、最近一个月的对话历史和若干负面因子
+    """
+    from database import HealthDatabaseSQLite
+    from analytics import drop_summary_triggers, rebuild_weekly_summaries
+
+    db = HealthDatabaseSQLite(db_path)
+    db.connect()
+    # 先停在最早的索引结构，之后升级做前后对比
+    db.create_tables(schema_version=1)
+    conn = db.conn
+    drop_summary_triggers(conn)
+    conn.commit()
+
+    users = max(1, weight_rows // 1000)
+    days = weight_rows // users
+    start = date(2022, 1, 1)
+    rng = random.Random(42)
+
+    conn.executemany("INSERT INTO users (nickname, age, gender, height_cm, current_weight_kg) VALUES (?, 30, '女', 165, 70)",
+                     [(f"用户{i:05d}",) for i in range(users)])
+    conn.executemany(
+        "INSERT INTO weight_history (user_id, weight_kg, bmi, bmi_status, recorded_date) VALUES (?, ?, 25.0, '超重', ?)",
+        ((user_id, round(70 + rng.uniform(-2, 2), 1), (start + timedelta(days=day)).isoformat())
+         for user_id in range(1, users + 1) for day in range(days)))
+    conn.executemany(
+        "INSERT INTO daily_records (user_id, record_date, breakfast_status, exercise_status) VALUES (?, ?, '吃了', ?)",
+        ((user_id, (start + timedelta(days=day)).isoformat(), "已运动" if day % 3 else "没运动")
+         for user_id in range(1, users + 1) for day in range(min(days, 365))))
+    conn.executemany(
+        """INSERT INTO negative_factors (user_id, factor_type, description, severity, status, start_date)
+           VALUES (?, '身体不适', '感冒', '轻', ?, ?)""",
+        ((user_id, "active" if i % 5 == 0 else "recovered", (start + timedelta(days=i * 7)).isoformat())
+         for user_id in range(1, users + 1) for i in range(20)))
+    conn.executemany(
+        "INSERT INTO daily_history_entries (user_id, record_date, entry) VALUES (?, ?, ?)",
+        ((user_id, (start + timedelta(days=day)).isoformat(), f'{{"role": "user", "content": "第{i}条"}}')
+         for user_id in range(1, users + 1) for day in range(min(days, 30)) for i in range(10)))
+    rebuild_weekly_summaries(conn, commit=False)
+    conn.commit()
+
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ("users", "weight_history", "daily_records", "daily_history_entries", "negative_factors")}
+    db.disconnect()
+    return counts
+
+
+def _time_queries(conn: sqlite3.Connection, repeat: int) -> Dict[str, float]:
+    """每个热点查询执行 repeat 次（用户随机），返回P50延迟（微秒）；当前结构版本执行不了的查询跳过"""
+    user_count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    rng = random.Random(1)
+    timings = {}
+
+    for name, sql, params, allow_scan in HOT_QUERIES:
+        # 扫描类查询只跑几次
+        runs = 5 if allow_scan else repeat
+        samples = []
+        for _ in range(runs):
+            user_id = rng.randint(1, user_count)
+            args = tuple(user_id if i == 0 and isinstance(p, int) else
+                         f"用户{user_id - 1:05d}" if isinstance(p, str) and p.startswith("用户") else p
+                         for i, p in enumerate(params))
+            begin = time.perf_counter()
+            try:
+                conn.execute(sql, args).fetchall()
+            except sqlite3.OperationalError:
+                break
+            samples.append(time.perf_counter() - begin)
+        if samples:
+            samples.sort()
+            timings[name] = samples[len(samples) // 2] * 1e6
+
+    return timings
+
+
+def benchmark_migrations(weight_rows: int = 1_000_000, repeat: int = 2000, rounds: int = 3) -> List[Dict[str, Any]]:
+    """
+    在合成数据库上对比结构版本1（原有索引）和最新版本的热点查询延迟与执行计划
+
+    生成数据后复制一份保留版本1，另一份升级到最新版本，两边轮流计时多轮，每个查询取各轮中最好的P50，
+    减少缓存预热顺序和机器抖动的影响
+
+    Args:
+        weight_rows: 体重记录行数
+        repeat: 每轮每个查询的执行次数
+        rounds: 轮数
+
+    Returns:
+        每个查询升级前后的P50延迟（微秒）
+    """
+    from db_pool import create_connection
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        old_path = os.path.join(tmp, "bench_v1.db")
+        print(f"🏗️  生成合成数据（{weight_rows:,} 条体重记录）...")
+        build_start = time.perf_counter()
+        counts = _build_synthetic_db(db_path, weight_rows)
+        shutil.copyfile(db_path, old_path)
+        print(f"   {counts}，{time.perf_counter() - build_start:.1f} 秒")
+
+        old_conn = create_connection(old_path)
+        conn = create_connection(db_path)
+        migrate_start = time.perf_counter()
+        apply_migrations(conn)
+        print(f"🔧 升级到版本 {get_schema_version(conn)}，{time.perf_counter() - migrate_start:.1f} 秒")
+
+        print("\n📋 版本1执行计划：")
+        problems_before = check_query_plans(old_conn)
+        print(f"\n📋 版本{LATEST_VERSION}执行计划：")
+        problems_after = check_query_plans(conn)
+
+        before: Dict[str, float] = {}
+        after: Dict[str, float] = {}
+        for _ in range(rounds):
+            for timings, connection in ((before, old_conn), (after, conn)):
+                for name, value in _time_queries(connection, repeat).items():
+                    timings[name] = min(value, timings.get(name, value))
+
+        size = os.path.getsize(db_path)
+        old_conn.close()
+        conn.close()
+
+    # 版本1执行不了的查询（用到后来才加的列）只有新版本的延迟
+    results = [{"query": name, "before_us": round(before[name], 1) if name in before else None,
+                "after_us": round(after[name], 1)}
+               for name in after]
+
+    print("\n" + "=" * 64)
+    print(f"📊 热点查询P50延迟（微秒，{weight_rows:,} 条体重记录，数据库 {size / 1e6:.0f}MB）")
+    print("=" * 64)
+    print(f"{'查询':<20}{'版本1':>12}{f'版本{LATEST_VERSION}':>12}{'加速':>10}")
+    for r in results:
+        if r["before_us"] is None:
+            print(f"{r['query']:<20}{'-':>12}{r['after_us']:>12}{'-':>10}")
+            continue
+        speedup = r["before_us"] / r["after_us"] if r["after_us"] else 0
+        print(f"{r['query']:<20}{r['before_us']:>12}{r['after_us']:>12}{speedup:>9.1f}x")
+    print("=" * 64)
+    print(f"执行计划问题：版本1 {len(problems_before)} 个，版本{LATEST_VERSION} {len(problems_after)} 个")
+
+    return results
+
+
+if __name__ == "__main__":
+    from db_pool import create_connection
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+
+    if command == "benchmark":
+        benchmark_migrations(int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000)
+    elif command == "check":
+        connection = create_connection(sys.argv[2] if len(sys.argv) > 2 else "health_assistant.db")
+        found = check_query_plans(connection)
+        connection.close()
+        print(f"\n{'❌ 发现' + str(len(found)) + '个退化的查询' if found else '✅ 所有热点查询都使用了索引'}")
+        sys.exit(1 if found else 0)
+    else:
+        connection = create_connection("health_assistant.db")
+        versions = apply_migrations(connection)
+        print(f"✅ 数据库结构版本: {get_schema_version(connection)}（本次执行 {versions or '无'}）")
+        connection.close()
@@ -0,0 +1,261 @@
+# db_pool.py
+"""
+SQLite连接池
+统一创建连接（WAL日志、synchronous=NORMAL、缓存/内存映射、busy_timeout），
+每个线程使用自己的连接：WAL模式下读操作不会阻塞写操作，多个聊天会话可以同时访问数据库。
+HealthDatabaseSQLite、db_bridge、UserManagerSQLite、view_db 都通过这里获取连接
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import tempfile
+import logging
+from typing import Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+# 默认连接参数
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",       # 读写并发：读不阻塞写，写不阻塞读
+    "synchronous": "NORMAL",     # WAL下NORMAL已经保证不会损坏数据库，只在断电时可能丢失最后的事务
+    "foreign_keys": "ON",
+    "cache_size": -16000,        # 负数表示KB，约16MB页缓存
+    "mmap_size": 134217728,      # 128MB内存映射读取
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,        # 写锁被占用时最多等待5秒，而不是立即报 database is locked
+}
+
+
+def create_connection(db_path: str, pragmas: Dict[str, Any] = None) -> sqlite3.Connection:
+    """
+    创建一个配置好的SQLite连接
+
+    Args:
+        db_path: 数据库文件路径
+        pragmas: 覆盖默认的PRAGMA设置
+
+    Returns:
+        sqlite3连接（行工厂为sqlite3.Row）
+    """
+    settings = dict(DEFAULT_PRAGMAS)
+    settings.update(pragmas or {})
+
+    # busy_timeout同时交给驱动，保证连接建立阶段也会等待
+    conn = sqlite3.connect(db_path, timeout=settings["busy_timeout"] / 1000)
+    conn.row_factory = sqlite3.Row
+
+    for name, value in settings.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+    return conn
+
+
+class SQLiteConnectionPool:
+    """按线程分配连接的连接池（同一线程内复用同一个连接）"""
+
+    def __init__(self, db_path: str, pragmas: Dict[str, Any] = None):
+        """
+        初始化连接池
+
+        Args:
+            db_path: 数据库文件路径
+            pragmas: 覆盖默认的PRAGMA设置
+        """
+        self.db_path = db_path
+        self.pragmas = pragmas
+        self._local = threading.local()
+        self._connections: Dict[int, sqlite3.Connection] = {}
+        self._lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        """获取当前线程的连接（第一次调用时创建）"""
+        conn = getattr(self._local, "conn", None)
+
+        if conn is None:
+            conn = create_connection(self.db_path, self.pragmas)
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
+            with self._lock:
+                self._connections[threading.get_ident()] = conn
+
+        return conn
+
+    def cursor(self) -> sqlite3.Cursor:
+        """获取当前线程连接上的共享游标"""
+        self.connection()
+        return self._local.cursor
+
+    def close_thread(self) -> None:
+        """关闭当前线程的连接（之后再次使用会自动重新创建）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+
+        self._local.cursor.close()
+        conn.close()
+        self._local.conn = None
+        self._local.cursor = None
+        with self._lock:
+            self._connections.pop(threading.get_ident(), None)
+
+    def close_all(self) -> None:
+        """关闭所有线程的连接（用于程序退出）"""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                # 连接属于其他线程，进程退出时会被回收
+                pass
+        self._local = threading.local()
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+
+_pools: Dict[str, SQLiteConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str = "health_assistant.db") -> SQLiteConnectionPool:
+    """
+    获取数据库文件对应的连接池（同一个文件在进程内共享一个连接池）
+
+    Args:
+        db_path: 数据库文件路径
+    """
+    key = os.path.abspath(db_path) if db_path != ":memory:" else db_path
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = SQLiteConnectionPool(db_path)
+            _pools[key] = pool
+        return pool
+
+
+def _run_workload(make_conn, db_path: str, readers: int, writes: int, reads_per_reader: int) -> Dict[str, Any]:
+    """一个写线程加多个读线程同时运行，统计吞吐量和锁等待错误"""
+    errors = []
+    write_latency = []
+    read_count = [0]
+    count_lock = threading.Lock()
+    stop = threading.Event()
+
+    def writer():
+        conn = make_conn(db_path)
+        try:
+            for i in range(writes):
+                start = time.perf_counter()
+                try:
+                    conn.execute(
+                        "INSERT INTO weight_history (user_id, weight_kg, recorded_date) VALUES (?, ?, ?)",
+                        (i % 50 + 1, 60 + i % 10, f"2026-01-{i % 28 + 1:02d}"))
+                    conn.commit()
+                except sqlite3.OperationalError as e:
+                    errors.append(str(e))
+                write_latency.append(time.perf_counter() - start)
+        finally:
+            stop.set()
+            conn.close()
+
+    def reader():
+        conn = make_conn(db_path)
+        done = 0
+        try:
+            while done < reads_per_reader and not stop.is_set():
+                try:
+                    conn.execute(
+                        "SELECT COUNT(*), AVG(weight_kg) FROM weight_history WHERE user_id = ?",
+                        (done % 50 + 1,)).fetchone()
+                except sqlite3.OperationalError as e:
+                    errors.append(str(e))
+                done += 1
+        finally:
+            with count_lock:
+                read_count[0] += done
+            conn.close()
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    write_latency.sort()
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "writes_per_s": round(writes / elapsed, 1),
+        "reads_per_s": round(read_count[0] / elapsed, 1),
+        "write_p95_ms": round(write_latency[int(len(write_latency) * 0.95) - 1] * 1000, 3) if write_latency else 0,
+        "lock_errors": len(errors)
+    }
+
+
+def benchmark_connection_modes(readers: int = 4, writes: int = 500, reads_per_reader: int = 5000) -> List[Dict[str, Any]]:
+    """
+    对比原有连接方式（回滚日志、默认同步）和连接池配置
+
+    在临时数据库中运行：一个线程持续写入体重记录并逐条提交，多个线程同时查询
+
+    Returns:
+        每种配置的统计结果
+    """
+
+    def legacy_connection(path):
+        # 与原来 HealthDatabaseSQLite.connect 相同，只开启外键
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    modes = [
+        ("原有配置(回滚日志)", legacy_connection),
+        ("连接池(WAL+NORMAL)", create_connection),
+    ]
+
+    results = []
+
+    for label, make_conn in modes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "bench.db")
+
+            setup = make_conn(db_path)
+            setup.execute("""
+            CREATE TABLE weight_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                weight_kg REAL NOT NULL,
+                recorded_date TEXT NOT NULL
+            )""")
+            setup.execute("CREATE INDEX idx_weight_user_date ON weight_history(user_id, recorded_date)")
+            setup.executemany(
+                "INSERT INTO weight_history (user_id, weight_kg, recorded_date) VALUES (?, ?, ?)",
+                [(i % 50 + 1, 60.0, "2026-01-01") for i in range(20000)])
+            setup.commit()
+            setup.close()
+
+            result = _run_workload(make_conn, db_path, readers, writes, reads_per_reader)
+            result["mode"] = label
+            results.append(result)
+
+    print("\n" + "=" * 78)
+    print(f"📊 SQLite连接配置对比（1个写线程 + {readers}个读线程，写入{writes}次）")
+    print("=" * 78)
+    print(f"{'配置':<20}{'耗时(s)':>9}{'写入/秒':>10}{'读取/秒':>11}{'写P95(ms)':>12}{'锁错误':>8}")
+    for r in results:
+        print(f"{r['mode']:<20}{r['elapsed_s']:>9}{r['writes_per_s']:>10}{r['reads_per_s']:>11}"
+              f"{r['write_p95_ms']:>12}{r['lock_errors']:>8}")
+    print("=" * 78)
+
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_connection_modes()
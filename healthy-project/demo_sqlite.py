@@ -156,6 +156,11 @@ def demonstrate_performance():
     print("  3. 关联查询用户的多维度数据")
     print("  4. 保证数据操作的原子性")
 
+    choice = input("\n是否在合成数据上实际测试各数据库方法的性能？(y/N): ").lower()
+    if choice == 'y':
+        from db_benchmark import run_benchmark_suite
+        run_benchmark_suite(users=20, months=3, threads=4, iterations=200)
+
 
 def main():
     """主演示函数"""
@@ -1,69 +1,86 @@
 import os
-import json
 import datetime
 from typing import Dict, List, Any, Optional
 import logging
 from openai import OpenAI
+from First_Entry import get_user_profile, load_profiles
+from record_serializer import list_record_files, read_record_fields
 
 
 class WeightLossJourneyAnalyzer:
     """减肥历程分析器 - 在用户达到目标体重时自动调用"""
 
-    def __init__(self, openai_client: OpenAI, daily_records_dir: str = "daily_records"):
+    def __init__(self, openai_client: OpenAI, daily_records_dir: str = "daily_records", recorder=None):
         """
         初始化分析器
 
         Args:
             openai_client: OpenAI客户端实例
             daily_records_dir: 每日记录目录
+            recorder: DailyHealthRecorder实例（提供时按其目录布局读取该用户的记录）
         """
         self.client = openai_client
         self.daily_records_dir = daily_records_dir
-        self.profiles_file = "user_profiles.json"
+        self.recorder = recorder
 
         # 配置日志
         logging.getLogger("httpx").setLevel(logging.WARNING)
 
     def load_user_profile(self) -> Optional[Dict[str, Any]]:
-        """加载用户档案"""
+        """加载用户档案（通过 First_Entry 读取，档案保存在数据库时从数据库读取）"""
         try:
-            if not os.path.exists(self.profiles_file):
-                return None
-
-            with open(self.profiles_file, 'r', encoding='utf-8') as f:
-                profiles = json.load(f)
+            nickname = getattr(self.recorder, "user_id", None)
+            if nickname:
+                return get_user_profile(nickname)
 
             # 取第一个用户（一对一应用）
-            if profiles and isinstance(profiles, dict) and len(profiles) > 0:
-                user_key = list(profiles.keys())[0]
-                return profiles[user_key]
+            profiles = load_profiles()
+            if profiles and isinstance(profiles, dict):
+                return next(iter(profiles.values()))
             return None
 
         except Exception as e:
             logging.error(f"加载用户档案失败: {e}")
             return None
 
-    def load_all_daily_records(self) -> List[Dict[str, Any]]:
-        """加载所有每日记录（排除对话历史）"""
+    def load_all_daily_records(self, fields: List[str] = None) -> List[Dict[str, Any]]:
+        """
+        加载所有每日记录（排除对话历史）
+
+        Args:
+            fields: 只加载这些顶层字段（None表示除对话历史外的全部字段）
+
+        Returns:
+            每日记录列表
+        """
         daily_records = []
 
         try:
-            if not os.path.exists(self.daily_records_dir):
+            # 记录保存在数据库时一次查询读取，不读取对话历史列
+            repository = getattr(self.recorder, "repository", None)
+            if repository is not None:
+                daily_records = repository.load_records(self.recorder.user_id, fields=fields,
+                                                        exclude=["daily_history"])
+                for record in daily_records:
+                    for key in list(record.keys()):
+                        if isinstance(record.get(key), list) and len(record[key]) > 10:
+                            record[key] = record[key][:5]
+                return daily_records
+
+            # 获取所有记录文件（JSON / MessagePack / CBOR，自动识别格式）
+            if self.recorder is not None:
+                record_files = self.recorder.list_record_files()
+            elif os.path.exists(self.daily_records_dir):
+                record_files = list_record_files(self.daily_records_dir)
+            else:
                 return []
 
-            # 获取所有JSON文件
-            json_files = [f for f in os.listdir(self.daily_records_dir) if f.endswith('.json')]
-
-            for filename in sorted(json_files):
-                filepath = os.path.join(self.daily_records_dir, filename)
+            for date_str, filepath in record_files.items():
+                filename = os.path.basename(filepath)
 
                 try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        record = json.load(f)
-
-                    # 移除对话历史以简化数据
-                    if "daily_history" in record:
-                        del record["daily_history"]
+                    # 对话历史在读取时直接排除（MessagePack格式下不会被解码）
+                    record = read_record_fields(filepath, fields=fields, exclude=["daily_history"])
 
                     # 移除其他不必要的大字段
                     for key in list(record.keys()):
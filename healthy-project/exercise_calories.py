@@ -0,0 +1,164 @@
+# exercise_calories.py
+"""
+运动热量引擎（MET）
+消耗热量（千卡）= MET × 体重(kg) × 时长(小时)，MET 取《身体活动纲要》（Compendium of Physical Activities）
+中各项运动常见强度的数值；只有距离没有时长的记录，按该运动的典型速度折算时长。
+批量计算时把多条运动记录转换成数组，用 NumPy 一次算完，供运动周报、月报使用。
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+# 可选依赖：没有安装时批量计算逐条进行
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 运动类型 → MET
+EXERCISE_METS = {
+    "跑步": 9.8,
+    "步行": 3.5,
+    "骑行": 7.5,
+    "游泳": 8.0,
+    "跳绳": 12.3,
+    "瑜伽": 2.5,
+    "健身": 5.0,
+    "羽毛球": 5.5,
+    "篮球": 6.5,
+    "足球": 7.0,
+    "其他": 4.0,
+}
+
+# 典型速度（公里/小时），用于只有距离的记录
+EXERCISE_SPEEDS_KMH = {
+    "跑步": 9.0,
+    "步行": 5.0,
+    "骑行": 16.0,
+    "游泳": 2.5,
+}
+
+# 档案中没有体重时使用的体重（kg）
+DEFAULT_WEIGHT_KG = 60.0
+
+# 既没有时长也没有距离时按多少分钟估算
+DEFAULT_DURATION_MIN = 30
+
+
+def profile_weight(user_profile: Optional[Dict[str, Any]]) -> Optional[float]:
+    """从用户档案中取当前体重（kg），没有返回None"""
+    if not user_profile:
+        return None
+    for key in ("current_weight_kg", "weight_kg", "体重"):
+        try:
+            weight = float(user_profile.get(key) or 0)
+        except (TypeError, ValueError):
+            continue
+        if weight > 0:
+            return weight
+    return None
+
+
+class METCalorieEngine:
+    """基于 MET 的运动热量计算"""
+
+    def __init__(self, weight_kg: float = None, mets: Dict[str, float] = None,
+                 speeds_kmh: Dict[str, float] = None):
+        """
+        初始化引擎
+
+        Args:
+            weight_kg: 默认体重（kg），计算时没有指定体重就使用它
+            mets: 运动类型 → MET，默认 EXERCISE_METS
+            speeds_kmh: 运动类型 → 典型速度，默认 EXERCISE_SPEEDS_KMH
+        """
+        self.weight_kg = weight_kg
+        self.mets = dict(mets or EXERCISE_METS)
+        self.speeds_kmh = dict(speeds_kmh or EXERCISE_SPEEDS_KMH)
+        self.mets.setdefault("其他", EXERCISE_METS["其他"])
+
+        # 运动类型编号，批量计算时按编号取 MET 和速度
+        self.types = list(self.mets)
+        self.type_index = {ex_type: index for index, ex_type in enumerate(self.types)}
+        if np is not None:
+            self._met_array = np.array([self.mets[ex_type] for ex_type in self.types], dtype=np.float64)
+            self._speed_array = np.array([self.speeds_kmh.get(ex_type, 0.0) for ex_type in self.types],
+                                         dtype=np.float64)
+
+    def _weight(self, weight_kg: float = None) -> float:
+        return weight_kg or self.weight_kg or DEFAULT_WEIGHT_KG
+
+    def duration_minutes(self, ex_type: str, duration_min: float = None, distance_km: float = None) -> float:
+        """运动时长（分钟）：有时长直接用，只有距离时按典型速度折算，都没有时按默认时长"""
+        if duration_min:
+            return float(duration_min)
+        speed = self.speeds_kmh.get(ex_type, 0.0)
+        if distance_km and speed > 0:
+            return distance_km / speed * 60
+        return float(DEFAULT_DURATION_MIN)
+
+    def calories(self, ex_type: str, duration_min: float = None, distance_km: float = None,
+                 weight_kg: float = None) -> Dict[str, Any]:
+        """
+        计算一次运动的消耗
+
+        Returns:
+            {"total_calories", "duration_min", "met", "calculation_method", "explanation"}
+        """
+        met = self.mets.get(ex_type, self.mets["其他"])
+        weight = self._weight(weight_kg)
+        minutes = self.duration_minutes(ex_type, duration_min, distance_km)
+        total = met * weight * minutes / 60
+
+        if duration_min:
+            basis = f"{minutes:g}分钟"
+        elif distance_km and self.speeds_kmh.get(ex_type):
+            basis = f"{distance_km:g}公里（按{self.speeds_kmh[ex_type]:g}公里/小时约{minutes:.0f}分钟）"
+        else:
+            basis = f"按{DEFAULT_DURATION_MIN}分钟估算"
+
+        return {
+            "total_calories": int(total),
+            "duration_min": round(minutes, 1),
+            "met": met,
+            "calculation_method": "按MET计算",
+            "explanation": f"{ex_type}{basis}：MET {met:g} × {weight:g}kg × {minutes / 60:.2f}小时"
+        }
+
+    def calories_batch(self, types: Iterable[str], durations_min: Iterable[Optional[float]],
+                       distances_km: Iterable[Optional[float]], weights_kg: Iterable[Optional[float]] = None) -> List[float]:
+        """
+        批量计算多次运动的消耗（与逐条调用 calories 的未取整结果相同）
+
+        Args:
+            types: 运动类型
+            durations_min: 时长（分钟，可以为None）
+            distances_km: 距离（公里，可以为None）
+            weights_kg: 每次运动时的体重（默认都用引擎的体重）
+
+        Returns:
+            每次运动消耗的千卡（未取整）
+        """
+        types = list(types)
+        durations = [float(value or 0) for value in durations_min]
+        distances = [float(value or 0) for value in distances_km]
+        weights = [self._weight(value) for value in weights_kg] if weights_kg is not None else \
+            [self._weight()] * len(types)
+
+        if np is None or not types:
+            return [self.mets.get(ex_type, self.mets["其他"]) * weight *
+                    self.duration_minutes(ex_type, duration, distance) / 60
+                    for ex_type, duration, distance, weight in zip(types, durations, distances, weights)]
+
+        other = self.type_index["其他"]
+        codes = np.array([self.type_index.get(ex_type, other) for ex_type in types], dtype=np.int64)
+        duration_array = np.array(durations, dtype=np.float64)
+        distance_array = np.array(distances, dtype=np.float64)
+        speeds = self._speed_array[codes]
+
+        # 有时长用时长，只有距离时按典型速度折算，都没有时用默认时长
+        by_distance = (distance_array > 0) & (speeds > 0)
+        minutes = np.where(duration_array > 0, duration_array,
+                           np.where(by_distance, distance_array / np.where(by_distance, speeds, 1.0) * 60,
+                                    float(DEFAULT_DURATION_MIN)))
+        totals = self._met_array[codes] * np.array(weights, dtype=np.float64) * minutes / 60
+        return totals.tolist()
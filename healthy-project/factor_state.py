@@ -0,0 +1,270 @@
+# factor_state.py
+"""
+负面因子状态引擎
+负面因子按区间保存：锚定日期（最近一次写入记录的日期）的因子状态，加上从该日期开始逐日推算的严重程度表。
+任意日期的严重程度、持续天数和状态都直接查表得到，不需要每天复制因子、也不需要重新读取记录文件；
+活跃因子集合按日期缓存，因子有变化（新增、康复、修改天数）时重新锚定并清空缓存。
+
+推算规则与原来每天复制因子时相同：只有前一天仍为 active 的因子会延续到下一天，
+延续时持续天数 +1，再按类型和严重程度自动减轻（auto_reduce_severity）。
+"""
+
+import datetime
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# 不同类型的问题有不同的恢复时间（天）
+RECOVERY_TIMELINES = {
+    "受伤": {"轻": 3, "中": 7, "重": 14},
+    "生病": {"轻": 3, "中": 5, "重": 10},
+    "情绪": {"轻": 2, "中": 4, "重": 7},
+    "疲劳": {"轻": 2, "中": 3, "重": 5},
+    "其他": {"轻": 3, "中": 5, "重": 7}
+}
+
+SEVERITY_LEVELS = {"轻": 1, "中": 2, "重": 3}
+
+# 超过这个天数的活跃因子强制标记为康复，推算最多到这一天
+MAX_ACTIVE_DAYS = 30
+
+
+def auto_reduce_severity(factor: Dict[str, Any], on_date: str = None) -> None:
+    """
+    根据持续时间自动减轻负面因子的严重程度
+
+    规则：
+    - 轻度问题：3天后自动减轻或建议康复
+    - 中度问题：5天后自动减轻
+    - 重度问题：7天后自动减轻
+    - 超过14天：自动标记为"恢复中"
+    - 超过30天：自动康复
+
+    Args:
+        factor: 因子字典（就地修改）
+        on_date: 调整发生的日期 YYYY-MM-DD（默认今天）
+    """
+    on_date = on_date or datetime.datetime.now().strftime("%Y-%m-%d")
+    duration = factor.get("duration_days", 1)
+    current_severity = factor.get("severity", "轻")
+    factor_type = factor.get("type", "")
+
+    # 获取该类型问题的恢复时间
+    timeline = RECOVERY_TIMELINES.get(factor_type, RECOVERY_TIMELINES["其他"])
+    recovery_days = timeline.get(current_severity, 3)
+
+    # 记录原始值，用于大模型参考
+    if "original_severity" not in factor:
+        factor["original_severity"] = current_severity
+    if "original_start_date" not in factor:
+        factor["original_start_date"] = factor.get("start_date", "")
+
+    # 判断是否需要调整严重程度
+    if current_severity == "重":
+        if duration >= recovery_days:
+            # 重度问题达到恢复时间后降为中度
+            factor["severity"] = "中"
+            factor["severity_level"] = 2
+            factor["auto_reduced"] = True
+            factor["reduction_reason"] = f"持续{duration}天后自动减轻"
+            factor["reduction_date"] = on_date
+
+            # 如果是受伤，调整运动建议
+            if factor_type == "受伤":
+                factor["should_exercise"] = False  # 中度受伤仍不建议运动
+        elif duration >= recovery_days * 2:
+            # 两倍恢复时间后降为轻度
+            factor["severity"] = "轻"
+            factor["severity_level"] = 1
+            factor["auto_reduced"] = True
+            factor["reduction_reason"] = f"持续{duration}天后显著改善"
+
+            # 调整运动建议
+            factor["should_exercise"] = True  # 轻度可以适当运动
+
+    elif current_severity == "中":
+        if duration >= recovery_days:
+            # 中度问题达到恢复时间后降为轻度
+            factor["severity"] = "轻"
+            factor["severity_level"] = 1
+            factor["auto_reduced"] = True
+            factor["reduction_reason"] = f"持续{duration}天后自动减轻"
+
+            # 调整运动建议
+            factor["should_exercise"] = True  # 轻度可以适当运动
+        elif duration >= recovery_days * 1.5:
+            # 1.5倍恢复时间后建议确认康复
+            factor["status"] = "recovering"
+            factor["recovery_suggested"] = True
+            factor["recovery_reason"] = f"已持续{duration}天，建议确认是否已完全康复"
+
+    elif current_severity == "轻":
+        if duration >= recovery_days:
+            # 轻度问题达到恢复时间后建议确认康复
+            factor["status"] = "recovering"
+            factor["recovery_suggested"] = True
+            factor["recovery_reason"] = f"已持续{duration}天，建议确认是否已完全康复"
+        elif duration >= recovery_days * 2:
+            # 两倍恢复时间后自动康复
+            factor["status"] = "recovered"
+            factor["recovery_date"] = on_date
+            factor["recovery_notes"] = f"持续{duration}天后系统自动标记康复"
+            factor["auto_recovered"] = True
+
+    # 超过30天的活跃负面因子，强制标记为康复
+    if duration >= MAX_ACTIVE_DAYS and factor.get("status") == "active":
+        factor["status"] = "recovered"
+        factor["recovery_date"] = on_date
+        factor["recovery_notes"] = f"持续{duration}天，系统自动标记康复"
+        factor["auto_recovered"] = True
+
+    # 记录恢复进度百分比（用于大模型参考）
+    recovery_percent = min(100, (duration / recovery_days) * 100)
+    factor["recovery_progress"] = round(recovery_percent, 1)
+    factor["estimated_recovery_days"] = max(0, recovery_days - duration)
+
+
+def _parse_date(date_str: str) -> datetime.date:
+    return datetime.datetime.strptime(date_str, "%Y-%m-%d").date()
+
+
+@dataclass
+class FactorInterval:
+    """一个负面因子的区间：锚定日期的状态 + 之后每天的推算状态"""
+    anchor_date: datetime.date
+    # schedule[k] 为锚定日期之后第k天的状态（schedule[0] 即锚定时的状态）；因子不再延续的那天之后没有条目
+    schedule: List[Dict[str, Any]] = field(default_factory=list)
+
+    @classmethod
+    def from_snapshot(cls, anchor_date: datetime.date, factor: Dict[str, Any]) -> "FactorInterval":
+        """从记录中的因子推算出完整的区间"""
+        schedule = [dict(factor)]
+        day = anchor_date
+        # 只有仍为 active 的因子会延续到第二天；30天规则保证推算会结束
+        while schedule[-1].get("status") == "active" and len(schedule) <= MAX_ACTIVE_DAYS + 1:
+            previous = schedule[-1]
+            day += datetime.timedelta(days=1)
+            state = dict(previous)
+            state["duration_days"] = previous.get("duration_days", 1) + 1
+            state["copied_from"] = (day - datetime.timedelta(days=1)).isoformat()
+            auto_reduce_severity(state, day.isoformat())
+            schedule.append(state)
+        return cls(anchor_date, schedule)
+
+    @property
+    def end_date(self) -> datetime.date:
+        """因子最后一天存在于记录中的日期"""
+        return self.anchor_date + datetime.timedelta(days=len(self.schedule) - 1)
+
+    def state_on(self, day: datetime.date) -> Optional[Dict[str, Any]]:
+        """指定日期的因子状态（不在区间内返回None）"""
+        offset = (day - self.anchor_date).days
+        if 0 <= offset < len(self.schedule):
+            return self.schedule[offset]
+        return None
+
+
+class FactorStateEngine:
+    """负面因子状态引擎（单个用户）"""
+
+    def __init__(self):
+        self.intervals: List[FactorInterval] = []
+        # 锚定日期记录里的"是否适合运动"标志（之后新建的记录默认为True）
+        self.anchor_date: Optional[datetime.date] = None
+        self.anchor_should_exercise = True
+        self._active_cache: Dict[datetime.date, List[Dict[str, Any]]] = {}
+
+    def load_snapshot(self, date_str: str, negative_factors: Optional[Dict[str, Any]]) -> None:
+        """
+        以某一天记录中的负面因子重新锚定（替换之前的所有区间）
+
+        Args:
+            date_str: 记录日期 YYYY-MM-DD
+            negative_factors: 记录中的 negative_factors 字段（可以为None）
+        """
+        anchor_date = _parse_date(date_str)
+        negative_factors = negative_factors or {}
+        self.intervals = [FactorInterval.from_snapshot(anchor_date, factor)
+                          for factor in negative_factors.get("factors", [])]
+        self.anchor_date = anchor_date
+        self.anchor_should_exercise = negative_factors.get("should_exercise", True)
+        self._active_cache.clear()
+
+    def _day(self, date_str: str = None) -> datetime.date:
+        return _parse_date(date_str) if date_str else datetime.date.today()
+
+    def factors_on(self, date_str: str = None) -> List[Dict[str, Any]]:
+        """指定日期记录中会出现的所有因子（包括当天转为恢复中/已康复的）"""
+        day = self._day(date_str)
+        states = (interval.state_on(day) for interval in self.intervals)
+        return [dict(state) for state in states if state is not None]
+
+    def active_factors(self, date_str: str = None) -> List[Dict[str, Any]]:
+        """指定日期的活跃因子（按日期缓存）"""
+        day = self._day(date_str)
+        active = self._active_cache.get(day)
+        if active is None:
+            active = []
+            for interval in self.intervals:
+                state = interval.state_on(day)
+                if state is not None and state.get("status") == "active":
+                    active.append(state)
+            self._active_cache[day] = active
+        return [dict(state) for state in active]
+
+    def total_impact(self, date_str: str = None) -> int:
+        """总影响力评分（活跃因子严重程度之和，0-10）"""
+        day = self._day(date_str)
+        if day not in self._active_cache:
+            self.active_factors(date_str)
+        total = sum(factor.get("severity_level", 1) for factor in self._active_cache[day])
+        return min(total, 10)
+
+    def should_exercise_flag(self, date_str: str = None) -> bool:
+        """记录中的"是否适合运动"标志"""
+        return self.anchor_should_exercise if self._day(date_str) == self.anchor_date else True
+
+    def can_exercise(self, date_str: str = None) -> Dict[str, Any]:
+        """
+        判断是否适合运动（只遍历当天的活跃因子）
+
+        Returns:
+            与 DailyHealthRecorder.can_user_exercise_today 相同格式的字典
+        """
+        day = self._day(date_str)
+        if day not in self._active_cache:
+            self.active_factors(date_str)
+        active = self._active_cache[day]
+
+        if not active:
+            has_factors = any(interval.state_on(day) is not None for interval in self.intervals)
+            return {
+                "can_exercise": True,
+                "reason": "无活跃负面因子" if has_factors else "无负面因子记录",
+                "suggestion": "可以正常进行运动",
+                "factors": []
+            }
+
+        # 检查是否有重度因子
+        severe_factors = [dict(factor) for factor in active if factor.get("severity") == "重"]
+        if severe_factors:
+            return {
+                "can_exercise": False,
+                "reason": f"存在{len(severe_factors)}个重度负面因子",
+                "suggestion": "建议充分休息或就医，暂停剧烈运动",
+                "factors": severe_factors
+            }
+
+        # 如果没有重度因子，使用记录中的标志
+        if self.should_exercise_flag(date_str):
+            return {
+                "can_exercise": True,
+                "reason": "负面因子影响较小",
+                "suggestion": "可以进行轻度到中度运动",
+                "factors": [dict(factor) for factor in active]
+            }
+        return {
+            "can_exercise": False,
+            "reason": "系统建议休息",
+            "suggestion": "建议休息或进行极轻度活动",
+            "factors": [dict(factor) for factor in active]
+        }
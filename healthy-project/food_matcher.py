@@ -0,0 +1,199 @@
+# food_matcher.py
+"""
+食物名称匹配器
+初始化时把食物名称、别名（常见关键词）和连锁餐厅的店名+菜品名编译成关键词自动机，
+查找时只扫描一遍用户给出的食物名称，就能得到其中包含的所有已知名称，按最长匹配选出结果。
+另外为"用户给出的名称是数据库名称的一部分"（例如 "鸡胸" → "鸡胸肉"）维护一个有序的后缀索引，
+用二分查找代替逐个比较，食物数据库扩大到几万条时查找时间基本不变。
+"""
+
+import bisect
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from keyword_automaton import KeywordAutomaton
+
+
+class FoodMatcher:
+    """食物名称 → 数据库标准名称 / 餐厅菜品"""
+
+    def __init__(self, food_names: Iterable[str] = (), aliases: Dict[str, str] = None,
+                 restaurants: Dict[str, Dict[str, Any]] = None):
+        """
+        初始化匹配器
+
+        Args:
+            food_names: 食物数据库中的标准名称
+            aliases: 别名 → 标准名称（例如 {"饭": "米饭"}），只有名称都匹配不上时才使用
+            restaurants: 连锁餐厅菜单 {店名: {菜品名: 热量}}
+        """
+        # 食物名称和别名共用一个自动机，值为 ("food", 标准名称) 或 ("alias", 标准名称)
+        self.automaton = KeywordAutomaton()
+        # 标准名称 → 加入顺序（名称长度相同时优先先加入的）
+        self._food_order: Dict[str, int] = {}
+        # 后缀索引：(后缀, 名称长度, 加入顺序, 标准名称)，按需重建
+        self._suffixes: List[Tuple[str, int, int, str]] = []
+        self._suffixes_dirty = False
+
+        # 店名和菜品名单独一个自动机，避免 "番茄炒蛋" 这类菜品名干扰普通食物的匹配
+        self.restaurant_automaton = KeywordAutomaton()
+        self._restaurant_names: Dict[str, int] = {}
+        # 菜品名 → [(店名, 热量), ...]（同名菜品可能出现在多家店，例如 "薯条(中)"）
+        self._dishes: Dict[str, List[Tuple[str, Any]]] = {}
+
+        for name in food_names:
+            self.add_food(name)
+        for alias, target in (aliases or {}).items():
+            self.add_alias(alias, target)
+        for restaurant, menu in (restaurants or {}).items():
+            self.add_restaurant(restaurant, menu)
+
+    def add_food(self, name: str) -> None:
+        """添加食物标准名称"""
+        if not name or name in self._food_order:
+            return
+        self._food_order[name] = len(self._food_order)
+        self.automaton.add(name, ("food", name))
+        self._suffixes_dirty = True
+
+    def add_alias(self, alias: str, target: str) -> None:
+        """添加别名（与某个标准名称相同的别名忽略，标准名称优先）"""
+        if not alias or alias in self._food_order:
+            return
+        self.automaton.add(alias, ("alias", target))
+
+    def add_restaurant(self, restaurant: str, menu: Dict[str, Any]) -> None:
+        """添加连锁餐厅及其菜单"""
+        if restaurant not in self._restaurant_names:
+            self._restaurant_names[restaurant] = len(self._restaurant_names)
+            self.restaurant_automaton.add(restaurant)
+        for dish, calories in menu.items():
+            self.restaurant_automaton.add(dish)
+            self._dishes.setdefault(dish, []).append((restaurant, calories))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._food_order
+
+    def _build_suffixes(self) -> None:
+        """把每个标准名称的所有后缀排序，任意子串都是某个后缀的前缀"""
+        self._suffixes = sorted(
+            (name[i:], len(name), order, name)
+            for name, order in self._food_order.items()
+            for i in range(len(name))
+        )
+        self._suffixes_dirty = False
+
+    def find_containing(self, food_name: str) -> Optional[str]:
+        """
+        查找包含 food_name 的标准名称（最短的优先，例如 "鸡胸" → "鸡胸肉"）
+
+        Returns:
+            标准名称，找不到返回None
+        """
+        if not food_name:
+            return None
+        if self._suffixes_dirty:
+            self._build_suffixes()
+
+        best = None
+        index = bisect.bisect_left(self._suffixes, (food_name,))
+        while index < len(self._suffixes) and self._suffixes[index][0].startswith(food_name):
+            candidate = self._suffixes[index]
+            if best is None or candidate[1:3] < best[1:3]:
+                best = candidate
+            index += 1
+        return best[3] if best else None
+
+    def resolve(self, food_name: str) -> Optional[str]:
+        """
+        把用户给出的食物名称解析为数据库标准名称
+
+        优先级：完全匹配 → 名称中包含的最长标准名称（长度相同取数据库中靠前的）
+        → 包含该名称的标准名称 → 最靠左的别名
+
+        Returns:
+            标准名称，找不到返回None
+        """
+        if not food_name:
+            return None
+        if food_name in self._food_order:
+            return food_name
+
+        best = None
+        alias = None
+        values = self.automaton.values
+        for start, end, keyword in self.automaton.iter_matches(food_name):
+            kind, target = values[keyword]
+            if kind == "food":
+                # (长度, -加入顺序) 越大越优先
+                rank = (end - start, -self._food_order[target])
+                if best is None or rank > best[0]:
+                    best = (rank, target)
+            elif alias is None or start < alias[0]:
+                alias = (start, target)
+
+        if best is not None:
+            return best[1]
+
+        containing = self.find_containing(food_name)
+        if containing is not None:
+            return containing
+
+        return alias[1] if alias is not None else None
+
+    def find_foods(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        文本中出现的标准食物名称（从左到右取不重叠的最长匹配，不含别名）
+
+        Returns:
+            [(开始位置, 结束位置, 标准名称), ...]
+        """
+        values = self.automaton.values
+        return [(start, end, keyword) for start, end, keyword in self.automaton.longest_matches(text)
+                if values[keyword][0] == "food"]
+
+    def restaurant_spans(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        文本中出现的店名和菜品名（不重叠的最长匹配）
+
+        Returns:
+            [(开始位置, 结束位置, 店名或菜品名), ...]
+        """
+        return self.restaurant_automaton.longest_matches(text)
+
+    def is_restaurant(self, name: str) -> bool:
+        """是否为已知的连锁餐厅店名"""
+        return name in self._restaurant_names
+
+    def match_restaurant(self, food_name: str) -> Optional[Tuple[str, str, Any]]:
+        """
+        查找连锁餐厅菜品（店名和菜品名都要出现在名称中）
+
+        菜品按最长匹配选择，例如 "麦当劳麦辣鸡腿堡" 不会被更短的菜品名截断
+
+        Returns:
+            (店名, 菜品名, 热量)，不是餐厅菜品返回None
+        """
+        if not food_name:
+            return None
+
+        restaurants = set()
+        dishes = []
+        for start, end, keyword in self.restaurant_automaton.iter_matches(food_name):
+            if keyword in self._restaurant_names:
+                restaurants.add(keyword)
+            if keyword in self._dishes:
+                dishes.append((start, end, keyword))
+        if not restaurants or not dishes:
+            return None
+
+        best = None
+        for start, end, dish in dishes:
+            # 该菜品所在的、名称中出现过的第一家店
+            menu_entry = next(((restaurant, calories) for restaurant, calories in self._dishes[dish]
+                               if restaurant in restaurants), None)
+            if menu_entry is None:
+                continue
+            if best is None or end - start > best[1] - best[0]:
+                best = (start, end, menu_entry[0], dish, menu_entry[1])
+
+        return best[2:] if best is not None else None
@@ -0,0 +1,272 @@
+# food_parser.py
+"""
+本地食物描述解析器
+对 "200克米饭"、"两个鸡蛋和一杯牛奶"、"麦当劳巨无霸" 这类本地数据库完全能覆盖的描述，
+直接用规则提取食物、数量、烹饪方式、份量和酱料，生成与大模型相同格式的分析结果，省去一次网络往返；
+描述里有识别不了的内容、缺少数量时判为低置信度，交给大模型分析。
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from food_matcher import FoodMatcher
+
+# 重量单位 → 克
+WEIGHT_UNITS = {
+    "克": 1, "g": 1, "G": 1, "毫升": 1, "ml": 1, "ML": 1,
+    "公斤": 1000, "千克": 1000, "kg": 1000, "KG": 1000,
+    "斤": 500, "两": 50,
+}
+
+# 计数单位的默认重量（克）
+COUNT_UNITS = {
+    "碗": 200, "份": 150, "个": 100, "杯": 250, "盘": 300,
+    "片": 30, "根": 100, "块": 50, "盒": 250, "瓶": 500,
+}
+
+# 特定食物的计数单位重量（克），优先于 COUNT_UNITS
+FOOD_UNIT_WEIGHTS = {
+    ("鸡蛋", "个"): 50,
+    ("苹果", "个"): 200,
+    ("香蕉", "根"): 120,
+    ("玉米", "根"): 200,
+    ("土豆", "个"): 150,
+    ("番茄", "个"): 150,
+    ("面包", "片"): 35,
+    ("牛奶", "杯"): 250,
+    ("牛奶", "盒"): 250,
+    ("米饭", "碗"): 200,
+    ("面条", "碗"): 300,
+    ("燕麦", "碗"): 50,
+}
+
+# 没有说明烹饪方式时的默认做法（直接食用的按 "生吃"，系数都是1.0）；其他食物留空，按未知做法计算
+DEFAULT_COOKING_METHODS = {
+    "米饭": "蒸", "白米饭": "蒸", "面条": "煮", "燕麦": "煮", "鸡蛋": "煮", "玉米": "煮",
+    "苹果": "生吃", "香蕉": "生吃", "牛奶": "生吃", "面包": "生吃",
+}
+
+CHINESE_DIGITS = {"零": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5,
+                  "六": 6, "七": 7, "八": 8, "九": 9}
+CHINESE_UNITS = {"十": 10, "百": 100, "千": 1000}
+
+# 数量 + 单位，例如 "200克"、"1.5碗"、"两个"、"半碗"、"三百克"
+NUMBER_PATTERN = r"\d+(?:\.\d+)?|[零一二两三四五六七八九十百千]+半?|半"
+QUANTITY_PATTERN = re.compile(
+    rf"({NUMBER_PATTERN})\s*({'|'.join(sorted(list(WEIGHT_UNITS) + list(COUNT_UNITS), key=len, reverse=True))})"
+)
+
+# 食物描述里常见、不影响热量计算的词
+FILLER_PATTERN = re.compile(
+    r"补充[:：]?|今天|今早|早上|上午|中午|下午|晚上|夜里|刚才|刚刚|"
+    r"早餐|午餐|晚餐|宵夜|夜宵|早饭|午饭|晚饭|加餐|"
+    r"我|吃了|喝了|吃|喝|了|的|还有|以及|加上|和|跟|配|大概|大约|左右|约|一共|总共|"
+    r"[\s,，、;；。.!！~～+＋:：]"
+)
+
+# 分隔多种食物的符号和连接词
+SEGMENT_PATTERN = re.compile(r"[,，、;；。+＋]|还有|以及|加上|和|跟|配")
+
+# 剩下的字符中有这些内容时，说明描述里有识别不了的食物或修饰
+UNEXPLAINED_PATTERN = re.compile(r"[\u4e00-\u9fffA-Za-z]")
+
+
+def parse_number(text: str) -> Optional[float]:
+    """解析阿拉伯数字或中文数字（支持 "半"、"两"、"一百五十"、"一半" 等）"""
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        pass
+
+    half = 0.5 if text.endswith("半") else 0.0
+    text = text[:-1] if half else text
+    if not text:
+        return half or None
+
+    total, current = 0, 0
+    for char in text:
+        if char in CHINESE_DIGITS:
+            current = CHINESE_DIGITS[char]
+        elif char in CHINESE_UNITS:
+            total += (current or 1) * CHINESE_UNITS[char]
+            current = 0
+        else:
+            return None
+    return total + current + half
+
+
+def _word_pattern(words) -> "re.Pattern":
+    """按长度从长到短拼成一个预编译的正则（同一位置优先匹配更长的词）"""
+    return re.compile("|".join(re.escape(word) for word in sorted(words, key=len, reverse=True)))
+
+
+class LocalFoodParser:
+    """规则食物描述解析器"""
+
+    def __init__(self, food_matcher: FoodMatcher, cooking_methods: Dict[str, float],
+                 portion_sizes: Dict[str, float], sauce_levels: Dict[str, float], min_clarity: int = 4):
+        """
+        初始化解析器
+
+        Args:
+            food_matcher: 食物名称匹配器（与 DietFunctions 共用）
+            cooking_methods: 烹饪方式系数表
+            portion_sizes: 份量系数表
+            sauce_levels: 酱料系数表
+            min_clarity: 清晰度达到该分数才直接使用本地结果（1-5）
+        """
+        self.food_matcher = food_matcher
+        self.min_clarity = min_clarity
+        self.cooking_pattern = _word_pattern(cooking_methods)
+
+        # 单字的份量/酱料词（"大"、"少"、"重"…）在普通描述里太常见（"大概"、"多少"、"中午"），
+        # 只在 "大份"、"少油" 这样的组合里识别；词 → 系数表中的键
+        self.portion_words = {word: word for word in portion_sizes if len(word) > 1}
+        self.sauce_words = {word: word for word in sauce_levels if len(word) > 1}
+        for word in portion_sizes:
+            if len(word) == 1:
+                for suffix in ("份", "碗", "盘"):
+                    self.portion_words.setdefault(word + suffix, word)
+        for word in sauce_levels:
+            if len(word) == 1:
+                for suffix in ("油", "盐", "酱", "糖"):
+                    self.sauce_words.setdefault(word + suffix, word)
+        self.portion_pattern = _word_pattern(self.portion_words)
+        self.sauce_pattern = _word_pattern(self.sauce_words)
+
+    @staticmethod
+    def _blank(pattern: "re.Pattern", text: str) -> str:
+        """把匹配到的部分替换成空格（保持位置不变）"""
+        return pattern.sub(lambda match: " " * len(match.group(0)), text)
+
+    @staticmethod
+    def _blank_spans(text: str, spans) -> str:
+        """把 (开始, 结束, 词) 列出的部分替换成空格"""
+        for start, end, _ in spans:
+            text = text[:start] + " " * (end - start) + text[end:]
+        return text
+
+    def _parse_segment(self, segment: str, restaurant: Optional[str]) -> Optional[Tuple[List[Dict[str, Any]], int, Optional[str]]]:
+        """
+        解析一段描述（一种食物，或同一家店的菜品）
+
+        Args:
+            segment: 文本片段
+            restaurant: 前面片段中提到的店名
+
+        Returns:
+            (食物条目, 清晰度, 当前店名)；有识别不了的内容时返回None
+        """
+        # 1. 连锁餐厅：店名可以只在前面出现一次，例如 "麦当劳巨无霸和麦辣鸡翅"
+        restaurant_spans = self.food_matcher.restaurant_spans(segment)
+        dishes = []
+        for _, _, keyword in restaurant_spans:
+            if self.food_matcher.is_restaurant(keyword):
+                restaurant = keyword
+            else:
+                dishes.append(keyword)
+        remaining = self._blank_spans(segment, restaurant_spans)
+
+        # 2. 数量
+        quantities = []
+        for match in QUANTITY_PATTERN.finditer(remaining):
+            amount = parse_number(match.group(1))
+            if amount is None or amount <= 0:
+                return None
+            quantities.append((amount, match.group(2)))
+        remaining = self._blank(QUANTITY_PATTERN, remaining)
+
+        # 3. 食物
+        foods = self.food_matcher.find_foods(remaining)
+        remaining = self._blank_spans(remaining, foods)
+
+        # 4. 烹饪方式（一段里只能有一种）
+        methods = set(self.cooking_pattern.findall(remaining))
+        if len(methods) > 1:
+            return None
+        cooking_method = methods.pop() if methods else ""
+        remaining = self._blank(self.cooking_pattern, remaining)
+
+        # 去掉已识别的部分和无关的词后不能再剩下文字，否则说明有不认识的食物或修饰
+        if UNEXPLAINED_PATTERN.search(FILLER_PATTERN.sub(" ", remaining)):
+            return None
+
+        # 一段里有多种食物又带数量时，无法确定数量对应哪种食物
+        if len(quantities) > 1 or (quantities and len(dishes) + len(foods) != 1):
+            return None
+        amount, unit = quantities[0] if quantities else (None, None)
+
+        items = []
+        clarity = 5
+        for dish in dishes:
+            name = f"{restaurant}{dish}" if restaurant else dish
+            if restaurant is None or self.food_matcher.match_restaurant(name) is None:
+                return None
+            count = 1
+            if amount is not None:
+                if unit in WEIGHT_UNITS or amount != int(amount):
+                    return None
+                count = int(amount)
+            # 餐厅菜品按标准份计算热量，多份时重复条目
+            items.extend({"name": name, "estimated_weight_g": 100, "cooking_method": cooking_method}
+                         for _ in range(count))
+
+        for _, _, food in foods:
+            if amount is None:
+                weight = 100
+                clarity = min(clarity, 3)  # 没有数量
+            elif unit in WEIGHT_UNITS:
+                weight = amount * WEIGHT_UNITS[unit]
+            else:
+                weight = amount * FOOD_UNIT_WEIGHTS.get((food, unit), COUNT_UNITS[unit])
+                clarity = min(clarity, 4)  # 按单位估算的重量
+            items.append({"name": food, "estimated_weight_g": round(weight),
+                          "cooking_method": cooking_method or DEFAULT_COOKING_METHODS.get(food, "")})
+
+        return items, clarity, restaurant
+
+    def parse(self, food_input: str) -> Optional[Dict[str, Any]]:
+        """
+        解析食物描述
+
+        Args:
+            food_input: 用户输入的食物描述
+
+        Returns:
+            与 DietFunctions.analyze_food_with_llm 相同格式的分析结果；置信度低时返回None
+        """
+        if not food_input or not food_input.strip():
+            return None
+
+        # 份量和酱料作用于整餐
+        portion_match = self.portion_pattern.search(food_input)
+        sauce_match = self.sauce_pattern.search(food_input)
+        text = self._blank(self.sauce_pattern, self._blank(self.portion_pattern, food_input))
+
+        items = []
+        clarity = 5
+        restaurant = None
+        for segment in SEGMENT_PATTERN.split(text):
+            if not segment.strip():
+                continue
+            parsed = self._parse_segment(segment, restaurant)
+            if parsed is None:
+                return None
+            segment_items, segment_clarity, restaurant = parsed
+            items.extend(segment_items)
+            clarity = min(clarity, segment_clarity)
+
+        if not items or clarity < self.min_clarity:
+            return None
+
+        return {
+            "food_items": items,
+            "portion_size": self.portion_words[portion_match.group(0)] if portion_match else "中",
+            "sauce_level": self.sauce_words[sauce_match.group(0)] if sauce_match else "正常",
+            "clarity_score": clarity,
+            "needs_clarification": False,
+            "clarification_questions": [],
+            "source": "local"
+        }
@@ -1,5 +1,6 @@
 import datetime
 import os
+from typing import Any, Dict, Generator, Iterator, List, Optional, Tuple
 import httpx
 import ssl
 from openai import OpenAI
@@ -13,8 +14,11 @@ import logging
 
 
 from First_Entry import (load_profiles, save_profiles, create_user_profile, delete_user_profile,
-                         search_user_profile, update_user_weight, calculate_bmi, USER_PROFILES)
+                         search_user_profile, update_user_weight, calculate_bmi, USER_PROFILES,
+                         get_user_profile, set_profile_repository)
 from Daily_Recorder import DailyHealthRecorder
+from repository import HealthRepository
+from nutrition_table import load_nutrition_table
 
 from Diet import (update_meal_status, get_daily_plan, DietFunctions)
 
@@ -32,17 +36,63 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 # 配置开关
 USE_DATABASE = True  # 设置为True使用数据库，False使用JSON
 
+# 数据库作为主存储：档案、体重、每日记录和负面因子都读写SQLite，JSON文件只在导出时生成
+health_repository = None
+if USE_DATABASE and db_bridge.connected:
+    try:
+        health_repository = HealthRepository(db_bridge.db)
+        # 第一次启用时导入已有的JSON数据
+        health_repository.import_json_if_empty()
+    except Exception as e:
+        logging.error(f"❌ 数据库仓储初始化失败，使用JSON文件: {e}")
+        health_repository = None
+set_profile_repository(health_repository)
+
+# 大型营养成分表（可选）：HEALTH_NUTRITION_TABLE 指向CSV文件时加载，所有机器人共用同一份内存映射数据
+NUTRITION_TABLE_PATH = os.environ.get("HEALTH_NUTRITION_TABLE")
+nutrition_table = None
+if NUTRITION_TABLE_PATH:
+    try:
+        nutrition_table = load_nutrition_table(NUTRITION_TABLE_PATH)
+    except Exception as e:
+        logging.error(f"❌ 营养成分表加载失败，使用内置食物数据库: {e}")
+        nutrition_table = None
+
 # 编码环境显示日志
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 # 生产环境关闭日志
 #logging.getLogger("httpx").setLevel(logging.WARNING)
 
+def create_qwen_client(qwen_api_key: str) -> OpenAI:
+    """
+    创建通义千问客户端（OpenAI兼容接口）
+
+    客户端内部维护HTTP连接池，可以在多个机器人之间共享
+    """
+    # 创建不验证SSL的HTTP客户端
+    ssl_context = ssl.create_default_context()
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
+
+    # 创建自定义HTTP客户端
+    http_client = httpx.Client(
+        verify=ssl_context,  # 禁用SSL验证
+        timeout=30.0
+    )
+
+    return OpenAI(
+        api_key=qwen_api_key,
+        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+        http_client=http_client,  # 使用自定义客户端
+    )
+
+
 class HealthAssistantBot:
     """健康减肥助手机器人（一对一版本）"""
 
-    def __init__(self, qwen_api_key: str):
+    def __init__(self, qwen_api_key: str, nickname: str = None, client: OpenAI = None):
         self.qwen_api_key = qwen_api_key
-        self.current_user = None  # 当前登录的用户
+        self.current_user = nickname  # 当前登录的用户（None时沿用档案中的第一个用户）
         # ========== 新增：数据库状态展示 ==========
         print("\n" + "=" * 50)
         print("🗄️  数据库系统状态")
@@ -60,39 +110,18 @@ class HealthAssistantBot:
             print("⚠️  数据库未连接，使用纯JSON系统")
         print("=" * 50 + "\n")
         # ========== 新增结束 ==========
-        self.recorder = DailyHealthRecorder()
-        self.users = load_profiles()
+        self.repository = health_repository
+        self._reload_users()
         self.update_meal_status = update_meal_status.__get__(self, HealthAssistantBot)
         self.get_daily_plan = get_daily_plan.__get__(self, HealthAssistantBot)
         self.save_profiles_func = save_profiles
-        self.history_summary = HistorySummaryManager(self.recorder)
-        self.exercise_functions = ExerciseFunctions(
-            self.recorder,
-            self.users.get(self.get_current_user()) if self.get_current_user() else None
-        )
-        self.negative_factor_manager = NegativeFactorManager(self.recorder)
-
-        # 创建不验证SSL的HTTP客户端
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-
-        # 创建自定义HTTP客户端
-        http_client = httpx.Client(
-            verify=ssl_context,  # 禁用SSL验证
-            timeout=30.0
-        )
 
-        # 初始化OpenAI客户端（兼容阿里云）
-        self.client = OpenAI(
-            api_key=qwen_api_key,
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-            http_client=http_client,  # 使用自定义客户端
-        )
+        # 初始化OpenAI客户端（兼容阿里云），可以由调用方传入共享的客户端
+        self.client = client or create_qwen_client(qwen_api_key)
 
-        self.diet_functions = DietFunctions(client=self.client, api_key=qwen_api_key)
-        self.journey_analyzer = WeightLossJourneyAnalyzer(self.client)
-        self.users = load_profiles()
+        self.diet_functions = DietFunctions(client=self.client, api_key=qwen_api_key,
+                                            nutrition_table=nutrition_table)
+        self._bind_recorder()
 
         # 定义工具 - 健康减肥相关功能
         # 在 __init__ 方法中修改工具描述
@@ -583,13 +612,102 @@ AI行动：
         """检查是否有用户档案存在"""
         return len(self.users) > 0
 
+    def _bind_recorder(self) -> None:
+        """
+        按当前用户创建每日记录器和依赖它的功能管理器
+
+        使用数据库仓储时每日记录按用户保存：没有指定用户（控制台、Streamlit）时取档案中的当前用户；
+        使用JSON文件且没有指定用户时沿用旧的平铺目录
+        """
+        record_user = self.current_user
+        if record_user is None and self.repository is not None:
+            record_user = self.get_current_user()
+        self.recorder = DailyHealthRecorder(user_id=record_user, repository=self.repository)
+        self.history_summary = HistorySummaryManager(self.recorder)
+        # 传入函数而不是档案快照：self.users 重新加载后运动热量按最新体重计算
+        self.exercise_functions = ExerciseFunctions(self.recorder, self.get_current_profile)
+        self.negative_factor_manager = NegativeFactorManager(self.recorder)
+        self.journey_analyzer = WeightLossJourneyAnalyzer(self.client, recorder=self.recorder)
+
+    def _reload_users(self) -> None:
+        """
+        重新读取档案到 self.users
+
+        绑定了用户（nickname）的机器人只读取这个用户的档案，不加载全部用户，
+        会话池中的每个会话也只保存自己用户的档案；没有绑定用户时（控制台、Streamlit）加载全部档案
+        """
+        if self.current_user:
+            profile = get_user_profile(self.current_user)
+            self.users = {self.current_user: profile} if profile else {}
+        else:
+            self.users = load_profiles()
+
     def get_current_user(self) -> str:
         """获取当前用户昵称（如果有的话）"""
+        if self.current_user:
+            return self.current_user
         if not self.users:
             return None
         # 取第一个用户（一对一应用只有一个用户）
         return list(self.users.keys())[0]
 
+    def get_current_profile(self) -> Optional[Dict[str, Any]]:
+        """获取当前用户的档案（没有用户时返回None）"""
+        user_nickname = self.get_current_user()
+        return self.users.get(user_nickname) if user_nickname else None
+
+    def update_weight(self, new_weight: float) -> dict:
+        """
+        更新当前用户的体重（同步到数据库，并检查是否达到目标体重）
+
+        Args:
+            new_weight: 新体重（kg）
+
+        Returns:
+            {"success": 是否成功, "message": 回复文本, "profile": 更新后的档案（失败时为None）}
+        """
+        if not self.check_user_exists():
+            return {"success": False, "message": "您还没有创建健康档案，请先创建档案再来更新体重。", "profile": None}
+
+        user_nickname = self.get_current_user()
+
+        if not new_weight or new_weight <= 0:
+            return {"success": False, "message": "请输入有效的体重值。", "profile": None}
+
+        if not update_user_weight(user_nickname, new_weight):
+            return {"success": False, "message": "❌ 更新体重失败。", "profile": None}
+
+        self._reload_users()  # 重新加载数据
+        profile = self.users.get(user_nickname)
+        current_weight = profile['current_weight_kg']
+        bmi = profile['bmi']
+        status = profile['status']
+        # ========== 新增：同步到数据库 ==========
+        if db_bridge.connected and self.repository is None:
+            db_bridge.enqueue_weight_update(user_nickname, new_weight)
+            print(f"✅ 体重更新已提交数据库同步")
+        # ========== 新增结束 ==========
+        summary = self.journey_analyzer.check_and_generate_summary(new_weight)
+        if summary:
+            print("\n" + "🎉" * 30)
+            print("🎉 恭喜！检测到你已经达到目标体重！ 🎉")
+            print("🎉" * 30)
+            print("\n你的坚持和努力得到了回报！这是一份为你准备的特别总结：\n")
+
+            # 保存总结，稍后可以显示
+            self.last_weight_loss_summary = summary
+
+            # 询问用户是否要查看完整总结
+            print("💡 我已经为你生成了完整的减肥历程总结报告！")
+            print("   输入'查看减肥总结'可以查看详细报告")
+            print("   报告已自动保存到文件，你可以随时查看")
+
+        return {
+            "success": True,
+            "message": f"✅ 体重更新成功！\n📊 当前体重: {current_weight}kg\n📈 BMI: {bmi} ({status})",
+            "profile": profile
+        }
+
     def _execute_tool(self, function_name: str, arguments: dict) -> str:
         """执行工具函数并返回结果"""
         print(f"🔧 执行工具: {function_name}")
@@ -605,15 +723,20 @@ AI行动：
                 user_data = create_user_profile()     #
                 if user_data:
                     # 更新本地用户数据
-                    self.users = load_profiles()
                     self.current_user = user_data.get('nickname')
+                    self._reload_users()
+                    # 使用数据库仓储时，之前没有用户的记录器换成新用户的记录器
+                    if self.repository is not None and self.recorder.user_id != self.current_user:
+                        self._bind_recorder()
                     # ========== 新增：同步到数据库 ==========
-                    if db_bridge.connected:
+                    # 使用数据库仓储时档案已直接写入数据库
+                    if db_bridge.connected and self.repository is None:
                         # 提取昵称（假设user_data格式为 {'昵称': 'xxx', ...}）
                         nickname = user_data.get('昵称') or user_data.get('nickname')
                         if nickname:
-                            db_bridge.sync_user_creation(nickname, user_data)
-                            print(f"✅ 用户数据已同步到数据库: {nickname}")
+                            # 后台异步写入数据库，不阻塞本轮对话
+                            db_bridge.enqueue_user_creation(nickname, user_data)
+                            print(f"✅ 用户数据已提交数据库同步: {nickname}")
                     # ========== 新增结束 ==========
                     return f"✅ 成功创建您的个人健康档案！欢迎 {self.current_user}，从现在开始我会陪伴您的健康减肥之旅！"
                 else:
@@ -621,43 +744,7 @@ AI行动：
 
             elif function_name == "update_user_weight":
                 # 更新体重
-                if not self.check_user_exists():
-                    return "您还没有创建健康档案，请先创建档案再来更新体重。"
-
-                user_nickname = self.get_current_user()
-                new_weight = arguments.get("new_weight", 0)
-
-                if new_weight <= 0:
-                    return "请输入有效的体重值。"
-
-                success = update_user_weight(user_nickname, new_weight)
-                if success:
-                    self.users = load_profiles()  # 重新加载数据
-                    current_weight = self.users[user_nickname]['current_weight_kg']
-                    bmi = self.users[user_nickname]['bmi']
-                    status = self.users[user_nickname]['status']
-                    # ========== 新增：同步到数据库 ==========
-                    if db_bridge.connected:
-                        db_bridge.sync_weight_update(user_nickname, new_weight)
-                        print(f"✅ 体重更新已同步到数据库")
-                    # ========== 新增结束 ==========
-                    summary = self.journey_analyzer.check_and_generate_summary(new_weight)
-                    if summary:
-                        print("\n" + "🎉" * 30)
-                        print("🎉 恭喜！检测到你已经达到目标体重！ 🎉")
-                        print("🎉" * 30)
-                        print("\n你的坚持和努力得到了回报！这是一份为你准备的特别总结：\n")
-
-                        # 保存总结，稍后可以显示
-                        self.last_weight_loss_summary = summary
-
-                        # 询问用户是否要查看完整总结
-                        print("💡 我已经为你生成了完整的减肥历程总结报告！")
-                        print("   输入'查看减肥总结'可以查看详细报告")
-                        print("   报告已自动保存到文件，你可以随时查看")
-                    return f"✅ 体重更新成功！\n📊 当前体重: {current_weight}kg\n📈 BMI: {bmi} ({status})"
-                else:
-                    return "❌ 更新体重失败。"
+                return self.update_weight(arguments.get("new_weight", 0))["message"]
 
             elif function_name == "search_my_profile":
                 # 查看个人档案
@@ -699,7 +786,7 @@ AI行动：
 
                 success = delete_user_profile(user_nickname)
                 if success:
-                    self.users = load_profiles()  # 重新加载数据
+                    self._reload_users()  # 重新加载数据
                     self.current_user = None
                     return f"✅ 您的健康档案已删除。如需重新开始，可以创建新的健康档案。"
                 else:
@@ -735,7 +822,7 @@ AI行动：
                         if result.get("success"):
                             print(f"✅ update_meal_status执行成功！")
                             # 重新加载用户数据检查
-                            self.users = load_profiles()
+                            self._reload_users()
                             user_nickname = self.get_current_user()
                             if user_nickname and self.users.get(user_nickname):
                                 user_profile = self.users[user_nickname]
@@ -1305,98 +1392,147 @@ AI行动：
         except Exception as e:
             return f"❌ 格式化档案信息失败: {str(e)}"
 
-    def chat(self, user_input: str) -> str:
-        """主聊天函数"""
-        print(f"\n{'=' * 50}")
-        print(f"用户: {user_input}")
+    def _request_reply(self, with_tools: bool) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        请求一次AI回复（非流式）
 
-        # 1. 保存用户对话到每日记录
-        self.recorder.add_daily_history("user", user_input)
+        Returns:
+            (回复内容, 工具调用列表 [{"id", "name", "arguments"}])
+        """
+        request = {"model": "qwen-turbo", "messages": self.history}
+        if with_tools:
+            request.update(tools=self.tools, tool_choice="auto")
+
+        ai_message = self.client.chat.completions.create(**request).choices[0].message
+        calls = [{
+            "id": call.id,
+            "name": call.function.name,
+            "arguments": call.function.arguments
+        } for call in ai_message.tool_calls or []]
+        return ai_message.content or "", calls
+
+    def _stream_reply(self, with_tools: bool) -> Generator[str, None, Tuple[str, List[Dict[str, str]]]]:
+        """
+        流式请求一次AI回复，逐段产出回复文本
+
+        Returns:
+            (回复内容, 工具调用列表 [{"id", "name", "arguments"}])，作为生成器的返回值
+        """
+        request = {"model": "qwen-turbo", "messages": self.history, "stream": True}
+        if with_tools:
+            request.update(tools=self.tools, tool_choice="auto")
+
+        content_parts = []
+        tool_calls = {}
+
+        for chunk in self.client.chat.completions.create(**request):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+
+            if delta.content:
+                content_parts.append(delta.content)
+                yield delta.content
+
+            # 工具调用的参数是分片返回的，按index拼接
+            for call in delta.tool_calls or []:
+                entry = tool_calls.setdefault(call.index, {"id": "", "name": "", "arguments": ""})
+                if call.id:
+                    entry["id"] = call.id
+                if call.function and call.function.name:
+                    entry["name"] += call.function.name
+                if call.function and call.function.arguments:
+                    entry["arguments"] += call.function.arguments
+
+        return "".join(content_parts), [tool_calls[index] for index in sorted(tool_calls)]
+
+    def _chat_turn(self, user_input: str, stream: bool) -> Iterator[str]:
+        """
+        chat() 和 chat_stream() 共用的对话流程：记录用户输入、处理本地命令、多轮工具调用
 
-        # 2. 添加到主历史记录
+        最多3轮工具调用，之后追加一次不带工具的请求让AI整合所有工具结果
+
+        Args:
+            user_input: 用户输入
+            stream: 是否流式请求（流式时回复按片段产出，否则产出完整回复）
+
+        Yields:
+            回复文本
+        """
+        # 保存用户对话到每日记录，并添加到主历史记录
+        self.recorder.add_daily_history("user", user_input)
         self.history.append({"role": "user", "content": user_input})
 
         if user_input == "查看聊天历史":
             print(self.display_history())
-            return "这是您的聊天历史..."
+            yield "这是您的聊天历史..."
+            return
 
-        # 使用流式处理，支持多轮工具调用
         max_iterations = 3
-        iteration_count = 0
-
-        while iteration_count < max_iterations:
-            iteration_count += 1
-            print(f"\n🤖 AI思考第{iteration_count}轮...")
-
-            # 调用AI
-            response = self.client.chat.completions.create(
-                model="qwen-turbo",
-                messages=self.history,
-                tools=self.tools,
-                tool_choice="auto"
-            )
 
-            ai_message = response.choices[0].message
-            self.history.append(ai_message)
+        for iteration_count in range(1, max_iterations + 2):
+            with_tools = iteration_count <= max_iterations
+            if with_tools:
+                print(f"\n🤖 AI思考第{iteration_count}轮...")
+            else:
+                print("🤖 AI整合所有工具结果生成回复...")
 
-            # 如果没有工具调用，直接返回
-            if not ai_message.tool_calls:
-                final_reply = ai_message.content
+            if stream:
+                reply, calls = yield from self._stream_reply(with_tools)
+            else:
+                reply, calls = self._request_reply(with_tools)
 
+            # 没有工具调用，这就是最终回复
+            if not calls:
+                self.history.append({"role": "assistant", "content": reply})
                 # 保存助手回复到每日记录
-                self.recorder.add_daily_history("assistant", final_reply)
-
-                print(f"AI: {final_reply[:100]}...")
-                print(f"{'=' * 50}")
-                return final_reply
-
-            # 执行所有工具调用
-            print(f"🔧 AI决定调用{len(ai_message.tool_calls)}个工具！")
-            all_tool_results = []
-
-            for tool_call in ai_message.tool_calls:
-                # 解析参数
-                function_name = tool_call.function.name
-                arguments = json.loads(tool_call.function.arguments)
-
-                # 执行工具
-                tool_result = self._execute_tool(function_name, arguments)
-                print(f"✅ 工具[{function_name}]执行完成")
-
-                # 收集结果
-                all_tool_results.append({
-                    "tool_call_id": tool_call.id,
-                    "function_name": function_name,
-                    "result": tool_result
-                })
+                self.recorder.add_daily_history("assistant", reply)
+                if not stream:
+                    yield reply
+                return
+
+            self.history.append({
+                "role": "assistant",
+                "content": reply,
+                "tool_calls": [{
+                    "id": call["id"],
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": call["arguments"]}
+                } for call in calls]
+            })
+
+            # 执行所有工具调用，并添加工具响应到历史
+            print(f"🔧 AI决定调用{len(calls)}个工具！")
+            for call in calls:
+                arguments = json.loads(call["arguments"] or "{}")
+                tool_result = self._execute_tool(call["name"], arguments)
+                print(f"✅ 工具[{call['name']}]执行完成")
 
-                # 添加工具响应到历史
                 self.history.append({
                     "role": "tool",
-                    "tool_call_id": tool_call.id,
+                    "tool_call_id": call["id"],
                     "content": tool_result,
                 })
 
-            # 如果是最后一轮，让AI整合结果
-            if iteration_count >= max_iterations:
-                print("🤖 AI整合所有工具结果生成回复...")
-                final_response = self.client.chat.completions.create(
-                    model="qwen-turbo",
-                    messages=self.history,
-                )
-                final_reply = final_response.choices[0].message.content
+    def chat(self, user_input: str) -> str:
+        """主聊天函数"""
+        print(f"\n{'=' * 50}")
+        print(f"用户: {user_input}")
 
-                # 保存助手回复到每日记录
-                self.recorder.add_daily_history("assistant", final_reply)
+        final_reply = "".join(self._chat_turn(user_input, stream=False))
 
-                print(f"AI: {final_reply[:100]}...")
-                print(f"{'=' * 50}")
-                return final_reply
+        print(f"AI: {final_reply[:100]}...")
+        print(f"{'=' * 50}")
+        return final_reply
 
-        # 达到最大轮次
-        default_reply = "我已经为您处理了相关数据，还有什么可以帮助您的吗？"
-        self.recorder.add_daily_history("assistant", default_reply)
-        return default_reply
+    def chat_stream(self, user_input: str) -> Iterator[str]:
+        """
+        流式聊天：工具调用轮次照常执行，最终回复按片段逐步返回
+
+        Yields:
+            回复文本片段
+        """
+        yield from self._chat_turn(user_input, stream=True)
 
     def interactive_chat(self):
         """交互式聊天"""
@@ -1423,20 +1559,14 @@ AI行动：
             user_data = create_user_profile()
             if user_data:
                 # 更新本地用户数据
-                self.users = load_profiles()
                 self.current_user = user_data.get('nickname')
+                self._reload_users()
                 print(f"✅ 成功创建您的个人健康档案！欢迎 {self.current_user}，从现在开始我会陪伴您的健康减肥之旅！")
             else:
                 print("❌ 创建健康档案失败或您取消了操作。")
 
-        today = datetime.datetime.now().strftime("%Y-%m-%d")
-
-        # 构建文件路径（假设文件在当前目录下）
-        daily_records_dir = "daily_records"
-        file_path = os.path.join(daily_records_dir, f"{today}.json")
-
-        # 检查文件是否存在并输出
-        if not os.path.exists(file_path):
+        # 检查今日记录是否存在（任意序列化格式）
+        if not self.recorder.check_today_record_exists():
             # 处理最近未总结的记录
             date_str, summary, is_new = self.history_summary.process_latest_unsummarized_record(
                 ai_client=self.client,  # 传入AI客户端用于生成智能总结
@@ -0,0 +1,156 @@
+# keyword_automaton.py
+"""
+多关键词匹配自动机（Aho–Corasick）
+初始化时把所有关键词编译成一个自动机，匹配时只需要线性扫描一遍文本，
+就能得到每个关键词出现的全部位置（包括互相重叠的匹配），不需要对每个关键词单独 `in` / `find`。
+"""
+
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+class KeywordAutomaton:
+    """Aho–Corasick 关键词自动机"""
+
+    def __init__(self, keywords: Iterable[str] = ()):
+        """
+        初始化自动机
+
+        Args:
+            keywords: 初始关键词（之后还可以用 add 添加，匹配前会自动编译）
+        """
+        # 每个状态的转移表、失败指针和输出（以该状态结尾的关键词）
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+        # 关键词中出现过的字符；其他字符不可能属于任何匹配，扫描时直接回到初始状态
+        self._alphabet = set()
+        # 按需记下的完整转移（沿失败指针查找后的结果），同一状态同一字符只查找一次
+        self._delta: List[Dict[str, int]] = [{}]
+        self._built = True
+        # 关键词 → 附加值（例如食物别名对应的标准名称）
+        self.values: Dict[str, Any] = {}
+
+        for keyword in keywords:
+            self.add(keyword)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __contains__(self, keyword: str) -> bool:
+        return keyword in self.values
+
+    def add(self, keyword: str, value: Any = None) -> None:
+        """
+        添加关键词（重复添加时更新附加值）
+
+        Args:
+            keyword: 关键词（空字符串忽略）
+            value: 附加值，默认为关键词本身
+        """
+        if not keyword:
+            return
+        if keyword not in self.values:
+            self._alphabet.update(keyword)
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._delta.append({})
+                state = next_state
+            self._output[state].append(keyword)
+            self._built = False
+        self.values[keyword] = keyword if value is None else value
+
+    def build(self) -> None:
+        """按广度优先计算失败指针，并把后缀状态的输出合并进来"""
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                # 更短的关键词先输出
+                self._output[next_state] = self._output[self._fail[next_state]] + [
+                    keyword for keyword in self._output[next_state]
+                    if keyword not in self._output[self._fail[next_state]]]
+
+        self._delta = [{} for _ in self._goto]
+        self._built = True
+
+    def _transition(self, state: int, char: str) -> int:
+        """沿失败指针查找转移，并记下结果"""
+        origin = state
+        while state and char not in self._goto[state]:
+            state = self._fail[state]
+        next_state = self._goto[state].get(char, 0)
+        self._delta[origin][char] = next_state
+        return next_state
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """
+        扫描一遍文本，按结束位置顺序产生所有匹配
+
+        Yields:
+            (开始位置, 结束位置（不含）, 关键词)
+        """
+        if not self._built:
+            self.build()
+
+        delta, output, alphabet = self._delta, self._output, self._alphabet
+        state = 0
+        for index, char in enumerate(text):
+            if char not in alphabet:
+                state = 0
+                continue
+            next_state = delta[state].get(char)
+            state = self._transition(state, char) if next_state is None else next_state
+            if output[state]:
+                end = index + 1
+                for keyword in output[state]:
+                    yield end - len(keyword), end, keyword
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """返回所有匹配（包括重叠的匹配）"""
+        return list(self.iter_matches(text))
+
+    def first_positions(self, text: str) -> Dict[str, int]:
+        """每个出现过的关键词第一次出现的开始位置（与 str.find 的结果相同）"""
+        positions = {}
+        for start, _, keyword in self.iter_matches(text):
+            # 同一个关键词的匹配按位置先后产生，第一次出现的就是最靠前的
+            positions.setdefault(keyword, start)
+        return positions
+
+    def longest_matches(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        最长匹配：从左到右取不重叠的匹配，同一开始位置优先取最长的关键词
+
+        例如关键词 "米饭"、"炒米饭" 在 "扬州炒米饭" 中只返回 "炒米饭"
+        """
+        best: Dict[int, Tuple[int, str]] = {}
+        for start, end, keyword in self.iter_matches(text):
+            if start not in best or end > best[start][0]:
+                best[start] = (end, keyword)
+
+        matches = []
+        position = 0
+        for start in sorted(best):
+            if start < position:
+                continue
+            end, keyword = best[start]
+            matches.append((start, end, keyword))
+            position = end
+        return matches
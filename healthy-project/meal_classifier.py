@@ -0,0 +1,161 @@
+# meal_classifier.py
+"""
+餐次识别
+根据用户消息中的关键词判断是哪一餐（早餐/午餐/晚餐），没有关键词时按时间段判断（包括宵夜）。
+正则在初始化时编译一次，可以在所有对话之间共用；也支持对一批消息（例如当天的对话历史）批量识别。
+"""
+
+import datetime
+import re
+import sys
+import time
+from typing import List, Optional, Sequence, Tuple, Union
+
+# 餐次关键词（按顺序检查，第一个匹配的餐次生效）
+MEAL_PATTERNS = [
+    ("早餐", r'早餐|早饭|早点|晨餐|早(?![上中晚])|breakfast'),
+    ("午餐", r'午餐|午饭|午(?![餐])|中餐|中午饭|lunch'),
+    ("晚餐", r'晚餐|晚饭|晚(?![上])|晚饭|supper|dinner'),
+]
+
+# 各餐次的时间段（开始小时, 结束小时），不在任何时间段内的算宵夜
+MEAL_TIME_RANGES = {
+    "早餐": (5, 11),
+    "午餐": (11, 16),
+    "晚餐": (16, 22),
+}
+LATE_NIGHT_MEAL = "宵夜"
+
+TimeLike = Union[datetime.datetime, str, None]
+
+
+class MealClassifier:
+    """餐次识别器"""
+
+    def __init__(self, patterns: Sequence[Tuple[str, str]] = None, time_ranges: dict = None):
+        """
+        初始化识别器
+
+        Args:
+            patterns: [(餐次, 正则), ...]，默认 MEAL_PATTERNS
+            time_ranges: {餐次: (开始小时, 结束小时)}，默认 MEAL_TIME_RANGES
+        """
+        self.patterns = [(meal, re.compile(pattern, re.IGNORECASE))
+                         for meal, pattern in (patterns or MEAL_PATTERNS)]
+        self.time_ranges = dict(time_ranges or MEAL_TIME_RANGES)
+        # 每个小时对应的餐次，按时间判断时直接查表
+        self._meal_by_hour = [self._meal_for_hour(hour) for hour in range(24)]
+
+    def _meal_for_hour(self, hour: int) -> str:
+        for meal, (start, end) in self.time_ranges.items():
+            if start <= hour < end:
+                return meal
+        return LATE_NIGHT_MEAL
+
+    def detect(self, text: str) -> Optional[str]:
+        """只按关键词识别餐次，没有关键词返回None"""
+        if not text:
+            return None
+        for meal, pattern in self.patterns:
+            if pattern.search(text):
+                return meal
+        return None
+
+    def meal_for_time(self, when: TimeLike = None) -> str:
+        """
+        按时间段判断餐次
+
+        Args:
+            when: 时间（datetime 或 ISO 格式字符串），默认当前时间
+        """
+        if when is None:
+            hour = datetime.datetime.now().hour
+        elif isinstance(when, str):
+            hour = datetime.datetime.fromisoformat(when).hour
+        else:
+            hour = when.hour
+        return self._meal_by_hour[hour]
+
+    def classify(self, text: str, when: TimeLike = None) -> str:
+        """识别餐次：先看关键词，没有关键词时按时间段"""
+        return self.detect(text) or self.meal_for_time(when)
+
+    def classify_batch(self, messages: Sequence[str], times: Sequence[TimeLike] = None) -> List[str]:
+        """
+        批量识别餐次
+
+        Args:
+            messages: 消息列表
+            times: 每条消息的时间（与 messages 一一对应），默认都按当前时间
+
+        Returns:
+            与 messages 一一对应的餐次
+        """
+        if times is None:
+            fallback = self.meal_for_time()
+            return [self.detect(text) or fallback for text in messages]
+        return [self.detect(text) or self.meal_for_time(when) for text, when in zip(messages, times)]
+
+    def time_range(self, meal: str) -> Optional[Tuple[int, int]]:
+        """餐次的时间段（宵夜等没有固定时间段的返回None）"""
+        return self.time_ranges.get(meal)
+
+
+def benchmark_meal_classifier(count: int = 100000) -> dict:
+    """
+    餐次识别耗时测试：每次调用重新构建正则表 vs 预编译的 MealClassifier（并核对结果一致）
+
+    Args:
+        count: 识别的消息条数
+    """
+    samples = ["早上吃了两个包子", "中午吃了一碗牛肉面", "晚饭吃了米饭和青菜", "刚吃完饭",
+               "今天lunch吃了沙拉", "下午喝了一杯奶茶", "晚上吃了点水果", "吃了一个苹果"]
+    messages = [samples[i % len(samples)] for i in range(count)]
+    hour = datetime.datetime.now().hour
+
+    def rebuild_each_call(text):
+        # 原来 update_meal_status 中的写法
+        meal_patterns = {meal: [pattern, meal] for meal, pattern in MEAL_PATTERNS}
+        for meal, (pattern, display_name) in meal_patterns.items():
+            if re.search(pattern, text, re.IGNORECASE):
+                return display_name
+        return _hour_fallback(hour)
+
+    classifier = MealClassifier()
+    timings = {}
+
+    start = time.perf_counter()
+    expected = [rebuild_each_call(text) for text in messages]
+    timings["每次构建"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single = [classifier.classify(text) for text in messages]
+    timings["预编译"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = classifier.classify_batch(messages)
+    timings["批量"] = time.perf_counter() - start
+
+    consistent = expected == single == batch
+    print(f"🧪 餐次识别：{count} 条消息")
+    for label, seconds in timings.items():
+        print(f"  {label:<6} {seconds:7.3f} 秒  {seconds / count * 1e6:8.2f} 微秒/条")
+    print(f"  {'✅' if consistent else '❌'} 结果一致")
+
+    return {"count": count, "consistent": consistent,
+            "us_per_message": {label: round(seconds / count * 1e6, 3) for label, seconds in timings.items()}}
+
+
+def _hour_fallback(hour: int) -> str:
+    """原来 update_meal_status 中按时间判断的写法"""
+    if 5 <= hour < 11:
+        return "早餐"
+    elif 11 <= hour < 16:
+        return "午餐"
+    elif 16 <= hour < 22:
+        return "晚餐"
+    return "宵夜"
+
+
+if __name__ == "__main__":
+    benchmark_meal_classifier(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,311 @@
+# nutrition_table.py
+"""
+营养成分表
+从CSV（例如《中国食物成分表》导出的表格）加载大量食物的营养数据（每100克），
+热量、蛋白质、碳水、脂肪按列存成一个 NumPy 数组，另外维护 名称 → 行号 的索引。
+第一次加载时把数组写成 .npy 缓存，之后以内存映射方式打开：多个进程共享操作系统的页缓存，
+不需要每个进程重新解析CSV。
+"""
+
+import csv
+import json
+import os
+import re
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional
+
+# 可选依赖：没有安装时无法使用营养成分表，饮食模块仍使用内置的基础食物数据库
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 营养列（与 DietFunctions.base_food_db 中的字段相同）
+NUTRIENT_COLUMNS = ("calories", "protein", "carbs", "fat")
+
+# CSV表头 → 字段名（表头中括号里的单位会被忽略，例如 "能量(kcal)"）
+HEADER_ALIASES = {
+    "name": ("name", "food", "food_name", "食物名称", "食物", "名称"),
+    "calories": ("calories", "energy", "kcal", "能量", "热量"),
+    "protein": ("protein", "蛋白质"),
+    "carbs": ("carbs", "carbohydrate", "碳水化合物", "碳水"),
+    "fat": ("fat", "脂肪"),
+    "aliases": ("aliases", "alias", "别名", "俗名"),
+}
+
+# 别名列中多个别名之间的分隔符
+ALIAS_SEPARATORS = re.compile(r"[|;；,，、/]")
+
+# 缓存文件
+CACHE_META_FILE = "nutrition_meta.json"
+CACHE_DATA_FILE = "nutrition_columns.npy"
+
+
+def _write_temp(cache_dir: str, filename: str, write) -> str:
+    """在缓存目录中写一个临时文件（write 接收以二进制方式打开的文件），返回临时文件路径"""
+    fd, path = tempfile.mkstemp(dir=cache_dir, prefix=f".{filename}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("未安装numpy，无法使用营养成分表")
+
+
+def _normalize_header(header: str) -> str:
+    """去掉单位和空白，统一小写"""
+    header = re.split(r"[(（\[]", header or "", maxsplit=1)[0]
+    return header.strip().lower()
+
+
+def _parse_amount(value: str) -> float:
+    """解析营养数值；食物成分表中的 "Tr"（微量）、"—"、空值都按0处理"""
+    try:
+        return float(str(value).strip())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _read_cache_meta(cache_dir: str) -> Dict[str, Any]:
+    with open(os.path.join(cache_dir, CACHE_META_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _source_fingerprint(path: str) -> Dict[str, int]:
+    """CSV文件的大小和修改时间，用于判断缓存是否过期"""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class NutritionTable:
+    """列式营养成分表"""
+
+    def __init__(self, names: List[str], columns, aliases: Dict[str, str] = None):
+        """
+        初始化营养成分表
+
+        Args:
+            names: 食物名称（第i个名称对应第i行）
+            columns: 形状为 (4, 食物数) 的数组，各行依次为 NUTRIENT_COLUMNS（每100克）
+            aliases: 别名 → 食物名称
+        """
+        _require_numpy()
+        self.names = list(names)
+        self.columns = columns
+        self.index: Dict[str, int] = {}
+        for row, name in enumerate(self.names):
+            self.index.setdefault(name, row)
+        self.aliases = {alias: name for alias, name in (aliases or {}).items() if name in self.index}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index or name in self.aliases
+
+    def column(self, nutrient: str):
+        """某一营养列（每100克）"""
+        return self.columns[NUTRIENT_COLUMNS.index(nutrient)]
+
+    @classmethod
+    def from_dict(cls, foods: Dict[str, Dict[str, Any]]) -> "NutritionTable":
+        """从 {名称: {"calories": .., "protein": .., "carbs": .., "fat": ..}} 构建（例如内置的基础食物数据库）"""
+        _require_numpy()
+        names = list(foods)
+        columns = np.array([[float(foods[name].get(nutrient, 0)) for name in names]
+                            for nutrient in NUTRIENT_COLUMNS], dtype=np.float64).reshape(len(NUTRIENT_COLUMNS), len(names))
+        return cls(names, columns)
+
+    @classmethod
+    def from_csv(cls, csv_path: str, encoding: str = "utf-8-sig") -> "NutritionTable":
+        """
+        解析CSV营养成分表
+
+        表头需要包含食物名称、能量、蛋白质、碳水化合物、脂肪列（中英文均可，见 HEADER_ALIASES），
+        可选的别名列中多个别名用 | ; 、 等分隔
+
+        Args:
+            csv_path: CSV文件路径
+            encoding: 文件编码
+        """
+        _require_numpy()
+        with open(csv_path, "r", encoding=encoding, newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+
+            positions = {}
+            for position, title in enumerate(header):
+                normalized = _normalize_header(title)
+                for field, candidates in HEADER_ALIASES.items():
+                    if field not in positions and normalized in candidates:
+                        positions[field] = position
+            missing = [field for field in ("name",) + NUTRIENT_COLUMNS if field not in positions]
+            if missing:
+                raise ValueError(f"营养成分表缺少列: {', '.join(missing)}")
+
+            names = []
+            values = [[] for _ in NUTRIENT_COLUMNS]
+            aliases = {}
+            alias_position = positions.get("aliases")
+            for row in reader:
+                if len(row) <= positions["name"]:
+                    continue
+                name = row[positions["name"]].strip()
+                if not name:
+                    continue
+                names.append(name)
+                for column, nutrient in zip(values, NUTRIENT_COLUMNS):
+                    position = positions[nutrient]
+                    column.append(_parse_amount(row[position]) if position < len(row) else 0.0)
+                if alias_position is not None and alias_position < len(row):
+                    for alias in ALIAS_SEPARATORS.split(row[alias_position]):
+                        alias = alias.strip()
+                        if alias and alias != name:
+                            aliases.setdefault(alias, name)
+
+        columns = np.array(values, dtype=np.float64).reshape(len(NUTRIENT_COLUMNS), len(names))
+        return cls(names, columns, aliases)
+
+    def save(self, cache_dir: str, source: Dict[str, int] = None) -> None:
+        """
+        把营养成分表写成缓存（列数组为 .npy，名称和别名为JSON）
+
+        其他进程可能正以内存映射方式打开着旧的 .npy，所以从不打开正在使用的缓存文件写入：
+        两个文件都先写到同目录的临时文件，再用 os.replace 换上去（先换 .npy，最后换元数据）。
+        旧文件被换掉后，已经映射它的进程继续读取原来的内容
+
+        Args:
+            cache_dir: 缓存目录
+            source: 来源CSV的指纹（大小、修改时间）
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        meta = {
+            "columns": list(NUTRIENT_COLUMNS),
+            "names": self.names,
+            "aliases": self.aliases,
+            "source": source,
+        }
+
+        data_tmp = _write_temp(cache_dir, CACHE_DATA_FILE,
+                               lambda f: np.save(f, np.ascontiguousarray(self.columns)))
+        try:
+            meta_tmp = _write_temp(cache_dir, CACHE_META_FILE,
+                                   lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8")))
+        except OSError:
+            os.remove(data_tmp)
+            raise
+
+        os.replace(data_tmp, os.path.join(cache_dir, CACHE_DATA_FILE))
+        os.replace(meta_tmp, os.path.join(cache_dir, CACHE_META_FILE))
+
+    @classmethod
+    def load(cls, cache_dir: str, mmap: bool = True) -> "NutritionTable":
+        """
+        打开缓存的营养成分表
+
+        Args:
+            cache_dir: 缓存目录
+            mmap: 是否以只读内存映射方式打开列数组
+        """
+        _require_numpy()
+        return cls._from_cache(cache_dir, _read_cache_meta(cache_dir), mmap)
+
+    @classmethod
+    def _from_cache(cls, cache_dir: str, meta: Dict[str, Any], mmap: bool) -> "NutritionTable":
+        columns = np.load(os.path.join(cache_dir, CACHE_DATA_FILE), mmap_mode="r" if mmap else None)
+        # 另一个进程正在更新缓存时，读到的元数据和数组可能不是同一版
+        if columns.shape != (len(NUTRIENT_COLUMNS), len(meta["names"])):
+            raise ValueError(f"缓存的数组形状 {columns.shape} 与元数据不一致")
+        return cls(meta["names"], columns, meta.get("aliases"))
+
+    def row(self, name: str) -> Optional[int]:
+        """食物名称（或别名）对应的行号"""
+        row = self.index.get(name)
+        if row is None and name in self.aliases:
+            row = self.index[self.aliases[name]]
+        return row
+
+    def get(self, name: str) -> Optional[Dict[str, float]]:
+        """
+        查找一种食物的营养数据（每100克）
+
+        Returns:
+            与 base_food_db 条目相同格式的字典，找不到返回None
+        """
+        row = self.row(name)
+        if row is None:
+            return None
+        values = self.columns[:, row].tolist()
+        return dict(zip(NUTRIENT_COLUMNS, values))
+
+    def rows(self, names: Iterable[str]):
+        """批量查找行号（找不到的为-1）"""
+        return np.array([-1 if row is None else row for row in map(self.row, names)], dtype=np.int64)
+
+    def nutrients(self, rows, weights_g):
+        """
+        按行号和重量批量计算营养素
+
+        Args:
+            rows: 行号数组（-1 的条目结果为0）
+            weights_g: 对应的重量（克）
+
+        Returns:
+            形状为 (4, 条目数) 的数组，各行依次为 NUTRIENT_COLUMNS
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        weights = np.asarray(weights_g, dtype=np.float64)
+        found = rows >= 0
+        values = self.columns[:, np.where(found, rows, 0)] * (weights / 100.0)
+        values[:, ~found] = 0.0
+        return values
+
+    def totals(self, names: Iterable[str], weights_g: Iterable[float]) -> Dict[str, float]:
+        """多种食物的营养素合计（找不到的食物不计入）"""
+        names = list(names)
+        sums = self.nutrients(self.rows(names), list(weights_g)).sum(axis=1)
+        return dict(zip(NUTRIENT_COLUMNS, sums.tolist()))
+
+
+def load_nutrition_table(csv_path: str, cache_dir: str = None, mmap: bool = True) -> NutritionTable:
+    """
+    加载营养成分表：缓存有效时直接内存映射打开，否则解析CSV并重新写缓存
+
+    Args:
+        csv_path: CSV文件路径
+        cache_dir: 缓存目录（默认与CSV同名的 _cache 目录）
+        mmap: 是否内存映射
+    """
+    _require_numpy()
+    cache_dir = cache_dir or os.path.splitext(csv_path)[0] + "_cache"
+    source = _source_fingerprint(csv_path)
+
+    if os.path.exists(os.path.join(cache_dir, CACHE_META_FILE)) and \
+            os.path.exists(os.path.join(cache_dir, CACHE_DATA_FILE)):
+        try:
+            meta = _read_cache_meta(cache_dir)
+            if meta.get("source") == source:
+                return NutritionTable._from_cache(cache_dir, meta, mmap)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 营养成分表缓存无法读取，重新解析: {e}")
+
+    table = NutritionTable.from_csv(csv_path)
+    try:
+        table.save(cache_dir, source)
+    except OSError as e:
+        print(f"⚠️ 营养成分表缓存写入失败: {e}")
+        return table
+    print(f"✅ 营养成分表已缓存: {len(table)} 种食物 → {cache_dir}")
+    if not mmap:
+        return table
+    try:
+        return NutritionTable.load(cache_dir, mmap=True)
+    except (OSError, ValueError):
+        # 其他进程刚好又换上了别的版本，直接使用这次解析的结果
+        return table
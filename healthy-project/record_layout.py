@@ -0,0 +1,250 @@
+"""
+每日记录目录布局模块
+多用户时按用户分片存储：daily_records/<用户哈希>/<yyyy>/<mm>/<日期>.json
+每个目录下的文件数量都很小（一个月最多31个），并通过目录缓存避免重复的磁盘查找，
+同时提供从旧的平铺布局（daily_records/<日期>.json）迁移的工具
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from record_serializer import RECORD_EXTENSIONS, history_path, list_record_files, split_record_filename
+
+
+def user_shard_key(user_id: str) -> str:
+    """
+    计算用户的分片目录名
+
+    使用昵称的哈希而不是昵称本身：目录名长度固定、不含特殊字符，也不会暴露昵称
+
+    Args:
+        user_id: 用户昵称或用户ID
+
+    Returns:
+        16位十六进制字符串
+    """
+    return hashlib.sha1(str(user_id).encode('utf-8')).hexdigest()[:16]
+
+
+def user_record_root(base_dir: str, user_id: str) -> str:
+    """获取用户的记录根目录"""
+    return os.path.join(base_dir, user_shard_key(user_id))
+
+
+def shard_dir_for_date(user_root: str, date_str: str) -> str:
+    """
+    获取日期对应的分片目录
+
+    Args:
+        user_root: 用户记录根目录
+        date_str: 日期字符串，格式 YYYY-MM-DD
+
+    Returns:
+        <user_root>/<yyyy>/<mm>
+    """
+    return os.path.join(user_root, date_str[:4], date_str[5:7])
+
+
+class RecordDirectoryCache:
+    """
+    记录目录缓存
+
+    每个目录第一次访问时扫描一次，之后在内存里维护 {日期: 文件路径} 索引，
+    查找记录不再需要对每种格式逐个调用 os.path.exists。
+    索引同时记下扫描时目录的修改时间，每次使用前 stat 一次目录：其他进程新建或删除了记录文件时
+    目录修改时间会变化，这时重新扫描，避免看不到别处写入的记录而覆盖它。
+    缓存按LRU淘汰，多个用户的记录器可以共享同一个缓存
+    """
+
+    def __init__(self, max_dirs: int = 4096):
+        """
+        初始化目录缓存
+
+        Args:
+            max_dirs: 最多缓存的目录数量
+        """
+        self.max_dirs = max_dirs
+        self._dirs: "OrderedDict[str, Tuple[Optional[int], Dict[str, str]]]" = OrderedDict()
+        self._existing = set()  # 已确认存在的目录
+        self._lock = threading.Lock()
+
+    def _scan(self, directory: str) -> Dict[str, str]:
+        """扫描目录，建立 {日期: 文件路径} 索引（同一日期多种格式时按优先级取一个）"""
+        return list_record_files(directory)
+
+    @staticmethod
+    def _mtime(directory: str) -> Optional[int]:
+        """目录修改时间（纳秒），目录不存在返回None"""
+        try:
+            return os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+
+    def _get_index(self, directory: str) -> Dict[str, str]:
+        """获取目录索引，目录在扫描后有变化时重新扫描（调用方需持有锁）"""
+        mtime = self._mtime(directory)
+        cached = self._dirs.get(directory)
+
+        if cached is None or cached[0] != mtime:
+            # 扫描前取修改时间：扫描过程中目录又有变化时，下次使用会再扫描一次
+            index = self._scan(directory)
+            self._dirs[directory] = (mtime, index)
+            if mtime is None:
+                self._existing.discard(directory)
+            if len(self._dirs) > self.max_dirs:
+                evicted, _ = self._dirs.popitem(last=False)
+                self._existing.discard(evicted)
+        else:
+            index = cached[1]
+            self._dirs.move_to_end(directory)
+
+        return index
+
+    def find(self, directory: str, date_str: str) -> Optional[str]:
+        """查找目录下指定日期的记录文件，不存在返回None"""
+        with self._lock:
+            return self._get_index(directory).get(date_str)
+
+    def ensure(self, directory: str) -> None:
+        """确保目录存在（已缓存的目录不会再访问磁盘）"""
+        with self._lock:
+            if directory in self._existing:
+                return
+
+        os.makedirs(directory, exist_ok=True)
+
+        with self._lock:
+            self._get_index(directory)
+            self._existing.add(directory)
+
+    def record_saved(self, directory: str, date_str: str, filepath: str) -> None:
+        """记录文件写入后更新索引"""
+        with self._lock:
+            self._get_index(directory)[date_str] = filepath
+
+    def record_removed(self, directory: str, date_str: str) -> None:
+        """记录文件删除后更新索引"""
+        with self._lock:
+            cached = self._dirs.get(directory)
+            if cached is not None:
+                cached[1].pop(date_str, None)
+
+    def invalidate(self, directory: str = None) -> None:
+        """清除目录缓存（directory为None时清除全部）"""
+        with self._lock:
+            if directory is None:
+                self._dirs.clear()
+                self._existing.clear()
+            else:
+                self._dirs.pop(directory, None)
+                self._existing.discard(directory)
+
+
+# 进程内共享的目录缓存
+directory_cache = RecordDirectoryCache()
+
+
+def list_user_record_files(user_root: str) -> Dict[str, str]:
+    """
+    列出用户分片目录下的所有记录文件
+
+    Args:
+        user_root: 用户记录根目录
+
+    Returns:
+        按日期排序的 {日期: 文件路径}
+    """
+    found = {}
+
+    if not os.path.exists(user_root):
+        return found
+
+    for year in sorted(os.listdir(user_root)):
+        year_dir = os.path.join(user_root, year)
+        if not (year.isdigit() and os.path.isdir(year_dir)):
+            continue
+
+        for month in sorted(os.listdir(year_dir)):
+            month_dir = os.path.join(year_dir, month)
+            if month.isdigit() and os.path.isdir(month_dir):
+                found.update(list_record_files(month_dir))
+
+    return dict(sorted(found.items()))
+
+
+def migrate_flat_layout(base_dir: str, user_id: str, remove_old: bool = True) -> int:
+    """
+    将旧的平铺布局（base_dir/<日期>.json）迁移到用户分片布局
+
+    旧版本是一对一应用，平铺目录下的记录都属于同一个用户。
+    文件按原格式移动，不重新序列化；目标位置已有同日期记录时跳过
+
+    Args:
+        base_dir: 记录目录
+        user_id: 这些记录所属的用户昵称
+        remove_old: 是否移动文件（False时复制，保留原文件）
+
+    Returns:
+        迁移的文件数量
+    """
+    user_root = user_record_root(base_dir, user_id)
+    migrated_count = 0
+
+    if not os.path.exists(base_dir):
+        print(f"📭 记录目录不存在: {base_dir}")
+        return 0
+
+    for filename in sorted(os.listdir(base_dir)):
+        old_path = os.path.join(base_dir, filename)
+        date_str = split_record_filename(filename)
+        if not date_str or not os.path.isfile(old_path):
+            continue
+
+        target_dir = shard_dir_for_date(user_root, date_str)
+
+        try:
+            if any(os.path.exists(os.path.join(target_dir, f"{date_str}{ext}")) for ext in RECORD_EXTENSIONS):
+                print(f"⚠️ 分片目录已有 {date_str} 的记录，跳过: {filename}")
+                continue
+
+            os.makedirs(target_dir, exist_ok=True)
+            new_path = os.path.join(target_dir, filename)
+
+            # 历史文件跟记录文件一起迁移
+            moves = [(old_path, new_path)]
+            if os.path.exists(history_path(old_path)):
+                moves.insert(0, (history_path(old_path), history_path(new_path)))
+
+            for src_path, dst_path in moves:
+                if remove_old:
+                    os.replace(src_path, dst_path)
+                else:
+                    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+                        dst.write(src.read())
+
+            migrated_count += 1
+            print(f"✅ 已迁移: {filename} -> {os.path.relpath(new_path, base_dir)}")
+
+        except Exception as e:
+            print(f"❌ 迁移文件失败 {filename}: {e}")
+
+    directory_cache.invalidate()
+    print(f"🎉 用户 {user_id} 总计迁移 {migrated_count} 个记录文件到 {user_root}")
+    return migrated_count
+
+
+if __name__ == "__main__":
+    import sys
+
+    # 用法：
+    #   python record_layout.py migrate <用户昵称> [目录]
+    #   python record_layout.py locate <用户昵称> [目录]
+    if len(sys.argv) > 2 and sys.argv[1] == "migrate":
+        migrate_flat_layout(sys.argv[3] if len(sys.argv) > 3 else "daily_records", sys.argv[2])
+    elif len(sys.argv) > 2 and sys.argv[1] == "locate":
+        print(user_record_root(sys.argv[3] if len(sys.argv) > 3 else "daily_records", sys.argv[2]))
+    else:
+        print("用法: python record_layout.py migrate|locate <用户昵称> [目录]")
@@ -0,0 +1,487 @@
+"""
+每日记录序列化模块
+为每日记录文件提供可插拔的序列化格式（JSON / MessagePack / CBOR，可选zstd压缩），
+读取时根据文件内容自动识别格式，并提供格式迁移和性能对比工具。
+记录按冷热拆开保存：当天的状态字段写在 <日期><后缀> 中，不断增长的 daily_history
+写在旁边的 <日期>.history<后缀> 中，只读取状态字段时不需要解析历史
+"""
+
+import os
+import json
+import time
+from typing import Dict, Any, List, Optional, Iterable
+
+# 可选依赖：没有安装时对应格式不可用，JSON始终可用
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 文件头魔数，用于读取时自动识别格式
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+CBOR_SELF_DESCRIBE = b'\xd9\xd9\xf7'  # CBOR自描述标签55799
+
+# 所有支持的记录文件后缀（按查找优先级排列）
+RECORD_EXTENSIONS = [".json", ".msgpack", ".cbor", ".json.zst", ".msgpack.zst", ".cbor.zst"]
+
+# 单独保存的历史字段，以及历史文件名中日期后面的标记
+HISTORY_FIELD = "daily_history"
+HISTORY_MARK = ".history"
+
+class JsonRecordSerializer:
+    """JSON序列化器（默认格式，与原有文件完全兼容）"""
+
+    name = "json"
+
+    def __init__(self, indent: Optional[int] = 2, compress: bool = False, level: int = 3):
+        """
+        初始化序列化器
+
+        Args:
+            indent: 缩进空格数，None表示紧凑输出
+            compress: 是否使用zstd压缩
+            level: zstd压缩级别
+        """
+        if compress and zstandard is None:
+            raise ImportError("未安装zstandard，无法使用压缩功能")
+        self.indent = indent
+        self.compress = compress
+        self.level = level
+
+    @property
+    def extension(self) -> str:
+        """文件后缀"""
+        return f".{self.name}.zst" if self.compress else f".{self.name}"
+
+    def _encode(self, data: Dict[str, Any]) -> bytes:
+        separators = None if self.indent is not None else (',', ':')
+        return json.dumps(data, ensure_ascii=False, indent=self.indent, separators=separators).encode('utf-8')
+
+    def dumps(self, data: Dict[str, Any]) -> bytes:
+        """序列化为字节"""
+        raw = self._encode(data)
+        if self.compress:
+            raw = zstandard.ZstdCompressor(level=self.level).compress(raw)
+        return raw
+
+
+class MsgpackRecordSerializer(JsonRecordSerializer):
+    """MessagePack序列化器"""
+
+    name = "msgpack"
+
+    def __init__(self, compress: bool = False, level: int = 3):
+        if msgpack is None:
+            raise ImportError("未安装msgpack，无法使用MessagePack格式")
+        super().__init__(indent=None, compress=compress, level=level)
+
+    def _encode(self, data: Dict[str, Any]) -> bytes:
+        return msgpack.packb(data, use_bin_type=True)
+
+
+class CborRecordSerializer(JsonRecordSerializer):
+    """CBOR序列化器"""
+
+    name = "cbor"
+
+    def __init__(self, compress: bool = False, level: int = 3):
+        if cbor2 is None:
+            raise ImportError("未安装cbor2，无法使用CBOR格式")
+        super().__init__(indent=None, compress=compress, level=level)
+
+    def _encode(self, data: Dict[str, Any]) -> bytes:
+        # 加上自描述标签，读取时可以和MessagePack区分开
+        return CBOR_SELF_DESCRIBE + cbor2.dumps(data)
+
+
+SERIALIZERS = {
+    "json": JsonRecordSerializer,
+    "msgpack": MsgpackRecordSerializer,
+    "cbor": CborRecordSerializer,
+}
+
+
+def get_serializer(name: str = "json", compress: bool = False) -> JsonRecordSerializer:
+    """
+    根据名称获取序列化器
+
+    Args:
+        name: 格式名称（json / msgpack / cbor）
+        compress: 是否使用zstd压缩
+
+    Returns:
+        序列化器实例
+    """
+    if name not in SERIALIZERS:
+        raise ValueError(f"不支持的序列化格式: {name}，可选: {', '.join(SERIALIZERS)}")
+    return SERIALIZERS[name](compress=compress)
+
+
+def detect_format(raw: bytes) -> str:
+    """
+    根据文件内容识别序列化格式
+
+    Args:
+        raw: 文件原始字节（已解压）
+
+    Returns:
+        格式名称
+    """
+    if raw.startswith(CBOR_SELF_DESCRIBE):
+        return "cbor"
+
+    head = raw.lstrip(b'\xef\xbb\xbf \t\r\n')[:1]
+    if head in (b'{', b'['):
+        return "json"
+
+    # MessagePack的map类型：fixmap(0x80-0x8f)、map16(0xde)、map32(0xdf)
+    if head and (0x80 <= head[0] <= 0x8f or head[0] in (0xde, 0xdf)):
+        return "msgpack"
+
+    return "json"
+
+
+def loads_record(raw: bytes) -> Dict[str, Any]:
+    """
+    自动识别格式并反序列化
+
+    Args:
+        raw: 文件原始字节
+
+    Returns:
+        记录数据字典
+    """
+    if raw.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ImportError("记录文件使用了zstd压缩，但未安装zstandard")
+        raw = zstandard.ZstdDecompressor().decompress(raw)
+
+    fmt = detect_format(raw)
+
+    if fmt == "cbor":
+        if cbor2 is None:
+            raise ImportError("记录文件为CBOR格式，但未安装cbor2")
+        return cbor2.loads(raw[len(CBOR_SELF_DESCRIBE):])
+
+    if fmt == "msgpack":
+        if msgpack is None:
+            raise ImportError("记录文件为MessagePack格式，但未安装msgpack")
+        return msgpack.unpackb(raw, raw=False)
+
+    return json.loads(raw.decode('utf-8-sig'))
+
+
+def _record_extension(filepath: str) -> str:
+    """记录文件的后缀（最长匹配）"""
+    for ext in sorted(RECORD_EXTENSIONS, key=len, reverse=True):
+        if filepath.endswith(ext):
+            return ext
+    return os.path.splitext(filepath)[1]
+
+
+def history_path(filepath: str) -> str:
+    """
+    获取记录文件对应的历史文件路径
+
+    Args:
+        filepath: 记录文件路径，如 2026-01-23.msgpack
+
+    Returns:
+        历史文件路径，如 2026-01-23.history.msgpack
+    """
+    ext = _record_extension(filepath)
+    return f"{filepath[:-len(ext)]}{HISTORY_MARK}{ext}"
+
+
+def _read_history(filepath: str) -> Optional[List[Any]]:
+    """读取记录的历史文件，没有历史文件返回None（旧记录的历史保存在记录文件中）"""
+    try:
+        with open(history_path(filepath), 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return None
+    return loads_record(raw).get(HISTORY_FIELD, [])
+
+
+def read_record_file(filepath: str) -> Dict[str, Any]:
+    """读取记录文件（自动识别格式，并合并单独保存的历史）"""
+    with open(filepath, 'rb') as f:
+        data = loads_record(f.read())
+
+    history = _read_history(filepath)
+    if history is not None:
+        data[HISTORY_FIELD] = history
+    return data
+
+
+def read_record_fields(filepath: str, fields: Iterable[str] = None,
+                       exclude: Iterable[str] = None) -> Dict[str, Any]:
+    """
+    按字段投影读取记录文件，只返回需要的顶层字段
+
+    daily_history 保存在单独的历史文件中，只有需要它时才读取历史文件；
+    MessagePack格式会直接跳过其余不需要的字段，不构造Python对象；
+    JSON格式交给标准库的C解码器解析后再筛选（纯Python逐字符跳过反而更慢）
+
+    Args:
+        filepath: 记录文件路径
+        fields: 只读取这些顶层字段（None表示全部）
+        exclude: 跳过这些顶层字段
+
+    Returns:
+        只包含所需字段的记录字典
+    """
+    fields = set(fields) if fields is not None else None
+    exclude = set(exclude or ())
+
+    def wanted(key: str) -> bool:
+        return (fields is None or key in fields) and key not in exclude
+
+    with open(filepath, 'rb') as f:
+        raw = f.read()
+
+    if raw.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ImportError("记录文件使用了zstd压缩，但未安装zstandard")
+        raw = zstandard.ZstdDecompressor().decompress(raw)
+
+    fmt = detect_format(raw)
+
+    if fmt == "msgpack" and msgpack is not None:
+        # MessagePack可以逐个字段跳过，不需要解码被排除的值
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(raw)
+        result = {}
+        for _ in range(unpacker.read_map_header()):
+            key = unpacker.unpack()
+            if wanted(key):
+                result[key] = unpacker.unpack()
+            else:
+                unpacker.skip()
+    else:
+        result = {key: value for key, value in loads_record(raw).items() if wanted(key)}
+
+    if wanted(HISTORY_FIELD):
+        history = _read_history(filepath)
+        if history is not None:
+            result[HISTORY_FIELD] = history
+    return result
+
+
+def write_record_file(filepath: str, data: Dict[str, Any], serializer: JsonRecordSerializer = None) -> None:
+    """
+    使用指定序列化器写入记录文件
+
+    daily_history 写入单独的历史文件（先写历史再写记录），记录文件只保存当天的状态字段
+    """
+    serializer = serializer or JsonRecordSerializer()
+    hot = {key: value for key, value in data.items() if key != HISTORY_FIELD}
+
+    if HISTORY_FIELD in data:
+        with open(history_path(filepath), 'wb') as f:
+            f.write(serializer.dumps({HISTORY_FIELD: data[HISTORY_FIELD]}))
+    else:
+        try:
+            os.remove(history_path(filepath))
+        except FileNotFoundError:
+            pass
+
+    with open(filepath, 'wb') as f:
+        f.write(serializer.dumps(hot))
+
+
+def remove_record_file(filepath: str) -> None:
+    """删除记录文件及其历史文件（不存在时忽略）"""
+    for path in (filepath, history_path(filepath)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def split_record_filename(filename: str) -> Optional[str]:
+    """
+    从记录文件名中提取日期部分
+
+    Args:
+        filename: 文件名，如 2026-01-23.msgpack.zst
+
+    Returns:
+        日期字符串，不是记录文件（包括历史文件）时返回None
+    """
+    for ext in sorted(RECORD_EXTENSIONS, key=len, reverse=True):
+        if filename.endswith(ext):
+            date_str = filename[:-len(ext)]
+            return None if date_str.endswith(HISTORY_MARK) else date_str
+    return None
+
+
+def list_record_files(base_dir: str) -> Dict[str, str]:
+    """
+    列出目录下所有记录文件
+
+    Args:
+        base_dir: 记录目录
+
+    Returns:
+        {日期: 文件路径}，同一日期存在多种格式时按RECORD_EXTENSIONS优先级取一个
+    """
+    if not os.path.exists(base_dir):
+        return {}
+
+    found = {}
+    priority = {ext: i for i, ext in enumerate(RECORD_EXTENSIONS)}
+
+    for filename in os.listdir(base_dir):
+        date_str = split_record_filename(filename)
+        if not date_str:
+            continue
+        ext = filename[len(date_str):]
+        current = found.get(date_str)
+        if current is None or priority[ext] < priority[current[len(date_str):]]:
+            found[date_str] = filename
+
+    return {date_str: os.path.join(base_dir, filename) for date_str, filename in sorted(found.items())}
+
+
+def migrate_records(base_dir: str, serializer: JsonRecordSerializer, remove_old: bool = True) -> int:
+    """
+    将目录下所有记录文件迁移到指定格式
+
+    Args:
+        base_dir: 记录目录
+        serializer: 目标格式的序列化器
+        remove_old: 迁移成功后是否删除旧格式文件
+
+    Returns:
+        迁移的文件数量
+    """
+    migrated_count = 0
+
+    for filename in sorted(os.listdir(base_dir)) if os.path.exists(base_dir) else []:
+        date_str = split_record_filename(filename)
+        if not date_str or filename == f"{date_str}{serializer.extension}":
+            continue
+
+        old_path = os.path.join(base_dir, filename)
+        new_path = os.path.join(base_dir, f"{date_str}{serializer.extension}")
+
+        try:
+            data = read_record_file(old_path)
+            write_record_file(new_path, data, serializer)
+
+            # 校验写入的文件可以正确读回
+            if read_record_file(new_path) != data:
+                print(f"❌ 迁移校验失败，保留原文件: {filename}")
+                remove_record_file(new_path)
+                continue
+
+            if remove_old:
+                remove_record_file(old_path)
+
+            migrated_count += 1
+            print(f"✅ 已迁移: {filename} -> {os.path.basename(new_path)}")
+
+        except Exception as e:
+            print(f"❌ 迁移文件失败 {filename}: {e}")
+
+    print(f"🎉 总计迁移 {migrated_count} 个记录文件")
+    return migrated_count
+
+
+def benchmark_serializers(base_dir: str = "daily_records", rounds: int = 20) -> List[Dict[str, Any]]:
+    """
+    对比各序列化格式的解析耗时、写入耗时和文件大小
+
+    Args:
+        base_dir: 用作样本数据的记录目录
+        rounds: 每种格式重复的轮数
+
+    Returns:
+        每种格式的统计结果列表
+    """
+    records = []
+    for filepath in list_record_files(base_dir).values():
+        try:
+            records.append(read_record_file(filepath))
+        except Exception as e:
+            print(f"⚠️ 跳过无法读取的文件 {filepath}: {e}")
+
+    if not records:
+        print("📭 没有可用于测试的记录文件")
+        return []
+
+    candidates = [("json(缩进)", lambda: JsonRecordSerializer()),
+                  ("json(紧凑)", lambda: JsonRecordSerializer(indent=None))]
+    for name in ["msgpack", "cbor"]:
+        candidates.append((name, lambda name=name: get_serializer(name)))
+        candidates.append((f"{name}+zstd", lambda name=name: get_serializer(name, compress=True)))
+
+    results = []
+
+    for label, factory in candidates:
+        try:
+            serializer = factory()
+        except ImportError as e:
+            print(f"⚠️ 跳过 {label}: {e}")
+            continue
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            blobs = [serializer.dumps(record) for record in records]
+        dump_ms = (time.perf_counter() - start) * 1000 / rounds
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for blob in blobs:
+                loads_record(blob)
+        load_ms = (time.perf_counter() - start) * 1000 / rounds
+
+        results.append({
+            "format": label,
+            "files": len(records),
+            "dump_ms": round(dump_ms, 3),
+            "load_ms": round(load_ms, 3),
+            "total_bytes": sum(len(blob) for blob in blobs)
+        })
+
+    baseline = results[0]["total_bytes"] if results else 1
+
+    print("\n" + "=" * 70)
+    print(f"📊 序列化格式对比（{len(records)}个文件，{rounds}轮平均）")
+    print("=" * 70)
+    print(f"{'格式':<16}{'写入(ms)':>12}{'解析(ms)':>12}{'大小(字节)':>14}{'相对大小':>10}")
+    for result in results:
+        ratio = result["total_bytes"] / baseline * 100
+        print(f"{result['format']:<16}{result['dump_ms']:>12}{result['load_ms']:>12}"
+              f"{result['total_bytes']:>14}{ratio:>9.1f}%")
+    print("=" * 70)
+
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    # 用法：
+    #   python record_serializer.py benchmark [目录]
+    #   python record_serializer.py migrate <json|msgpack|cbor> [zstd] [目录]
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        target = sys.argv[2] if len(sys.argv) > 2 else "json"
+        use_zstd = len(sys.argv) > 3 and sys.argv[3] == "zstd"
+        directory = sys.argv[4] if len(sys.argv) > 4 else (
+            sys.argv[3] if len(sys.argv) > 3 and not use_zstd else "daily_records")
+        migrate_records(directory, get_serializer(target, compress=use_zstd))
+    else:
+        directory = sys.argv[2] if len(sys.argv) > 2 else "daily_records"
+        benchmark_serializers(directory)
@@ -0,0 +1,613 @@
+# repository.py
+"""
+健康数据仓储层：SQLite 是唯一的主存储
+用户档案、体重历史、每日记录和负面因子都读写 HealthDatabaseSQLite 中的表，
+JSON 文件（user_profiles.json、weight_history_<昵称>.json、daily_records/）只在导出时生成。
+
+读取按 (user_id, record_date) 唯一索引查询，只取需要的列；每日记录里没有对应列的字段
+（created_at、last_updated 以及将来新增的字段）整体存在 extra 列里，导入导出不丢字段。
+对话历史每条消息一行存在 daily_history_entries 表，新消息只追加一行（append_history），
+不重写当天的记录；读取当天状态时不读历史。
+
+用法：
+    python repository.py import [数据库]          # 把当前目录的JSON数据导入数据库（已有数据按日期覆盖）
+    python repository.py export [目录] [数据库]   # 从数据库导出JSON文件
+"""
+
+import os
+import sys
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable
+
+from database import HealthDatabaseSQLite
+from bulk_import import MEAL_FIELDS, RECORD_FIELD_COLUMNS, STATUS_DEFAULTS, daily_record_values
+from record_serializer import HISTORY_FIELD, JsonRecordSerializer, list_record_files, read_record_file
+from record_layout import list_user_record_files, user_record_root
+
+logger = logging.getLogger(__name__)
+
+# 档案字段 → users 表的列（其余字段存在 extra 列）
+PROFILE_COLUMNS = {
+    "age": "age",
+    "gender": "gender",
+    "height_cm": "height_cm",
+    "current_weight_kg": "current_weight_kg",
+    "bmi": "bmi",
+    "status": "bmi_status",
+    "goal": "goal",
+    "target_weight_kg": "target_weight_kg",
+    "diet_preferences": "diet_preferences",
+    "allergens": "allergens",
+    "move_prefer": "move_prefer",
+    "remarks": "remarks",
+    "registration_date": "registration_date",
+    "last_update": "last_update",
+}
+
+# 以JSON文本保存的档案字段
+PROFILE_JSON_FIELDS = ("diet_preferences", "allergens", "move_prefer")
+
+RECORD_COLUMNS = [
+    "breakfast_status", "breakfast_details", "lunch_status", "lunch_details",
+    "dinner_status", "dinner_details", "snack_status", "snack_details",
+    "exercise_status", "exercise_details", "drink_plan", "drink_number",
+    "food_plan", "movement_plan", "daily_summary", "negative_factors", "extra"
+]
+
+
+
+def _from_text(value: Optional[str], default: Any = None) -> Any:
+    """_to_text 的逆操作：看起来是JSON对象/数组的文本还原成对象，其余原样返回"""
+    if value is None:
+        return default
+    if value[:1] in ("{", "["):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return value
+
+
+class HealthRepository:
+    """以SQLite为主存储的健康数据仓储"""
+
+    def __init__(self, db: HealthDatabaseSQLite = None, db_path: str = "health_assistant.db"):
+        """
+        初始化仓储
+
+        Args:
+            db: 已连接的数据库（例如 db_bridge.db），不提供时按 db_path 新建连接
+            db_path: SQLite数据库文件路径
+        """
+        if db is None:
+            db = HealthDatabaseSQLite(db_path)
+            if not db.connect():
+                raise RuntimeError(f"无法连接数据库: {db_path}")
+        self.db = db
+        # 建表并升级到最新结构（每日记录的 daily_history / extra 列在结构版本4中加入）
+        if not self.db.create_tables():
+            raise RuntimeError(f"初始化数据库结构失败: {self.db.db_path}")
+
+    @property
+    def conn(self):
+        return self.db.conn
+
+    def _user_id(self, nickname: str) -> Optional[int]:
+        return self.db.get_user_id(nickname)
+
+    # ==================== 用户档案 ====================
+
+    def _profile_from_row(self, row) -> Dict[str, Any]:
+        """users 表的一行 → 档案字典（与 user_profiles.json 中的格式相同）"""
+        profile = {"nickname": row["nickname"]}
+        for field, column in PROFILE_COLUMNS.items():
+            value = row[column]
+            if value is None:
+                continue
+            if field in PROFILE_JSON_FIELDS:
+                value = _from_text(value, [])
+            profile[field] = value
+        if row["extra"]:
+            profile.update(json.loads(row["extra"]))
+        return profile
+
+    def load_profiles(self) -> Dict[str, Dict[str, Any]]:
+        """读取所有用户档案（昵称→档案）"""
+        rows = self.conn.execute("SELECT * FROM users ORDER BY id").fetchall()
+        return {row["nickname"]: self._profile_from_row(row) for row in rows}
+
+    def get_profile(self, nickname: str) -> Optional[Dict[str, Any]]:
+        """读取一个用户的档案，不存在返回None"""
+        row = self.conn.execute("SELECT * FROM users WHERE nickname = ?", (nickname,)).fetchone()
+        return self._profile_from_row(row) if row else None
+
+    def save_profile(self, profile: Dict[str, Any], commit: bool = True) -> int:
+        """
+        新建或更新一个用户档案
+
+        使用 ON CONFLICT(nickname) DO UPDATE，已存在的用户保留原ID（不会级联删除历史数据）
+
+        Returns:
+            用户ID
+        """
+        nickname = profile["nickname"]
+        values = []
+        for field in PROFILE_COLUMNS:
+            value = profile.get(field)
+            if field in PROFILE_JSON_FIELDS:
+                value = json.dumps(value or [], ensure_ascii=False)
+            values.append(value)
+        extra = {key: value for key, value in profile.items()
+                 if key != "nickname" and key not in PROFILE_COLUMNS}
+
+        columns = ["nickname", *PROFILE_COLUMNS.values(), "extra"]
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+        row = self.conn.execute(f"""
+        INSERT INTO users ({", ".join(columns)})
+        VALUES ({", ".join(["?"] * len(columns))})
+        ON CONFLICT(nickname) DO UPDATE SET {updates}
+        RETURNING id
+        """, (nickname, *values, json.dumps(extra, ensure_ascii=False) if extra else None)).fetchone()
+        if commit:
+            self.conn.commit()
+
+        self.db.identity.invalidate(nickname=nickname)
+        return row["id"]
+
+    def save_profiles(self, profiles: Dict[str, Dict[str, Any]]) -> int:
+        """在一个事务里保存多个档案，返回保存的数量"""
+        try:
+            for nickname, profile in profiles.items():
+                self.save_profile({**profile, "nickname": nickname}, commit=False)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return len(profiles)
+
+    def delete_profile(self, nickname: str) -> bool:
+        """删除用户（体重历史、每日记录和负面因子级联删除）"""
+        user_id = self._user_id(nickname)
+        if user_id is None:
+            return False
+        self.conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        self.conn.commit()
+        self.db.identity.invalidate(nickname=nickname, user_id=user_id)
+        return True
+
+    # ==================== 体重历史 ====================
+
+    def add_weight_record(self, nickname: str, weight: float, bmi: float = None, status: str = None,
+                          recorded_at: str = None, commit: bool = True) -> bool:
+        """
+        记录一次称重
+
+        Args:
+            recorded_at: 称重时间 "YYYY-MM-DD HH:MM:SS"（默认当前时间）
+        """
+        user_id = self._user_id(nickname)
+        if user_id is None:
+            return False
+
+        recorded_at = recorded_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.conn.execute("""
+        INSERT INTO weight_history (user_id, weight_kg, bmi, bmi_status, recorded_date, recorded_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """, (user_id, weight, bmi, status, recorded_at[:10], recorded_at))
+        if commit:
+            self.conn.commit()
+        return True
+
+    def get_weight_history(self, nickname: str) -> List[Dict[str, Any]]:
+        """按时间顺序读取体重历史（与 weight_history_<昵称>.json 中 history 的格式相同）"""
+        user_id = self._user_id(nickname)
+        if user_id is None:
+            return []
+
+        rows = self.conn.execute("""
+        SELECT weight_kg, bmi, bmi_status, recorded_date, recorded_at
+        FROM weight_history WHERE user_id = ? ORDER BY recorded_date, id
+        """, (user_id,)).fetchall()
+        return [{
+            "up_date": row["recorded_at"] or row["recorded_date"],
+            "weight_kg": row["weight_kg"],
+            "bmi": row["bmi"],
+            "status": row["bmi_status"],
+        } for row in rows]
+
+    # ==================== 每日记录 ====================
+
+    def _record_columns(self, fields: Optional[Iterable[str]]) -> List[str]:
+        """需要读取的列（fields 为None时读取全部列）"""
+        if fields is None:
+            return list(RECORD_COLUMNS)
+        columns = []
+        for field in fields:
+            for column in RECORD_FIELD_COLUMNS.get(field, ["extra"]):
+                if column not in columns:
+                    columns.append(column)
+        return columns
+
+    def _record_from_row(self, row, date_str: str, fields: Optional[List[str]]) -> Dict[str, Any]:
+        """daily_records 表的一行 → 记录字典（与每日记录JSON文件中的格式相同）"""
+        keys = row.keys()
+        extra = json.loads(row["extra"]) if "extra" in keys and row["extra"] else {}
+
+        record = {"date": date_str}
+        for field, prefix in [*MEAL_FIELDS.items(), ("运动状态", "exercise")]:
+            if f"{prefix}_status" in keys:
+                record[field] = [row[f"{prefix}_status"] or STATUS_DEFAULTS[field],
+                                 _from_text(row[f"{prefix}_details"], "")]
+        if "food_plan" in keys:
+            record["daily_plan"] = {
+                "food": _from_text(row["food_plan"], []),
+                "movement": _from_text(row["movement_plan"], []),
+                **extra.pop("daily_plan", {}),
+            }
+        for field, column in (("drink_number", "drink_number"), ("drink_plan", "drink_plan")):
+            if column in keys:
+                record[field] = row[column]
+        if "daily_summary" in keys:
+            record["summary"] = row["daily_summary"] or ""
+        if "negative_factors" in keys and row["negative_factors"]:
+            record["negative_factors"] = _from_text(row["negative_factors"])
+        extra.pop("daily_plan", None)
+        record.update(extra)
+
+        if fields is not None:
+            record = {key: value for key, value in record.items() if key in fields}
+        return record
+
+    @staticmethod
+    def _wants_history(fields: Optional[List[str]], exclude: Optional[List[str]]) -> bool:
+        """是否需要读取对话历史"""
+        return (fields is None or HISTORY_FIELD in fields) and HISTORY_FIELD not in (exclude or ())
+
+    def _history_by_date(self, user_id: int, start_date: str, end_date: str) -> Dict[str, List[Dict[str, Any]]]:
+        """按 (user_id, record_date, id) 索引读取日期范围内的对话历史，按日期分组"""
+        rows = self.conn.execute("""
+        SELECT record_date, entry FROM daily_history_entries
+        WHERE user_id = ? AND record_date BETWEEN ? AND ?
+        ORDER BY record_date, id
+        """, (user_id, start_date, end_date))
+        history: Dict[str, List[Dict[str, Any]]] = {}
+        for record_date, entry in rows:
+            history.setdefault(record_date, []).append(json.loads(entry))
+        return history
+
+    def load_record(self, nickname: str, date_str: str, fields: List[str] = None,
+                    exclude: List[str] = None) -> Dict[str, Any]:
+        """
+        读取一天的记录
+
+        Args:
+            fields: 只读取这些顶层字段（None表示完整记录）
+            exclude: 不读取的顶层字段（例如 daily_history，每次对话都要读的当天状态不需要历史）
+
+        Returns:
+            记录字典，不存在返回空字典
+        """
+        user_id = self._user_id(nickname)
+        if user_id is None:
+            return {}
+
+        columns = self._record_columns(fields)
+        row = self.conn.execute(f"""
+        SELECT {", ".join(["record_date", *columns])} FROM daily_records WHERE user_id = ? AND record_date = ?
+        """, (user_id, date_str)).fetchone()
+        if not row:
+            return {}
+
+        record = self._record_from_row(row, date_str, fields)
+        for field in exclude or ():
+            record.pop(field, None)
+        if self._wants_history(fields, exclude):
+            record[HISTORY_FIELD] = self._history_by_date(user_id, date_str, date_str).get(date_str, [])
+        return record
+
+    def load_records(self, nickname: str, start_date: str = None, end_date: str = None,
+                     fields: List[str] = None, exclude: List[str] = None) -> List[Dict[str, Any]]:
+        """
+        一次查询读取日期范围内的记录（按日期升序）
+
+        Args:
+            start_date / end_date: 闭区间，None表示不限
+            fields: 只读取这些顶层字段（None表示完整记录）
+            exclude: 不读取的顶层字段（例如 daily_history）
+        """
+        user_id = self._user_id(nickname)
+        if user_id is None:
+            return []
+
+        columns = self._record_columns(fields)
+        if exclude:
+            excluded = {column for field in exclude for column in RECORD_FIELD_COLUMNS.get(field, [])
+                        if column != "extra"}
+            columns = [column for column in columns if column not in excluded]
+
+        start_date, end_date = start_date or "0000-00-00", end_date or "9999-99-99"
+        rows = self.conn.execute(f"""
+        SELECT {", ".join(["record_date", *columns])} FROM daily_records
+        WHERE user_id = ? AND record_date BETWEEN ? AND ?
+        ORDER BY record_date
+        """, (user_id, start_date, end_date)).fetchall()
+        history = self._history_by_date(user_id, start_date, end_date) \
+            if rows and self._wants_history(fields, exclude) else None
+
+        records = []
+        for row in rows:
+            record = self._record_from_row(row, row["record_date"], fields)
+            for field in exclude or ():
+                record.pop(field, None)
+            if history is not None:
+                record[HISTORY_FIELD] = history.get(row["record_date"], [])
+            records.append(record)
+        return records
+
+    def list_record_dates(self, nickname: str) -> List[str]:
+        """列出用户有记录的日期（升序，只读唯一索引）"""
+        user_id = self._user_id(nickname)
+        if user_id is None:
+            return []
+        rows = self.conn.execute(
+            "SELECT record_date FROM daily_records WHERE user_id = ? ORDER BY record_date", (user_id,))
+        return [row[0] for row in rows]
+
+    def record_exists(self, nickname: str, date_str: str) -> bool:
+        """指定日期是否已有记录"""
+        user_id = self._user_id(nickname)
+        if user_id is None:
+            return False
+        return self.conn.execute("SELECT 1 FROM daily_records WHERE user_id = ? AND record_date = ?",
+                                 (user_id, date_str)).fetchone() is not None
+
+    def _record_row(self, record: Dict[str, Any]) -> List[Any]:
+        """记录字典 → RECORD_COLUMNS 顺序的列值"""
+        values = daily_record_values(record)
+        return [values[column] for column in RECORD_COLUMNS]
+
+    def _sync_factors(self, user_id: int, date_str: str, factors: Dict[str, Any]) -> None:
+        """
+        把记录中的负面因子同步到 negative_factors 表
+
+        同一个因子会被复制到之后每一天的记录里，按 (类型, 描述, 开始日期) 识别，更新为最新状态
+        """
+        for factor in (factors or {}).get("factors", []):
+            start_date = factor.get("original_start_date") or factor.get("start_date") or date_str
+            key = (user_id, factor.get("type", "其他"), factor.get("description", ""), start_date)
+            state = (
+                factor.get("severity", "轻"),
+                factor.get("duration_days", 1),
+                1 if factor.get("should_exercise", True) else 0,
+                factor.get("status", "active"),
+                factor.get("recovery_date"),
+                factor.get("recovery_notes") or factor.get("notes"),
+            )
+            cursor = self.conn.execute("""
+            UPDATE negative_factors
+            SET severity = ?, duration_days = ?, should_exercise = ?, status = ?,
+                recovery_date = ?, recovery_notes = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = ? AND factor_type = ? AND description = ? AND start_date = ?
+            """, (*state, *key))
+            if cursor.rowcount == 0:
+                self.conn.execute("""
+                INSERT INTO negative_factors
+                (severity, duration_days, should_exercise, status, recovery_date, recovery_notes,
+                 user_id, factor_type, description, start_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (*state, *key))
+
+    def _replace_history(self, user_id: int, date_str: str, history: List[Dict[str, Any]]) -> None:
+        """用给定的列表替换一天的对话历史（不提交）"""
+        self.conn.execute("DELETE FROM daily_history_entries WHERE user_id = ? AND record_date = ?",
+                          (user_id, date_str))
+        self.conn.executemany(
+            "INSERT INTO daily_history_entries (user_id, record_date, entry) VALUES (?, ?, ?)",
+            [(user_id, date_str, json.dumps(entry, ensure_ascii=False)) for entry in history or []])
+
+    def save_record(self, nickname: str, date_str: str, record: Dict[str, Any], commit: bool = True) -> bool:
+        """
+        保存一天的完整记录（整行覆盖），并同步负面因子表
+
+        记录里有 daily_history 时整体替换当天的对话历史；没有这个字段时（例如按 exclude 读出的当天状态）
+        保留已有的历史，日常对话用 append_history 逐条追加
+
+        Returns:
+            是否成功（用户不存在时返回False）
+        """
+        user_id = self._user_id(nickname)
+        if user_id is None:
+            return False
+
+        updates = ", ".join(f"{column} = excluded.{column}" for column in RECORD_COLUMNS)
+        try:
+            self.conn.execute(f"""
+            INSERT INTO daily_records (user_id, record_date, {", ".join(RECORD_COLUMNS)})
+            VALUES ({", ".join(["?"] * (len(RECORD_COLUMNS) + 2))})
+            ON CONFLICT(user_id, record_date) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP
+            """, (user_id, date_str, *self._record_row(record)))
+            if HISTORY_FIELD in record:
+                self._replace_history(user_id, date_str, record[HISTORY_FIELD])
+            self._sync_factors(user_id, date_str, record.get("negative_factors"))
+            if commit:
+                self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return True
+
+    def append_history(self, nickname: str, date_str: str, entry: Dict[str, Any],
+                       max_entries: int = None, keep: int = None, commit: bool = True) -> bool:
+        """
+        追加一条对话历史（只插入一行，不读取也不重写当天的记录）
+
+        Args:
+            max_entries: 当天超过这么多条时清理旧消息（None表示不清理）
+            keep: 清理后保留的最新条数
+
+        Returns:
+            是否成功（用户不存在时返回False）
+        """
+        user_id = self._user_id(nickname)
+        if user_id is None:
+            return False
+
+        try:
+            self.conn.execute("INSERT INTO daily_history_entries (user_id, record_date, entry) VALUES (?, ?, ?)",
+                              (user_id, date_str, json.dumps(entry, ensure_ascii=False)))
+            if max_entries is not None:
+                count = self.conn.execute(
+                    "SELECT COUNT(*) FROM daily_history_entries WHERE user_id = ? AND record_date = ?",
+                    (user_id, date_str)).fetchone()[0]
+                if count > max_entries:
+                    self.conn.execute("""
+                    DELETE FROM daily_history_entries
+                    WHERE user_id = ? AND record_date = ? AND id NOT IN (
+                        SELECT id FROM daily_history_entries WHERE user_id = ? AND record_date = ?
+                        ORDER BY id DESC LIMIT ?)
+                    """, (user_id, date_str, user_id, date_str, keep if keep is not None else max_entries))
+            if commit:
+                self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return True
+
+    def load_history(self, nickname: str, date_str: str, limit: int = None) -> List[Dict[str, Any]]:
+        """
+        读取一天的对话历史（按时间顺序）
+
+        Args:
+            limit: 只读取最近的几条（None表示全部）
+        """
+        user_id = self._user_id(nickname)
+        if user_id is None:
+            return []
+        if limit is None:
+            return self._history_by_date(user_id, date_str, date_str).get(date_str, [])
+
+        rows = self.conn.execute("""
+        SELECT entry FROM daily_history_entries WHERE user_id = ? AND record_date = ?
+        ORDER BY id DESC LIMIT ?
+        """, (user_id, date_str, limit)).fetchall()
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    # ==================== 导入 / 导出 ====================
+
+    def import_json(self, profiles_file: str = "user_profiles.json", records_dir: str = "daily_records",
+                    flat_owner: str = None, weight_dir: str = ".") -> Dict[str, int]:
+        """
+        把现有的JSON数据导入数据库（每个用户一个事务）
+
+        Args:
+            profiles_file: 用户档案文件
+            records_dir: 每日记录根目录（按用户分片的 <根目录>/<用户哈希>/...）
+            flat_owner: 旧的平铺记录（<根目录>/<日期>.json）归属的用户，默认档案中的第一个用户
+            weight_dir: weight_history_<昵称>.json 所在目录
+        """
+        with open(profiles_file, "r", encoding="utf-8") as f:
+            profiles = json.load(f)
+
+        flat_owner = flat_owner or next(iter(profiles), None)
+        existing_weights = {(row[0], row[1], row[2]) for row in self.conn.execute(
+            "SELECT u.nickname, w.recorded_date, w.weight_kg FROM weight_history w JOIN users u ON u.id = w.user_id")}
+        counts = {"users": 0, "weights": 0, "records": 0}
+
+        for nickname, profile in profiles.items():
+            try:
+                self.save_profile({**profile, "nickname": nickname}, commit=False)
+
+                weight_file = os.path.join(weight_dir, f"weight_history_{nickname}.json")
+                if os.path.exists(weight_file):
+                    with open(weight_file, "r", encoding="utf-8") as f:
+                        history = json.load(f).get("history", [])
+                    for entry in history:
+                        recorded_at = entry.get("up_date") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                        # 重复执行时跳过已导入的同一天同一体重
+                        if (nickname, recorded_at[:10], entry.get("weight_kg")) in existing_weights:
+                            continue
+                        self.add_weight_record(nickname, entry.get("weight_kg"), entry.get("bmi"),
+                                               entry.get("status"), recorded_at, commit=False)
+                        counts["weights"] += 1
+
+                files = dict(list_user_record_files(user_record_root(records_dir, nickname)))
+                if nickname == flat_owner and os.path.isdir(records_dir):
+                    files = {**list_record_files(records_dir), **files}
+                for date_str, filepath in sorted(files.items()):
+                    record = read_record_file(filepath)
+                    self.save_record(nickname, record.get("date", date_str), record, commit=False)
+                    counts["records"] += 1
+
+                self.conn.commit()
+                counts["users"] += 1
+            except Exception:
+                self.conn.rollback()
+                raise
+
+        return counts
+
+    def import_json_if_empty(self, profiles_file: str = "user_profiles.json", **kwargs) -> Optional[Dict[str, int]]:
+        """第一次切换到数据库时导入已有的JSON数据（数据库中已有用户时不做任何事）"""
+        if self.conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is not None:
+            return None
+        if not os.path.exists(profiles_file):
+            return None
+        counts = self.import_json(profiles_file, **kwargs)
+        logger.info(f"✅ 已把JSON数据导入数据库: {counts['users']} 个用户，{counts['records']} 天的记录")
+        return counts
+
+    def export_profiles(self, path: str = "user_profiles.json") -> int:
+        """导出 user_profiles.json，返回导出的用户数"""
+        profiles = self.load_profiles()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(profiles, f, ensure_ascii=False, indent=2)
+        return len(profiles)
+
+    def export_weight_history(self, nickname: str, path: str = None) -> str:
+        """导出 weight_history_<昵称>.json，返回文件路径"""
+        path = path or f"weight_history_{nickname}.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"user": nickname, "history": self.get_weight_history(nickname)},
+                      f, ensure_ascii=False, indent=2)
+        return path
+
+    def export_records(self, nickname: str, base_dir: str = "daily_records",
+                       serializer: JsonRecordSerializer = None) -> int:
+        """按用户分片的目录布局导出每日记录文件，返回导出的文件数"""
+        from Daily_Recorder import DailyHealthRecorder
+
+        recorder = DailyHealthRecorder(base_dir, serializer=serializer, user_id=nickname)
+        records = self.load_records(nickname)
+        for record in records:
+            recorder.save_date_record(record["date"], record)
+        return len(records)
+
+    def export_all(self, out_dir: str = ".") -> Dict[str, int]:
+        """导出全部数据为JSON文件（档案、每个用户的体重历史和每日记录）"""
+        os.makedirs(out_dir, exist_ok=True)
+        counts = {"users": self.export_profiles(os.path.join(out_dir, "user_profiles.json")), "records": 0}
+        for nickname in self.load_profiles():
+            self.export_weight_history(nickname, os.path.join(out_dir, f"weight_history_{nickname}.json"))
+            counts["records"] += self.export_records(nickname, os.path.join(out_dir, "daily_records"))
+        return counts
+
+
+# ==================== 命令行 ====================
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    command = sys.argv[1] if len(sys.argv) > 1 else "export"
+
+    if command == "import":
+        repository = HealthRepository(db_path=sys.argv[2] if len(sys.argv) > 2 else "health_assistant.db")
+        counts = repository.import_json()
+        print(f"✅ 已导入 {counts['users']} 个用户，{counts['weights']} 条体重记录，{counts['records']} 天的记录")
+    elif command == "export":
+        out_dir = sys.argv[2] if len(sys.argv) > 2 else "json_export"
+        repository = HealthRepository(db_path=sys.argv[3] if len(sys.argv) > 3 else "health_assistant.db")
+        counts = repository.export_all(out_dir)
+        print(f"✅ 已导出 {counts['users']} 个用户，{counts['records']} 天的记录到 {out_dir}")
+    else:
+        print(__doc__)
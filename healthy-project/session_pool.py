@@ -0,0 +1,142 @@
+"""
+机器人会话池
+为每个用户缓存一个 HealthAssistantBot 实例（包含记录器、对话历史和各功能管理器），
+按LRU淘汰，保证构造机器人的开销（状态打印、加载档案、构建工具定义）每个会话只发生一次
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+
+class BotSession:
+    """单个用户的会话"""
+
+    def __init__(self, nickname: str, bot: Any):
+        self.nickname = nickname
+        self.bot = bot
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.request_count = 0
+        # 同一个机器人的对话历史和记录文件不是线程安全的，同一用户的请求需要串行执行
+        self.lock = threading.RLock()
+
+    def touch(self) -> None:
+        """更新最近使用时间"""
+        self.last_used = time.time()
+        self.request_count += 1
+
+    def info(self) -> Dict[str, Any]:
+        """会话概要信息"""
+        return {
+            "nickname": self.nickname,
+            "created_at": self.created_at,
+            "last_used": self.last_used,
+            "request_count": self.request_count,
+            "history_length": len(getattr(self.bot, "history", []))
+        }
+
+
+class BotSessionPool:
+    """有上限、按LRU淘汰的会话池"""
+
+    def __init__(self, bot_factory: Callable[[str], Any], max_sessions: int = 128):
+        """
+        初始化会话池
+
+        Args:
+            bot_factory: 根据用户昵称创建机器人的函数
+            max_sessions: 最多同时保留的会话数量
+        """
+        self.bot_factory = bot_factory
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, BotSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 正在创建中的会话，避免同一用户的并发请求重复构造机器人
+        self._creating: Dict[str, threading.Event] = {}
+        self.created_count = 0
+        self.evicted_count = 0
+
+    def get(self, nickname: str) -> BotSession:
+        """
+        获取用户的会话，不存在时创建
+
+        Args:
+            nickname: 用户昵称
+
+        Returns:
+            用户会话
+        """
+        while True:
+            with self._lock:
+                session = self._sessions.get(nickname)
+                if session is not None:
+                    self._sessions.move_to_end(nickname)
+                    session.touch()
+                    return session
+
+                pending = self._creating.get(nickname)
+                if pending is None:
+                    pending = threading.Event()
+                    self._creating[nickname] = pending
+                    break
+
+            # 其他线程正在创建该用户的会话，等它完成后重试
+            pending.wait()
+
+        try:
+            # 构造机器人比较耗时，不持有全局锁，其他用户的请求不受影响
+            session = BotSession(nickname, self.bot_factory(nickname))
+            session.touch()
+
+            with self._lock:
+                self._sessions[nickname] = session
+                self.created_count += 1
+                while len(self._sessions) > self.max_sessions:
+                    evicted, _ = self._sessions.popitem(last=False)
+                    self.evicted_count += 1
+                    print(f"♻️ 会话池已满，淘汰最久未使用的会话: {evicted}")
+
+            return session
+
+        finally:
+            with self._lock:
+                self._creating.pop(nickname, None)
+            pending.set()
+
+    def peek(self, nickname: str) -> Optional[BotSession]:
+        """获取已存在的会话（不创建、不更新LRU顺序）"""
+        with self._lock:
+            return self._sessions.get(nickname)
+
+    def remove(self, nickname: str) -> bool:
+        """
+        移除用户会话
+
+        Returns:
+            会话是否存在
+        """
+        with self._lock:
+            return self._sessions.pop(nickname, None) is not None
+
+    def clear(self) -> None:
+        """清空所有会话"""
+        with self._lock:
+            self._sessions.clear()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        """会话池统计信息"""
+        with self._lock:
+            sessions: List[Dict[str, Any]] = [session.info() for session in self._sessions.values()]
+
+        return {
+            "active_sessions": len(sessions),
+            "max_sessions": self.max_sessions,
+            "created": self.created_count,
+            "evicted": self.evicted_count,
+            "sessions": sessions
+        }
@@ -0,0 +1,7 @@
+# conftest.py
+"""测试公共配置：项目模块是平铺的，把项目目录加入导入路径"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
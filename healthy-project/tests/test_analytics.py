@@ -0,0 +1,55 @@
+# test_analytics.py
+"""周汇总统计表"""
+
+import pytest
+
+from analytics import activity_trend, rebuild_weekly_summaries
+from database import HealthDatabaseSQLite
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = HealthDatabaseSQLite(str(tmp_path / "health.db"))
+    assert database.connect()
+    assert database.create_tables()
+    database.conn.execute("INSERT INTO users (nickname) VALUES ('测试用户')")
+    database.conn.commit()
+    yield database
+    database.disconnect()
+
+
+def _insert_days(conn, rows):
+    conn.executemany("""
+        INSERT INTO daily_records (user_id, record_date, breakfast_status, dinner_status, snack_status)
+        VALUES (1, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+
+
+def test_multi_entry_meals_count_as_eaten(db):
+    # 2026-01-19 是周一；同一餐记录多次后状态为 "吃了N次"
+    _insert_days(db.conn, [
+        ("2026-01-19", "吃了", "吃了", "没吃"),
+        ("2026-01-20", "吃了2次", "吃了2次", "吃了"),
+        ("2026-01-21", "没吃", "吃了3次", None),
+        ("2026-01-22", None, "没吃", "没吃"),
+    ])
+
+    week = activity_trend(db.conn, 1)[-1]
+    assert week["week_start"] == "2026-01-19"
+    assert week["days_recorded"] == 4
+    assert week["breakfast_days"] == 2
+    assert week["dinner_days"] == 3
+    assert week["snack_days"] == 1
+
+
+def test_rebuild_matches_triggers(db):
+    _insert_days(db.conn, [
+        ("2026-01-19", "吃了2次", "吃了", "没吃"),
+        ("2026-01-27", "吃了", "吃了4次", "吃了2次"),
+    ])
+    maintained = activity_trend(db.conn, 1)
+
+    rebuild_weekly_summaries(db.conn, user_id=1)
+    assert activity_trend(db.conn, 1) == maintained
+    assert [week["dinner_days"] for week in maintained] == [1, 1]
@@ -0,0 +1,61 @@
+# test_daily_recorder.py
+"""每日记录器（数据库仓储）"""
+
+import pytest
+
+from Daily_Recorder import DailyHealthRecorder
+from repository import HealthRepository
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repository = HealthRepository(db_path=str(tmp_path / "health.db"))
+    repository.save_profile({"nickname": "测试用户", "current_weight_kg": 70})
+    yield repository
+    repository.db.disconnect()
+
+
+def test_record_saved_for_existing_user(repo):
+    recorder = DailyHealthRecorder(user_id="测试用户", repository=repo)
+    data = recorder.load_today_record()
+    assert recorder.check_today_record_exists()
+
+    data["drink_number"] = 3
+    assert recorder.save_today_record(data)
+    assert recorder.load_today_record()["drink_number"] == 3
+
+
+def test_user_missing_from_database(repo):
+    # 档案已删除但会话还在时：不能无限递归，保存要报告失败
+    recorder = DailyHealthRecorder(user_id="不存在的用户", repository=repo)
+    data = recorder.load_today_record()
+
+    assert data["早餐状态"][0] == "没吃"
+    assert not recorder.check_today_record_exists()
+    assert not recorder.save_today_record(data)
+
+
+def test_history_appended_without_rewriting_record(repo):
+    recorder = DailyHealthRecorder(user_id="测试用户", repository=repo)
+    data = recorder.load_today_record()
+    for i in range(3):
+        assert recorder.add_daily_history("user", f"第{i}条")
+
+    # 当天状态不带历史，保存时不会覆盖已经追加的消息
+    assert "daily_history" not in recorder.load_today_record()
+    data["drink_number"] = 2
+    assert recorder.save_today_record(data)
+
+    assert [entry["content"] for entry in recorder.get_daily_history(2)] == ["第1条", "第2条"]
+    today = recorder.load_today_record()["date"]
+    assert len(recorder.load_date_record(today)["daily_history"]) == 3
+
+
+def test_history_trimmed_to_recent_entries(repo):
+    recorder = DailyHealthRecorder(user_id="测试用户", repository=repo)
+    for i in range(101):
+        recorder.add_daily_history("user", str(i))
+
+    history = recorder.get_daily_history(1000)
+    assert len(history) == 50
+    assert history[-1]["content"] == "100"
@@ -0,0 +1,29 @@
+# test_database_bridge.py
+"""数据库桥接器"""
+
+import os
+
+from database import HealthDatabaseSQLite
+from database_bridge import DatabaseBridge
+
+
+def test_lazy_connect_and_invalidate_after_commit(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    bridge = DatabaseBridge()
+    # 创建桥接器不连接数据库，也不启动后台写入线程
+    assert not os.path.exists("health_assistant.db")
+    assert bridge._writer is None
+
+    assert bridge.connected
+    assert bridge.db.create_tables()
+    bridge.db.conn.execute("INSERT INTO users (nickname, current_weight_kg) VALUES ('测试用户', 70)")
+    bridge.db.conn.commit()
+    assert bridge.db.get_user_by_nickname("测试用户")["current_weight_kg"] == 70
+
+    assert bridge.enqueue_weight_update("测试用户", 68.5)
+    assert bridge._writer is not None
+    assert bridge.writer.flush(timeout=5)
+
+    assert bridge.writer.metrics()["written"] == 1
+    assert bridge.db.get_user_by_nickname("测试用户")["current_weight_kg"] == 68.5
+    bridge.writer.shutdown()
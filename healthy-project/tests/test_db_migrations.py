@@ -0,0 +1,39 @@
+# test_db_migrations.py
+"""数据库结构升级和热点查询执行计划"""
+
+import json
+
+from database import HealthDatabaseSQLite
+from db_migrations import LATEST_VERSION, apply_migrations, check_query_plans, get_schema_version
+
+
+def test_latest_schema_has_no_plan_regressions(tmp_path):
+    database = HealthDatabaseSQLite(str(tmp_path / "health.db"))
+    assert database.connect()
+    assert database.create_tables()
+
+    try:
+        assert get_schema_version(database.conn) == LATEST_VERSION
+        assert check_query_plans(database.conn, verbose=False) == []
+    finally:
+        database.disconnect()
+
+
+def test_history_column_moved_to_entries_table(tmp_path):
+    database = HealthDatabaseSQLite(str(tmp_path / "health.db"))
+    assert database.connect()
+    assert database.create_tables(schema_version=5)
+
+    try:
+        conn = database.conn
+        conn.execute("INSERT INTO users (nickname) VALUES ('测试用户')")
+        conn.execute("""INSERT INTO daily_records (user_id, record_date, daily_history)
+                        VALUES (1, '2024-01-01', '[{"role": "user", "content": "早上好"}, {"role": "assistant", "content": "你好"}]')""")
+        conn.commit()
+
+        assert apply_migrations(conn) == [6]
+        rows = conn.execute("SELECT entry FROM daily_history_entries WHERE user_id = 1 ORDER BY id").fetchall()
+        assert [json.loads(row[0])["content"] for row in rows] == ["早上好", "你好"]
+        assert conn.execute("SELECT daily_history FROM daily_records").fetchone()[0] is None
+    finally:
+        database.disconnect()
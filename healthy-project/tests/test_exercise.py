@@ -0,0 +1,54 @@
+# test_exercise.py
+"""运动热量计算"""
+
+from Exercise import ExerciseFunctions
+
+
+def test_weight_update_applies_to_next_calculation():
+    users = {"测试用户": {"current_weight_kg": 60}}
+    exercise = ExerciseFunctions(None, lambda: users.get("测试用户"))
+    analysis = {"detected_type": "跑步", "duration_min": 60}
+
+    before = exercise._calculate_calories_from_analysis(analysis)["total_calories"]
+    # 机器人更新体重后重新加载档案（self.users = load_profiles()），换成新的字典
+    users = {"测试用户": {"current_weight_kg": 80}}
+    after = exercise._calculate_calories_from_analysis(analysis)["total_calories"]
+
+    assert before == int(9.8 * 60)
+    assert after == int(9.8 * 80)
+    assert exercise.calculate_sessions_batch([{"exercise_type": "跑步", "duration_min": 60}]) == [after]
+
+
+def test_profile_created_after_construction_uses_met():
+    users = {}
+    exercise = ExerciseFunctions(None, lambda: users.get("新用户"))
+    analysis = {"detected_type": "步行", "duration_min": 30}
+
+    assert exercise._calculate_calories_from_analysis(analysis)["calculation_method"] != "按MET计算"
+    users["新用户"] = {"current_weight_kg": 70}
+    result = exercise._calculate_calories_from_analysis(analysis)
+    assert result["calculation_method"] == "按MET计算"
+    assert result["total_calories"] == int(3.5 * 70 * 0.5)
+
+
+def test_clarification_answer_updates_the_record_it_asked_about(tmp_path):
+    from Daily_Recorder import DailyHealthRecorder
+
+    recorder = DailyHealthRecorder(str(tmp_path), user_id="测试用户")
+    today = recorder.load_today_record()
+    today["运动状态"] = ("运动了", [{"description": "今天去跑步了", "exercise_type": "跑步",
+                                 "record_status": "待计算卡路里"}])
+    recorder.save_today_record(today)
+    exercise = ExerciseFunctions(recorder, lambda: {"current_weight_kg": 60})
+
+    asked = exercise.calculate_exercise_calories("今天去跑步了")
+    assert asked["needs_clarification"]
+
+    # 用户的回答经运动状态工具传回来，也要算到同一条记录上
+    answered = exercise.update_exercise_status("跑了5公里")
+    records = recorder.load_today_record()["运动状态"][1]
+    assert answered["success"]
+    assert len(records) == 1
+    assert records[0]["distance_km"] == 5
+    assert records[0]["record_status"] == "已计算卡路里"
+    assert exercise.pending_clarification is None
@@ -0,0 +1,32 @@
+# test_nutrition_table.py
+"""营养成分表缓存"""
+
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from nutrition_table import load_nutrition_table
+
+
+def _write_csv(path, calories, mtime_ns):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("食物名称,能量(kcal),蛋白质(g),碳水化合物(g),脂肪(g)\n")
+        f.write(f"米饭,{calories},2.6,25.9,0.3\n")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_rebuild_does_not_touch_mapped_cache(tmp_path):
+    csv_path = str(tmp_path / "foods.csv")
+    _write_csv(csv_path, 116, 10 ** 18)
+    old = load_nutrition_table(csv_path)
+    assert isinstance(old.columns, np.memmap)
+
+    # CSV 更新后重建缓存：已经映射旧缓存的表仍然读到旧数据
+    _write_csv(csv_path, 120, 10 ** 18 + 1)
+    new = load_nutrition_table(csv_path)
+
+    assert old.get("米饭")["calories"] == 116
+    assert new.get("米饭")["calories"] == 120
+    assert not [name for name in os.listdir(tmp_path / "foods_cache") if name.endswith(".tmp")]
@@ -0,0 +1,29 @@
+# test_record_layout.py
+"""每日记录目录缓存"""
+
+import os
+
+from record_layout import RecordDirectoryCache
+
+
+def _touch(path, mtime_ns):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{}")
+    os.utime(os.path.dirname(path), ns=(mtime_ns, mtime_ns))
+
+
+def test_sees_files_written_by_other_processes(tmp_path):
+    cache = RecordDirectoryCache()
+    directory = str(tmp_path)
+    cache.ensure(directory)
+    os.utime(directory, ns=(10 ** 18, 10 ** 18))
+    assert cache.find(directory, "2026-01-19") is None
+
+    # 另一个进程写入了记录：目录修改时间变化后重新扫描
+    path = os.path.join(directory, "2026-01-19.json")
+    _touch(path, 10 ** 18 + 1)
+    assert cache.find(directory, "2026-01-19") == path
+
+    os.remove(path)
+    os.utime(directory, ns=(10 ** 18 + 2, 10 ** 18 + 2))
+    assert cache.find(directory, "2026-01-19") is None
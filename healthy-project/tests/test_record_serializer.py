@@ -0,0 +1,45 @@
+# test_record_serializer.py
+"""每日记录文件的冷热拆分"""
+
+import json
+import os
+
+from record_serializer import (history_path, list_record_files, read_record_fields, read_record_file,
+                               write_record_file)
+
+RECORD = {
+    "date": "2026-01-19",
+    "早餐状态": ["吃了", "燕麦"],
+    "daily_history": [{"time": "08:00", "content": "早餐吃了燕麦"}],
+}
+
+
+def test_history_written_to_separate_file(tmp_path):
+    path = str(tmp_path / "2026-01-19.json")
+    write_record_file(path, RECORD)
+
+    with open(path, encoding="utf-8") as f:
+        assert "daily_history" not in json.load(f)
+    assert os.path.exists(history_path(path))
+    assert read_record_file(path) == RECORD
+    assert list_record_files(str(tmp_path)) == {"2026-01-19": path}
+
+
+def test_projection_skips_history_file(tmp_path):
+    path = str(tmp_path / "2026-01-19.json")
+    write_record_file(path, RECORD)
+    # 历史文件损坏也不影响只读取状态字段
+    with open(history_path(path), "w", encoding="utf-8") as f:
+        f.write("not json")
+
+    assert read_record_fields(path, exclude=["daily_history"]) == {
+        "date": "2026-01-19", "早餐状态": ["吃了", "燕麦"]}
+
+
+def test_legacy_record_with_inline_history(tmp_path):
+    path = str(tmp_path / "2026-01-19.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(RECORD, f, ensure_ascii=False)
+
+    assert read_record_file(path) == RECORD
+    assert read_record_fields(path, fields=["daily_history"]) == {"daily_history": RECORD["daily_history"]}
@@ -8,8 +8,8 @@ from database import HealthDatabaseSQLite
 class UserManagerSQLite:
     """基于SQLite的用户管理类"""
 
-    def __init__(self):
-        self.db = HealthDatabaseSQLite()
+    def __init__(self, db_path: str = "health_assistant.db"):
+        self.db = HealthDatabaseSQLite(db_path)
         self.db.connect()
 
     def create_user_profile(self, user_data: Dict[str, Any]) -> Optional[int]:
@@ -50,10 +50,9 @@ class UserManagerSQLite:
             self.db.cursor.execute(sql, values)
             self.db.conn.commit()
 
-            # 获取用户ID
-            self.db.cursor.execute("SELECT id FROM users WHERE nickname = ?", (user_data.get('nickname'),))
-            result = self.db.cursor.fetchone()
-            user_id = result['id'] if result else None
+            # INSERT OR REPLACE 会生成新的用户ID，先清除缓存再查询
+            self.db.identity.invalidate(nickname=user_data.get('nickname'))
+            user_id = self.db.get_user_id(user_data.get('nickname'))
 
             if user_id:
                 # 添加初始体重记录
@@ -116,6 +115,7 @@ class UserManagerSQLite:
             self.add_weight_record(user_id, new_weight, bmi, status)
 
             self.db.conn.commit()
+            self.db.identity.invalidate(user_id=user_id)
 
             print(f"✅ 用户 '{nickname}' 体重更新成功")
             print(f"📊 新体重: {new_weight}kg, BMI: {bmi} ({status})")
@@ -147,11 +147,7 @@ class UserManagerSQLite:
                 return False
 
             # 删除用户（由于外键约束，会级联删除相关记录）
-            sql = "DELETE FROM users WHERE nickname = ?"
-            self.db.cursor.execute(sql, (nickname,))
-            self.db.conn.commit()
-
-            if self.db.cursor.rowcount > 0:
+            if self.db.delete_user(nickname):
                 print(f"✅ 用户 '{nickname}' 已删除")
                 return True
             else:
@@ -1,11 +1,11 @@
-import sqlite3
+from db_pool import get_pool
 
 
 def view_database():
-    conn = None
+    # 与应用共用同一个连接池（WAL模式下查看数据不会阻塞正在写入的会话）
+    pool = get_pool('health_assistant.db')
     try:
-        conn = sqlite3.connect('health_assistant.db')
-        cursor = conn.cursor()
+        cursor = pool.connection().cursor()
 
         # 查看所有表
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
@@ -34,15 +34,14 @@ def view_database():
             if rows:
                 print(f"\n数据 ({len(rows)} 行):")
                 for row in rows:
-                    print(f"  {row}")
+                    print(f"  {tuple(row)}")
             else:
                 print("\n表中没有数据")
 
     except Exception as e:
         print(f"错误: {e}")
     finally:
-        if conn:
-            conn.close()
+        pool.close_thread()
 
 
 if __name__ == "__main__":